@@ -14,7 +14,14 @@ from .ledger import Ledger
 from .notifier import Notifier
 from .logging_setup import setup_logging
 from .config import CommonConfig, add_common_arguments, parse_common_config, get_setting_from_arg_or_file
-from .files import is_file_safe_for_processing, are_file_and_path_names_safe, is_file_ready
+from .files import is_file_safe_for_processing, are_file_and_path_names_safe, is_file_ready, FileMetadata, SourceIdentity, NameSafetyValidator, find_unsafe_filenames
+from .open_files import OpenFileSnapshot, create_open_file_snapshot
+from .copy_engine import CopyEngine, COPY_MECHANISMS
+from .hash_cache import HashCache, default_hash_cache
+from .hash_engine import HashEngine
+from .streaming_io import StreamingIO, default_streaming_io
+from .scan_verdict_cache import ScanVerdictCache, default_scan_verdict_cache
+from .clamd_client import ClamdClient, default_clamd_client
 from .logger_injection import (configure_logging, get_logger)
 
 # Define what's publicly available when using "from shuttle_common import *"
@@ -50,6 +57,35 @@ __all__ = [
     'is_file_safe_for_processing',
     'are_file_and_path_names_safe',
     'is_file_ready',
+    'FileMetadata',
+    'SourceIdentity',
+    'NameSafetyValidator',
+    'find_unsafe_filenames',
+    
+    # Open file detection
+    'OpenFileSnapshot',
+    'create_open_file_snapshot',
+    
+    # File copying
+    'CopyEngine',
+    'COPY_MECHANISMS',
+    
+    # Hash cache
+    'HashCache',
+    'default_hash_cache',
+    'HashEngine',
+    
+    # Page cache hints
+    'StreamingIO',
+    'default_streaming_io',
+    
+    # Scan verdict cache
+    'ScanVerdictCache',
+    'default_scan_verdict_cache',
+    
+    # clamd client
+    'ClamdClient',
+    'default_clamd_client',
     
     # Hierarchy logging
     'configure_logging',
@@ -0,0 +1,478 @@
+"""
+Clamd Client
+
+Scans files by talking the clamd protocol over its Unix socket, instead of
+starting clamdscan for every file.
+
+Single files are scanned with FILDES, which passes clamd an open descriptor
+so it needs no permission to read quarantine, or with INSTREAM, which sends
+the file's contents. Both are sent in IDSESSION sessions that are kept open
+and reused, so a scan costs one request on a connected socket rather than a
+process and a connection. Directories are scanned with MULTISCAN or CONTSCAN,
+which clamd does not accept in a session, on a connection of their own.
+
+Sessions cannot be shared across fork, so each scan worker process opens its
+own, up to max_sessions at once for the threads of that process.
+"""
+
+import os
+import time
+import socket
+import struct
+import threading
+from .logger_injection import get_logger
+from . import files
+from .scan_utils import (
+    scan_result_types,
+    ScanTimeoutError,
+    log_scan_metrics,
+    parse_clam_av_version
+)
+
+
+CLAMD_SCAN_COMMANDS = ('FILDES', 'INSTREAM')
+CLAMD_DIRECTORY_SCAN_COMMANDS = ('MULTISCAN', 'CONTSCAN')
+
+DEFAULT_MAX_SESSIONS = 4
+
+# Seconds to wait for clamd to accept a connection
+CONNECT_TIMEOUT_SECONDS = 10
+
+# INSTREAM chunk size, must be below clamd's StreamMaxLength
+INSTREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class ClamdProtocolError(Exception):
+    """Raised when clamd closes a session or replies out of turn"""
+    pass
+
+
+def parse_clamd_reply(reply):
+    """
+    Map a clamd scan reply onto scan_result_types.
+
+    Only the end of the reply is checked, a file name before it cannot change the result.
+
+    Args:
+        reply (str): Reply without session id, e.g. 'stream: Eicar-Signature FOUND'
+
+    Returns:
+        int: scan_result_types value
+    """
+    logger = get_logger()
+
+    if reply.endswith(' FOUND'):
+        logger.warning("Threats found")
+        return scan_result_types.FILE_IS_SUSPECT
+
+    if reply.endswith(': OK'):
+        logger.info("No threat found")
+        return scan_result_types.FILE_IS_CLEAN
+
+    logger.warning(f"Error while scanning: {reply}")
+    return scan_result_types.FILE_SCAN_FAILED
+
+
+class _Connection:
+    """A connected clamd socket with a deadline for each request."""
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+            self.sock.connect(socket_path)
+        except OSError:
+            self.sock.close()
+            raise
+        self.deadline = None
+        self._buffer = b''
+
+    def start(self, timeout_seconds):
+        """Start a request that must be answered within timeout_seconds (None for no limit)."""
+        self.deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+
+    def _apply_deadline(self):
+        if self.deadline is None:
+            self.sock.settimeout(None)
+            return
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("clamd request deadline passed")
+        self.sock.settimeout(remaining)
+
+    def send(self, data):
+        self._apply_deadline()
+        self.sock.sendall(data)
+
+    def send_fd(self, fd):
+        self._apply_deadline()
+        # clamd reads the descriptor from a message carrying at least one byte
+        socket.send_fds(self.sock, [b'\0'], [fd])
+
+    def read_reply(self):
+        """
+        Read one null terminated reply.
+
+        Returns:
+            str: The reply, or None if clamd closed the connection before sending one
+        """
+        while b'\0' not in self._buffer:
+            self._apply_deadline()
+            data = self.sock.recv(4096)
+            if not data:
+                return None
+            self._buffer += data
+        reply, _, self._buffer = self._buffer.partition(b'\0')
+        return reply.decode('utf-8', errors='replace')
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _ClamdSession:
+    """An IDSESSION session, replies carry the id of the request they answer."""
+
+    def __init__(self, socket_path):
+        self.connection = _Connection(socket_path)
+        self.connection.send(b'zIDSESSION\0')
+        self._next_id = 1
+
+    def request(self, command, timeout_seconds, send_body=None):
+        """
+        Send a command and wait for its reply.
+
+        Args:
+            command (bytes): Command name, e.g. b'FILDES'
+            timeout_seconds: Time allowed for the whole request, None for no limit
+            send_body (callable): Sends anything that follows the command, given the connection
+
+        Returns:
+            str: The reply without its session id
+
+        Raises:
+            socket.timeout: If clamd did not reply in time
+            ClamdProtocolError: If clamd ended the session or replied out of turn
+        """
+        request_id = self._next_id
+        self._next_id += 1
+
+        self.connection.start(timeout_seconds)
+        self.connection.send(b'z' + command + b'\0')
+        if send_body is not None:
+            send_body(self.connection)
+
+        reply = self.connection.read_reply()
+        if reply is None:
+            raise ClamdProtocolError("clamd closed the session")
+
+        prefix = f"{request_id}: "
+        if not reply.startswith(prefix):
+            raise ClamdProtocolError(f"Unexpected reply to request {request_id}: {reply}")
+        return reply[len(prefix):]
+
+    def close(self):
+        """End the session."""
+        try:
+            self.connection.start(CONNECT_TIMEOUT_SECONDS)
+            self.connection.send(b'zEND\0')
+        except OSError:
+            pass
+        self.connection.close()
+
+
+class ClamdClient:
+    """
+    Pool of persistent clamd sessions.
+
+    Usage:
+        - configure() with the clamd socket path before scan workers are started,
+          the client is disabled until then
+        - scan_file() from any thread or process, using an idle session or opening one
+        - scan_directory() for a directory, on a connection of its own
+        - close() to end this process's sessions
+    """
+
+    def __init__(self, socket_path=None, max_sessions=DEFAULT_MAX_SESSIONS, scan_command='FILDES'):
+        """
+        Initialize the client.
+
+        Args:
+            socket_path (str): Path of clamd's Unix socket (None to disable)
+            max_sessions (int): Maximum sessions open at once in each process
+            scan_command (str): 'FILDES' to pass clamd a descriptor, or 'INSTREAM' to send
+                the contents, for clamd instances that cannot receive descriptors
+        """
+        self.socket_path = None
+        self.max_sessions = DEFAULT_MAX_SESSIONS
+        self.scan_command = 'FILDES'
+        self._reset()
+        self.configure(socket_path, max_sessions, scan_command)
+
+    def _reset(self):
+        # Locks and sessions inherited across fork belong to the parent
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self._idle = []
+
+    def configure(self, socket_path, max_sessions=DEFAULT_MAX_SESSIONS, scan_command='FILDES'):
+        """
+        Set the clamd socket, closing any sessions to a previous one.
+
+        Args:
+            As for __init__
+
+        Raises:
+            ValueError: If scan_command or max_sessions is not valid
+        """
+        scan_command = (scan_command or 'FILDES').upper()
+        if scan_command not in CLAMD_SCAN_COMMANDS:
+            raise ValueError(f"Unsupported clamd scan command: {scan_command}, use one of {', '.join(CLAMD_SCAN_COMMANDS)}")
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+
+        if (socket_path, max_sessions, scan_command) == (self.socket_path, self.max_sessions, self.scan_command):
+            return
+
+        self.close()
+        self.socket_path = socket_path
+        self.max_sessions = max_sessions
+        self.scan_command = scan_command
+        self._reset()
+
+    @property
+    def enabled(self):
+        """True when a clamd socket has been configured."""
+        return self.socket_path is not None
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            # Leave the parent's sessions open, only this process's copies of the sockets are closed
+            for session in self._idle:
+                session.connection.close()
+            self._reset()
+
+    def _acquire(self):
+        """
+        Take an idle session, or open one.
+
+        Returns:
+            tuple: (session, reused) where reused is True if the session had been used before
+        """
+        self._slots.acquire()
+        try:
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop(), True
+            return _ClamdSession(self.socket_path), False
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, session, keep=True):
+        if keep:
+            with self._lock:
+                self._idle.append(session)
+        else:
+            session.close()
+        self._slots.release()
+
+    def _request(self, command, timeout_seconds, send_body=None):
+        """
+        Send a command on a pooled session.
+
+        A session clamd has closed since it was last used (after its IdleTimeout, or a
+        restart) is replaced by a new one and the request is sent again.
+
+        Returns:
+            str: The reply without its session id
+
+        Raises:
+            ScanTimeoutError: If clamd did not reply in time
+            OSError, ClamdProtocolError: If clamd cannot be reached or the request failed
+        """
+        self._check_process()
+
+        while True:
+            session, reused = self._acquire()
+            try:
+                reply = session.request(command, timeout_seconds, send_body)
+            except socket.timeout:
+                self._release(session, keep=False)
+                raise ScanTimeoutError(f"clamd did not reply to {command.decode()} within {timeout_seconds} seconds")
+            except (OSError, ClamdProtocolError):
+                self._release(session, keep=False)
+                if reused:
+                    continue
+                raise
+            self._release(session)
+            return reply
+
+    def scan_file(self, path, timeout_seconds=None, file_size_bytes=None):
+        """
+        Scan a file with the configured scan command.
+
+        Args:
+            path (str): Path to the file to scan
+            timeout_seconds (int, optional): Timeout in seconds (None for no timeout)
+            file_size_bytes (int, optional): File size if already known, used for scan metrics
+
+        Returns:
+            int: scan_result_types value
+
+        Raises:
+            ScanTimeoutError: If the scan times out
+        """
+        logger = get_logger()
+
+        if not files.is_pathname_safe(path):
+            logger.error(f"Security error: Unsafe filename detected: {path}")
+            return scan_result_types.FILE_SCAN_FAILED
+
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            logger.warning(f"File not found at {path}")
+            return scan_result_types.FILE_NOT_FOUND
+        except OSError as e:
+            logger.error(f"Could not open {path} for scanning: {e}")
+            return scan_result_types.FILE_SCAN_FAILED
+
+        try:
+            logger.info(f"Scanning file {path} for malware with clamd {self.scan_command}...")
+            start_time = time.time()
+
+            if self.scan_command == 'FILDES':
+                send_body = lambda connection: connection.send_fd(fd)
+            else:
+                send_body = lambda connection: self._send_stream(connection, fd)
+
+            try:
+                reply = self._request(self.scan_command.encode(), timeout_seconds, send_body)
+            except ScanTimeoutError:
+                logger.error(f"Scan timed out after {timeout_seconds} seconds for {path} (actual time: {time.time() - start_time:.2f}s)")
+                raise
+            except (OSError, ClamdProtocolError) as e:
+                logger.error(f"Exception during clamd scan of {path}: {e}")
+                return scan_result_types.FILE_SCAN_FAILED
+
+            log_scan_metrics(path, time.time() - start_time, timeout_seconds, file_size_bytes)
+            logger.debug(f"clamd reply: {reply}")
+
+            return parse_clamd_reply(reply)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _send_stream(connection, fd):
+        # Each chunk is prefixed with its length, a zero length chunk ends the stream
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            chunk = os.read(fd, INSTREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            connection.send(struct.pack('!L', len(chunk)) + chunk)
+        connection.send(struct.pack('!L', 0))
+
+    def scan_directory(self, path, timeout_seconds=None, command='MULTISCAN'):
+        """
+        Scan a directory with one MULTISCAN or CONTSCAN request.
+
+        clamd reads the files itself, so it must have permission to read the directory.
+
+        Args:
+            path (str): Directory to scan
+            timeout_seconds (int, optional): Timeout in seconds (None for no timeout)
+            command (str): 'MULTISCAN' to scan files in parallel in clamd, or 'CONTSCAN'
+
+        Returns:
+            tuple: (result, findings) where result is FILE_IS_CLEAN if clamd found nothing,
+                FILE_IS_SUSPECT if it found threats, and FILE_SCAN_FAILED on any error, and
+                findings maps each path clamd reported a threat or error for to its result
+
+        Raises:
+            ScanTimeoutError: If the scan times out
+        """
+        logger = get_logger()
+
+        command = command.upper()
+        if command not in CLAMD_DIRECTORY_SCAN_COMMANDS:
+            raise ValueError(f"Unsupported clamd directory scan command: {command}")
+
+        if not files.is_pathname_safe(path):
+            logger.error(f"Security error: Unsafe filename detected: {path}")
+            return scan_result_types.FILE_SCAN_FAILED, {}
+
+        findings = {}
+        replies = 0
+        connection = None
+        try:
+            connection = _Connection(self.socket_path)
+            connection.start(timeout_seconds)
+            connection.send(b'z' + command.encode() + b' ' + os.fsencode(path) + b'\0')
+
+            # One reply for each threat or error, or one OK for the directory, then clamd closes the connection
+            while True:
+                reply = connection.read_reply()
+                if reply is None:
+                    break
+                replies += 1
+                result = parse_clamd_reply(reply)
+                if result != scan_result_types.FILE_IS_CLEAN:
+                    findings[reply.rsplit(': ', 1)[0]] = result
+        except socket.timeout:
+            logger.error(f"clamd {command} of {path} timed out after {timeout_seconds} seconds")
+            raise ScanTimeoutError(f"Scan timed out for {path}")
+        except OSError as e:
+            logger.error(f"Exception during clamd {command} of {path}: {e}")
+            return scan_result_types.FILE_SCAN_FAILED, findings
+        finally:
+            if connection is not None:
+                connection.close()
+
+        if not replies or scan_result_types.FILE_SCAN_FAILED in findings.values():
+            return scan_result_types.FILE_SCAN_FAILED, findings
+        if findings:
+            return scan_result_types.FILE_IS_SUSPECT, findings
+        return scan_result_types.FILE_IS_CLEAN, findings
+
+    def get_versions(self):
+        """
+        Get the engine and signature database versions of the clamd instance.
+
+        Returns:
+            tuple: (engine_version, definitions_version), each None if it cannot be determined
+        """
+        logger = get_logger()
+        self._check_process()
+
+        try:
+            reply = self._request(b'VERSION', CONNECT_TIMEOUT_SECONDS)
+        except (ScanTimeoutError, OSError, ClamdProtocolError) as e:
+            logger.warning(f"Error getting ClamAV version from clamd: {e}")
+            return None, None
+
+        versions = parse_clam_av_version(reply)
+        if versions is None:
+            logger.warning(f"Failed to get ClamAV version from clamd: {reply}")
+            return None, None
+
+        logger.debug(f"Detected ClamAV version: {reply}")
+        return versions
+
+    def close(self):
+        """End this process's idle sessions."""
+        if self._pid != os.getpid():
+            self._check_process()
+            return
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+
+# Configured by Shuttle at startup, scan worker processes inherit the settings
+default_clamd_client = ClamdClient()
@@ -0,0 +1,207 @@
+"""
+Copy Engine
+
+This module copies file contents using the fastest mechanism that works
+between two filesystems, trying in order:
+
+- reflink: FICLONE ioctl, the copy shares blocks with the source (XFS, Btrfs)
+- copy_file_range: in-kernel copy, server side copy on NFS 4.2 and SMB3
+- sendfile: in-kernel copy without the userspace buffer
+- readinto: userspace copy through a large buffer
+
+The first mechanism that works for a (source device, destination device)
+pair is remembered, so later copies between the same filesystems go straight
+to it. Only file contents are copied, callers copy metadata.
+"""
+
+import os
+import errno
+from .logger_injection import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+
+COPY_MECHANISM_REFLINK = 'reflink'
+COPY_MECHANISM_COPY_FILE_RANGE = 'copy_file_range'
+COPY_MECHANISM_SENDFILE = 'sendfile'
+COPY_MECHANISM_READINTO = 'readinto'
+
+COPY_MECHANISMS = (
+    COPY_MECHANISM_REFLINK,
+    COPY_MECHANISM_COPY_FILE_RANGE,
+    COPY_MECHANISM_SENDFILE,
+    COPY_MECHANISM_READINTO,
+)
+
+# From linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# Bytes requested per copy_file_range or sendfile call
+KERNEL_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+READINTO_BUFFER_SIZE = 1024 * 1024
+
+# Errors meaning a mechanism is not supported between two files, rather than a failed copy
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+    errno.ENOTTY, errno.EBADF, errno.EPERM, errno.ETXTBSY,
+    getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP),
+}
+
+
+class CopyMechanismUnsupported(Exception):
+    """Raised by a mechanism that cannot copy between the two files."""
+    pass
+
+
+def _raise_if_unsupported(error):
+    if error.errno in UNSUPPORTED_ERRNOS:
+        raise CopyMechanismUnsupported(str(error))
+    raise error
+
+
+def _copy_reflink(source_fd, target_fd, size):
+    if fcntl is None:
+        raise CopyMechanismUnsupported("fcntl not available")
+    try:
+        fcntl.ioctl(target_fd, FICLONE, source_fd)
+    except OSError as e:
+        _raise_if_unsupported(e)
+
+
+def _copy_file_range(source_fd, target_fd, size):
+    if not hasattr(os, 'copy_file_range'):
+        raise CopyMechanismUnsupported("os.copy_file_range not available")
+    copied = 0
+    while True:
+        try:
+            count = os.copy_file_range(source_fd, target_fd, KERNEL_COPY_CHUNK_SIZE)
+        except OSError as e:
+            if copied == 0:
+                _raise_if_unsupported(e)
+            raise
+        if count == 0:
+            break
+        copied += count
+    if copied == 0 and size > 0:
+        # Some filesystems report success without copying anything
+        raise CopyMechanismUnsupported("copy_file_range copied no data")
+
+
+def _copy_sendfile(source_fd, target_fd, size):
+    if not hasattr(os, 'sendfile'):
+        raise CopyMechanismUnsupported("os.sendfile not available")
+    offset = 0
+    while True:
+        try:
+            count = os.sendfile(target_fd, source_fd, offset, KERNEL_COPY_CHUNK_SIZE)
+        except OSError as e:
+            if offset == 0:
+                _raise_if_unsupported(e)
+            raise
+        if count == 0:
+            break
+        offset += count
+    if offset == 0 and size > 0:
+        raise CopyMechanismUnsupported("sendfile copied no data")
+
+
+def _copy_readinto(source_fd, target_fd, size):
+    buffer = bytearray(READINTO_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(source_fd, 'rb', buffering=0, closefd=False) as source_file, \
+            open(target_fd, 'wb', buffering=0, closefd=False) as target_file:
+        while True:
+            length = source_file.readinto(buffer)
+            if not length:
+                break
+            written = 0
+            while written < length:
+                written += target_file.write(view[written:length])
+
+
+_COPY_FUNCTIONS = {
+    COPY_MECHANISM_REFLINK: _copy_reflink,
+    COPY_MECHANISM_COPY_FILE_RANGE: _copy_file_range,
+    COPY_MECHANISM_SENDFILE: _copy_sendfile,
+    COPY_MECHANISM_READINTO: _copy_readinto,
+}
+
+
+class CopyEngine:
+    """
+    Copy file contents with the fastest mechanism that works for each pair of filesystems.
+
+    Mechanisms found not to work for a (source st_dev, destination st_dev)
+    pair are remembered for the life of the engine and not tried again for
+    that pair. Counts of copies made with each mechanism are kept in
+    mechanism_counts.
+    """
+
+    def __init__(self, mechanisms=COPY_MECHANISMS):
+        """
+        Initialize the engine.
+
+        Args:
+            mechanisms: Mechanisms to try, in order of preference. readinto is always
+                tried last as it works between any two files.
+        """
+        self.mechanisms = tuple(m for m in mechanisms if m != COPY_MECHANISM_READINTO) + (COPY_MECHANISM_READINTO,)
+        self.mechanism_counts = {mechanism: 0 for mechanism in self.mechanisms}
+        self._unsupported = {}       # (source dev, target dev) -> set of mechanisms
+        self._pair_mechanisms = {}   # (source dev, target dev) -> mechanism last used
+
+    def get_mechanism(self, source_dev, target_dev):
+        """Get the mechanism last used between two devices, or None if nothing has been copied yet."""
+        return self._pair_mechanisms.get((source_dev, target_dev))
+
+    def copy(self, from_path, to_path, mechanisms=None):
+        """
+        Copy the contents of from_path to to_path, creating or truncating to_path.
+
+        Args:
+            from_path (str): Source file path
+            to_path (str): Destination file path
+            mechanisms: Optional subset of mechanisms to try (default: all of the engine's)
+
+        Returns:
+            str: The mechanism used, or None if none of the given mechanisms work
+                between the two filesystems (to_path is then left empty)
+        """
+        logger = get_logger()
+
+        with open(from_path, 'rb') as source_file, open(to_path, 'wb') as target_file:
+            source_fd = source_file.fileno()
+            target_fd = target_file.fileno()
+            source_stat = os.fstat(source_fd)
+            pair = (source_stat.st_dev, os.fstat(target_fd).st_dev)
+            unsupported = self._unsupported.setdefault(pair, set())
+
+            for mechanism in self.mechanisms:
+                if mechanism in unsupported or (mechanisms is not None and mechanism not in mechanisms):
+                    continue
+                try:
+                    _COPY_FUNCTIONS[mechanism](source_fd, target_fd, source_stat.st_size)
+                except CopyMechanismUnsupported as e:
+                    logger.debug(f"Copy mechanism {mechanism} not supported from {from_path} to {to_path}: {e}")
+                    unsupported.add(mechanism)
+                    # Start again from an empty file
+                    os.ftruncate(target_fd, 0)
+                    os.lseek(target_fd, 0, os.SEEK_SET)
+                    os.lseek(source_fd, 0, os.SEEK_SET)
+                    continue
+
+                if self._pair_mechanisms.get(pair) != mechanism:
+                    logger.info(f"Using {mechanism} to copy from device {pair[0]} to device {pair[1]}")
+                    self._pair_mechanisms[pair] = mechanism
+                self.mechanism_counts[mechanism] += 1
+                return mechanism
+
+        return None
+
+
+# Engine shared by the copy functions in shuttle_common.files
+default_copy_engine = CopyEngine()
@@ -1,11 +1,156 @@
 import os
+import re
+import errno
 import shutil
 import hashlib
 import time
 import subprocess
 from pathlib import Path
+from typing import NamedTuple
 import gnupg
 from .logger_injection import get_logger
+from .copy_engine import (
+    default_copy_engine,
+    COPY_MECHANISM_REFLINK,
+    COPY_MECHANISM_COPY_FILE_RANGE,
+    COPY_MECHANISM_SENDFILE
+)
+from .hash_cache import default_hash_cache, get_file_identity
+from .hash_engine import default_hash_engine
+from .streaming_io import default_streaming_io
+
+
+class FileMetadata(NamedTuple):
+    """
+    Stat results for a file, taken once and passed along with the file so
+    later checks (stability, throttling, tracking, scan timeouts) do not
+    need to stat it again.
+    """
+    size: int
+    mtime_ns: int
+    inode: int
+    dev: int
+
+    @classmethod
+    def from_stat(cls, st):
+        """Create from an os.stat_result (or os.DirEntry.stat() result)."""
+        return cls(st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+    @property
+    def size_mb(self):
+        return self.size / (1024 * 1024)
+
+    @property
+    def mtime(self):
+        return self.mtime_ns / 1e9
+
+
+class SourceIdentity(NamedTuple):
+    """
+    Identity of a source file taken when it is copied. If the file still has
+    the same identity later, its contents are assumed to be those that were copied.
+    """
+    size: int
+    mtime_ns: int
+    ctime_ns: int
+    inode: int
+    dev: int
+
+    @classmethod
+    def from_stat(cls, st):
+        """Create from an os.stat_result."""
+        return cls(st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino, st.st_dev)
+
+
+def get_source_identity(file_path):
+    """
+    Stat a file and return its identity.
+    
+    Args:
+        file_path (str): Path to the file
+        
+    Returns:
+        SourceIdentity: Identity of the file, or None if it could not be read
+    """
+    try:
+        return SourceIdentity.from_stat(os.stat(file_path))
+    except OSError as e:
+        logger = get_logger()
+        logger.debug(f"Could not stat file {file_path}: {e}")
+        return None
+
+
+def get_file_metadata(file_path):
+    """
+    Stat a file and return its metadata.
+    
+    Args:
+        file_path (str): Path to the file
+        
+    Returns:
+        FileMetadata: Metadata for the file, or None if it could not be read
+    """
+    try:
+        return FileMetadata.from_stat(os.stat(file_path))
+    except OSError as e:
+        logger = get_logger()
+        logger.debug(f"Could not stat file {file_path}: {e}")
+        return None
+
+
+def iter_files_with_metadata(root_path):
+    """
+    Walk a directory tree with os.scandir, yielding each file with its metadata.
+    
+    Directories are visited bottom up (deepest first), in the same order as
+    os.walk(root_path, topdown=False). Symbolic links to directories are not
+    followed. Files that disappear or cannot be stat'ed during the walk are skipped.
+    
+    Args:
+        root_path (str): Root of the directory tree
+        
+    Yields:
+        tuple: (directory_path, file_name, FileMetadata)
+    """
+    logger = get_logger()
+
+    # Each stack entry is (directory_path, files found, subdirectories still to visit)
+    stack = []
+
+    def read_directory(directory_path):
+        files = []
+        subdirectories = []
+        try:
+            with os.scandir(directory_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                        elif not entry.is_dir():
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Could not read directory {directory_path}: {e}")
+        subdirectories.reverse()
+        return (directory_path, files, subdirectories)
+
+    stack.append(read_directory(root_path))
+    while stack:
+        directory_path, files, subdirectories = stack[-1]
+        if subdirectories:
+            stack.append(read_directory(subdirectories.pop()))
+            continue
+
+        stack.pop()
+        for entry in files:
+            try:
+                file_metadata = FileMetadata.from_stat(entry.stat())
+            except OSError as e:
+                logger.debug(f"Could not stat file {entry.path}: {e}")
+                continue
+            yield directory_path, entry.name, file_metadata
+
 
 def is_filename_safe(filename):
     """
@@ -38,6 +183,18 @@ def is_pathname_safe(pathname):
         
     return is_name_safe(pathname, True)
 
+# Characters and sequences that make a name unsafe, compiled once:
+# control characters, lone surrogates (bytes that were not valid UTF-8,
+# decoded with surrogateescape) and shell or traversal metacharacters
+_UNSAFE_CHARACTERS = r'\x00-\x1f\x7f\ud800-\udfff\\<>|*$&;`'
+_UNSAFE_PATHNAME_PATTERN = re.compile(r'[' + _UNSAFE_CHARACTERS + r']|\.\.')
+_UNSAFE_FILENAME_PATTERN = re.compile(r'[' + _UNSAFE_CHARACTERS + r'/]|\.\.')
+
+# Names in a listing joined with '/' (which cannot appear in a filename),
+# also matching any name that starts with a dash or period
+_UNSAFE_LISTING_PATTERN = re.compile(r'[' + _UNSAFE_CHARACTERS + r']|\.\.|(?:^|/)[-.]')
+
+
 def is_name_safe(name, is_path = False):
     """
     Check if a filename contains potentially dangerous characters.
@@ -51,58 +208,123 @@ def is_name_safe(name, is_path = False):
     Returns:
         bool: True if filename is safe, False otherwise
     """
-    # Block control characters (0x00-0x1F, 0x7F)
-    if any(ord(char) < 32 or ord(char) == 0x7F for char in name):
+    # Block control characters, characters that are not valid UTF-8 and
+    # dangerous character sequences (forward slashes only in filenames)
+    pattern = _UNSAFE_PATHNAME_PATTERN if is_path else _UNSAFE_FILENAME_PATTERN
+    if pattern.search(name):
         return False
         
-    # Define dangerous characters based on whether this is a path or filename
-    dangerous_chars = ['\\', '..', '>', '<', '|', '*', '$', '&', ';', '`']
-    
-    # For filenames (not paths), also block forward slashes
-    if not is_path:
-        dangerous_chars.append('/')
-    
-    # Check for dangerous character sequences
-    for char in dangerous_chars:
-        if char in name:
-            return False
-        
     # For paths, only check the filename part for starting with dash or period
     check_name = name
     if is_path and '/' in name:
-        check_name = name.rstrip('/').split('/')[-1]  # Get the last component
+        check_name = name.rstrip('/').rpartition('/')[2]  # Get the last component
     
     # Block filenames starting with dash or period (unless it's . or ..)
-    if check_name not in ['.', '..'] and (check_name.startswith('-') or check_name.startswith('.')):
-        return False
-        
-    # Ensure filename is valid UTF-8
-    try:
-        name.encode('utf-8').decode('utf-8')
-    except UnicodeError:
+    if check_name[:1] in ('-', '.') and check_name not in ('.', '..'):
         return False
         
     return True
 
-def get_file_hash(file_path):
+def find_unsafe_filenames(names):
+    """
+    Check all the filenames from a directory listing at once.
+    
+    A listing where every name is safe, the usual case, is checked with a
+    single regex search.
+    
+    Args:
+        names (list): Filenames (not paths) from one directory listing
+        
+    Returns:
+        list: The names that are not safe, in listing order
+    """
+    if not names or not _UNSAFE_LISTING_PATTERN.search('/'.join(names)):
+        return []
+    return [name for name in names if not is_filename_safe(name)]
+
+
+class NameSafetyValidator:
+    """
+    Name safety checks for one pass over the source tree.
+    
+    Every file in a directory shares the same directory path, so the verdict
+    for each directory is kept and each directory is only checked once.
+    """
+    
+    def __init__(self):
+        self._directory_verdicts = {}
+    
+    def is_directory_safe(self, source_root):
+        """
+        Check a directory path, using the verdict from an earlier file in the same directory.
+        
+        Args:
+            source_root (str): Directory path
+            
+        Returns:
+            bool: True if the directory path is safe, False otherwise
+        """
+        verdict = self._directory_verdicts.get(source_root)
+        if verdict is None:
+            verdict = is_pathname_safe(source_root)
+            self._directory_verdicts[source_root] = verdict
+        return verdict
+    
+    def are_file_and_path_names_safe(self, source_file, source_root):
+        """
+        Check if filenames and paths are safe for processing.
+        
+        Gives the same result as are_file_and_path_names_safe(). The full path
+        is not checked separately: a safe filename cannot start with a period
+        or contain a slash, so joining it to a safe directory path cannot
+        create an unsafe sequence.
+        
+        Args:
+            source_file: Filename only
+            source_root: Directory containing the file
+           
+        Returns:
+            bool: True if all names are safe, False otherwise
+        """
+        if not is_filename_safe(source_file):
+            logger = get_logger()
+            logger.error(f"Skipping file {source_file} because it contains unsafe characters.")
+            return False
+        
+        if not self.is_directory_safe(source_root):
+            logger = get_logger()
+            logger.error(f"Skipping file in directory {source_root} because the path contains unsafe characters.")
+            return False
+        
+        return True
+
+def get_file_hash(file_path, use_cache=True, algorithm=None):
     """
-    Compute the SHA-256 hash of a file.
+    Compute the hash of a file, with the configured algorithm (SHA-256 by default).
+
+    The hash is taken from default_hash_cache when the file's identity
+    (dev, inode, size, mtime_ns) is unchanged since it was last hashed.
 
     Args:
         file_path (str): Path to the file.
+        use_cache (bool): Whether to use a cached hash, False always reads the file.
+        algorithm (str): Hash algorithm (default: default_hash_engine.algorithm)
 
 
     Returns:
         str: The computed hash or None if an error occurred.
     """
-    hash_sha256 = hashlib.sha256()
-        
+    algorithm = algorithm or default_hash_engine.algorithm
     try:
-        with open(file_path, 'rb') as f:
-            # Read the file in chunks to avoid memory issues with large files
-            for chunk in iter(lambda: f.read(4096), b''):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+        with open(file_path, 'rb', buffering=0) as f:
+            identity = get_file_identity(os.fstat(f.fileno()))
+            cached_hash = default_hash_cache.get(identity, algorithm) if use_cache else None
+            if cached_hash is not None:
+                return cached_hash
+
+            file_hash = default_hash_engine.hash_open_file(f, algorithm)
+            default_hash_cache.put(get_file_identity(os.fstat(f.fileno())), file_hash, identity, algorithm)
+        return file_hash
     except FileNotFoundError:
         logger = get_logger()
         logger.error(f"File not found: {file_path}")
@@ -228,14 +450,122 @@ def verify_file_integrity(source_file_path, comparison_file_path):
         return result
 
 
-def copy_temp_then_rename(from_path, to_path):
+# Buffer size used when copying and hashing in one pass
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Copy mechanisms tried before hashing the bytes in a userspace copy
+KERNEL_COPY_MECHANISMS = (COPY_MECHANISM_REFLINK, COPY_MECHANISM_COPY_FILE_RANGE, COPY_MECHANISM_SENDFILE)
+
+
+class FileIntegrityError(Exception):
+    """Raised when copied bytes do not match the expected hash."""
+    pass
+
+
+def copy_file_with_digests(from_path, to_path, algorithms=None):
     """
-    Copy a file to a temporary location then rename it to the final destination.
+    Copy a file's contents and metadata, hashing the bytes as they are copied.
+    
+    The copy is made in the kernel by default_copy_engine where it can be: a reflink
+    clone sharing the source's blocks, or copy_file_range or sendfile, and the hashes
+    are then computed by reading the copy once. Where no kernel copy works between
+    the two filesystems, the bytes are hashed as they are copied in userspace, so
+    the source is still only read once.
+    
+    The hashes are stored in default_hash_cache for both files, so they are not
+    read again to hash them while unchanged.
     
     Args:
         from_path (str): Source file path
-        to_path (str): Destination file path
-       
+        to_path (str): Destination file path (overwritten)
+        algorithms: Hash algorithms (default: default_hash_engine.algorithms, the
+            configured algorithm and any secondary algorithm)
+        
+    Returns:
+        dict: Algorithm name to hex digest of the copied bytes
+    """
+    algorithms = tuple(algorithms or default_hash_engine.algorithms)
+    source_identity = get_file_identity(os.stat(from_path))
+    
+    if default_copy_engine.copy(from_path, to_path, mechanisms=KERNEL_COPY_MECHANISMS):
+        with open(to_path, 'rb', buffering=0) as copied_file:
+            digests = default_hash_engine.hash_open_file_with_algorithms(copied_file, algorithms)
+        # Kernel copies pass through the page cache too, the copy was dropped as it was hashed
+        default_streaming_io.drop_file(from_path)
+        default_streaming_io.drop_file(to_path, flush=True)
+    else:
+        # A userspace copy hashes the bytes on their way through
+        hashes = [hashlib.new(algorithm) for algorithm in algorithms]
+        buffer = bytearray(COPY_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(from_path, 'rb', buffering=0) as source_file, open(to_path, 'wb', buffering=0) as target_file:
+            source_stream = default_streaming_io.reader(source_file.fileno())
+            target_stream = default_streaming_io.writer(target_file.fileno())
+            while True:
+                length = source_file.readinto(buffer)
+                if not length:
+                    break
+                for file_hash in hashes:
+                    file_hash.update(view[:length])
+                written = 0
+                while written < length:
+                    written += target_file.write(view[written:length])
+                source_stream.advance(length)
+                target_stream.advance(length)
+            source_stream.finish()
+            target_stream.finish()
+        digests = {algorithm: file_hash.hexdigest() for algorithm, file_hash in zip(algorithms, hashes)}
+    
+    # Same metadata as shutil.copy2
+    shutil.copystat(from_path, to_path)
+    
+    source_after = get_file_identity(os.stat(from_path))
+    # The copy keeps its inode when renamed into place
+    copy_identity = get_file_identity(os.stat(to_path))
+    for algorithm, digest in digests.items():
+        default_hash_cache.put(source_after, digest, source_identity, algorithm)
+        default_hash_cache.put(copy_identity, digest, algorithm=algorithm)
+    return digests
+
+def copy_file_with_hash(from_path, to_path):
+    """
+    Copy a file's contents and metadata, computing the hash of the bytes as they are copied.
+    
+    Args:
+        from_path (str): Source file path
+        to_path (str): Destination file path (overwritten)
+        
+    Returns:
+        str: Hex digest of the copied bytes, with default_hash_engine.algorithm
+    """
+    algorithm = default_hash_engine.algorithm
+    return copy_file_with_digests(from_path, to_path, (algorithm,))[algorithm]
+
+def copy_file_fast(from_path, to_path):
+    """
+    Copy a file's contents and metadata using the fastest mechanism available
+    between the two filesystems (reflink, copy_file_range, sendfile, then a userspace copy).
+    
+    Args:
+        from_path (str): Source file path
+        to_path (str): Destination file path (overwritten)
+        
+    Returns:
+        str: Name of the copy mechanism used
+    """
+    mechanism = default_copy_engine.copy(from_path, to_path)
+    shutil.copystat(from_path, to_path)
+    # Kernel copies pass through the page cache too
+    default_streaming_io.drop_file(from_path)
+    default_streaming_io.drop_file(to_path, flush=True)
+    return mechanism
+
+def _copy_temp_then_rename(from_path, to_path, copy_function):
+    """
+    Copy a file to a temporary name next to the destination with copy_function, then rename it into place.
+    
+    Returns:
+        The result of copy_function
     """
     logger = get_logger()
         
@@ -243,15 +573,18 @@ def copy_temp_then_rename(from_path, to_path):
     to_path_temp = os.path.join(to_path + '.copying')
     
     try:        
-        os.makedirs(to_dir, exist_ok=True)
+        if not os.path.isdir(to_dir):
+            os.makedirs(to_dir, exist_ok=True)
+            invalidate_path_cache(to_dir)
 
         if os.path.exists(to_path_temp):
             os.remove(to_path_temp)
 
-        shutil.copy2(from_path, to_path_temp)
+        result = copy_function(from_path, to_path_temp)
         os.rename(to_path_temp, to_path)
 
         logger.info(f"Copied file {from_path} to : {to_path}")
+        return result
 
     except FileNotFoundError as e:
         logger.error(f"File not found during copying: {from_path} to: {to_path}. Error: {e}")
@@ -269,9 +602,174 @@ def copy_temp_then_rename(from_path, to_path):
         if os.path.exists(to_path_temp):
             os.remove(to_path_temp)
 
+def copy_temp_then_rename(from_path, to_path):
+    """
+    Copy a file to a temporary location then rename it to the final destination.
+    
+    Args:
+        from_path (str): Source file path
+        to_path (str): Destination file path
+       
+    Returns:
+        str: Name of the copy mechanism used
+    """
+    return _copy_temp_then_rename(from_path, to_path, copy_file_fast)
+
+def copy_and_hash_temp_then_rename(from_path, to_path, expected_hash=None, digests=None, algorithm=None):
+    """
+    Copy a file to a temporary location then rename it to the final destination,
+    computing its hash from the same read of the source.
+    
+    The hash uses default_hash_engine.algorithm unless algorithm is given. When a
+    secondary algorithm is configured it is computed from the same read and
+    returned through digests.
+    
+    Args:
+        from_path (str): Source file path
+        to_path (str): Destination file path
+        expected_hash (str): Optional hash the copied bytes must match. On a mismatch
+            the temporary copy is removed and the destination is left untouched.
+        digests (dict): Optional dict filled with the hex digest for each algorithm computed
+        algorithm (str): Hash algorithm, only this one is computed when given
+        
+    Returns:
+        str: Hex digest of the copied bytes
+        
+    Raises:
+        FileIntegrityError: If expected_hash is given and does not match
+    """
+    algorithms = default_hash_engine.algorithms if algorithm is None else (algorithm,)
+    algorithm = algorithms[0]
+    
+    def copy_and_check(copy_from, copy_to):
+        copy_digests = copy_file_with_digests(copy_from, copy_to, algorithms)
+        if digests is not None:
+            digests.update(copy_digests)
+        file_hash = copy_digests[algorithm]
+        if expected_hash is not None and file_hash != expected_hash:
+            raise FileIntegrityError(f"Hash of copied bytes {file_hash} does not match expected hash {expected_hash}")
+        return file_hash
+    
+    return _copy_temp_then_rename(from_path, to_path, copy_and_check)
+
+def _get_existing_ancestor_device(path):
+    """Get st_dev of the nearest existing directory at or above path."""
+    current = os.path.abspath(path)
+    while not os.path.isdir(current):
+        parent = os.path.dirname(current)
+        if parent == current:
+            break
+        current = parent
+    return os.stat(current).st_dev
+
+def is_same_filesystem(from_path, to_path):
+    """
+    Check whether a file could be renamed to a new path rather than copied.
+    
+    Args:
+        from_path (str): Existing file path
+        to_path (str): Destination file path, its directory need not exist yet
+        
+    Returns:
+        bool: True if from_path and the directory of to_path are on the same device
+    """
+    return os.stat(from_path).st_dev == _get_existing_ancestor_device(os.path.dirname(to_path))
+
+def move_temp_then_rename(from_path, to_path):
+    """
+    Move a file to the final destination by renaming it, first to a temporary
+    name next to the destination then to its final name, without copying its contents.
+    
+    Only works when both paths are on the same filesystem. Where they are not,
+    nothing is moved and the caller should copy the file instead.
+    
+    Args:
+        from_path (str): Source file path, removed on success
+        to_path (str): Destination file path
+        
+    Returns:
+        bool: True if the file was moved, False if it must be copied instead
+    """
+    logger = get_logger()
+    
+    if not is_same_filesystem(from_path, to_path):
+        return False
+    
+    to_dir = os.path.dirname(to_path)
+    to_path_temp = to_path + '.copying'
+    
+    try:
+        if not os.path.isdir(to_dir):
+            os.makedirs(to_dir, exist_ok=True)
+            invalidate_path_cache(to_dir)
+        
+        try:
+            os.rename(from_path, to_path_temp)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                # Same device but different mounts, e.g. bind mounts
+                logger.debug(f"Cannot rename {from_path} to {to_path_temp} across mounts, copying instead")
+                return False
+            raise
+        
+        os.rename(to_path_temp, to_path)
+        logger.info(f"Moved file {from_path} to : {to_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Failed to move file: {from_path} to : {to_path}. Error: {e}")
+        # Put the file back so it can still be copied or retried
+        if os.path.exists(to_path_temp) and not os.path.exists(from_path):
+            os.rename(to_path_temp, from_path)
+        raise
+
+# Resolved form of each absolute directory passed through normalize_path,
+# kept for a run (see clear_path_cache) to avoid repeating realpath lookups
+_resolved_directories = {}
+
 def normalize_path(path):
+    """
+    Resolve symbolic links and relative components in the directory part of a path.
+    
+    Resolved directories are cached until clear_path_cache() is called, or the
+    directory is created or removed through this module. Changes to symbolic
+    links made by other processes during a run are not seen until the cache
+    is cleared.
+    
+    Args:
+        path (str): Path to normalize
+        
+    Returns:
+        str: The path with its parent directory resolved
+    """
     p = Path(path)
-    return str(p.parent.resolve().joinpath(p.name))
+    parent = p.parent
+    if not parent.is_absolute():
+        # Relative paths depend on the working directory, resolve every time
+        return str(parent.resolve().joinpath(p.name))
+    
+    key = str(parent)
+    resolved = _resolved_directories.get(key)
+    if resolved is None:
+        resolved = parent.resolve()
+        _resolved_directories[key] = resolved
+    return str(resolved.joinpath(p.name))
+
+def clear_path_cache():
+    """Forget all directories resolved by normalize_path, e.g. at the start of a run."""
+    _resolved_directories.clear()
+
+def invalidate_path_cache(directory_path):
+    """
+    Forget the resolved form of a directory and of everything below it.
+    
+    Args:
+        directory_path (str): Directory that was created or removed
+    """
+    key = str(Path(directory_path))
+    prefix = key.rstrip('/') + '/'
+    for cached in [cached for cached in _resolved_directories if cached == key or cached.startswith(prefix)]:
+        del _resolved_directories[cached]
 
 
 def remove_empty_directories(root, keep_root=False):
@@ -290,6 +788,7 @@ def remove_empty_directories(root, keep_root=False):
             break
         try:
             os.rmdir(path)
+            invalidate_path_cache(path)
             logger.debug(f"Removed empty directory: {path}")
         except OSError as ex:
             logger.debug(f"Could not remove directory: {path}, {ex}")
@@ -313,7 +812,7 @@ def is_directory_empty(directory_path):
     except (OSError, PermissionError):
         return False
 
-def is_safe_to_remove_directory(directory_path, root_paths, stability_seconds=300):
+def is_safe_to_remove_directory(directory_path, root_paths, stability_seconds=300, open_file_snapshot=None):
     """
     Check if it's safe to remove a directory with comprehensive safety checks.
     
@@ -321,6 +820,7 @@ def is_safe_to_remove_directory(directory_path, root_paths, stability_seconds=30
         directory_path (str): Path to directory to check
         root_paths (list): List of root paths we should never go above
         stability_seconds (int): Minimum seconds since last modification (0 = no check)
+        open_file_snapshot (OpenFileSnapshot): Optional snapshot used instead of running lsof
         
     Returns:
         bool: True if safe to remove, False otherwise
@@ -367,7 +867,7 @@ def is_safe_to_remove_directory(directory_path, root_paths, stability_seconds=30
         return False
     
     # Check if directory is currently open/in use
-    if is_path_open(directory_path):
+    if is_path_open(directory_path, open_file_snapshot):
         logger.debug(f"Directory {directory_path} is currently in use")
         return False
     
@@ -427,7 +927,7 @@ def would_directory_be_empty_after_removals(directory_path, planned_removals):
         logger.debug(f"Error checking directory {directory_path}: {e}")
         return False
 
-def collect_all_removable_directories(empty_directories, root_paths, stability_seconds=300, max_depth=131):
+def collect_all_removable_directories(empty_directories, root_paths, stability_seconds=300, max_depth=131, open_file_snapshot=None):
     """
     Collect all directories that can be removed, including parents that would become empty.
     
@@ -436,6 +936,7 @@ def collect_all_removable_directories(empty_directories, root_paths, stability_s
         root_paths (list): List of root paths we should never go above
         stability_seconds (int): Minimum seconds since last modification
         max_depth (int): Maximum levels to traverse upward
+        open_file_snapshot (OpenFileSnapshot): Optional snapshot used instead of running lsof
         
     Returns:
         set: Set of all directories that can be removed
@@ -445,7 +946,7 @@ def collect_all_removable_directories(empty_directories, root_paths, stability_s
     
     # Start with all empty directories that pass safety checks
     for directory in empty_directories:
-        if is_safe_to_remove_directory(directory, root_paths, stability_seconds):
+        if is_safe_to_remove_directory(directory, root_paths, stability_seconds, open_file_snapshot):
             removable_dirs.add(directory)
     
     # Now check parent directories iteratively
@@ -475,7 +976,7 @@ def collect_all_removable_directories(empty_directories, root_paths, stability_s
         for parent in parents_to_check:
             logger.debug(f"Iteration {iteration}: Checking parent {parent}")
             # Check if parent passes safety checks
-            if is_safe_to_remove_directory(parent, root_paths, stability_seconds):
+            if is_safe_to_remove_directory(parent, root_paths, stability_seconds, open_file_snapshot):
                 logger.debug(f"Parent {parent} passes safety checks")
                 # Check if parent would be empty after planned removals
                 if would_directory_be_empty_after_removals(parent, removable_dirs):
@@ -490,7 +991,7 @@ def collect_all_removable_directories(empty_directories, root_paths, stability_s
     logger.info(f"Collected {len(removable_dirs)} directories for removal after {iteration} iterations")
     return removable_dirs
 
-def cleanup_empty_directories(root_paths, stability_seconds=300):
+def cleanup_empty_directories(root_paths, stability_seconds=300, open_file_snapshot=None):
     """
     Enhanced directory cleanup with proper parent directory handling.
     Single-pass approach since mtime updates would block subsequent iterations.
@@ -498,6 +999,7 @@ def cleanup_empty_directories(root_paths, stability_seconds=300):
     Args:
         root_paths (list): List of root directories to clean
         stability_seconds (int): Minimum seconds since last modification (default 300 = 5 minutes)
+        open_file_snapshot (OpenFileSnapshot): Optional snapshot used instead of running lsof
         
     Returns:
         dict: Summary of cleanup results
@@ -529,7 +1031,8 @@ def cleanup_empty_directories(root_paths, stability_seconds=300):
     # Phase 1: Plan all removals (no mtime changes yet)
     # Use the new algorithm that properly handles multiple empty siblings
     all_removable_dirs = collect_all_removable_directories(
-        directories_to_check, root_paths, stability_seconds, max_depth=131
+        directories_to_check, root_paths, stability_seconds, max_depth=131,
+        open_file_snapshot=open_file_snapshot
     )
     
     # Phase 2: Execute removals (deepest first to avoid conflicts)
@@ -591,6 +1094,7 @@ def remove_directory(path):
         
     try:
         os.rmdir(path)
+        invalidate_path_cache(path)
         logger.debug(f"Removed directory: {path}")
         return True
     except OSError as ex:
@@ -618,20 +1122,30 @@ def remove_directory_contents(root):
                 logger.debug(f"Removed directory tree: {file_path}")
         except Exception as e:
             logger.error(f"Failed to delete {file_path}. Reason: {e}")
+    
+    invalidate_path_cache(root)
 
 
 
-def is_path_open(file_path):
+def is_path_open(file_path, open_file_snapshot=None, file_metadata=None):
     """
     Check if a file is currently open by any process.
     
     Args:
         file_path (str): Path to the file to check.
-       
+        open_file_snapshot (OpenFileSnapshot): Optional snapshot of open files. When provided
+            the check is a lookup in the snapshot, otherwise 'lsof' is run for the path.
+        file_metadata (FileMetadata): Optional metadata for the file, saves a stat when
+            checking against the snapshot
     
     Returns:
         bool: True if the file is open, False otherwise.
     """
+    if open_file_snapshot is not None:
+        if file_metadata is not None:
+            return open_file_snapshot.contains(file_metadata.dev, file_metadata.inode)
+        return open_file_snapshot.is_open(file_path)
+
     try:
         result = subprocess.run(
             ['lsof', file_path],
@@ -663,20 +1177,23 @@ def is_path_open(file_path):
         logger.error(f"Exception occurred while checking if file is open: {e}")
         return False
     
-def is_path_stable(file_path, stability_time=5):
+def is_path_stable(file_path, stability_time=5, file_metadata=None):
     """
     Check if a file has not been modified in the last 'stability_time' seconds.
     
     Args:
         file_path (str): Path to the file to check.
         stability_time (int): Time in seconds to consider the file stable (default is 5).
-       
+        file_metadata (FileMetadata): Optional metadata for the file, used instead of a stat
     
     Returns:
         bool: True if the file is stable, False otherwise.
     """
     try:
-        last_modified_time = os.path.getmtime(file_path)
+        if file_metadata is not None:
+            last_modified_time = file_metadata.mtime
+        else:
+            last_modified_time = os.path.getmtime(file_path)
         current_time = time.time()
         is_stable = (current_time - last_modified_time) > stability_time
         if not is_stable:
@@ -787,13 +1304,16 @@ def are_file_and_path_names_safe(source_file, source_root):
     
     return True
 
-def is_file_ready(source_file_path, skip_stability_check=False):
+def is_file_ready(source_file_path, skip_stability_check=False, open_file_snapshot=None, file_metadata=None, stability_time=5):
     """
     Check if a file is ready for processing (stable and not open).
     
     Args:
         source_file_path: Full path to source file
         skip_stability_check: Whether to skip file stability check
+        open_file_snapshot: Optional OpenFileSnapshot used instead of running lsof
+        file_metadata: Optional FileMetadata for the file, saves stat calls
+        stability_time: Seconds the file must be unmodified to be considered stable
        
         
     Returns:
@@ -802,20 +1322,20 @@ def is_file_ready(source_file_path, skip_stability_check=False):
     logger = get_logger()
     
     # Check file stability
-    if not skip_stability_check and not is_path_stable(source_file_path):
+    if not skip_stability_check and not is_path_stable(source_file_path, stability_time, file_metadata):
         logger.debug(f"Skipping file {source_file_path} because it may still be written to.")
         return False
     elif skip_stability_check:
         logger.debug(f"Stability check bypassed for {source_file_path} (test mode).")
     
     # Check if file is open
-    if is_path_open(source_file_path):
+    if is_path_open(source_file_path, open_file_snapshot, file_metadata):
         logger.debug(f"Skipping file {source_file_path} because it is currently open.")
         return False
     
     return True
 
-def is_file_safe_for_processing(source_file, source_root, skip_stability_check=False):
+def is_file_safe_for_processing(source_file, source_root, skip_stability_check=False, open_file_snapshot=None, file_metadata=None):
     """
     Check if a file is safe to process (filename, path, stability, not open).
     
@@ -823,6 +1343,8 @@ def is_file_safe_for_processing(source_file, source_root, skip_stability_check=F
         source_file: Filename only
         source_root: Directory containing the file
         skip_stability_check: Whether to skip file stability check
+        open_file_snapshot: Optional OpenFileSnapshot used instead of running lsof
+        file_metadata: Optional FileMetadata for the file, saves stat calls
         
     Returns:
         bool: True if file is safe to process, False otherwise
@@ -836,7 +1358,7 @@ def is_file_safe_for_processing(source_file, source_root, skip_stability_check=F
     source_file_path = os.path.join(source_root, source_file)
     
     # Then check if the file is ready
-    if not is_file_ready(source_file_path, skip_stability_check):
+    if not is_file_ready(source_file_path, skip_stability_check, open_file_snapshot, file_metadata):
         return False
     
     return True
@@ -0,0 +1,215 @@
+"""
+Hash Cache
+
+Remembers the digest of files by their identity (st_dev, st_ino, size,
+mtime_ns) and hash algorithm, so a file that has not changed since it was
+last hashed, or since it was hashed while being copied, is not read again.
+
+Entries are evicted least recently used first. The cache can be saved to and
+loaded from a small SQLite database to keep digests across runs.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from .logger_injection import get_logger
+from .hash_engine import DEFAULT_HASH_ALGORITHM
+
+
+HASH_CACHE_FILE_NAME = 'hash_cache.sqlite3'
+
+# The cache is rebuilt rather than migrated when the schema changes
+SCHEMA_VERSION = 2
+
+DEFAULT_MAX_ENTRIES = 100000
+
+# Files modified more recently than this may still change within the same
+# mtime tick (network and FAT filesystems have coarse timestamps), so their
+# digests are not cached
+MTIME_SAFETY_SECONDS = 2
+
+
+def get_file_identity(stat_result):
+    """Get the (dev, inode, size, mtime_ns) identity of a file from its stat result."""
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+class HashCache:
+    """
+    Bounded LRU map from file identity and hash algorithm to hex digest.
+
+    A digest is only stored when the file's identity was the same before and
+    after it was read, and the file was not modified within the last
+    MTIME_SAFETY_SECONDS.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum digests kept in memory (0 disables the cache)
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def resize(self, max_entries):
+        """Change the maximum number of entries, evicting the least recently used."""
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def clear(self):
+        """Forget every digest and reset the hit counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, identity, algorithm=DEFAULT_HASH_ALGORITHM):
+        """
+        Get the digest stored for a file identity.
+
+        Args:
+            identity: (dev, inode, size, mtime_ns) tuple, see get_file_identity
+            algorithm: Hash algorithm of the digest
+
+        Returns:
+            str: The digest, or None if not cached
+        """
+        identity = identity + (algorithm,)
+        with self._lock:
+            digest = self._entries.get(identity)
+            if digest is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(identity)
+                self.hits += 1
+            return digest
+
+    def put(self, identity, digest, stat_before=None, algorithm=DEFAULT_HASH_ALGORITHM):
+        """
+        Store the digest of a file.
+
+        Args:
+            identity: (dev, inode, size, mtime_ns) tuple of the file after it was read
+            digest: Hex digest of its contents
+            stat_before: Optional identity from before it was read, the digest is
+                not stored if the file changed while it was read
+            algorithm: Hash algorithm of the digest
+
+        Returns:
+            bool: True if the digest was stored
+        """
+        if self.max_entries <= 0 or digest is None:
+            return False
+        if stat_before is not None and stat_before != identity:
+            return False
+        if identity[3] > time.time_ns() - MTIME_SAFETY_SECONDS * 1_000_000_000:
+            return False
+
+        identity = identity + (algorithm,)
+        with self._lock:
+            self._entries[identity] = digest
+            self._entries.move_to_end(identity)
+            self._evict()
+        return True
+
+    def _evict(self):
+        while len(self._entries) > max(self.max_entries, 0):
+            self._entries.popitem(last=False)
+
+    def load(self, database_file):
+        """
+        Load digests saved by save(), keeping the most recently used.
+
+        Args:
+            database_file: Path of the SQLite database
+
+        Returns:
+            int: Number of digests loaded
+        """
+        logger = get_logger()
+
+        if self.max_entries <= 0 or not os.path.exists(database_file):
+            return 0
+
+        try:
+            connection = sqlite3.connect(database_file)
+            try:
+                if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    return 0
+                rows = connection.execute(
+                    "SELECT dev, inode, size, mtime_ns, algorithm, digest FROM file_hashes ORDER BY last_used DESC LIMIT ?",
+                    (self.max_entries,)
+                ).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not load hash cache {database_file}: {e}")
+            return 0
+
+        with self._lock:
+            # Oldest first so the most recently used end up at the end
+            for dev, inode, size, mtime_ns, algorithm, digest in reversed(rows):
+                self._entries[(dev, inode, size, mtime_ns, algorithm)] = digest
+            self._evict()
+
+        logger.debug(f"Loaded {len(rows)} file hashes from {database_file}")
+        return len(rows)
+
+    def save(self, database_file):
+        """
+        Replace the saved digests with the current contents of the cache.
+
+        Args:
+            database_file: Path of the SQLite database
+
+        Returns:
+            bool: True if saved
+        """
+        logger = get_logger()
+
+        with self._lock:
+            rows = [identity + (digest, order) for order, (identity, digest) in enumerate(self._entries.items())]
+
+        try:
+            os.makedirs(os.path.dirname(database_file) or '.', exist_ok=True)
+            connection = sqlite3.connect(database_file)
+            try:
+                with connection:
+                    connection.execute("DROP TABLE IF EXISTS file_hashes")
+                    connection.execute("""
+                        CREATE TABLE file_hashes (
+                            dev INTEGER NOT NULL,
+                            inode INTEGER NOT NULL,
+                            size INTEGER NOT NULL,
+                            mtime_ns INTEGER NOT NULL,
+                            algorithm TEXT NOT NULL,
+                            digest TEXT NOT NULL,
+                            last_used INTEGER NOT NULL,
+                            PRIMARY KEY (dev, inode, size, mtime_ns, algorithm)
+                        )
+                    """)
+                    connection.executemany("INSERT INTO file_hashes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save hash cache {database_file}: {e}")
+            return False
+
+        logger.debug(f"Saved {len(rows)} file hashes to {database_file}")
+        return True
+
+
+# Cache used by the hashing functions in shuttle_common.files
+default_hash_cache = HashCache()
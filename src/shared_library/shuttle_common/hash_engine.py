@@ -0,0 +1,211 @@
+"""
+Hash Engine
+
+This module computes hashes of files as fast as the disk allows:
+
+- reads go into one large reused buffer per thread with readinto
+- hashlib.file_digest is used when available and no buffer size is set
+- files can optionally be hashed through mmap instead of read
+- many files can be hashed at once on a thread pool, hashlib releases the
+  GIL while hashing so the threads run in parallel
+- with streaming I/O enabled, hashed pages are dropped from the page cache
+
+The algorithm is SHA-256 by default. BLAKE2b is faster on hosts whose CPUs
+have no SHA extensions. A secondary algorithm can be set while moving from
+one algorithm to another, so both digests are recorded for each file copied.
+"""
+
+import os
+import mmap
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .logger_injection import get_logger
+from .streaming_io import default_streaming_io
+
+
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+DEFAULT_HASH_ALGORITHM = 'sha256'
+
+# Algorithms that may be configured for integrity checks
+HASH_ALGORITHMS = ('sha256', 'sha512', 'blake2b', 'blake2s', 'sha3_256')
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def validate_hash_algorithm(algorithm):
+    """
+    Check that a hash algorithm may be used for integrity checks.
+
+    Raises:
+        ValueError: If the algorithm is not one of HASH_ALGORITHMS
+    """
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm {algorithm!r}, expected one of {', '.join(HASH_ALGORITHMS)}")
+
+
+class HashEngine:
+    """
+    Compute hashes of files.
+
+    Errors are raised to the caller, except by hash_files which returns None
+    for files that could not be hashed.
+    """
+
+    def __init__(self, buffer_size=HASH_BUFFER_SIZE, use_mmap=False, use_file_digest=False, max_workers=DEFAULT_MAX_WORKERS,
+                 algorithm=DEFAULT_HASH_ALGORITHM, secondary_algorithm=None, streaming_io=None):
+        """
+        Initialize the engine.
+
+        Args:
+            buffer_size: Bytes read into the buffer at a time
+            use_mmap: Hash files by mapping them into memory instead of reading them
+            use_file_digest: Use hashlib.file_digest where available, which reads in 256 KB chunks
+            max_workers: Threads used by hash_files
+            algorithm: Hash algorithm used for integrity checks
+            secondary_algorithm: Optional second algorithm recorded alongside the first
+            streaming_io: StreamingIO giving page cache hints (default: default_streaming_io),
+                when enabled files are always hashed with readinto
+        """
+        self.buffer_size = buffer_size
+        self.use_mmap = use_mmap
+        self.use_file_digest = use_file_digest and hasattr(hashlib, 'file_digest')
+        self.max_workers = max_workers
+        self.streaming_io = streaming_io or default_streaming_io
+        self.set_algorithms(algorithm, secondary_algorithm)
+        self._local = threading.local()
+
+    def set_algorithms(self, algorithm, secondary_algorithm=None):
+        """
+        Set the hash algorithm, and optional secondary algorithm for dual digests.
+
+        Raises:
+            ValueError: If either algorithm is not one of HASH_ALGORITHMS
+        """
+        validate_hash_algorithm(algorithm)
+        if secondary_algorithm == algorithm:
+            secondary_algorithm = None
+        if secondary_algorithm is not None:
+            validate_hash_algorithm(secondary_algorithm)
+        self.algorithm = algorithm
+        self.secondary_algorithm = secondary_algorithm
+
+    @property
+    def algorithms(self):
+        """The algorithm followed by the secondary algorithm, if set."""
+        if self.secondary_algorithm is None:
+            return (self.algorithm,)
+        return (self.algorithm, self.secondary_algorithm)
+
+    def _get_buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) != self.buffer_size:
+            buffer = bytearray(self.buffer_size)
+            self._local.buffer = buffer
+        return buffer
+
+    def hash_open_file(self, file_obj, algorithm=None):
+        """
+        Hash the rest of a file opened in binary mode.
+
+        Args:
+            file_obj: File object opened with 'rb'
+            algorithm: Hash algorithm (default: the engine's algorithm)
+
+        Returns:
+            str: Hex digest
+        """
+        algorithm = algorithm or self.algorithm
+
+        # Page cache hints are given between reads
+        if self.streaming_io.enabled:
+            return self.hash_open_file_with_algorithms(file_obj, (algorithm,))[algorithm]
+
+        if self.use_mmap:
+            size = os.fstat(file_obj.fileno()).st_size - file_obj.tell()
+            # Empty files cannot be mapped
+            if size > 0:
+                file_hash = hashlib.new(algorithm)
+                with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if hasattr(mapped, 'madvise'):
+                        mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    file_hash.update(memoryview(mapped)[file_obj.tell():])
+                return file_hash.hexdigest()
+
+        if self.use_file_digest:
+            return hashlib.file_digest(file_obj, algorithm).hexdigest()
+
+        return self.hash_open_file_with_algorithms(file_obj, (algorithm,))[algorithm]
+
+    def hash_open_file_with_algorithms(self, file_obj, algorithms):
+        """
+        Hash the rest of a file with several algorithms from one read.
+
+        Args:
+            file_obj: File object opened with 'rb'
+            algorithms: Hash algorithm names
+
+        Returns:
+            dict: Algorithm name to hex digest
+        """
+        hashes = [hashlib.new(algorithm) for algorithm in algorithms]
+        buffer = self._get_buffer()
+        view = memoryview(buffer)
+        stream = self.streaming_io.reader(file_obj.fileno())
+        while True:
+            length = file_obj.readinto(buffer)
+            if not length:
+                break
+            for file_hash in hashes:
+                file_hash.update(view[:length])
+            stream.advance(length)
+        stream.finish()
+        return {algorithm: file_hash.hexdigest() for algorithm, file_hash in zip(algorithms, hashes)}
+
+    def hash_file(self, file_path, algorithm=None):
+        """
+        Hash a file.
+
+        Args:
+            file_path (str): Path to the file
+            algorithm: Hash algorithm (default: the engine's algorithm)
+
+        Returns:
+            str: Hex digest
+        """
+        with open(file_path, 'rb', buffering=0) as f:
+            return self.hash_open_file(f, algorithm)
+
+    def hash_files(self, file_paths, hash_function=None):
+        """
+        Hash many files at once on a thread pool.
+
+        Args:
+            file_paths: Iterable of file paths
+            hash_function: Optional callable taking a path and returning its hash,
+                such as shuttle_common.files.get_file_hash (default: hash_file)
+
+        Returns:
+            dict: Path to hex digest, None for files that could not be hashed
+        """
+        hash_function = hash_function or self.hash_file
+        file_paths = list(file_paths)
+
+        def hash_or_none(file_path):
+            try:
+                return hash_function(file_path)
+            except OSError as e:
+                logger = get_logger()
+                logger.error(f"Error computing hash for {file_path}: {e}")
+                return None
+
+        if self.max_workers <= 1 or len(file_paths) <= 1:
+            return {file_path: hash_or_none(file_path) for file_path in file_paths}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hash') as executor:
+            return dict(zip(file_paths, executor.map(hash_or_none, file_paths)))
+
+
+# Engine used by the hashing functions in shuttle_common.files
+default_hash_engine = HashEngine()
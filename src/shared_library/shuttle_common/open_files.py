@@ -0,0 +1,294 @@
+"""
+Open File Detection
+
+This module provides a snapshot of the files held open by running processes,
+so that checking whether a file is open does not need an `lsof` process per file.
+
+A snapshot is built once (per discovery pass, or when it is older than a
+configured age) by asking one or more backends for the (st_dev, st_ino) pairs
+they know to be open. Lookups then only need a stat of the path being checked.
+"""
+
+import os
+import abc
+import json
+import time
+import subprocess
+from typing import Iterable, List, Optional, Set, Tuple
+from .logger_injection import get_logger
+
+
+# Names accepted in the open_file_detection setting
+OPEN_FILE_BACKEND_PROC = 'proc'
+OPEN_FILE_BACKEND_SMBSTATUS = 'smbstatus'
+OPEN_FILE_BACKEND_LSOF = 'lsof'  # Legacy: run lsof for every path checked
+
+
+class OpenFileBackend(abc.ABC):
+    """Base class for sources of open file information."""
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def collect(self) -> Set[Tuple[int, int]]:
+        """
+        Collect the files currently held open.
+
+        Returns:
+            set: (st_dev, st_ino) pairs of open files and directories
+        """
+
+
+class ProcFdBackend(OpenFileBackend):
+    """
+    Read open files from /proc for every visible process.
+
+    Includes open file descriptors, working directories and memory mapped files,
+    matching what lsof reports. As with lsof, files held open by processes of
+    other users are only visible when running with sufficient privileges.
+    """
+
+    name = OPEN_FILE_BACKEND_PROC
+
+    def __init__(self, proc_path='/proc'):
+        self.proc_path = proc_path
+
+    def collect(self) -> Set[Tuple[int, int]]:
+        open_files = set()
+        own_pid = str(os.getpid())
+
+        try:
+            process_entries = list(os.scandir(self.proc_path))
+        except OSError as e:
+            logger = get_logger()
+            logger.error(f"Could not read {self.proc_path}: {e}")
+            return open_files
+
+        for entry in process_entries:
+            if not entry.name.isdigit() or entry.name == own_pid:
+                continue
+
+            process_path = entry.path
+
+            # Open file descriptors
+            try:
+                for fd_entry in os.scandir(os.path.join(process_path, 'fd')):
+                    try:
+                        st = os.stat(fd_entry.path)
+                        open_files.add((st.st_dev, st.st_ino))
+                    except OSError:
+                        continue
+            except OSError:
+                # Process exited or not accessible
+                continue
+
+            # Working directory
+            try:
+                st = os.stat(os.path.join(process_path, 'cwd'))
+                open_files.add((st.st_dev, st.st_ino))
+            except OSError:
+                pass
+
+            # Memory mapped files
+            open_files.update(self._read_mapped_files(os.path.join(process_path, 'maps')))
+
+        return open_files
+
+    @staticmethod
+    def _read_mapped_files(maps_path) -> Set[Tuple[int, int]]:
+        """Parse a /proc/<pid>/maps file into (st_dev, st_ino) pairs."""
+        mapped = set()
+        try:
+            with open(maps_path, 'r') as maps_file:
+                for line in maps_file:
+                    # address perms offset dev inode [path]
+                    fields = line.split(None, 5)
+                    if len(fields) < 6 or fields[4] == '0':
+                        continue
+                    major, minor = fields[3].split(':')
+                    mapped.add((os.makedev(int(major, 16), int(minor, 16)), int(fields[4])))
+        except (OSError, ValueError):
+            pass
+        return mapped
+
+
+class SmbstatusBackend(OpenFileBackend):
+    """
+    Read files locked by Samba clients using `smbstatus -L --json`.
+
+    Samba holds files open on behalf of clients in its own smbd processes, so
+    these are normally also visible to ProcFdBackend when running as root. This
+    backend covers hosts where Shuttle cannot read smbd's /proc entries.
+    Requires Samba 4.16 or later for JSON output.
+    """
+
+    name = OPEN_FILE_BACKEND_SMBSTATUS
+
+    def __init__(self, command='smbstatus', timeout_seconds=30):
+        self.command = command
+        self.timeout_seconds = timeout_seconds
+
+    def collect(self) -> Set[Tuple[int, int]]:
+        logger = get_logger()
+        open_files = set()
+
+        try:
+            result = subprocess.run(
+                [self.command, '-L', '--json'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=False,
+                timeout=self.timeout_seconds
+            )
+        except FileNotFoundError:
+            logger.error(f"'{self.command}' command not found. Please ensure Samba is installed.")
+            return open_files
+        except subprocess.TimeoutExpired:
+            logger.error(f"'{self.command}' timed out after {self.timeout_seconds} seconds")
+            return open_files
+
+        if result.returncode != 0:
+            logger.error(f"Error reading Samba open files: {result.stderr.strip()}")
+            return open_files
+
+        try:
+            status = json.loads(result.stdout)
+        except ValueError as e:
+            logger.error(f"Could not parse {self.command} output: {e}")
+            return open_files
+
+        for open_file in (status.get('open_files') or {}).values():
+            service_path = open_file.get('service_path')
+            filename = open_file.get('filename')
+            if not service_path or filename is None:
+                continue
+            try:
+                st = os.stat(os.path.join(service_path, filename))
+                open_files.add((st.st_dev, st.st_ino))
+            except OSError:
+                continue
+
+        return open_files
+
+
+def create_open_file_backends(backend_names) -> List[OpenFileBackend]:
+    """
+    Create backends from a comma separated list (or list) of backend names.
+
+    Args:
+        backend_names: e.g. 'proc' or 'proc,smbstatus'
+
+    Returns:
+        list: OpenFileBackend instances
+
+    Raises:
+        ValueError: If a backend name is not recognised
+    """
+    if isinstance(backend_names, str):
+        backend_names = [name.strip() for name in backend_names.split(',') if name.strip()]
+
+    backends = []
+    for name in backend_names:
+        if name == OPEN_FILE_BACKEND_PROC:
+            backends.append(ProcFdBackend())
+        elif name == OPEN_FILE_BACKEND_SMBSTATUS:
+            backends.append(SmbstatusBackend())
+        else:
+            raise ValueError(f"Unknown open file detection backend: {name}")
+    return backends
+
+
+class OpenFileSnapshot:
+    """
+    Set of files held open by any process, answering membership in O(1).
+
+    Refresh policy:
+        - refresh() can always be called explicitly, e.g. at the start of each discovery pass
+        - max_age_seconds > 0: the snapshot refreshes itself on lookup when older than this
+        - max_age_seconds == 0: refresh on every lookup (same freshness as running lsof per file)
+        - max_age_seconds is None: only explicit refreshes
+    """
+
+    def __init__(self, backends: Optional[Iterable[OpenFileBackend]] = None, max_age_seconds: Optional[float] = None):
+        """
+        Initialize the snapshot. The snapshot is empty until the first refresh.
+
+        Args:
+            backends: OpenFileBackend instances to query (default: ProcFdBackend only)
+            max_age_seconds: Automatic refresh policy (see class docstring)
+        """
+        self.backends = list(backends) if backends is not None else [ProcFdBackend()]
+        self.max_age_seconds = max_age_seconds
+        self._open_files = set()
+        self._taken_at = None
+
+    def refresh(self):
+        """Rebuild the snapshot from all backends."""
+        logger = get_logger()
+
+        start_time = time.monotonic()
+        open_files = set()
+        for backend in self.backends:
+            try:
+                open_files |= backend.collect()
+            except Exception as e:
+                logger.error(f"Open file backend '{backend.name}' failed: {e}")
+
+        self._open_files = open_files
+        self._taken_at = time.monotonic()
+        logger.debug(f"Open file snapshot: {len(open_files)} open files "
+                     f"in {self._taken_at - start_time:.3f}s")
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the snapshot was taken, or None if never taken."""
+        if self._taken_at is None:
+            return None
+        return time.monotonic() - self._taken_at
+
+    def _refresh_if_stale(self):
+        if self._taken_at is None:
+            self.refresh()
+        elif self.max_age_seconds is not None and self.age_seconds >= self.max_age_seconds:
+            self.refresh()
+
+    def contains(self, st_dev: int, st_ino: int) -> bool:
+        """Check whether the file with the given identity is open."""
+        self._refresh_if_stale()
+        return (st_dev, st_ino) in self._open_files
+
+    def is_open(self, path: str) -> bool:
+        """
+        Check whether a path is open by any process.
+
+        Args:
+            path (str): File or directory to check
+
+        Returns:
+            bool: True if the path is open, False otherwise (including if it no longer exists)
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return self.contains(st.st_dev, st.st_ino)
+
+
+def create_open_file_snapshot(open_file_detection=OPEN_FILE_BACKEND_LSOF, max_age_seconds=None):
+    """
+    Create a snapshot for the configured detection method.
+
+    Args:
+        open_file_detection (str): Comma separated backend names, or 'lsof' for per-file lsof checks
+        max_age_seconds (float): Automatic refresh policy for the snapshot
+
+    Returns:
+        OpenFileSnapshot: A refreshed snapshot, or None when per-file lsof checks are configured
+    """
+    if not open_file_detection or open_file_detection.strip() == OPEN_FILE_BACKEND_LSOF:
+        return None
+
+    snapshot = OpenFileSnapshot(create_open_file_backends(open_file_detection), max_age_seconds)
+    snapshot.refresh()
+    return snapshot
@@ -6,6 +6,7 @@ that can be shared between the main application and test scripts.
 """
 
 import os
+import asyncio
 import subprocess
 import re
 import types
@@ -119,7 +120,7 @@ def process_defender_result(result_code, path, scanner_handles_suspect=False):
         )
 
 
-def calculate_dynamic_timeout(file_path: str, base_timeout_seconds: int, ms_per_byte: float) -> Optional[int]:
+def calculate_dynamic_timeout(file_path: str, base_timeout_seconds: int, ms_per_byte: float, file_size_bytes: Optional[int] = None) -> Optional[int]:
     """
     Calculate dynamic timeout based on file size and configuration.
     
@@ -130,6 +131,7 @@ def calculate_dynamic_timeout(file_path: str, base_timeout_seconds: int, ms_per_
         file_path: Path to the file to be scanned
         base_timeout_seconds: Fixed timeout component (0 = no base timeout)
         ms_per_byte: Milliseconds per byte for size-based timeout (0 = no per-byte timeout)
+        file_size_bytes: File size if already known (avoids a stat of the file)
         
     Returns:
         int: Calculated timeout in seconds, or None if no timeout should be applied
@@ -138,7 +140,8 @@ def calculate_dynamic_timeout(file_path: str, base_timeout_seconds: int, ms_per_
     
     try:
         # Get file size
-        file_size_bytes = os.path.getsize(file_path)
+        if file_size_bytes is None:
+            file_size_bytes = os.path.getsize(file_path)
         
         # Calculate components
         base_component = base_timeout_seconds if base_timeout_seconds > 0 else 0
@@ -222,7 +225,128 @@ def get_mdatp_version() -> Optional[str]:
         return None
 
 
-def run_malware_scan(cmd, path, result_handler, timeout_seconds=None):
+def get_mdatp_definitions_version() -> Optional[str]:
+    """
+    Get the version of the Microsoft Defender for Endpoint (mdatp) security intelligence definitions.
+    
+    Returns:
+        str: Definitions version, or None if it cannot be determined
+    """
+    logger = get_logger()
+
+    try:
+        result = subprocess.run(
+            [DEFENDER_COMMAND, "health", "--field", "definitions_version"],
+            capture_output=True,
+            text=True,
+            check=False
+        )
+
+        if result.returncode != 0:
+            logger.warning(f"{DEFENDER_COMMAND} health command failed with code {result.returncode}: {result.stderr}")
+            return None
+
+        match = re.search(r'([\d\.]+)', result.stdout)
+        if match:
+            version = match.group(1)
+            logger.debug(f"Detected mdatp definitions version: {version}")
+            return version
+        else:
+            logger.warning(f"Failed to parse mdatp definitions version from output: {result.stdout}")
+            return None
+
+    except FileNotFoundError:
+        logger.error(f"{DEFENDER_COMMAND} command not found. Microsoft Defender for Endpoint may not be installed.")
+        return None
+    except Exception as e:
+        logger.warning(f"Error getting {DEFENDER_COMMAND} definitions version: {e}")
+        return None
+
+
+def parse_clam_av_version(output):
+    """
+    Parse the ClamAV engine and signature database versions from version output.
+    
+    Args:
+        output (str): Output of clamdscan --version, or clamd's reply to VERSION
+        
+    Returns:
+        tuple: (engine_version, definitions_version), or None if no version was found.
+            definitions_version is None when clamd has no signature database loaded.
+    """
+    # ClamAV 1.0.1/26890/Mon Apr 24 07:25:30 2023
+    match = re.search(r'ClamAV ([\d\.]+)(?:/(\d+))?', output)
+    if not match:
+        return None
+    return match.group(1), match.group(2)
+
+
+def get_clam_av_versions():
+    """
+    Get the ClamAV engine and signature database versions from clamdscan.
+    
+    Returns:
+        tuple: (engine_version, definitions_version), each None if it cannot be determined
+    """
+    logger = get_logger()
+
+    try:
+        result = subprocess.run(
+            ["clamdscan", "--version"],
+            capture_output=True,
+            text=True,
+            check=False
+        )
+
+        versions = parse_clam_av_version(result.stdout)
+        if result.returncode == 0 and versions:
+            logger.debug(f"Detected ClamAV version: {result.stdout.strip()}")
+            return versions
+
+        logger.warning(f"Failed to get ClamAV version, code {result.returncode}: {result.stdout} {result.stderr}")
+        return None, None
+
+    except FileNotFoundError:
+        logger.error("clamdscan command not found. ClamAV may not be installed.")
+        return None, None
+    except Exception as e:
+        logger.warning(f"Error getting ClamAV version: {e}")
+        return None, None
+
+
+def log_scan_metrics(path, scan_time, timeout_seconds=None, file_size_bytes=None):
+    """
+    Log the time taken to scan a file, and its scan rate.
+    
+    Args:
+        path (str): Path to the file that was scanned
+        scan_time (float): Time taken by the scan in seconds
+        timeout_seconds (int, optional): Timeout the scan was given
+        file_size_bytes (int, optional): File size if already known
+    """
+    logger = get_logger()
+    
+    try:
+        if file_size_bytes is None:
+            file_size_bytes = os.path.getsize(path)
+        file_size_mb = file_size_bytes / (1024 * 1024)
+        ms_per_byte = (scan_time * 1000) / file_size_bytes if file_size_bytes > 0 else 0
+        
+        # Log detailed scan metrics
+        logger.info(f"Scan metrics for {os.path.basename(path)}:")
+        logger.info(f"  Scan time: {scan_time:.3f} seconds")
+        logger.info(f"  File size: {file_size_bytes:,} bytes ({file_size_mb:.2f} MB)")
+        logger.info(f"  Scan rate: {ms_per_byte:.6f} ms/byte")
+        if timeout_seconds:
+            logger.info(f"  Timeout used: {timeout_seconds} seconds")
+        else:
+            logger.info(f"  Timeout used: None (unlimited)")
+    except OSError as e:
+        logger.warning(f"Could not calculate scan metrics for {path}: {e}")
+        logger.info(f"Scan completed in {scan_time:.3f} seconds")
+
+
+def run_malware_scan(cmd, path, result_handler, timeout_seconds=None, file_size_bytes=None):
     """
     Run a malware scan using the specified command and process the results.
     SECURITY NOTE: This function executes external commands. Only use with trusted,
@@ -233,6 +357,7 @@ def run_malware_scan(cmd, path, result_handler, timeout_seconds=None):
         path (str): Path to file being scanned
         result_handler (callable): Function to process scan results
         timeout_seconds (int, optional): Timeout in seconds (None for no timeout)
+        file_size_bytes (int, optional): File size if already known, used for scan metrics
         
     Returns:
         int: scan_result_types value
@@ -274,24 +399,7 @@ def run_malware_scan(cmd, path, result_handler, timeout_seconds=None):
             
         scan_time = time.time() - start_time
         
-        # Calculate and log scan metrics
-        try:
-            file_size_bytes = os.path.getsize(path)
-            file_size_mb = file_size_bytes / (1024 * 1024)
-            ms_per_byte = (scan_time * 1000) / file_size_bytes if file_size_bytes > 0 else 0
-            
-            # Log detailed scan metrics
-            logger.info(f"Scan metrics for {os.path.basename(path)}:")
-            logger.info(f"  Scan time: {scan_time:.3f} seconds")
-            logger.info(f"  File size: {file_size_bytes:,} bytes ({file_size_mb:.2f} MB)")
-            logger.info(f"  Scan rate: {ms_per_byte:.6f} ms/byte")
-            if timeout_seconds:
-                logger.info(f"  Timeout used: {timeout_seconds} seconds")
-            else:
-                logger.info(f"  Timeout used: None (unlimited)")
-        except OSError as e:
-            logger.warning(f"Could not calculate scan metrics for {path}: {e}")
-            logger.info(f"Scan completed in {scan_time:.3f} seconds")
+        log_scan_metrics(path, scan_time, timeout_seconds, file_size_bytes)
         
         logger.debug(f"Return code: {result.returncode}")
         logger.debug(f"Output: {result.stdout}")
@@ -342,13 +450,14 @@ def parse_defender_scan_result(returncode, output):
     return scan_result_types.FILE_SCAN_FAILED
 
 
-def scan_for_malware_using_defender(path, config=None):
+def scan_for_malware_using_defender(path, config=None, file_size_bytes=None):
     """
     Scan a file using Microsoft Defender with retry logic for timeouts.
     
     Args:
         path (str): Path to the file to scan
         config: CommonConfig object with timeout settings
+        file_size_bytes (int): File size if already known (avoids a stat of the file)
         
     Returns:
         Scan result or raises ScanTimeoutError after all retries
@@ -370,13 +479,13 @@ def scan_for_malware_using_defender(path, config=None):
     logger = get_logger()
     
     # Calculate dynamic timeout based on file size
-    timeout = calculate_dynamic_timeout(path, base_timeout, ms_per_byte)
+    timeout = calculate_dynamic_timeout(path, base_timeout, ms_per_byte, file_size_bytes)
         
     # If retry_count is 0, use unlimited retries
     attempt = 0
     while True:
         try:
-            return run_malware_scan(cmd, path, parse_defender_scan_result, timeout)
+            return run_malware_scan(cmd, path, parse_defender_scan_result, timeout, file_size_bytes)
         except ScanTimeoutError:
             attempt += 1
             
@@ -396,6 +505,110 @@ def scan_for_malware_using_defender(path, config=None):
                 logger.debug(f"Waiting {retry_wait}s before retry")
                 time.sleep(retry_wait)
 
+
+def parse_defender_batch_scan_result(returncode, output, entry_paths):
+    """
+    Attribute the result of a Defender scan of a batch directory to the files in it.
+    
+    Files named after the threat report are suspect. When a threat is reported
+    the other files cannot be known to be clean, so they are left out and must
+    be scanned on their own. Every file is clean only when the scan completed
+    without threats and, if Defender reports how many files it scanned, it
+    scanned all of them.
+    
+    Args:
+        returncode (int): Process return code
+        output (str): Process output
+        entry_paths: Paths of the files in the batch directory
+        
+    Returns:
+        dict: Entry path to scan_result_types.FILE_IS_CLEAN or FILE_IS_SUSPECT, for
+            the files whose verdicts are known
+    """
+    logger = get_logger()
+
+    result = parse_defender_scan_result(returncode, output)
+
+    if result == scan_result_types.FILE_IS_SUSPECT:
+        threat_report = output[output.index(defender_scan_patterns.THREAT_FOUND):]
+        suspects = {path: scan_result_types.FILE_IS_SUSPECT for path in entry_paths if path in threat_report}
+        logger.warning(f"Threats found in batch, {len(suspects)} of {len(entry_paths)} files named in the threat report")
+        return suspects
+
+    if result == scan_result_types.FILE_IS_CLEAN:
+        # Read the count from the summary at the end, never from a file name earlier in the output
+        match = re.search(r'\n\t(\d+) file\(s\) scanned' + re.escape(defender_scan_patterns.NO_THREATS) + r'\s*$', output)
+        if match and int(match.group(1)) < len(entry_paths):
+            logger.warning(f"Batch scan covered {match.group(1)} of {len(entry_paths)} files")
+            return {}
+        return {path: scan_result_types.FILE_IS_CLEAN for path in entry_paths}
+
+    return {}
+
+
+def scan_batch_for_malware_using_defender(batch_directory, entry_paths, config=None, total_size_bytes=None):
+    """
+    Scan a directory of files with one Microsoft Defender invocation.
+    
+    Starting mdatp costs far more than scanning a small file, so small files are
+    scanned in batches. Timeouts are retried as for scan_for_malware_using_defender,
+    with the timeout calculated from the size of the whole batch.
+    
+    Args:
+        batch_directory (str): Directory holding only the files to scan
+        entry_paths: Paths of the files in batch_directory
+        config: CommonConfig object with timeout settings
+        total_size_bytes (int): Total size of the files, if already known
+        
+    Returns:
+        dict: Entry path to scan result for the files whose verdicts are known, see
+            parse_defender_batch_scan_result. Files left out must be scanned on their own.
+        
+    Raises:
+        ScanTimeoutError: After all retries
+    """
+    base_timeout = config.malware_scan_timeout_seconds if config else 300
+    ms_per_byte = config.malware_scan_timeout_ms_per_byte if config else 0.0
+    retry_wait = config.malware_scan_retry_wait_seconds if config else 30
+    retry_count = config.malware_scan_retry_count if config else 3
+
+    logger = get_logger()
+
+    if total_size_bytes is None:
+        total_size_bytes = sum(os.path.getsize(path) for path in entry_paths)
+    timeout = calculate_dynamic_timeout(batch_directory, base_timeout, ms_per_byte, total_size_bytes)
+
+    verdicts = {}
+
+    def handle_batch_result(returncode, output):
+        verdicts.update(parse_defender_batch_scan_result(returncode, output, entry_paths))
+        return parse_defender_scan_result(returncode, output)
+
+    attempt = 0
+    while True:
+        cmd = [
+            DEFENDER_COMMAND,
+            "scan",
+            "custom",
+            "--ignore-exclusions",
+            "--path"
+        ]
+        try:
+            run_malware_scan(cmd, batch_directory, handle_batch_result, timeout, total_size_bytes)
+            return verdicts
+        except ScanTimeoutError:
+            attempt += 1
+
+            if retry_count > 0 and attempt >= retry_count:
+                logger.error(f"Defender batch scan timeout after {retry_count} attempts for {batch_directory}")
+                raise
+
+            logger.warning(f"Defender batch scan timeout on attempt {attempt} for {batch_directory}")
+
+            if retry_wait > 0:
+                time.sleep(retry_wait)
+
+
 def handle_clamav_scan_result(returncode, output):
     """
     Process ClamAV scan results.
@@ -430,13 +643,17 @@ def handle_clamav_scan_result(returncode, output):
     return scan_result_types.FILE_SCAN_FAILED
 
 
-def scan_for_malware_using_clam_av(path, config=None):
+def scan_for_malware_using_clam_av(path, config=None, file_size_bytes=None):
     """
     Scan a file using ClamAV with retry logic for timeouts.
     
+    The file is scanned over a pooled clamd session when default_clamd_client has been
+    configured with clamd's socket, and with clamdscan otherwise.
+    
     Args:
         path (str): Path to the file to scan
         config: CommonConfig object with timeout settings
+        file_size_bytes (int): File size if already known (avoids a stat of the file)
         
     Returns:
         Scan result or raises ScanTimeoutError after all retries
@@ -454,14 +671,19 @@ def scan_for_malware_using_clam_av(path, config=None):
     
     logger = get_logger()
     
+    # Imported here, the clamd client builds on this module
+    from .clamd_client import default_clamd_client
+    
     # Calculate dynamic timeout based on file size
-    timeout = calculate_dynamic_timeout(path, base_timeout, ms_per_byte)
+    timeout = calculate_dynamic_timeout(path, base_timeout, ms_per_byte, file_size_bytes)
         
     # If retry_count is 0, use unlimited retries
     attempt = 0
     while True:
         try:
-            return run_malware_scan(cmd, path, handle_clamav_scan_result, timeout)
+            if default_clamd_client.enabled:
+                return default_clamd_client.scan_file(path, timeout, file_size_bytes)
+            return run_malware_scan(cmd, path, handle_clamav_scan_result, timeout, file_size_bytes)
         except ScanTimeoutError:
             attempt += 1
             
@@ -480,3 +702,174 @@ def scan_for_malware_using_clam_av(path, config=None):
             if retry_wait > 0:
                 logger.debug(f"Waiting {retry_wait}s before retry")
                 time.sleep(retry_wait)
+
+
+async def run_malware_scan_async(cmd, path, result_handler, timeout_seconds=None, file_size_bytes=None):
+    """
+    Run a malware scan as a child process of the running event loop, as for run_malware_scan.
+    SECURITY NOTE: This function executes external commands. Only use with trusted,
+    hardcoded command lists. Never pass user-controlled input to the cmd parameter.
+    
+    The scanner is killed if the scan times out or is cancelled.
+        
+    Args:
+        As for run_malware_scan
+        
+    Returns:
+        int: scan_result_types value
+        
+    Raises:
+        ScanTimeoutError: If scan times out
+    """
+    logger = get_logger()
+    
+    # Security validation
+    if not isinstance(cmd, list):
+        logger.error("Security error: cmd must be a list, not a string")
+        return scan_result_types.FILE_SCAN_FAILED
+    
+    if not files.is_pathname_safe(path):
+        logger.error(f"Security error: Unsafe filename detected: {path}")
+        return scan_result_types.FILE_SCAN_FAILED
+    
+    try:
+        logger.info(f"Scanning file {path} for malware...")
+        
+        start_time = time.time()
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout_seconds)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            scan_time = time.time() - start_time
+            logger.error(f"Scan timed out after {timeout_seconds} seconds for {path} (actual time: {scan_time:.2f}s)")
+            raise ScanTimeoutError(f"Scan timed out for {path}")
+        except asyncio.CancelledError:
+            # Wait for the scanner to exit, so it is no longer reading the file once cancelled
+            process.kill()
+            await process.wait()
+            raise
+            
+        scan_time = time.time() - start_time
+        
+        log_scan_metrics(path, scan_time, timeout_seconds, file_size_bytes)
+        
+        output = stdout.decode(errors='replace')
+        logger.debug(f"Return code: {process.returncode}")
+        logger.debug(f"Output: {output}")
+        
+        return result_handler(process.returncode, output)
+        
+    except ScanTimeoutError:
+        # Re-raise timeout errors so they can be handled by retry logic
+        raise
+    except Exception as e:
+        logger.error(f"Exception during malware scan: {e}")
+        return scan_result_types.FILE_SCAN_FAILED
+
+
+async def scan_with_retries_async(scan_once, path, scanner_name, config=None):
+    """
+    Retry a scan that times out, with the same settings as the synchronous scanners.
+    
+    Args:
+        scan_once (callable): Returns a new awaitable scanning the file once
+        path (str): Path to the file being scanned, for logging
+        scanner_name (str): Scanner name for logging
+        config: CommonConfig object with retry settings
+        
+    Returns:
+        Scan result or raises ScanTimeoutError after all retries
+    """
+    retry_wait = config.malware_scan_retry_wait_seconds if config else 30
+    retry_count = config.malware_scan_retry_count if config else 3
+    
+    logger = get_logger()
+    
+    # If retry_count is 0, use unlimited retries
+    attempt = 0
+    while True:
+        try:
+            return await scan_once()
+        except ScanTimeoutError:
+            attempt += 1
+            
+            if retry_count > 0 and attempt >= retry_count:
+                logger.error(f"{scanner_name} scan timeout after {retry_count} attempts for {path}")
+                raise
+            
+            if retry_count > 0:
+                logger.warning(f"{scanner_name} scan timeout on attempt {attempt}/{retry_count} for {path}")
+            else:
+                logger.warning(f"{scanner_name} scan timeout on attempt {attempt} (unlimited retries) for {path}")
+            
+            if retry_wait > 0:
+                logger.debug(f"Waiting {retry_wait}s before retry")
+                await asyncio.sleep(retry_wait)
+
+
+async def scan_for_malware_using_defender_async(path, config=None, file_size_bytes=None):
+    """
+    Scan a file using Microsoft Defender without blocking the event loop.
+    
+    Args:
+        As for scan_for_malware_using_defender
+        
+    Returns:
+        Scan result or raises ScanTimeoutError after all retries
+    """
+    cmd = [
+        DEFENDER_COMMAND,
+        "scan",
+        "custom",
+        "--ignore-exclusions",
+        "--path"
+    ]
+    
+    base_timeout = config.malware_scan_timeout_seconds if config else 300
+    ms_per_byte = config.malware_scan_timeout_ms_per_byte if config else 0.0
+    timeout = calculate_dynamic_timeout(path, base_timeout, ms_per_byte, file_size_bytes)
+    
+    return await scan_with_retries_async(
+        lambda: run_malware_scan_async(cmd, path, parse_defender_scan_result, timeout, file_size_bytes),
+        path,
+        "Defender",
+        config
+    )
+
+
+async def scan_for_malware_using_clam_av_async(path, config=None, file_size_bytes=None):
+    """
+    Scan a file using ClamAV without blocking the event loop.
+    
+    clamd sessions are blocking sockets, so scans over them run in the default executor.
+    
+    Args:
+        As for scan_for_malware_using_clam_av
+        
+    Returns:
+        Scan result or raises ScanTimeoutError after all retries
+    """
+    cmd = [
+        "clamdscan",
+        "--fdpass"  # temp until permissions issues resolved
+    ]
+    
+    from .clamd_client import default_clamd_client
+    
+    base_timeout = config.malware_scan_timeout_seconds if config else 300
+    ms_per_byte = config.malware_scan_timeout_ms_per_byte if config else 0.0
+    timeout = calculate_dynamic_timeout(path, base_timeout, ms_per_byte, file_size_bytes)
+    
+    def scan_once():
+        if default_clamd_client.enabled:
+            return asyncio.to_thread(default_clamd_client.scan_file, path, timeout, file_size_bytes)
+        return run_malware_scan_async(cmd, path, handle_clamav_scan_result, timeout, file_size_bytes)
+    
+    return await scan_with_retries_async(scan_once, path, "ClamAV", config)
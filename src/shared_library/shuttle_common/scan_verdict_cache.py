@@ -0,0 +1,210 @@
+"""
+Scan Verdict Cache
+
+Remembers the verdict each scanner gave for some content, keyed by the
+content's digest, so a file identical to one scanned before (a re-upload, or
+the same installer arriving on another day) is not scanned again.
+
+Each verdict is stored with the scanner's engine and definitions versions.
+It is only used while the scanner still reports the same versions and the
+verdict is younger than the time to live, so a definitions update makes
+every file be scanned again.
+
+Verdicts are kept in a SQLite database, shared by the scan worker processes.
+"""
+
+import os
+import time
+import sqlite3
+from .logger_injection import get_logger
+from .scan_utils import scan_result_types
+
+
+SCAN_VERDICT_CACHE_FILE_NAME = 'scan_verdict_cache.sqlite3'
+
+# The cache is rebuilt rather than migrated when the schema changes
+SCHEMA_VERSION = 1
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+SCANNER_DEFENDER = 'defender'
+SCANNER_CLAM_AV = 'clam_av'
+
+# Only completed scans are remembered, failures are always retried
+CACHEABLE_VERDICTS = (scan_result_types.FILE_IS_CLEAN, scan_result_types.FILE_IS_SUSPECT)
+
+# Seconds to wait for another scan worker holding the database lock
+DATABASE_TIMEOUT_SECONDS = 30
+
+
+class ScanVerdictCache:
+    """
+    Persistent map from (digest, hash algorithm, scanner) to scan verdict.
+
+    Usage:
+        - open() the database before scan workers are started
+        - set_scanner_versions() for each scanner, verdicts are only used and
+          stored for scanners whose versions are known
+        - get() before scanning and put() after, from any process
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl_seconds: Time a verdict may be used for, even if no versions change
+        """
+        self.ttl_seconds = ttl_seconds
+        self.database_file = None
+        self.hits = 0
+        self.misses = 0
+        self._scanner_versions = {}  # scanner -> (engine version, definitions version)
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def enabled(self):
+        """True once a database has been opened."""
+        return self.database_file is not None
+
+    def set_scanner_versions(self, scanner, engine_version, definitions_version):
+        """
+        Set the current versions of a scanner.
+
+        Verdicts from other versions are no longer used. If either version is
+        None, verdicts for the scanner are neither used nor stored.
+        """
+        if engine_version is None or definitions_version is None:
+            self._scanner_versions.pop(scanner, None)
+        else:
+            self._scanner_versions[scanner] = (engine_version, definitions_version)
+
+    def open(self, database_file):
+        """
+        Open or create the database, and remove verdicts that can no longer be used.
+
+        Args:
+            database_file: Path of the SQLite database
+
+        Returns:
+            bool: True if the database could be opened
+        """
+        logger = get_logger()
+
+        self.close()
+        self.database_file = database_file
+        try:
+            os.makedirs(os.path.dirname(database_file) or '.', exist_ok=True)
+            connection = self._get_connection()
+            if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                with connection:
+                    connection.execute("DROP TABLE IF EXISTS scan_verdicts")
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            with connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS scan_verdicts (
+                        digest TEXT NOT NULL,
+                        algorithm TEXT NOT NULL,
+                        scanner TEXT NOT NULL,
+                        engine_version TEXT NOT NULL,
+                        definitions_version TEXT NOT NULL,
+                        verdict INTEGER NOT NULL,
+                        scanned_at REAL NOT NULL,
+                        PRIMARY KEY (digest, algorithm, scanner)
+                    )
+                """)
+                removed = connection.execute(
+                    "DELETE FROM scan_verdicts WHERE scanned_at < ?",
+                    (time.time() - self.ttl_seconds,)
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open scan verdict cache {database_file}: {e}")
+            self.close()
+            self.database_file = None
+            return False
+
+        logger.debug(f"Opened scan verdict cache {database_file}, removed {removed} expired verdicts")
+        return True
+
+    def close(self):
+        """Close this process's connection to the database."""
+        if self._connection is not None and self._connection_pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._connection_pid = None
+
+    def _get_connection(self):
+        # SQLite connections must not be used across fork, each scan worker opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.database_file, timeout=DATABASE_TIMEOUT_SECONDS)
+            self._connection_pid = os.getpid()
+            self._connection.execute("PRAGMA journal_mode = WAL")
+        return self._connection
+
+    def get(self, digest, algorithm, scanner):
+        """
+        Get the verdict a scanner gave for some content.
+
+        Args:
+            digest: Hex digest of the content
+            algorithm: Hash algorithm of the digest
+            scanner: SCANNER_DEFENDER or SCANNER_CLAM_AV
+
+        Returns:
+            int: scan_result_types value, or None if there is no usable verdict
+        """
+        versions = self._scanner_versions.get(scanner)
+        if not self.enabled or versions is None or digest is None:
+            return None
+
+        try:
+            row = self._get_connection().execute(
+                "SELECT verdict FROM scan_verdicts WHERE digest = ? AND algorithm = ? AND scanner = ? "
+                "AND engine_version = ? AND definitions_version = ? AND scanned_at >= ?",
+                (digest, algorithm, scanner, versions[0], versions[1], time.time() - self.ttl_seconds)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger = get_logger()
+            logger.warning(f"Could not read scan verdict cache: {e}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, digest, algorithm, scanner, verdict):
+        """
+        Store the verdict a scanner gave for some content.
+
+        Args:
+            digest: Hex digest of the content
+            algorithm: Hash algorithm of the digest
+            scanner: SCANNER_DEFENDER or SCANNER_CLAM_AV
+            verdict: scan_result_types value, only clean and suspect verdicts are stored
+
+        Returns:
+            bool: True if the verdict was stored
+        """
+        versions = self._scanner_versions.get(scanner)
+        if not self.enabled or versions is None or digest is None or verdict not in CACHEABLE_VERDICTS:
+            return False
+
+        try:
+            connection = self._get_connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO scan_verdicts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (digest, algorithm, scanner, versions[0], versions[1], verdict, time.time())
+                )
+        except sqlite3.Error as e:
+            logger = get_logger()
+            logger.warning(f"Could not write scan verdict cache: {e}")
+            return False
+        return True
+
+
+# Cache used by shuttle.scanning.scan_and_process_file
+default_scan_verdict_cache = ScanVerdictCache()
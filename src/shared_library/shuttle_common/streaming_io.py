@@ -0,0 +1,153 @@
+"""
+Streaming I/O
+
+Files moved through quarantine are read and written once, from start to end,
+and are often larger than the page cache. Left to itself the kernel keeps
+their pages cached, evicting directory metadata and the start of the files
+that are about to be copied.
+
+When enabled, StreamingIO uses posix_fadvise to:
+
+- mark files as read sequentially, so the kernel reads further ahead
+- prefetch the start of the next file while the current one is copied
+- drop pages from the cache once they have been hashed, or written and
+  flushed to disk
+
+Pages are dropped every DROP_INTERVAL_BYTES rather than after every read.
+Nothing is done where posix_fadvise is not available.
+"""
+
+import os
+from .logger_injection import get_logger
+
+
+STREAMING_IO_AVAILABLE = hasattr(os, 'posix_fadvise')
+
+# Bytes read or written between dropping pages from the cache
+DROP_INTERVAL_BYTES = 16 * 1024 * 1024
+
+# Bytes from the start of the next file read ahead while the current file is copied
+PREFETCH_BYTES = 8 * 1024 * 1024
+
+
+def _fadvise(fd, offset, length, advice):
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+        return True
+    except OSError as e:
+        # Hints are not supported by some filesystems, copying carries on without them
+        logger = get_logger()
+        logger.debug(f"posix_fadvise failed: {e}")
+        return False
+
+
+class _NoStreaming:
+    """Stands in for _StreamingRange when streaming I/O is disabled."""
+
+    def advance(self, length):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NO_STREAMING = _NoStreaming()
+
+
+class _StreamingRange:
+    """Bytes of an open file that have been read or written but not yet dropped from the cache."""
+
+    def __init__(self, fd, flush):
+        self.fd = fd
+        self.flush = flush
+        self.position = os.lseek(fd, 0, os.SEEK_CUR)
+        self.dropped = self.position
+
+    def advance(self, length):
+        """Record that length more bytes have been read or written."""
+        self.position += length
+        if self.position - self.dropped >= DROP_INTERVAL_BYTES:
+            self._drop()
+
+    def finish(self):
+        """Drop the remaining bytes, call when done with the file and before closing it."""
+        if self.position > self.dropped:
+            self._drop()
+
+    def _drop(self):
+        # Dirty pages are not dropped, written bytes have to reach the disk first
+        if self.flush:
+            os.fdatasync(self.fd)
+        _fadvise(self.fd, self.dropped, self.position - self.dropped, os.POSIX_FADV_DONTNEED)
+        self.dropped = self.position
+
+
+class StreamingIO:
+    """
+    Page cache hints for files read or written once.
+
+    Usage:
+        stream = streaming_io.reader(fd)  # or writer(fd)
+        ... stream.advance(length) after each block ...
+        stream.finish()
+
+    reader() and writer() return objects that do nothing while disabled.
+    """
+
+    def __init__(self, enabled=False):
+        self.set_enabled(enabled)
+
+    def set_enabled(self, enabled):
+        """Enable or disable the hints, they stay disabled where posix_fadvise is not available."""
+        self.enabled = bool(enabled) and STREAMING_IO_AVAILABLE
+
+    def reader(self, fd):
+        """Mark a file as read sequentially from its current offset, and drop the pages read."""
+        if not self.enabled:
+            return _NO_STREAMING
+        _fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return _StreamingRange(fd, flush=False)
+
+    def writer(self, fd):
+        """Flush and drop the pages written to a file."""
+        if not self.enabled:
+            return _NO_STREAMING
+        return _StreamingRange(fd, flush=True)
+
+    def prefetch(self, file_path):
+        """Start reading the beginning of a file into the cache in the background."""
+        if not self.enabled:
+            return
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            _fadvise(fd, 0, PREFETCH_BYTES, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    def drop_file(self, file_path, flush=False):
+        """
+        Drop a whole file from the cache, after it was copied by the kernel.
+
+        Args:
+            file_path (str): Path to the file
+            flush (bool): Write the file's dirty pages to disk first, so they can be dropped
+        """
+        if not self.enabled:
+            return
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            if flush:
+                os.fdatasync(fd)
+            _fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+# Hints used by the copy and hash functions in shuttle_common.files and hash_engine
+default_streaming_io = StreamingIO()
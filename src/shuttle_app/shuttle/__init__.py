@@ -38,6 +38,8 @@ from shuttle_common.files import (
     get_file_hash,
     compare_file_hashes,
     copy_temp_then_rename,
+    copy_and_hash_temp_then_rename,
+    move_temp_then_rename,
     normalize_path,
     is_path_open,
     is_path_stable,
@@ -85,6 +87,8 @@ __all__ = [
     'get_file_hash',
     'compare_file_hashes',
     'copy_temp_then_rename',
+    'copy_and_hash_temp_then_rename',
+    'move_temp_then_rename',
     'normalize_path',
     'is_path_open',
     'is_path_stable',
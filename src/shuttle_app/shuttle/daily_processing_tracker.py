@@ -9,6 +9,7 @@ import yaml
 import logging
 from datetime import datetime
 from shuttle_common.logger_injection import get_logger
+from shuttle_common.hash_engine import default_hash_engine
 
 
 class DailyProcessingTracker:
@@ -107,7 +108,8 @@ class DailyProcessingTracker:
         pending_volume = self.pending_volume_mb if include_pending else 0.0
         return base_volume + pending_volume + include_additional_mb
         
-    def add_pending_file(self, file_path, file_size_mb, file_hash, source_path, relative_file_path):
+    def add_pending_file(self, file_path, file_size_mb, file_hash, source_path, relative_file_path,
+                         hash_algorithm=None, secondary_hashes=None):
         """
         Track a file that has been approved for processing.
         
@@ -117,6 +119,8 @@ class DailyProcessingTracker:
             file_hash: Hash identifier for the file
             source_path: Original path of the file before quarantine
             relative_file_path: Relative path from source root (rel_dir + source_file)
+            hash_algorithm: Algorithm file_hash was calculated with (default: default_hash_engine.algorithm)
+            secondary_hashes: Optional dict of algorithm to hash, recorded while changing algorithm
             
         Returns:
             str: The relative file path for later reference
@@ -124,6 +128,7 @@ class DailyProcessingTracker:
 
         logger = get_logger()
 
+        hash_algorithm = hash_algorithm or default_hash_engine.algorithm
         timestamp = datetime.now().isoformat()
         
         self.pending_files += 1
@@ -132,6 +137,7 @@ class DailyProcessingTracker:
         # Track the specific file using relative file path as identifier
         self.file_records[relative_file_path] = {
             'file_hash': file_hash,
+            'hash_algorithm': hash_algorithm,
             'file_path': file_path,
             'source_path': source_path,
             'relative_file_path': relative_file_path,
@@ -142,8 +148,10 @@ class DailyProcessingTracker:
             'outcome': None,
             'error': None
         }
+        if secondary_hashes:
+            self.file_records[relative_file_path]['secondary_hashes'] = dict(secondary_hashes)
         
-        logger.debug(f"Added pending file: {file_path} ({file_size_mb:.2f} MB), hash: {file_hash}, key: {relative_file_path}")
+        logger.debug(f"Added pending file: {file_path} ({file_size_mb:.2f} MB), {hash_algorithm}: {file_hash}, key: {relative_file_path}")
         return relative_file_path  # Return relative file path for later reference
         
     def complete_pending_file(self, relative_file_path, outcome='success', error=None):
@@ -0,0 +1,165 @@
+"""
+Defender batch scanning for Shuttle.
+
+Starting mdatp costs far more than scanning a small file, so small quarantined
+files can be scanned together. The files of each batch are hard linked into a
+directory of their own in quarantine, and the directory is scanned with one
+mdatp invocation.
+
+Files are linked under numbered names, so the threat report can only name
+files by their number and a file name cannot be mistaken for scanner output.
+Verdicts are returned for the files they are known for: every file when the
+batch is clean, and the files named in the threat report when it is not. The
+remaining files of a batch with threats, and every file of a batch that failed
+or timed out, are scanned on their own as usual.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from shuttle_common.logger_injection import get_logger
+from shuttle_common.hash_engine import default_hash_engine
+from shuttle_common.scan_verdict_cache import default_scan_verdict_cache, SCANNER_DEFENDER
+from shuttle_common.scan_utils import ScanTimeoutError, scan_batch_for_malware_using_defender
+
+# Scanners refuse paths whose last component starts with a period or dash
+BATCH_DIRECTORY_PREFIX = 'defender-batch-'
+
+
+def plan_defender_batches(file_data_list, max_files, max_bytes):
+    """
+    Group quarantined files into batches for Defender.
+
+    Files larger than max_bytes are left out, as are batches that would hold a single
+    file, since scanning them alone costs the same.
+
+    Args:
+        file_data_list: Quarantined file tuples from quarantine_files_for_scanning
+        max_files (int): Maximum files in a batch
+        max_bytes (int): Maximum total size of the files in a batch
+
+    Returns:
+        list: Lists of quarantined file tuples, one for each batch
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+
+    for file_data in file_data_list:
+        file_size = file_data[5].size
+        if file_size > max_bytes:
+            continue
+
+        if batch and (len(batch) >= max_files or batch_bytes + file_size > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+
+        batch.append(file_data)
+        batch_bytes += file_size
+
+    batches.append(batch)
+
+    return [batch for batch in batches if len(batch) > 1]
+
+
+def scan_defender_batch(batch, quarantine_path, config=None):
+    """
+    Scan a batch of quarantined files with one Defender invocation.
+
+    Args:
+        batch: Quarantined file tuples
+        quarantine_path (str): Quarantine directory, the batch directory is made in it
+            so the files can be hard linked
+        config: Optional config object with timeout settings
+
+    Returns:
+        dict: Quarantine file path to scan_result_types value, for the files whose
+            verdicts are known
+    """
+    logger = get_logger()
+
+    batch_directory = tempfile.mkdtemp(prefix=BATCH_DIRECTORY_PREFIX, dir=quarantine_path)
+    entries = {}  # Entry path -> quarantine file path
+    total_size_bytes = 0
+
+    try:
+        for index, file_data in enumerate(batch):
+            entry_path = os.path.join(batch_directory, f"{index:06d}")
+            try:
+                os.link(file_data[0], entry_path)
+            except OSError as e:
+                logger.warning(f"Could not link {file_data[0]} into Defender batch, it will be scanned on its own: {e}")
+                continue
+            entries[entry_path] = file_data[0]
+            total_size_bytes += file_data[5].size
+
+        if not entries:
+            return {}
+
+        logger.info(f"Scanning {len(entries)} files in Defender batch {batch_directory}")
+        verdicts = scan_batch_for_malware_using_defender(batch_directory, list(entries), config, total_size_bytes)
+        return {entries[entry_path]: result for entry_path, result in verdicts.items()}
+
+    except ScanTimeoutError:
+        logger.error(f"Defender batch scan timed out for {batch_directory}, its files will be scanned on their own")
+        return {}
+
+    finally:
+        # Defender may already have removed links to suspect files
+        shutil.rmtree(batch_directory, ignore_errors=True)
+
+
+def scan_defender_batches(file_data_list, quarantine_path, max_scan_threads, config):
+    """
+    Scan small quarantined files in Defender batches before they are scanned on their own.
+
+    Files that already have a cached Defender verdict are not batched.
+
+    Args:
+        file_data_list: Quarantined file tuples that are about to be scanned
+        quarantine_path (str): Quarantine directory
+        max_scan_threads (int): Number of batches scanned at once
+        config: Optional config object with the batch limits and timeout settings
+
+    Returns:
+        dict: Quarantine file path to scan_result_types value, for the files whose
+            verdicts are known, see scan_defender_batch
+    """
+    logger = get_logger()
+
+    algorithm = (config.hash_algorithm if config else None) or default_hash_engine.algorithm
+    max_files = config.defender_batch_scan_max_files if config else 50
+    max_mb = config.defender_batch_scan_max_mb if config else 16.0
+
+    uncached_files = [
+        file_data for file_data in file_data_list
+        if default_scan_verdict_cache.get(file_data[3], algorithm, SCANNER_DEFENDER) is None
+    ]
+
+    batches = plan_defender_batches(uncached_files, max_files, max_mb * 1024 * 1024)
+    if not batches:
+        return {}
+
+    batched_count = sum(len(batch) for batch in batches)
+    logger.info(f"Scanning {batched_count} files in {len(batches)} Defender batches")
+
+    verdicts = {}
+    try:
+        if max_scan_threads > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=min(max_scan_threads, len(batches))) as executor:
+                futures = [executor.submit(scan_defender_batch, batch, quarantine_path, config) for batch in batches]
+                for future in futures:
+                    verdicts.update(future.result())
+        else:
+            for batch in batches:
+                verdicts.update(scan_defender_batch(batch, quarantine_path, config))
+    except Exception as e:
+        logger.error(f"Defender batch scanning failed, remaining files will be scanned on their own: {e}")
+
+    logger.info(f"Defender batch verdicts for {len(verdicts)} of {batched_count} files, "
+                f"{len(file_data_list) - len(verdicts)} files will be scanned on their own")
+
+    return verdicts
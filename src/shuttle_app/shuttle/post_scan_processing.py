@@ -4,8 +4,10 @@ from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor
 from shuttle_common.logger_injection import get_logger
 from shuttle_common.files import (
-    copy_temp_then_rename,
+    copy_and_hash_temp_then_rename,
+    move_temp_then_rename,
     get_file_hash,
+    get_source_identity,
     verify_file_integrity,
     remove_file_with_logging,
     encrypt_file
@@ -14,9 +16,10 @@ from shuttle_common.files import (
 class ProcessingResult:
     """Result of file processing with outcome type information."""
     
-    def __init__(self, success, is_suspect=False):
+    def __init__(self, success, is_suspect=False, scan_cache_hit=False):
         self.success = success
         self.is_suspect = is_suspect
+        self.scan_cache_hit = scan_cache_hit  # Verdict came from the scan verdict cache, nothing was scanned
     
     def __bool__(self):
         """Allow the result to be used as a boolean for backward compatibility."""
@@ -26,7 +29,8 @@ def handle_suspect_source_file(
     source_file_path,
     quarantine_hash,
     hazard_archive_path,
-    key_file_path
+    key_file_path,
+    hash_algorithm=None
 ):
     """
     Handle a source file when its quarantine copy is found to be suspect.
@@ -37,6 +41,7 @@ def handle_suspect_source_file(
         hazard_archive_path (str): Path to archive suspicious files
         key_file_path (str): Path to GPG public key file
         delete_source_files (bool): Whether to delete source files
+        hash_algorithm (str): Algorithm of quarantine_hash (default: the configured algorithm)
     
     Returns:
         bool: True if handled successfully, False otherwise
@@ -46,7 +51,7 @@ def handle_suspect_source_file(
     if not os.path.exists(source_file_path):
         return True
         
-    source_hash = get_file_hash(source_file_path)
+    source_hash = get_file_hash(source_file_path, algorithm=hash_algorithm)
     
     if source_hash == quarantine_hash:
         logger.error(f"Hash match for source file {source_file_path}")
@@ -72,7 +77,8 @@ def handle_suspect_scan_result(
     key_file_path,
     delete_source_files,
     scanner_handling_suspect_file,
-    quarantine_hash
+    quarantine_hash,
+    hash_algorithm=None
 ):
     """
     Handle the result of a malware scan that found a suspect file.
@@ -85,6 +91,7 @@ def handle_suspect_scan_result(
         delete_source_files (bool): Whether to delete source files
         scanner_handling_suspect_file (bool): Whether virus scanner removes suspect files
         quarantine_hash (str): Hash of the quarantine file for comparison
+        hash_algorithm (str): Algorithm of quarantine_hash (default: the configured algorithm)
     
     Returns:
         ProcessingResult: Result with success status and suspect flag set to True
@@ -108,7 +115,8 @@ def handle_suspect_scan_result(
             source_file_path,
             quarantine_hash,
             hazard_archive_path,
-            key_file_path
+            key_file_path,
+            hash_algorithm
         )
         return ProcessingResult(success, is_suspect=True)
     else:
@@ -126,16 +134,40 @@ def handle_clean_file(
     quarantine_file_path,
     source_file_path,
     destination_file_path,
-    delete_source_files
+    delete_source_files,
+    quarantine_hash=None,
+    rename_to_destination=False,
+    source_identity=None,
+    rehash_source=False,
+    hash_algorithm=None
 ):
     """
     Handle processing of clean files by moving them to the destination.
 
+    The destination copy is hashed as it is written. When quarantine_hash is
+    given, a copy that does not match it is not delivered, and the destination
+    is not read again to verify the source.
+
+    With rename_to_destination, a quarantine file on the same filesystem as the
+    destination is renamed into place instead of copied. The delivered file is
+    then the scanned file itself, so its hash is quarantine_hash.
+
+    Before the source is deleted it is checked against what was delivered.
+    When source_identity is given the source is not read again: it is deleted
+    if its identity is unchanged since it was copied and the delivered file
+    matches quarantine_hash. Otherwise, or with rehash_source, the source is
+    hashed again in full.
+
     Args:
         quarantine_file_path (str): Full path to the file in quarantine
         source_file_path (str): Full path to the original source file
         destination_file_path (str): Full path where the file should be copied in destination
         delete_source_files (bool): Whether to delete source files after processing
+        quarantine_hash (str): Hash of the quarantined file, calculated when it was copied from source
+        rename_to_destination (bool): Rename the quarantine file into place when on the same filesystem
+        source_identity (SourceIdentity): Identity of the source file taken before it was copied to quarantine
+        rehash_source (bool): Always re-read the source to verify it before deleting it
+        hash_algorithm (str): Algorithm of quarantine_hash (default: the configured algorithm)
 
     Returns:
         ProcessingResult: Result with success status and suspect flag set to False
@@ -143,7 +175,17 @@ def handle_clean_file(
     logger = get_logger()
     
     try:
-        copy_temp_then_rename(quarantine_file_path, destination_file_path)
+        if rename_to_destination and move_temp_then_rename(quarantine_file_path, destination_file_path):
+            destination_hash = quarantine_hash
+            if destination_hash is None and delete_source_files:
+                destination_hash = get_file_hash(destination_file_path, algorithm=hash_algorithm)
+        else:
+            destination_hash = copy_and_hash_temp_then_rename(
+                quarantine_file_path,
+                destination_file_path,
+                expected_hash=quarantine_hash,
+                algorithm=hash_algorithm
+            )
 
     except Exception as e:
         if logger:
@@ -153,10 +195,19 @@ def handle_clean_file(
     if delete_source_files:
         try:
 
-            # Verify integrity and delete source if requested
-            verify = verify_file_integrity(source_file_path, destination_file_path)
+            # Verify the source still matches what was delivered, and delete it
+            if source_identity is not None and quarantine_hash is not None and not rehash_source:
+                # An unchanged source still holds the bytes hashed when it was copied
+                source_verified = (
+                    destination_hash == quarantine_hash
+                    and get_source_identity(source_file_path) == source_identity
+                )
+            else:
+                source_hash = get_file_hash(source_file_path, use_cache=not rehash_source, algorithm=hash_algorithm)
+                source_verified = source_hash is not None and source_hash == destination_hash
 
-            if verify['success']:
+            if source_verified:
+                logger.info(f"File integrity verified between {source_file_path} and {destination_file_path}")
                 remove_file_with_logging(source_file_path)
             else:
                 logger.error(f"Integrity check failed, source file not deleted: {source_file_path}")
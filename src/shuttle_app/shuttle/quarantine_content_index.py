@@ -0,0 +1,108 @@
+"""
+Quarantine content index for Shuttle.
+
+Groups the files quarantined in a pass by the digest calculated while they
+were copied, so that identical files (the same installer dropped into many
+user folders, for example) are scanned once.
+
+The first file with some content is scanned. Later files with the same
+digest and size are held back as duplicates of it, and the scan result of
+the first file is applied to each of them once it is known. Each duplicate
+keeps its own quarantine copy, source and destination, so it is delivered,
+archived and tracked exactly as if it had been scanned itself.
+"""
+
+
+class _ContentGroup:
+    """Quarantined files sharing one digest and size."""
+
+    def __init__(self, file_data):
+        self.scanned_file = file_data
+        self.scan_result = None
+        self.duplicates = []
+
+
+class QuarantineContentIndex:
+    """
+    Index of quarantined file tuples by content, for one pass.
+
+    Usage:
+        - add() each quarantined file, only scan it if add() returns True
+        - set_scan_result() with the result of each scanned file, and process
+          the duplicates it returns with that result
+        - a duplicate added after its scan result is known has nothing to wait
+          for, get_scan_result() returns the result straight away
+    """
+
+    def __init__(self):
+        self._groups = {}  # (file hash, size) -> _ContentGroup
+        self.duplicate_count = 0
+
+    @staticmethod
+    def _content_key(file_data):
+        file_hash = file_data[3]
+        file_metadata = file_data[5]
+        if file_hash is None:
+            return None
+        return (file_hash, file_metadata.size)
+
+    def add(self, file_data):
+        """
+        Add a quarantined file.
+
+        Args:
+            file_data: Quarantined file tuple from quarantine_files_for_scanning
+
+        Returns:
+            bool: True if the file must be scanned, False if it is a duplicate of a file
+                that was added earlier
+        """
+        key = self._content_key(file_data)
+        if key is None:
+            # Without a hash the file cannot be matched, it is scanned on its own
+            self._groups[(None, len(self._groups))] = _ContentGroup(file_data)
+            return True
+
+        group = self._groups.get(key)
+        if group is None:
+            self._groups[key] = _ContentGroup(file_data)
+            return True
+
+        self.duplicate_count += 1
+        if group.scan_result is None:
+            group.duplicates.append(file_data)
+        return False
+
+    def get_scan_result(self, file_data):
+        """Get the scan result for the content of a file, or None if it is not known yet."""
+        key = self._content_key(file_data)
+        group = self._groups.get(key) if key is not None else None
+        return group.scan_result if group is not None else None
+
+    def set_scan_result(self, file_data, scan_result):
+        """
+        Record the result of scanning a file.
+
+        Args:
+            file_data: The scanned file tuple
+            scan_result: Result from scan_and_process_file, or the exception it raised
+
+        Returns:
+            list: Duplicates that were waiting for this result, in the order they were added
+        """
+        key = self._content_key(file_data)
+        group = self._groups.get(key) if key is not None else None
+        if group is None or group.scanned_file != file_data:
+            return []
+
+        group.scan_result = scan_result
+        duplicates, group.duplicates = group.duplicates, []
+        return duplicates
+
+    def grouped_files(self):
+        """Get every file added, each scanned file followed by its waiting duplicates."""
+        files = []
+        for group in self._groups.values():
+            files.append(group.scanned_file)
+            files.extend(group.duplicates)
+        return files
@@ -0,0 +1,201 @@
+"""
+Re-check queue for Shuttle.
+
+Holds source files that were not ready (recently modified or open) when a
+pass first reached them, and offers them again later in the same pass, so a
+file that finishes uploading just after a run starts does not wait for the
+next run.
+
+Files are checked again with exponential backoff until a per-pass deadline.
+Each check samples the file's size and mtime. If a file changes after it had
+been idle for some time, its writer pauses for at least that long between
+writes, so the stability window for that file is widened to cover the pause.
+"""
+
+import os
+import time
+import heapq
+from shuttle_common.files import FileMetadata
+from shuttle_common.logger_injection import get_logger
+
+
+# Stability window used for files with no observed pauses between writes,
+# the same as the default for is_path_stable
+BASE_STABILITY_SECONDS = 5
+
+# Upper limit for a widened stability window
+MAX_STABILITY_SECONDS = 300
+
+# A file must stay unchanged for this multiple of the longest pause seen
+# between its writes before it is considered stable
+STABILITY_PAUSE_FACTOR = 2
+
+
+class _RecheckEntry:
+    """Samples and backoff state for a file waiting to be checked again."""
+
+    def __init__(self, source_root, source_file):
+        self.source_root = source_root
+        self.source_file = source_file
+        self.attempts = 0
+        self.last_metadata = None
+        self.last_sample_time = None
+        self.longest_pause_seconds = 0.0
+
+
+class RecheckQueue:
+    """
+    Queue of files that were not ready, checked again later in the same pass.
+
+    Usage:
+        - defer() a file when it is not ready, it is scheduled after a backoff delay
+        - iterate the queue once the walk is done, it sleeps until each file is
+          due and yields it with fresh metadata so it can be checked again
+        - defer() the file again if it is still not ready
+
+    Files that would not be due before the deadline are dropped and left for
+    the next pass.
+    """
+
+    def __init__(self, deadline_seconds, initial_delay_seconds=1, max_delay_seconds=30,
+                 base_stability_seconds=BASE_STABILITY_SECONDS, open_file_snapshot=None):
+        """
+        Initialize the queue. The deadline is measured from now.
+
+        Args:
+            deadline_seconds (float): Time after which no more checks are made
+            initial_delay_seconds (float): Delay before a file is first checked again
+            max_delay_seconds (float): Upper limit for the doubling delay between checks
+            base_stability_seconds (float): Stability window for files with no observed pauses
+            open_file_snapshot (OpenFileSnapshot): Optional snapshot to refresh before each check
+        """
+        self.deadline = time.monotonic() + deadline_seconds
+        self.initial_delay_seconds = initial_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.base_stability_seconds = base_stability_seconds
+        self.open_file_snapshot = open_file_snapshot
+        self.rechecked_count = 0
+        self._entries = {}
+        self._schedule = []  # heap of (due time, sequence, path)
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._schedule)
+
+    def stability_window(self, source_file_path):
+        """
+        Get the stability window for a file.
+
+        Args:
+            source_file_path (str): Full path to the source file
+
+        Returns:
+            float: Seconds the file must be unmodified before it is considered stable
+        """
+        entry = self._entries.get(os.path.normpath(source_file_path))
+        if entry is None:
+            return self.base_stability_seconds
+        return min(
+            MAX_STABILITY_SECONDS,
+            max(self.base_stability_seconds, STABILITY_PAUSE_FACTOR * entry.longest_pause_seconds)
+        )
+
+    def _sample(self, entry, file_metadata):
+        """Record a size/mtime sample, noting any pause the writer made since the last one."""
+        logger = get_logger()
+        now = time.time()
+
+        previous = entry.last_metadata
+        if previous is not None and (file_metadata.mtime_ns != previous.mtime_ns or file_metadata.size != previous.size):
+            # The file was idle from its previous mtime until at least the previous
+            # sample, and has been written since, so the writer paused that long
+            pause_seconds = max(0.0, entry.last_sample_time - previous.mtime)
+            entry.longest_pause_seconds = max(entry.longest_pause_seconds, pause_seconds)
+
+            elapsed = file_metadata.mtime - previous.mtime
+            if elapsed > 0:
+                rate_mb = (file_metadata.size - previous.size) / elapsed / (1024 * 1024)
+                logger.debug(f"File still being written at {rate_mb:.2f} MB/s, longest pause "
+                             f"{entry.longest_pause_seconds:.1f}s: {os.path.join(entry.source_root, entry.source_file)}")
+
+        entry.last_metadata = file_metadata
+        entry.last_sample_time = now
+
+    def defer(self, source_root, source_file, file_metadata):
+        """
+        Schedule a file that is not ready to be checked again.
+
+        The file is due after the backoff delay for its number of attempts, or
+        when its stability window would expire if that is later.
+
+        Args:
+            source_root (str): Directory containing the file
+            source_file (str): Filename only
+            file_metadata (FileMetadata): Metadata used for the failed check
+
+        Returns:
+            float: Seconds until the file is checked again, or None if that would be after the deadline
+        """
+        logger = get_logger()
+
+        source_file_path = os.path.normpath(os.path.join(source_root, source_file))
+        entry = self._entries.get(source_file_path)
+        if entry is None:
+            entry = _RecheckEntry(source_root, source_file)
+            self._entries[source_file_path] = entry
+
+        self._sample(entry, file_metadata)
+        entry.attempts += 1
+
+        delay = min(self.max_delay_seconds, self.initial_delay_seconds * (2 ** (entry.attempts - 1)))
+        time_until_stable = file_metadata.mtime + self.stability_window(source_file_path) - time.time()
+        delay = max(delay, time_until_stable)
+
+        due = time.monotonic() + delay
+        if due > self.deadline:
+            logger.debug(f"File not ready before re-check deadline, left for next run: {source_file_path}")
+            del self._entries[source_file_path]
+            return None
+
+        self._sequence += 1
+        heapq.heappush(self._schedule, (due, self._sequence, source_file_path))
+        return delay
+
+    def __iter__(self):
+        """
+        Wait for each deferred file to be due and yield it for another check.
+
+        Yields:
+            tuple: (source_root, source_file, file_metadata) with freshly stat'ed metadata
+        """
+        logger = get_logger()
+
+        while self._schedule:
+            due, _, source_file_path = heapq.heappop(self._schedule)
+            entry = self._entries.get(source_file_path)
+            if entry is None:
+                continue
+
+            wait_seconds = due - time.monotonic()
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+
+            try:
+                file_metadata = FileMetadata.from_stat(os.stat(source_file_path))
+            except OSError:
+                logger.debug(f"Deferred file no longer available: {source_file_path}")
+                del self._entries[source_file_path]
+                continue
+
+            # Files held open when the snapshot was taken may have been closed since
+            if self.open_file_snapshot is not None:
+                snapshot_age = self.open_file_snapshot.age_seconds
+                if snapshot_age is not None and snapshot_age >= self.initial_delay_seconds:
+                    self.open_file_snapshot.refresh()
+
+            self.rechecked_count += 1
+            yield entry.source_root, entry.source_file, file_metadata
+
+    def forget(self, source_root, source_file):
+        """Stop tracking samples for a file that has been handled."""
+        self._entries.pop(os.path.normpath(os.path.join(source_root, source_file)), None)
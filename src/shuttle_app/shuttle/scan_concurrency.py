@@ -0,0 +1,176 @@
+"""
+Adaptive scan concurrency for Shuttle.
+
+Adjusts the number of scans running at once from the scans that complete,
+instead of always running max_scan_threads. A fixed number is too low while
+the scanners are idle, and too high while definitions update or the host is
+busy, when scans slow down until they time out.
+
+The limit is changed by additive increase and multiplicative decrease, once
+per window of completed scans (at least as many scans as the limit):
+
+- a scan timing out halves the limit at once
+- a window whose 95th percentile scan latency is more than LATENCY_TOLERANCE
+  times the baseline halves the limit
+- otherwise the limit grows by one while each window's throughput is better
+  than the last, and holds once it stops improving, trying one more scan
+  again after PROBE_AFTER_WINDOWS windows
+
+Only scans started at the current limit can lower it, so scans that were
+already running when the limit fell do not lower it again.
+
+The latency baseline is the lowest window p95 seen, allowed to rise by
+BASELINE_DRIFT each window, so a run that moves on to larger files settles on
+their latency instead of backing off for the rest of the run.
+"""
+
+import time
+from shuttle_common.logger_injection import get_logger
+
+
+# Smallest number of scans in a window, so a window has a meaningful p95
+MIN_WINDOW_SCANS = 4
+
+# Fraction of the limit kept when backing off
+BACKOFF_FACTOR = 0.5
+
+# A window p95 latency above this multiple of the baseline backs off
+LATENCY_TOLERANCE = 2.0
+
+# Throughput must improve by this fraction for the limit to keep growing
+MIN_THROUGHPUT_GAIN = 0.05
+
+# Windows to hold at a limit before trying one more scan
+PROBE_AFTER_WINDOWS = 4
+
+# Factor the latency baseline may rise by each window
+BASELINE_DRIFT = 1.1
+
+
+def percentile(values, percent):
+    """Return the value below which the given percent of values fall (nearest rank)."""
+    ordered = sorted(values)
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(rank)]
+
+
+class ScanConcurrencyController:
+    """
+    Limit on concurrent scans, adjusted from scan latency, throughput and timeouts.
+
+    Usage:
+        - start a scan only while fewer than limit scans are running
+        - call start() as each scan starts, and finish() with its token and
+          whether it timed out when it completes, or when it fails or is cancelled
+    """
+
+    def __init__(self, min_limit, max_limit, clock=time.monotonic):
+        """
+        Initialize the controller, starting at the minimum limit.
+
+        Args:
+            min_limit (int): Fewest scans to run at once
+            max_limit (int): Most scans to run at once
+            clock (callable): Monotonic clock in seconds
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = self.min_limit
+        self.decrease_count = 0
+        self._clock = clock
+        self._generation = 0
+        self._last_throughput = None
+        self._baseline_p95 = None
+        self._held_windows = 0
+        self._start_window(clock())
+
+    def _start_window(self, now):
+        self._window_start = now
+        self._window_completed = 0
+        self._latencies = []
+
+    def _set_limit(self, limit, reason, now):
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if limit != self.limit:
+            get_logger().info(f"Scan concurrency {self.limit} -> {limit} ({reason})")
+            self.limit = limit
+            self._generation += 1
+        self._start_window(now)
+
+    def _decrease(self, reason, now):
+        self.decrease_count += 1
+        self._last_throughput = None
+        self._held_windows = 0
+        self._set_limit(int(self.limit * BACKOFF_FACTOR), reason, now)
+
+    def start(self):
+        """
+        Record a scan starting.
+
+        Returns:
+            tuple: Token to pass to finish() when the scan completes
+        """
+        return (self._generation, self._clock())
+
+    def finish(self, token, timed_out=False):
+        """
+        Record a scan completing, and adjust the limit at the end of a window.
+
+        Args:
+            token (tuple): Token returned by start() for the scan
+            timed_out (bool): Whether the scan timed out, or ended without a result
+        """
+        generation, started = token
+        now = self._clock()
+        current = generation == self._generation
+
+        if timed_out:
+            if current:
+                self._decrease("scan timed out", now)
+            return
+
+        self._window_completed += 1
+        if current:
+            self._latencies.append(now - started)
+        if len(self._latencies) < max(self.limit, MIN_WINDOW_SCANS):
+            return
+
+        p95 = percentile(self._latencies, 95)
+        throughput = self._window_completed / max(now - self._window_start, 1e-9)
+        if self._baseline_p95 is None:
+            self._baseline_p95 = p95
+        baseline = self._baseline_p95
+        self._baseline_p95 = min(p95, baseline * BASELINE_DRIFT)
+
+        if p95 > baseline * LATENCY_TOLERANCE:
+            self._decrease(f"p95 scan latency {p95:.2f}s, baseline {baseline:.2f}s", now)
+        elif (
+            self._last_throughput is None
+            or throughput > self._last_throughput * (1 + MIN_THROUGHPUT_GAIN)
+            or self._held_windows >= PROBE_AFTER_WINDOWS
+        ):
+            self._last_throughput = throughput
+            self._held_windows = 0
+            self._set_limit(self.limit + 1, f"{throughput:.1f} scans/s", now)
+        else:
+            self._held_windows += 1
+            self._start_window(now)
+
+
+def create_scan_concurrency_controller(config, max_scan_threads):
+    """
+    Create the concurrency controller for a run.
+
+    Args:
+        config: Shuttle config, or None
+        max_scan_threads (int): Most scans to run at once
+
+    Returns:
+        ScanConcurrencyController, or None when every run uses max_scan_threads
+    """
+    if not (config and config.adaptive_scan_concurrency):
+        return None
+    min_scan_threads = min(max(1, config.min_scan_threads), max_scan_threads)
+    if min_scan_threads >= max_scan_threads:
+        return None
+    return ScanConcurrencyController(min_scan_threads, max_scan_threads)
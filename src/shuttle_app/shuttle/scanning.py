@@ -1,34 +1,61 @@
 import os
+import stat
+import time
+import asyncio
 import logging
+import itertools
 from datetime import datetime
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 from shuttle_common.logger_injection import get_logger
 
 from shuttle_common import (
     is_file_safe_for_processing,
-    are_file_and_path_names_safe,
-    is_file_ready
+    is_file_ready,
+    NameSafetyValidator
 )
 
 from shuttle_common.files import (
     normalize_path,
-    copy_temp_then_rename,
+    clear_path_cache,
+    copy_and_hash_temp_then_rename,
     encrypt_file,
     remove_file_with_logging,
     remove_directory,
     remove_directory_contents,
     remove_empty_directories,
-    get_file_hash,
-    cleanup_empty_directories
+    cleanup_empty_directories,
+    get_source_identity,
+    FileMetadata
+)
+
+from shuttle_common.open_files import create_open_file_snapshot
+from shuttle_common.hash_engine import default_hash_engine
+from shuttle_common.streaming_io import default_streaming_io
+from shuttle_common.scan_verdict_cache import (
+    default_scan_verdict_cache,
+    SCANNER_DEFENDER,
+    SCANNER_CLAM_AV
 )
 
 from .throttler import Throttler
+from .source_manifest import (
+    DISPOSITION_UNSAFE_NAME,
+    DISPOSITION_NOT_READY,
+    DISPOSITION_DEFERRED,
+    DISPOSITION_COPY_FAILED
+)
+from .source_tree_walker import SourceTreeWalker
+from .recheck_queue import RecheckQueue, BASE_STABILITY_SECONDS
 from .throttle_utils import handle_throttle_check
 from .post_scan_processing import (
+    ProcessingResult,
     handle_clean_file,
     handle_suspect_scan_result
 )
+from .quarantine_content_index import QuarantineContentIndex
+from .defender_batch_scan import scan_defender_batches
+from .scan_concurrency import create_scan_concurrency_controller
 
 # Timeout result class
 class ScanTimeoutResult:
@@ -49,7 +76,9 @@ from shuttle_common.scan_utils import (
     scan_for_malware_using_clam_av,
     DefenderScanResult,
     process_defender_result,
-    parse_defender_scan_result
+    parse_defender_scan_result,
+    scan_for_malware_using_defender_async,
+    scan_for_malware_using_clam_av_async
 )
 
 
@@ -63,7 +92,11 @@ def is_clean_scan(scanner_enabled, scan_result):
         )
     )
 
-def scan_and_process_file(
+def _concurrent_scan_engines(config):
+    """Check if the enabled scan engines should scan each file at the same time."""
+    return config.concurrent_scan_engines if config else False
+
+async def _scan_and_process_file(
         paths,     
         hazard_encryption_key_file_path, 
         hazard_archive_path,
@@ -71,26 +104,31 @@ def scan_and_process_file(
         on_demand_defender, 
         on_demand_clam_av, 
         defender_handles_suspect_files,
-        config=None
+        config,
+        batch_defender_result,
+        scan_defender,
+        scan_clam_av,
+        run_blocking
     ):
     """
-    Scan a file for malware and process it accordingly.
-
+    Scan a file and process it with the scanners and post scan processing given.
+    
+    Shared by scan_and_process_file and scan_and_process_file_async, so both make
+    the same decisions.
+    
+    With concurrent_scan_engines, Defender and ClamAV scan the file at the same time.
+    The first suspect verdict cancels the other engine's scan, as does a failed Defender
+    scan; the verdicts are combined as when the engines scan one after the other.
+    
     Args:
-        paths (tuple): Contains all necessary paths for the file being processed.
-            - quarantine_file_path (str): Full path to the file in quarantine
-            - source_file_path (str): Full path to the original source file
-            - destination_file_path (str): Full path where the file should be copied in destination
-
-        - hazard_archive_path (str): Path to the hazard archive directory
-        - hazard_encryption_key_file_path (str): Full path to the public encryption key file
-        - delete_source_files (bool): Whether to delete source files after processing
-        - on_demand_defender (bool): Whether to use Defender for on-demand scanning
-        - on_demand_clam_av (bool): Whether to use ClamAV for on-demand scanning
-        - defender_handles_suspect_files (bool): Whether to let Defender handle suspect files
+        As for scan_and_process_file, and
+        - scan_defender (callable): Coroutine function scanning a file with Defender
+        - scan_clam_av (callable): Coroutine function scanning a file with ClamAV
+        - run_blocking (callable): Coroutine function running a blocking function with
+            its arguments, for post scan processing
     
     Returns:
-        bool: True if the file was processed successfully, False otherwise
+        As for scan_and_process_file
     """
     # Unpack arguments
     (
@@ -98,7 +136,9 @@ def scan_and_process_file(
         source_file_path,
         destination_file_path,
         file_hash,           # Hash for other checks
-        relative_file_path   # relative_file_path for daily processing tracker
+        relative_file_path,  # relative_file_path for daily processing tracker
+        file_metadata,       # FileMetadata of the quarantined file
+        source_identity      # SourceIdentity of the source file when it was copied
     ) = paths
 
     logger = get_logger()
@@ -110,84 +150,294 @@ def scan_and_process_file(
     # No need to calculate hash again
     logger.debug(f"Using pre-calculated hash for file: {quarantine_file_path}, hash: {file_hash}")
     quarantine_hash = file_hash
+    # Verify with the algorithm the quarantine hash was calculated with
+    hash_algorithm = config.hash_algorithm if config else None
+    verdict_algorithm = hash_algorithm or default_hash_engine.algorithm
 
     defender_result = None
     clam_av_result = None
+    defender_scan = None
+    
+    # Only set when every scanner used a cached verdict
+    scan_cache_hit = default_scan_verdict_cache.enabled
 
-    suspect_file_detected = False
-    scanner_handling_suspect_file = False
-
-    if on_demand_defender:
+    async def scan_with_defender():
+        nonlocal defender_result, scan_cache_hit
         # Scan the file for malware
         logger.info(f"Scanning file {quarantine_file_path} for malware...")
-        try:
-            defender_result = scan_for_malware_using_defender(quarantine_file_path, config)
-            
-            # Process the scan result with our helper
-            scan_result = process_defender_result(
-                defender_result,
-                quarantine_file_path,
-                defender_handles_suspect_files
-            )
-            
-            # Update our status flags based on the scan result
-            suspect_file_detected = scan_result.suspect_detected
-            scanner_handling_suspect_file = scan_result.scanner_handles_suspect
-            
-            # Return early if scan failed (not completed) and no threat detected
-            # This happens when file is not found and we're not letting defender handle it
-            if not scan_result.scan_completed and not scan_result.suspect_detected:
-                return False
-                
-        except ScanTimeoutError:
-            # Treat timeout as scan failure
-            logger.error(f"Defender scan timed out for {quarantine_file_path}")
-            return ScanTimeoutResult(quarantine_file_path, source_file_path)
-
+        defender_result = default_scan_verdict_cache.get(quarantine_hash, verdict_algorithm, SCANNER_DEFENDER)
+        defender_scanned_file = False
+        if defender_result is not None:
+            logger.info(f"Using cached Defender verdict for {quarantine_file_path}")
+        elif batch_defender_result is not None:
+            scan_cache_hit = False
+            defender_result = batch_defender_result
+            logger.info(f"Using Defender batch scan verdict for {quarantine_file_path}")
+            default_scan_verdict_cache.put(quarantine_hash, verdict_algorithm, SCANNER_DEFENDER, defender_result)
+        else:
+            scan_cache_hit = False
+            defender_result = await scan_defender(quarantine_file_path, config, file_metadata.size)
+            defender_scanned_file = True
+            default_scan_verdict_cache.put(quarantine_hash, verdict_algorithm, SCANNER_DEFENDER, defender_result)
         
-    if ((not suspect_file_detected) and on_demand_clam_av):
+        # Process the scan result with our helper, Defender cannot handle a file it did not scan,
+        # and a batch scan only showed it a link to the file
+        return process_defender_result(
+            defender_result,
+            quarantine_file_path,
+            defender_handles_suspect_files and defender_scanned_file
+        )
+
+    async def scan_with_clam_av():
+        nonlocal clam_av_result, scan_cache_hit
+        clam_av_result = default_scan_verdict_cache.get(quarantine_hash, verdict_algorithm, SCANNER_CLAM_AV)
+        if clam_av_result is not None:
+            logger.info(f"Using cached ClamAV verdict for {quarantine_file_path}")
+        else:
+            scan_cache_hit = False
+            clam_av_result = await scan_clam_av(quarantine_file_path, config, file_metadata.size)
+            default_scan_verdict_cache.put(quarantine_hash, verdict_algorithm, SCANNER_CLAM_AV, clam_av_result)
+
+        if clam_av_result == scan_result_types.FILE_IS_SUSPECT:
+            logger.warning(f"Threats found in {quarantine_file_path}, handling internally")
+
+    def scan_timed_out(scanner_name):
+        # Treat timeout as scan failure
+        logger.error(f"{scanner_name} scan timed out for {quarantine_file_path}")
+        return ScanTimeoutResult(quarantine_file_path, source_file_path)
+
+    # A suspect Defender verdict, or a failed Defender scan, decides the file without ClamAV
+    def decided_by_defender(scan_result):
+        return scan_result.suspect_detected or not scan_result.scan_completed
+
+    if on_demand_defender and on_demand_clam_av and _concurrent_scan_engines(config):
+        defender_task = asyncio.create_task(scan_with_defender())
+        clam_av_task = asyncio.create_task(scan_with_clam_av())
+        pending = {defender_task, clam_av_task}
         try:
-            clam_av_result = scan_for_malware_using_clam_av(quarantine_file_path, config)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if defender_task in done:
+                    try:
+                        defender_scan = defender_task.result()
+                    except ScanTimeoutError:
+                        return scan_timed_out("Defender")
+                    if decided_by_defender(defender_scan):
+                        break
+                if clam_av_task in done:
+                    try:
+                        clam_av_task.result()
+                    except ScanTimeoutError:
+                        return scan_timed_out("ClamAV")
+                    # A ClamAV failure waits for Defender, which may still find a threat
+                    if clam_av_result == scan_result_types.FILE_IS_SUSPECT:
+                        break
+        finally:
+            # Stop the engine still scanning, its verdict can no longer change the outcome
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    else:
+        if on_demand_defender:
+            try:
+                defender_scan = await scan_with_defender()
+            except ScanTimeoutError:
+                return scan_timed_out("Defender")
 
-            if clam_av_result == scan_result_types.FILE_IS_SUSPECT:
-                suspect_file_detected = True
-                logger.warning(f"Threats found in {quarantine_file_path}, handling internally")
-                
-        except ScanTimeoutError:
-            # Treat timeout as scan failure
-            logger.error(f"ClamAV scan timed out for {quarantine_file_path}")
-            return ScanTimeoutResult(quarantine_file_path, source_file_path)
+        if on_demand_clam_av and not (defender_scan and decided_by_defender(defender_scan)):
+            try:
+                await scan_with_clam_av()
+            except ScanTimeoutError:
+                return scan_timed_out("ClamAV")
 
+    suspect_file_detected = clam_av_result == scan_result_types.FILE_IS_SUSPECT
+    scanner_handling_suspect_file = False
 
+    if defender_scan is not None:
+        # Update our status flags based on the scan result
+        suspect_file_detected = suspect_file_detected or defender_scan.suspect_detected
+        scanner_handling_suspect_file = defender_scan.scanner_handles_suspect
+        
+        # Return early if scan failed (not completed) and no threat detected
+        # This happens when file is not found and we're not letting defender handle it
+        if not defender_scan.scan_completed and not suspect_file_detected:
+            return False
 
     if suspect_file_detected:
-        return handle_suspect_scan_result(
+        result = await run_blocking(
+            handle_suspect_scan_result,
             quarantine_file_path,
             source_file_path,
             hazard_archive_path,
             hazard_encryption_key_file_path,
             delete_source_files,
             scanner_handling_suspect_file,
-            quarantine_hash
+            quarantine_hash,
+            hash_algorithm
         )
+        result.scan_cache_hit = scan_cache_hit
+        return result
 
     # Check if all enabled scanners report clean
     if (
         is_clean_scan(on_demand_defender, defender_result) 
         and is_clean_scan(on_demand_clam_av, clam_av_result)
     ):
-        return handle_clean_file(
+        result = await run_blocking(
+            handle_clean_file,
             quarantine_file_path,
             source_file_path,
             destination_file_path,
-            delete_source_files
+            delete_source_files,
+            quarantine_hash,
+            rename_to_destination=config.rename_clean_files if config else False,
+            source_identity=source_identity,
+            rehash_source=config.rehash_source_before_delete if config else False,
+            hash_algorithm=hash_algorithm
         )
+        result.scan_cache_hit = scan_cache_hit
+        return result
 
     else:
         logger.warning(f"Scan failed on {quarantine_file_path}")
         return False
 
-def call_scan_and_process_file(file_paths, hazard_key_path, hazard_path, delete_source, use_defender, use_clamav, defender_handles_suspect, config=None):
+async def _run_inline(func, *args, **kwargs):
+    """Run a blocking function on the calling thread, for scan_and_process_file."""
+    return func(*args, **kwargs)
+
+
+def _blocking_scanner(scan):
+    """Wrap a blocking scanner in a coroutine function, for scan_and_process_file."""
+    async def scan_inline(path, config, file_size_bytes):
+        return scan(path, config, file_size_bytes)
+    return scan_inline
+
+
+def _run_without_event_loop(coroutine):
+    """
+    Run a coroutine that only awaits blocking calls to completion on the calling thread.
+    
+    Raises:
+        RuntimeError: If the coroutine waits for something only an event loop can provide
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("Coroutine suspended without an event loop")
+
+
+def scan_and_process_file(
+        paths,     
+        hazard_encryption_key_file_path, 
+        hazard_archive_path,
+        delete_source_files, 
+        on_demand_defender, 
+        on_demand_clam_av, 
+        defender_handles_suspect_files,
+        config=None,
+        batch_defender_result=None
+    ):
+    """
+    Scan a file for malware and process it accordingly.
+
+    Args:
+        paths (tuple): Contains all necessary paths for the file being processed.
+            - quarantine_file_path (str): Full path to the file in quarantine
+            - source_file_path (str): Full path to the original source file
+            - destination_file_path (str): Full path where the file should be copied in destination
+            - file_hash (str): Hash of the quarantined file
+            - relative_file_path (str): Path relative to the source directory
+            - file_metadata (FileMetadata): Size and identity of the quarantined file
+            - source_identity (SourceIdentity): Identity of the source file taken before it was copied
+
+        - hazard_archive_path (str): Path to the hazard archive directory
+        - hazard_encryption_key_file_path (str): Full path to the public encryption key file
+        - delete_source_files (bool): Whether to delete source files after processing
+        - on_demand_defender (bool): Whether to use Defender for on-demand scanning
+        - on_demand_clam_av (bool): Whether to use ClamAV for on-demand scanning
+        - defender_handles_suspect_files (bool): Whether to let Defender handle suspect files
+        - batch_defender_result (int): Verdict for the file from a Defender batch scan, if known
+    
+    Scanners are not run on content they have already given a verdict for, with
+    their current engine and definitions versions, when the scan verdict cache is open.
+    When both scanners are enabled and config.concurrent_scan_engines is set, they scan
+    the file at the same time and the first suspect verdict stops the other.
+    
+    Returns:
+        bool: True if the file was processed successfully, False otherwise
+    """
+    concurrent_scan_engines = on_demand_defender and on_demand_clam_av and _concurrent_scan_engines(config)
+    if concurrent_scan_engines:
+        # Scanners run as children of the event loop, so the engine still scanning can be stopped
+        scan_defender = scan_for_malware_using_defender_async
+        scan_clam_av = scan_for_malware_using_clam_av_async
+    else:
+        scan_defender = _blocking_scanner(scan_for_malware_using_defender)
+        scan_clam_av = _blocking_scanner(scan_for_malware_using_clam_av)
+
+    # Post scan processing stays on this thread
+    scan = _scan_and_process_file(
+        paths,
+        hazard_encryption_key_file_path,
+        hazard_archive_path,
+        delete_source_files,
+        on_demand_defender,
+        on_demand_clam_av,
+        defender_handles_suspect_files,
+        config,
+        batch_defender_result,
+        scan_defender,
+        scan_clam_av,
+        _run_inline
+    )
+    if concurrent_scan_engines:
+        return asyncio.run(scan)
+    # Nothing is awaited on another thread or process, so no event loop is needed
+    return _run_without_event_loop(scan)
+
+
+async def scan_and_process_file_async(
+        paths,     
+        hazard_encryption_key_file_path, 
+        hazard_archive_path,
+        delete_source_files, 
+        on_demand_defender, 
+        on_demand_clam_av, 
+        defender_handles_suspect_files,
+        config=None,
+        batch_defender_result=None
+    ):
+    """
+    Scan a file for malware and process it accordingly, without blocking the event loop.
+
+    Scanners run as children of the event loop's process, and post scan processing
+    (moving, encrypting and removing files) runs in the default executor.
+
+    Args:
+        As for scan_and_process_file
+
+    Returns:
+        As for scan_and_process_file
+    """
+    return await _scan_and_process_file(
+        paths,
+        hazard_encryption_key_file_path,
+        hazard_archive_path,
+        delete_source_files,
+        on_demand_defender,
+        on_demand_clam_av,
+        defender_handles_suspect_files,
+        config,
+        batch_defender_result,
+        scan_for_malware_using_defender_async,
+        scan_for_malware_using_clam_av_async,
+        asyncio.to_thread
+    )
+
+def call_scan_and_process_file(file_paths, hazard_key_path, hazard_path, delete_source, use_defender, use_clamav, defender_handles_suspect, config=None, batch_defender_result=None):
     """
     Wrapper function for parallel scanning to avoid using lambdas which can't be pickled
     """
@@ -199,9 +449,72 @@ def call_scan_and_process_file(file_paths, hazard_key_path, hazard_path, delete_
             use_defender, 
             use_clamav, 
             defender_handles_suspect,
-            config
+            config,
+            batch_defender_result
+        )
+
+def process_duplicate_file(file_paths, scan_result, hazard_key_path, hazard_path, delete_source, use_defender, use_clamav, defender_handles_suspect, config=None):
+    """
+    Process a quarantined file using the scan result of an identical file, without scanning it.
+    
+    A suspect result archives or removes this file's quarantine copy and handles its source,
+    as the scanner never saw this copy. A clean result delivers it to its own destination,
+    even if delivering the scanned file failed. If the identical file could not be scanned,
+    this file is not processed and its source is left for the next run.
+    
+    Args:
+        file_paths (tuple): Quarantined file tuple, as for scan_and_process_file
+        scan_result: Result of scanning the identical file
+        Remaining arguments as for call_scan_and_process_file
+    
+    Returns:
+        ProcessingResult or bool: As from scan_and_process_file
+    """
+    (
+        quarantine_file_path,
+        source_file_path,
+        destination_file_path,
+        file_hash,
+        relative_file_path,
+        file_metadata,
+        source_identity
+    ) = file_paths
+
+    logger = get_logger()
+    hash_algorithm = config.hash_algorithm if config else None
+
+    # Only results from post scan processing carry a verdict
+    if not isinstance(scan_result, ProcessingResult):
+        logger.warning(f"Identical file was not scanned, not processing {quarantine_file_path}")
+        return False
+
+    if scan_result.is_suspect:
+        logger.warning(f"Identical file was found suspect, handling {quarantine_file_path} as suspect")
+        return handle_suspect_scan_result(
+            quarantine_file_path,
+            source_file_path,
+            hazard_path,
+            hazard_key_path,
+            delete_source,
+            False,
+            file_hash,
+            hash_algorithm
         )
 
+    logger.info(f"Identical file was clean, delivering {quarantine_file_path} without scanning it")
+    return handle_clean_file(
+        quarantine_file_path,
+        source_file_path,
+        destination_file_path,
+        delete_source,
+        file_hash,
+        rename_to_destination=config.rename_clean_files if config else False,
+        source_identity=source_identity,
+        rehash_source=config.rehash_source_before_delete if config else False,
+        hash_algorithm=hash_algorithm
+    )
+
+
 def log_processing_progress(processed_count, total_files):
     """
     Log file processing progress at regular intervals
@@ -230,13 +543,13 @@ def log_final_status(mode, processed_count, failed_count):
     logger.info(f"{mode} processing completed: {processed_count} files processed, "
                 f"{failed_count} failures, {success_count} successes")
                 
-def process_task_result(task_result, file_data, results, processed_count, failed_count, total_files, logger, daily_processing_tracker=None, per_run_tracker=None, timeout_count=0):
+def process_task_result(task_result, file_data, results, processed_count, failed_count, total_files, logger, daily_processing_tracker=None, per_run_tracker=None, timeout_count=0, result_files=None):
     """
     Process a task result, handle errors, and update counters
     
     Args:
         task_result: Result from task execution or exception if failed
-        file_data: Tuple containing (quarantine_path, source_path, destination_path, file_hash)
+        file_data: Tuple containing (quarantine_path, source_path, destination_path, file_hash, relative_file_path, file_metadata, source_identity)
         results: List to append results to
         processed_count: Counter for processed files
         failed_count: Counter for failed files
@@ -244,6 +557,7 @@ def process_task_result(task_result, file_data, results, processed_count, failed
         logger: Logger instance
         daily_processing_tracker: Optional DailyProcessingTracker to update
         per_run_tracker: Optional PerRunTracker to update
+        result_files: Optional list to append file_data to, alongside its result in results
     
     Returns:
         tuple: Updated (processed_count, failed_count, timeout_count)
@@ -251,8 +565,14 @@ def process_task_result(task_result, file_data, results, processed_count, failed
 
     logger = get_logger()
 
-    # Unpack file_data (now includes 5 elements)
-    file_path, source_path, destination_path, file_hash, relative_file_path = file_data
+    if result_files is not None:
+        result_files.append(file_data)
+
+    # Unpack file_data (now includes 7 elements)
+    file_path, source_path, destination_path, file_hash, relative_file_path, file_metadata, source_identity = file_data
+    
+    # Size recorded when the file was quarantined, the quarantine file may already be gone
+    file_size_mb = file_metadata.size_mb
     
     processed_count += 1
     
@@ -278,7 +598,6 @@ def process_task_result(task_result, file_data, results, processed_count, failed
         # Mark as failed in per-run tracker
         if per_run_tracker is not None:
             try:
-                file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
                 per_run_tracker.complete_file_processing(file_path, file_size_mb)
                 logger.debug(f"Marked timeout file as completed in per-run tracker: {file_path} ({file_size_mb:.2f} MB)")
             except Exception as e:
@@ -305,7 +624,6 @@ def process_task_result(task_result, file_data, results, processed_count, failed
         # Mark as failed in per-run tracker
         if per_run_tracker is not None:
             try:
-                file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
                 per_run_tracker.complete_file_processing(file_path, file_size_mb)
                 logger.debug(f"Marked error file as completed in per-run tracker: {file_path} ({file_size_mb:.2f} MB)")
             except Exception as e:
@@ -331,7 +649,6 @@ def process_task_result(task_result, file_data, results, processed_count, failed
         if per_run_tracker is not None:
             try:
                 # Get file size for per-run tracking
-                file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
                 per_run_tracker.complete_file_processing(file_path, file_size_mb)
                 logger.debug(f"Marked file as completed in per-run tracker: {file_path} ({file_size_mb:.2f} MB)")
             except Exception as e:
@@ -342,7 +659,128 @@ def process_task_result(task_result, file_data, results, processed_count, failed
     
     return processed_count, failed_count, timeout_count
 
-def quarantine_files_for_scanning(source_path, quarantine_path, destination_path, hazard_archive_path, throttle, throttle_free_space_mb, throttle_max_file_count_per_day=0, throttle_max_file_volume_per_day_mb=0, daily_processing_tracker=None, throttle_max_file_count_per_run=0, throttle_max_file_volume_per_run_mb=0, per_run_tracker=None, notifier=None, skip_stability_check=False):
+def process_duplicate_results(scan_result, file_data, content_index, scan_task_args, config, results, processed_count, failed_count, total_files, logger, daily_processing_tracker=None, per_run_tracker=None, timeout_count=0, result_files=None):
+    """
+    Apply the result of a scanned file to the identical files held back from scanning.
+    
+    Each duplicate is processed and recorded in the trackers as a file in its own right.
+    
+    Args:
+        scan_result: Result from scanning file_data, or the exception raised
+        file_data: The scanned file tuple
+        content_index: QuarantineContentIndex holding the duplicates, or None
+        scan_task_args: Arguments of call_scan_and_process_file after the file tuple
+        config: Optional config object
+        Remaining arguments as for process_task_result
+    
+    Returns:
+        tuple: Updated (processed_count, failed_count, timeout_count)
+    """
+    if content_index is None:
+        return processed_count, failed_count, timeout_count
+
+    for duplicate in content_index.set_scan_result(file_data, scan_result):
+        try:
+            result = process_duplicate_file(duplicate, scan_result, *scan_task_args, config)
+        except Exception as e:
+            result = e
+        processed_count, failed_count, timeout_count = process_task_result(
+            result, duplicate, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, result_files
+        )
+
+    return processed_count, failed_count, timeout_count
+
+def iter_source_files(source_path, max_workers=1):
+    """
+    Walk the source directory tree and yield every file found.
+
+    Each file is stat'ed once during the walk and its metadata is passed
+    along with it, so later checks do not stat the file again.
+
+    Args:
+        source_path: Path to source directory
+        max_workers: Maximum number of directories listed at once
+
+    Yields:
+        tuple: (source_root, source_file, file_metadata) for each file in the tree
+    """
+    yield from SourceTreeWalker(source_path, max_workers=max_workers)
+
+def iter_candidate_files(source_path, candidate_files):
+    """
+    Filter externally supplied candidate files (e.g. from the source watcher)
+    down to existing files inside the source directory tree.
+
+    Args:
+        source_path: Path to source directory
+        candidate_files: Iterable of (source_root, source_file) tuples
+
+    Yields:
+        tuple: (source_root, source_file, file_metadata) for each valid candidate
+    """
+    logger = get_logger()
+
+    for source_root, source_file in candidate_files:
+        rel_dir = os.path.relpath(source_root, source_path)
+        if rel_dir == '..' or rel_dir.startswith('..' + os.sep) or os.path.isabs(rel_dir):
+            logger.debug(f"Ignoring candidate outside source directory: {os.path.join(source_root, source_file)}")
+            continue
+        try:
+            st = os.stat(os.path.join(source_root, source_file))
+        except OSError:
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        yield source_root, source_file, FileMetadata.from_stat(st)
+
+def iter_prioritised_source_files(source_path, source_manifest, max_workers=1):
+    """
+    Walk the source directory tree, yielding files deferred by throttling on
+    earlier passes before any other files. Unchanged directories with nothing
+    to process are pruned from the walk (see SourceTreeWalker).
+
+    Args:
+        source_path: Path to source directory
+        source_manifest: SourceManifest holding the deferred files
+        max_workers: Maximum number of directories listed at once
+
+    Yields:
+        tuple: (source_root, source_file, file_metadata) for each file in the tree
+    """
+    deferred_files = [
+        os.path.split(os.path.normpath(os.path.join(source_path, relative_file_path)))
+        for relative_file_path in source_manifest.get_deferred_files()
+    ]
+
+    yielded_paths = set()
+    for source_root, source_file, file_metadata in iter_candidate_files(source_path, deferred_files):
+        yielded_paths.add(os.path.normpath(os.path.join(source_root, source_file)))
+        yield source_root, source_file, file_metadata
+
+    for source_root, source_file, file_metadata in SourceTreeWalker(source_path, source_manifest, max_workers):
+        if yielded_paths and os.path.normpath(os.path.join(source_root, source_file)) in yielded_paths:
+            continue
+        yield source_root, source_file, file_metadata
+
+def prefetch_next_source_file(source_files):
+    """
+    Yield source files, starting to read the start of each next file into the page cache
+    while the file before it is being copied.
+    
+    Args:
+        source_files: Iterable of (source_root, source_file, source_metadata) tuples
+    """
+    previous = None
+    for source_entry in source_files:
+        default_streaming_io.prefetch(os.path.join(source_entry[0], source_entry[1]))
+        if previous is not None:
+            yield previous
+        previous = source_entry
+    if previous is not None:
+        yield previous
+
+
+def quarantine_files_for_scanning(source_path, quarantine_path, destination_path, hazard_archive_path, throttle, throttle_free_space_mb, throttle_max_file_count_per_day=0, throttle_max_file_volume_per_day_mb=0, daily_processing_tracker=None, throttle_max_file_count_per_run=0, throttle_max_file_volume_per_run_mb=0, per_run_tracker=None, notifier=None, skip_stability_check=False, candidate_files=None, open_file_snapshot=None, source_manifest=None, source_walk_max_workers=1, not_ready_recheck_seconds=0, on_file_quarantined=None):
     """
     Find eligible files in source directory, copy them to quarantine, and prepare for scanning.
     
@@ -361,14 +799,25 @@ def quarantine_files_for_scanning(source_path, quarantine_path, destination_path
         per_run_tracker: PerRunTracker instance for tracking per-run limits
         notifier: Notifier instance for sending notifications
         skip_stability_check: Whether to skip file stability check
+        candidate_files: Optional iterable of (source_root, source_file) tuples to consider
+            instead of walking the whole source tree (used by watch mode)
+        open_file_snapshot: Optional OpenFileSnapshot used to check whether files are open
+        source_manifest: Optional open SourceManifest recording files that were not quarantined
+        source_walk_max_workers: Maximum number of source directories listed at once
+        not_ready_recheck_seconds: Time to keep checking files that were not ready again
+            before returning (0 leaves them for the next pass)
+        on_file_quarantined: Optional callable taking each quarantined file tuple as soon as
+            it is quarantined, returning False to stop quarantining more files
         
     Returns:
         tuple: (quarantine_files, disk_error_stopped_processing)
-            - quarantine_files: List of (quarantine_path, source_path, destination_path) tuples
+            - quarantine_files: List of (quarantine_path, source_path, destination_path,
+              file_hash, relative_file_path, file_metadata, source_identity) tuples
             - disk_error_stopped_processing: Whether processing was stopped due to disk issues
     """
     quarantine_files = []
     disk_error_stopped_processing = False
+    scanning_stopped = False
     
     logger = get_logger()
     
@@ -376,108 +825,183 @@ def quarantine_files_for_scanning(source_path, quarantine_path, destination_path
         # Create quarantine directory if it doesn't exist
         os.makedirs(quarantine_path, exist_ok=True)
 
+        if source_manifest is not None:
+            source_manifest.begin_pass()
+
+        if candidate_files is not None:
+            source_files = iter_candidate_files(source_path, candidate_files)
+        elif source_manifest is not None:
+            source_files = iter_prioritised_source_files(source_path, source_manifest, source_walk_max_workers)
+        else:
+            source_files = iter_source_files(source_path, source_walk_max_workers)
+
+        # Directory names are checked once per pass, not once per file
+        name_validator = NameSafetyValidator()
+
+        # With streaming I/O, read ahead into the next file in the walk (not the re-check
+        # queue, which waits until each file is due)
+        if default_streaming_io.enabled:
+            source_files = prefetch_next_source_file(source_files)
+
+        # Files that are not ready are offered again once the walk is done
+        recheck_queue = None
+        if not_ready_recheck_seconds > 0:
+            recheck_queue = RecheckQueue(not_ready_recheck_seconds, open_file_snapshot=open_file_snapshot)
+            source_files = itertools.chain(source_files, recheck_queue)
+
         # Copy files from source to quarantine directory
-        # os.walk traverses the directory tree
-        for source_root, dirs, source_files in os.walk(source_path, topdown=False):
-            for source_file in source_files:
+        for source_root, source_file, source_metadata in source_files:
+            
+            # Calculate the full path (needed for subsequent operations)
+            source_file_path = os.path.join(source_root, source_file)
+
+            # Determine the relative directory structure
+            # Replicate that structure in the quarantine directory
+            rel_dir = os.path.relpath(source_root, source_path)
+            
+            # Create unique relative path using existing variables
+            relative_file_path = os.path.join(rel_dir, source_file)
+            
+            # Skip files rejected on an earlier pass that have not changed since
+            if source_manifest is not None and source_manifest.should_skip(relative_file_path, source_metadata):
+                logger.debug(f"Skipping unchanged file rejected on an earlier pass: {source_file_path}")
+                continue
+            
+            # Check if file is safe to process (names, then stability and open files)
+            if not name_validator.are_file_and_path_names_safe(source_file, source_root):
+                if source_manifest is not None:
+                    source_manifest.record(relative_file_path, source_metadata, DISPOSITION_UNSAFE_NAME)
+                continue  # Skip this file and proceed to the next one
+            
+            stability_time = recheck_queue.stability_window(source_file_path) if recheck_queue is not None else BASE_STABILITY_SECONDS
+            if not is_file_ready(source_file_path, skip_stability_check, open_file_snapshot, source_metadata, stability_time):
+                if recheck_queue is not None and recheck_queue.defer(source_root, source_file, source_metadata) is not None:
+                    # The directory is recorded before the file is checked again
+                    if source_manifest is not None:
+                        source_manifest.mark_directory_active(rel_dir)
+                    continue
+                if source_manifest is not None:
+                    source_manifest.record(relative_file_path, source_metadata, DISPOSITION_NOT_READY)
+                continue
+            quarantine_file_copy_dir = os.path.join(normalize_path(os.path.join(quarantine_path, rel_dir)))
+            # os.makedirs(quarantine_file_copy_dir, exist_ok=True)
+
+            # Full quarantine path
+            quarantine_file_path = os.path.join(normalize_path(os.path.join(quarantine_file_copy_dir, source_file)))
+
+            # Full destination path (but don't create directory yet)
+            destination_file_copy_dir = os.path.join(normalize_path(os.path.join(destination_path, rel_dir)))
+            destination_file_path = os.path.join(normalize_path(os.path.join(destination_file_copy_dir, source_file)))
+
+            # Check disk space if throttling is enabled 
+            if throttle:
+                if not handle_throttle_check(
+                    source_file_path, 
+                    quarantine_path,
+                    destination_path,
+                    hazard_archive_path,
+                    throttle_free_space_mb,
+                    Throttler(),
+                    max_files_per_day=throttle_max_file_count_per_day,
+                    max_volume_per_day=throttle_max_file_volume_per_day_mb,
+                    daily_processing_tracker=daily_processing_tracker,
+                    max_files_per_run=throttle_max_file_count_per_run,
+                    max_volume_per_run=throttle_max_file_volume_per_run_mb,
+                    per_run_tracker=per_run_tracker,
+                    notifier=notifier,
+                    file_metadata=source_metadata
+                ):
+                    if source_manifest is not None:
+                        source_manifest.record(relative_file_path, source_metadata, DISPOSITION_DEFERRED, "Throttled")
+                    disk_error_stopped_processing = True
+                    break
                 
-                # Check if file is safe to process using our consolidated function
-                if not is_file_safe_for_processing(source_file, source_root, skip_stability_check):
-                    continue  # Skip this file and proceed to the next one
+            # Copy the file to the appropriate directory in the quarantine directory
+            file_data = None
+            try:
+                # Taken before the copy, so a source changed while it is copied no longer matches
+                source_identity = get_source_identity(source_file_path)
                 
-                # Calculate the full path (needed for subsequent operations)
-                source_file_path = os.path.join(source_root, source_file)
-
-                # Determine the relative directory structure
-                # Replicate that structure in the quarantine directory
-                rel_dir = os.path.relpath(source_root, source_path)
-                quarantine_file_copy_dir = os.path.join(normalize_path(os.path.join(quarantine_path, rel_dir)))
-                # os.makedirs(quarantine_file_copy_dir, exist_ok=True)
-
-                # Full quarantine path
-                quarantine_file_path = os.path.join(normalize_path(os.path.join(quarantine_file_copy_dir, source_file)))
-
-                # Full destination path (but don't create directory yet)
-                destination_file_copy_dir = os.path.join(normalize_path(os.path.join(destination_path, rel_dir)))
-                destination_file_path = os.path.join(normalize_path(os.path.join(destination_file_copy_dir, source_file)))
-
-                # Check disk space if throttling is enabled 
-                if throttle:
-                    if not handle_throttle_check(
-                        source_file_path, 
-                        quarantine_path,
-                        destination_path,
-                        hazard_archive_path,
-                        throttle_free_space_mb,
-                        Throttler(),
-                        max_files_per_day=throttle_max_file_count_per_day,
-                        max_volume_per_day=throttle_max_file_volume_per_day_mb,
-                        daily_processing_tracker=daily_processing_tracker,
-                        max_files_per_run=throttle_max_file_count_per_run,
-                        max_volume_per_run=throttle_max_file_volume_per_run_mb,
-                        per_run_tracker=per_run_tracker,
-                        notifier=notifier
-                    ):
-                        disk_error_stopped_processing = True
-                        break
-                    
-                # Copy the file to the appropriate directory in the quarantine directory
-                try:
-                    copy_temp_then_rename(source_file_path, quarantine_file_path)
-                    
-                    # Calculate file hash
-                    file_hash = get_file_hash(quarantine_file_path)
-                    logger.debug(f"Calculated hash for file: {quarantine_file_path}, hash: {file_hash}")
-                    
-                    # Create unique relative path using existing variables
-                    relative_file_path = os.path.join(rel_dir, source_file)
-                    
-                    # Track the file as pending now that it's been copied and hashed
-                    file_size_mb = os.path.getsize(quarantine_file_path) / (1024 * 1024)
-                    
-                    if daily_processing_tracker:
-                        daily_processing_tracker.add_pending_file(
-                            file_path=quarantine_file_path,
-                            file_size_mb=file_size_mb,
-                            file_hash=file_hash,
-                            source_path=source_file_path,
-                            relative_file_path=relative_file_path
-                        )
-                        logger.debug(f"Added file to daily pending tracking: {quarantine_file_path} ({file_size_mb:.2f} MB), hash: {file_hash}, key: {relative_file_path}")
-                    
-                    if per_run_tracker:
-                        per_run_tracker.add_pending_file(
-                            file_path=quarantine_file_path,
-                            file_size_mb=file_size_mb
-                        )
-                        logger.debug(f"Added file to per-run pending tracking: {quarantine_file_path} ({file_size_mb:.2f} MB)")
-
-                    logger.info(f"Copied file {source_file_path} to quarantine: {quarantine_file_path}")
-
-                    # Add to processing queue with full paths, file hash, and relative file path
-                    quarantine_files.append((
-                        quarantine_file_path,       # Full path to the quarantined file
-                        source_file_path,           # Full path to the original source file
-                        destination_file_path,      # Full path to the destination file
-                        file_hash,                  # File hash for tracking
-                        relative_file_path          # Relative file path for complete_pending_file()
-                    ))
-                    
-                except Exception as e:
-                    logger.error(f"Failed to copy file from source: {source_file_path} to quarantine: {quarantine_file_path}. Error: {e}")
+                # The hash is calculated from the same read of the source as the copy,
+                # along with the secondary hash when changing hash algorithm
+                file_hashes = {}
+                file_hash = copy_and_hash_temp_then_rename(source_file_path, quarantine_file_path, digests=file_hashes)
+                logger.debug(f"Calculated hash for file: {quarantine_file_path}, hash: {file_hash}")
+                
+                # Stat the quarantined copy once, its metadata travels with the file from here
+                file_metadata = FileMetadata.from_stat(os.stat(quarantine_file_path))
+                
+                # Track the file as pending now that it's been copied and hashed
+                file_size_mb = file_metadata.size_mb
+                
+                if daily_processing_tracker:
+                    daily_processing_tracker.add_pending_file(
+                        file_path=quarantine_file_path,
+                        file_size_mb=file_size_mb,
+                        file_hash=file_hash,
+                        source_path=source_file_path,
+                        relative_file_path=relative_file_path,
+                        hash_algorithm=default_hash_engine.algorithm,
+                        secondary_hashes={
+                            algorithm: digest for algorithm, digest in file_hashes.items()
+                            if algorithm != default_hash_engine.algorithm
+                        }
+                    )
+                    logger.debug(f"Added file to daily pending tracking: {quarantine_file_path} ({file_size_mb:.2f} MB), hash: {file_hash}, key: {relative_file_path}")
+                
+                if per_run_tracker:
+                    per_run_tracker.add_pending_file(
+                        file_path=quarantine_file_path,
+                        file_size_mb=file_size_mb
+                    )
+                    logger.debug(f"Added file to per-run pending tracking: {quarantine_file_path} ({file_size_mb:.2f} MB)")
+
+                logger.info(f"Copied file {source_file_path} to quarantine: {quarantine_file_path}")
+                
+                if source_manifest is not None:
+                    source_manifest.forget(relative_file_path)
+                if recheck_queue is not None:
+                    recheck_queue.forget(source_root, source_file)
+
+                # Add to processing queue with full paths, file hash, and relative file path
+                file_data = (
+                    quarantine_file_path,       # Full path to the quarantined file
+                    source_file_path,           # Full path to the original source file
+                    destination_file_path,      # Full path to the destination file
+                    file_hash,                  # File hash for tracking
+                    relative_file_path,         # Relative file path for complete_pending_file()
+                    file_metadata,              # Size and identity of the quarantined file
+                    source_identity             # Identity of the source when copied, to verify it before deletion
+                )
+                quarantine_files.append(file_data)
+                
+            except Exception as e:
+                logger.error(f"Failed to copy file from source: {source_file_path} to quarantine: {quarantine_file_path}. Error: {e}")
+                if source_manifest is not None:
+                    source_manifest.record(relative_file_path, source_metadata, DISPOSITION_COPY_FAILED, str(e))
             
-            # If disk error stopped processing, break out of the outer loop too
-            if disk_error_stopped_processing:
+            # Hand the file straight to the scanner when streaming
+            if file_data is not None and on_file_quarantined is not None and not on_file_quarantined(file_data):
+                logger.warning("Scanning has stopped, no more files will be quarantined")
+                scanning_stopped = True
                 break
-                
+        
         logger.info(f"Quarantined {len(quarantine_files)} files for scanning")
+        if recheck_queue is not None and recheck_queue.rechecked_count:
+            logger.info(f"Re-checked files that were not ready {recheck_queue.rechecked_count} times, "
+                        f"{len(recheck_queue)} still waiting")
+        
+        if source_manifest is not None:
+            # Records can only be pruned if every file in the tree was seen
+            source_manifest.end_pass(walk_completed=(candidate_files is None and not disk_error_stopped_processing and not scanning_stopped))
+        
         return quarantine_files, disk_error_stopped_processing
         
     except Exception as e:
         logger.error(f"Error during file quarantine process: {e}")
         return [], True
 
-def send_summary_notification(notifier, source_path, destination_path, successful_files, failed_files, suspect_files, disk_error_stopped_processing, notify_summary):
+def send_summary_notification(notifier, source_path, destination_path, successful_files, failed_files, suspect_files, disk_error_stopped_processing, notify_summary, scan_cache_hits=None):
     """
     Send a summary notification about the processing results.
     
@@ -490,6 +1014,7 @@ def send_summary_notification(notifier, source_path, destination_path, successfu
         suspect_files: Number of suspect files found
         disk_error_stopped_processing: Whether processing was stopped due to disk issues
         notify_summary: Whether summary notification was explicitly requested
+        scan_cache_hits: Optional (hits, files) from count_scan_cache_hits, when the scan verdict cache is used
         options
     """
     if not notifier:
@@ -512,6 +1037,8 @@ def send_summary_notification(notifier, source_path, destination_path, successfu
     summary_message += f"Successfully processed: {successful_files}\n"
     summary_message += f"Failed to process: {failed_files}\n"
     summary_message += f"Suspect files: {suspect_files}\n"
+    if scan_cache_hits is not None:
+        summary_message += f"Scan verdict cache: {format_scan_cache_hits(*scan_cache_hits)}\n"
 
     # Add disk error information if applicable
     if disk_error_stopped_processing:
@@ -533,7 +1060,7 @@ def send_summary_notification(notifier, source_path, destination_path, successfu
     logger.info(f"Sent summary notification: {failed_files} failed, {successful_files} successful")
 
 
-def cleanup_after_processing(quarantine_files, results, source_path, delete_source_files, quarantine_path, is_timeout_shutdown=False):
+def cleanup_after_processing(quarantine_files, results, source_path, delete_source_files, quarantine_path, is_timeout_shutdown=False, open_file_snapshot=None):
     """
     Unified cleanup for both normal completion and timeout shutdown scenarios.
     
@@ -543,12 +1070,13 @@ def cleanup_after_processing(quarantine_files, results, source_path, delete_sour
     3. Remove empty source directories
     
     Args:
-        quarantine_files: List of file transfer tuples (quarantine_path, source_path, destination_path, hash, rel_path)
+        quarantine_files: List of file transfer tuples (quarantine_path, source_path, destination_path, hash, rel_path, metadata, source_identity)
         results: List of task results (True/False/result objects for each file)
         source_path: Original source path (root directory)
         delete_source_files: Flag indicating if source cleanup is enabled
         quarantine_path: Path to quarantine directory to clean
         is_timeout_shutdown: Whether this is cleanup after timeout shutdown (affects logging)
+        open_file_snapshot: Optional OpenFileSnapshot used to check whether directories are in use
     """
     logger = get_logger()
     
@@ -559,7 +1087,7 @@ def cleanup_after_processing(quarantine_files, results, source_path, delete_sour
     
     # 1. Remove source files based on processing results
     if delete_source_files:
-        for i, (q_path, s_path, d_path, file_hash, rel_path) in enumerate(quarantine_files):
+        for i, (q_path, s_path, d_path, file_hash, rel_path, file_metadata, source_identity) in enumerate(quarantine_files):
             if i >= len(results):
                 # File was never processed - leave source intact
                 logger.debug(f"File never processed: {s_path}")
@@ -611,10 +1139,15 @@ def cleanup_after_processing(quarantine_files, results, source_path, delete_sour
         # This prevents cleaning up directories that users are actively working with
         stability_seconds = 300  # 5 minutes - configurable in future
         
+        # Open files will have changed while files were being scanned
+        if open_file_snapshot is not None:
+            open_file_snapshot.refresh()
+        
         # Do full cleanup of all empty dirs
         cleanup_results = cleanup_empty_directories(
             [source_path],  # Only clean source, not quarantine
-            stability_seconds
+            stability_seconds,
+            open_file_snapshot
         )
         
         logger.info(f"Source directory cleanup completed: {cleanup_results['directories_removed']} removed, "
@@ -622,30 +1155,71 @@ def cleanup_after_processing(quarantine_files, results, source_path, delete_sour
 
 
 
-def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=None, per_run_tracker=None, config=None):
+def put_results_in_file_order(results, completed_files, scan_tasks, result_files=None):
+    """
+    Sort results recorded as scans complete into the order of the scan tasks.
+    
+    Each duplicate is recorded straight after its scanned file, and stays after it.
+    
+    Args:
+        results: List of task results, in the order they were recorded
+        completed_files: File tuple of each result, as filled by process_task_result
+        scan_tasks: List of parameter tuples for scan tasks, each starting with its file tuple
+        result_files: Optional list filled with the file tuple of each sorted result
+        
+    Returns:
+        list: The results in file order
+    """
+    positions = {task[0][0]: index for index, task in enumerate(scan_tasks)}
+    keys = []
+    position = -1
+    for file_data in completed_files:
+        position = positions.get(file_data[0], position)
+        keys.append(position)
+    
+    order = sorted(range(len(results)), key=keys.__getitem__)
+    if result_files is not None:
+        result_files.extend(completed_files[index] for index in order)
+    return [results[index] for index in order]
+
+
+def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=None, per_run_tracker=None, config=None, content_index=None, defender_verdicts=None, result_files=None):
     """
     Process a list of scan tasks either sequentially or in parallel based on max_scan_threads.
     
     Args:
         scan_tasks: List of parameter tuples for scan tasks
-        max_scan_threads: Number of parallel threads to use (1 for sequential)
+        max_scan_threads: Number of parallel threads to use (1 for sequential), the most
+            used when config.adaptive_scan_concurrency adjusts the scans in flight
         daily_processing_tracker: Optional DailyProcessingTracker to update
         per_run_tracker: Optional PerRunTracker to update
         config: Optional config object
+        content_index: Optional QuarantineContentIndex holding duplicates of the scanned files,
+            each is processed with the result of its scanned file as soon as that is known
+        defender_verdicts: Optional dict of quarantine file path to Defender batch scan verdict,
+            files with a verdict are not scanned by Defender again
+        result_files: Optional list filled with the file tuple of each result, in the same
+            order as the results. Files left unprocessed by a timeout shutdown have no result.
         
     Returns:
         tuple: (results, successful_files, failed_files, timeout_shutdown)
-            - results: List of task results (True/False for each file)
+            - results: List of task results (True/False for each file), in the order of
+              scan_tasks, each scanned file followed by its duplicates
             - successful_files: Count of successfully processed files
             - failed_files: Count of files that failed processing
             - timeout_shutdown: Whether processing was stopped due to timeouts
     """
     results = []
-    total_files = len(scan_tasks)
+    completed_files = []  # File of each result, results are recorded as scans complete
+    total_files = len(scan_tasks) + (content_index.duplicate_count if content_index is not None else 0)
+    # Every task has the same arguments after the file tuple
+    scan_task_args = scan_tasks[0][1:] if scan_tasks else ()
     processed_count = 0
     failed_count = 0
     timeout_count = 0
     timeout_shutdown = False
+    if defender_verdicts is None:
+        defender_verdicts = {}
     
     # Get max timeouts from config (0 means unlimited, so set high number)
     max_timeouts = config.malware_scan_retry_count if config else 3
@@ -657,31 +1231,45 @@ def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=No
     if max_scan_threads > 1:
         # Process files in parallel using a ProcessPoolExecutor
         logger.info(f"Starting parallel processing with {max_scan_threads} workers")
+        controller = create_scan_concurrency_controller(config, max_scan_threads)
         
         with ProcessPoolExecutor(max_workers=max_scan_threads) as executor:
             try:
-                # Submit all tasks and track them with their source file
+                def submit_task(task):
+                    return executor.submit(call_scan_and_process_file, *task, config, defender_verdicts.get(task[0][0]))
+                
                 futures_to_files = {}
-                for task in scan_tasks:
-                    future = executor.submit(call_scan_and_process_file, *task, config)
-                    futures_to_files[future] = task[0]  # Map future to its source file
+                if controller is None:
+                    # Submit all tasks and track them with their source file
+                    for task in scan_tasks:
+                        futures_to_files[submit_task(task)] = task[0]  # Map future to its source file
+                    completed_futures = as_completed(futures_to_files)
+                else:
+                    # Submit tasks as the controller allows, tasks not yet submitted are never started
+                    logger.info(f"Adapting concurrent scans between {controller.min_limit} and {controller.max_limit}")
+                    completed_futures = _complete_within_limit(scan_tasks, submit_task, futures_to_files, controller)
                 
                 # Process results as they complete (not in submission order)
-                for future in as_completed(futures_to_files):
+                for future in completed_futures:
                     file_path = futures_to_files[future]
                     
                     try:
                         # Get the result (or raises exception if the task failed)
                         result = future.result()
                         processed_count, failed_count, timeout_count = process_task_result(
-                            result, file_path, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count
+                            result, file_path, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
                         )
                     except Exception as task_error:
                         # For exceptions from future.result(), pass the exception to the processor
+                        result = task_error
                         processed_count, failed_count, timeout_count = process_task_result(
-                            task_error, file_path, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count
+                            task_error, file_path, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
                         )
                     
+                    processed_count, failed_count, timeout_count = process_duplicate_results(
+                        result, file_path, content_index, scan_task_args, config, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+                    )
+                    
                     # Check if we should shutdown due to too many timeouts
                     if timeout_count >= max_timeouts:
                         logger.error(f"Reached maximum timeout count ({max_timeouts}), shutting down processing")
@@ -709,23 +1297,28 @@ def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=No
                                         # Get result with short timeout to avoid hanging on result retrieval
                                         result = future.result(timeout=5)
                                         processed_count, failed_count, timeout_count = process_task_result(
-                                            result, futures_to_files[future], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count
+                                            result, futures_to_files[future], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+                                        )
+                                        processed_count, failed_count, timeout_count = process_duplicate_results(
+                                            result, futures_to_files[future], content_index, scan_task_args, config, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
                                         )
                                     except concurrent.futures.CancelledError:
                                         # Future was cancelled during shutdown
                                         logger.info(f"Scan was cancelled during shutdown: {futures_to_files[future]}")
                                         failed_count += 1
                                         results.append(None)  # Mark as failed
+                                        completed_files.append(futures_to_files[future])
                                     except concurrent.futures.TimeoutError:
                                         # Result retrieval timed out
                                         logger.warning(f"Scan result retrieval timeout during shutdown: {futures_to_files[future]}")
                                         failed_count += 1
                                         results.append(None)  # Mark as failed
+                                        completed_files.append(futures_to_files[future])
                                     except Exception as task_error:
                                         # Any other exception from the task
                                         logger.error(f"Error processing scan result during shutdown: {task_error}")
                                         processed_count, failed_count, timeout_count = process_task_result(
-                                            task_error, futures_to_files[future], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count
+                                            task_error, futures_to_files[future], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
                                         )
                                 
                                 logger.info(f"Graceful shutdown: {completed_count} running scans completed naturally")
@@ -763,16 +1356,21 @@ def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=No
         for i, task in enumerate(scan_tasks):
             try:
                 # Call the processing function with unpacked parameters
-                result = call_scan_and_process_file(*task, config)
+                result = call_scan_and_process_file(*task, config, defender_verdicts.get(task[0][0]))
                 processed_count, failed_count, timeout_count = process_task_result(
-                    result, task[0], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count
+                    result, task[0], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
                 )
             except Exception as e:
                 # For exceptions from the call itself, pass the exception to the processor
+                result = e
                 processed_count, failed_count, timeout_count = process_task_result(
-                    e, task[0], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count
+                    e, task[0], results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
                 )
             
+            processed_count, failed_count, timeout_count = process_duplicate_results(
+                result, task[0], content_index, scan_task_args, config, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+            )
+            
             # Check if we should shutdown due to too many timeouts
             if timeout_count >= max_timeouts:
                 logger.error(f"Reached maximum timeout count ({max_timeouts}), shutting down processing")
@@ -782,6 +1380,248 @@ def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=No
         # Final status report
         log_final_status("Sequential", processed_count, failed_count)
     
+    results = put_results_in_file_order(results, completed_files, scan_tasks, result_files)
+    successful_files, failed_files = summarise_scan_results(results, daily_processing_tracker)
+    
+    return results, successful_files, failed_files, timeout_shutdown
+
+
+def _complete_within_limit(scan_tasks, submit_task, futures_to_files, controller):
+    """
+    Submit scan tasks while fewer than the controller's limit are running, and yield
+    each future as it completes.
+    
+    Each completed scan's latency, from submission to completion, and whether it timed
+    out are recorded with the controller before it is yielded. A scan that raised or was
+    cancelled is recorded as timed out. Stopping iteration stops further submissions.
+    
+    Args:
+        scan_tasks: List of parameter tuples for scan tasks
+        submit_task (callable): Submits a task, returning its future
+        futures_to_files (dict): Updated with each submitted future and its file tuple
+        controller (ScanConcurrencyController): Controller setting the limit
+        
+    Yields:
+        Future: Each submitted future, as it completes
+    """
+    tasks = iter(scan_tasks)
+    tokens = {}
+    running = set()
+    
+    while True:
+        while len(running) < controller.limit:
+            task = next(tasks, None)
+            if task is None:
+                break
+            future = submit_task(task)
+            futures_to_files[future] = task[0]
+            tokens[future] = controller.start()
+            running.add(future)
+        
+        if not running:
+            return
+        
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            timed_out = (
+                future.cancelled()
+                or future.exception() is not None
+                or isinstance(future.result(), ScanTimeoutResult)
+            )
+            controller.finish(tokens.pop(future), timed_out)
+            yield future
+
+
+def process_scan_tasks_async(scan_tasks, max_scan_threads, daily_processing_tracker=None, per_run_tracker=None, config=None, content_index=None, defender_verdicts=None, result_files=None):
+    """
+    Process a list of scan tasks concurrently on an asyncio event loop.
+    
+    Works as process_scan_tasks, in this process: up to max_scan_threads scans run at
+    once as child processes of the event loop, instead of each in a worker process
+    that blocks waiting on its scanner. Tasks and config are not pickled, and no
+    worker processes import Shuttle.
+    
+    Args:
+        As for process_scan_tasks
+        
+    Returns:
+        tuple: As for process_scan_tasks
+    """
+    return asyncio.run(_process_scan_tasks_async(
+        scan_tasks,
+        max_scan_threads,
+        daily_processing_tracker,
+        per_run_tracker,
+        config,
+        content_index,
+        defender_verdicts,
+        result_files
+    ))
+
+
+async def _process_scan_tasks_async(scan_tasks, max_scan_threads, daily_processing_tracker, per_run_tracker, config, content_index, defender_verdicts, result_files):
+    results = []
+    completed_files = []  # File of each result, results are recorded as scans complete
+    total_files = len(scan_tasks) + (content_index.duplicate_count if content_index is not None else 0)
+    # Every task has the same arguments after the file tuple
+    scan_task_args = scan_tasks[0][1:] if scan_tasks else ()
+    processed_count = 0
+    failed_count = 0
+    timeout_count = 0
+    timeout_shutdown = False
+    if defender_verdicts is None:
+        defender_verdicts = {}
+    
+    # Get max timeouts from config (0 means unlimited, so set high number)
+    max_timeouts = config.malware_scan_retry_count if config else 3
+    if max_timeouts == 0:
+        max_timeouts = float('inf')  # Unlimited retries means no shutdown
+    
+    logger = get_logger()
+    logger.info(f"Starting asyncio processing with up to {max_scan_threads} concurrent scans")
+    controller = create_scan_concurrency_controller(config, max_scan_threads)
+    if controller is not None:
+        logger.info(f"Adapting concurrent scans between {controller.min_limit} and {controller.max_limit}")
+    
+    loop = asyncio.get_running_loop()
+    # Permits in circulation follow the controller's limit, a scan finishing keeps
+    # its permit when the limit has fallen, and extra permits are added when it rises
+    permits = controller.limit if controller is not None else max(1, max_scan_threads)
+    semaphore = asyncio.Semaphore(permits)
+    running = set()
+    
+    async def scan(task):
+        nonlocal permits
+        await semaphore.acquire()
+        running.add(asyncio.current_task())
+        token = controller.start() if controller is not None else None
+        # A scan that raises or is cancelled is recorded as timed out
+        timed_out = True
+        try:
+            result = await scan_and_process_file_async(*task, config, defender_verdicts.get(task[0][0]))
+            timed_out = isinstance(result, ScanTimeoutResult)
+            return result
+        finally:
+            if controller is not None:
+                controller.finish(token, timed_out)
+            if controller is not None and permits > controller.limit:
+                permits -= 1
+            else:
+                semaphore.release()
+            while controller is not None and permits < controller.limit:
+                permits += 1
+                semaphore.release()
+    
+    tasks_to_files = {asyncio.create_task(scan(task)): task[0] for task in scan_tasks}
+    pending = set(tasks_to_files)
+    shutdown_deadline = None
+    
+    while pending:
+        wait_time = None if shutdown_deadline is None else max(shutdown_deadline - loop.time(), 0)
+        done, pending = await asyncio.wait(pending, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+        
+        if not done:
+            # Cancelling a scan kills its scanner, post scan processing already started still finishes
+            logger.warning(f"Graceful shutdown timeout, {len(pending)} scans still running")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            
+            # Record the stopped scans as failed, so the trackers do not leave them pending
+            for task in pending:
+                file_path = tasks_to_files[task]
+                if task.cancelled():
+                    result = ScanTimeoutError(f"Scan stopped at graceful shutdown timeout: {file_path[0]}")
+                else:
+                    try:
+                        result = task.result()
+                    except Exception as task_error:
+                        result = task_error
+                processed_count, failed_count, timeout_count = process_task_result(
+                    result, file_path, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+                )
+                processed_count, failed_count, timeout_count = process_duplicate_results(
+                    result, file_path, content_index, scan_task_args, config, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+                )
+            break
+        
+        for task in done:
+            file_path = tasks_to_files[task]
+            try:
+                result = task.result()
+            except Exception as task_error:
+                result = task_error
+            
+            processed_count, failed_count, timeout_count = process_task_result(
+                result, file_path, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+            )
+            processed_count, failed_count, timeout_count = process_duplicate_results(
+                result, file_path, content_index, scan_task_args, config, results, processed_count, failed_count, total_files, logger, daily_processing_tracker, per_run_tracker, timeout_count, completed_files
+            )
+        
+        # Check if we should shutdown due to too many timeouts
+        if not timeout_shutdown and timeout_count >= max_timeouts:
+            logger.error(f"Reached maximum timeout count ({max_timeouts}), shutting down processing")
+            timeout_shutdown = True
+            
+            # Scans that have not started are cancelled, running scans are bounded by the scan timeout
+            unstarted = [task for task in pending if task not in running]
+            for task in unstarted:
+                task.cancel()
+            await asyncio.gather(*unstarted, return_exceptions=True)
+            pending.difference_update(unstarted)
+            if unstarted:
+                logger.info(f"Cancelled {len(unstarted)} unstarted scan tasks")
+            
+            scan_timeout = config.malware_scan_timeout_seconds if config else 300
+            # Allow extra time for post-scan processing (file moves, encryption, etc.)
+            max_wait_time = scan_timeout * 2
+            if pending:
+                logger.info(f"Waiting for {len(pending)} running scans to complete (max {max_wait_time}s total)...")
+            shutdown_deadline = loop.time() + max_wait_time
+    
+    # Final status report
+    log_final_status("Asyncio", processed_count, failed_count)
+    
+    results = put_results_in_file_order(results, completed_files, scan_tasks, result_files)
+    successful_files, failed_files = summarise_scan_results(results, daily_processing_tracker)
+    
+    return results, successful_files, failed_files, timeout_shutdown
+
+
+def count_scan_cache_hits(results):
+    """
+    Count the files whose scan verdicts all came from the scan verdict cache.
+    
+    Args:
+        results: List of task results
+        
+    Returns:
+        tuple: (hits, files) where files is the number of results
+    """
+    hits = sum(1 for result in results if getattr(result, 'scan_cache_hit', False))
+    return hits, len(results)
+
+
+def format_scan_cache_hits(hits, files):
+    """Format scan verdict cache hits as a hit rate."""
+    rate = 100 * hits / files if files else 0
+    return f"{hits} of {files} files not scanned ({rate:.0f}% hit rate)"
+
+
+def summarise_scan_results(results, daily_processing_tracker=None):
+    """
+    Count successful and failed files for the run.
+    
+    Args:
+        results: List of task results
+        daily_processing_tracker: Optional DailyProcessingTracker holding the outcomes
+        
+    Returns:
+        tuple: (successful_files, failed_files)
+    """
+    logger = get_logger()
+    
     # Get summary from tracker instead of calculating manually
     if daily_processing_tracker:
         summary = daily_processing_tracker.generate_task_summary()
@@ -795,9 +1635,209 @@ def process_scan_tasks(scan_tasks, max_scan_threads, daily_processing_tracker=No
         # Fallback if no tracker provided
         successful_files = sum(1 for result in results if result)
         failed_files = len(results) - successful_files
-        suspect_files = 0
     
-    return results, successful_files, failed_files, timeout_shutdown
+    if default_scan_verdict_cache.enabled:
+        logger.info(f"Scan verdict cache: {format_scan_cache_hits(*count_scan_cache_hits(results))}")
+    
+    return successful_files, failed_files
+
+
+class StreamingScanPipeline:
+    """
+    Scan files as they are quarantined, instead of after the whole batch.
+    
+    Pass submit() as the on_file_quarantined callback of
+    quarantine_files_for_scanning. Each file is handed to the scan executor as
+    soon as it is quarantined and hashed, so copying and scanning overlap.
+    
+    At most max_in_flight files are quarantined but not yet scanned: when the
+    window is full, submit() waits for a scan to finish, which holds back the
+    copy loop. Quarantine space is then bounded by the window rather than the
+    whole batch.
+    
+    Results are handled as in process_scan_tasks, including stopping after
+    too many scan timeouts.
+    
+    With a content index, a file identical to one already submitted is not
+    scanned. It is processed with the other file's result, straight away if
+    that is known, otherwise as soon as the scan finishes.
+    """
+    
+    def __init__(self, scan_task_args, max_scan_threads, max_in_flight=0, daily_processing_tracker=None, per_run_tracker=None, config=None, content_index=None):
+        """
+        Initialize the pipeline and start the scan executor.
+        
+        Args:
+            scan_task_args: Tuple of the scan_and_process_file arguments after the file tuple
+                (hazard_encryption_key_file_path, hazard_archive_path, delete_source_files,
+                on_demand_defender, on_demand_clam_av, defender_handles_suspect_files)
+            max_scan_threads: Number of parallel scans (1 scans each file before the next is copied)
+            max_in_flight: Maximum files quarantined but not yet scanned (0 = twice max_scan_threads)
+            daily_processing_tracker: Optional DailyProcessingTracker to update
+            per_run_tracker: Optional PerRunTracker to update
+            config: Optional config object
+            content_index: Optional QuarantineContentIndex used to scan identical files once
+        """
+        logger = get_logger()
+        
+        self.scan_task_args = scan_task_args
+        self.max_in_flight = max_in_flight if max_in_flight > 0 else 2 * max(1, max_scan_threads)
+        self.daily_processing_tracker = daily_processing_tracker
+        self.per_run_tracker = per_run_tracker
+        self.config = config
+        self.content_index = content_index
+        
+        # Files with a result so far, in the same order as results
+        self.quarantine_files = []
+        self.results = []
+        
+        self.submitted_count = 0
+        self.processed_count = 0
+        self.failed_count = 0
+        self.timeout_count = 0
+        self.timeout_shutdown = False
+        
+        # Get max timeouts from config (0 means unlimited, so set high number)
+        self.max_timeouts = config.malware_scan_retry_count if config else 3
+        if self.max_timeouts == 0:
+            self.max_timeouts = float('inf')
+        
+        self._in_flight = {}  # future -> file tuple
+        self._executor = None
+        if max_scan_threads > 1:
+            self._executor = ProcessPoolExecutor(max_workers=max_scan_threads)
+            logger.info(f"Starting streaming processing with {max_scan_threads} workers, "
+                        f"up to {self.max_in_flight} files in quarantine")
+        else:
+            logger.info("Starting streaming sequential processing")
+    
+    def _record(self, task_result, file_data):
+        """Handle the result of one scan."""
+        logger = get_logger()
+        
+        self.quarantine_files.append(file_data)
+        self.processed_count, self.failed_count, self.timeout_count = process_task_result(
+            task_result, file_data, self.results, self.processed_count, self.failed_count,
+            self.submitted_count, logger, self.daily_processing_tracker, self.per_run_tracker, self.timeout_count
+        )
+        
+        # Check if we should shutdown due to too many timeouts
+        if self.timeout_count >= self.max_timeouts and not self.timeout_shutdown:
+            logger.error(f"Reached maximum timeout count ({self.max_timeouts}), shutting down processing")
+            self.timeout_shutdown = True
+    
+    def _record_scanned(self, task_result, file_data):
+        """Handle the result of one scan, and of the duplicates that were waiting for it."""
+        self._record(task_result, file_data)
+        if self.content_index is not None:
+            for duplicate in self.content_index.set_scan_result(file_data, task_result):
+                self._record_duplicate(task_result, duplicate)
+    
+    def _record_duplicate(self, scan_result, file_data):
+        """Process a duplicate with the result of its identical scanned file."""
+        try:
+            result = process_duplicate_file(file_data, scan_result, *self.scan_task_args, self.config)
+        except Exception as e:
+            result = e
+        self._record(result, file_data)
+    
+    def _collect(self, timeout=None):
+        """Wait up to timeout seconds for at least one scan to finish, and handle every finished scan."""
+        done, _ = wait(self._in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            file_data = self._in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as task_error:
+                result = task_error
+            self._record_scanned(result, file_data)
+    
+    def submit(self, file_data):
+        """
+        Scan a quarantined file, waiting first if the in-flight window is full.
+        
+        Args:
+            file_data: Quarantined file tuple from quarantine_files_for_scanning
+            
+        Returns:
+            bool: False once processing has been stopped by scan timeouts
+        """
+        if self.timeout_shutdown:
+            return False
+        
+        self.submitted_count += 1
+        
+        if self.content_index is not None and not self.content_index.add(file_data):
+            # Identical to a file already submitted, wait for its result if it is still being scanned
+            scan_result = self.content_index.get_scan_result(file_data)
+            if scan_result is not None:
+                self._record_duplicate(scan_result, file_data)
+            return not self.timeout_shutdown
+        
+        if self._executor is None:
+            try:
+                result = call_scan_and_process_file(file_data, *self.scan_task_args, self.config)
+            except Exception as e:
+                result = e
+            self._record_scanned(result, file_data)
+            return not self.timeout_shutdown
+        
+        # Backpressure: hold the copy loop until a scan finishes
+        while len(self._in_flight) >= self.max_in_flight:
+            self._collect()
+            if self.timeout_shutdown:
+                return False
+        
+        future = self._executor.submit(call_scan_and_process_file, file_data, *self.scan_task_args, self.config)
+        self._in_flight[future] = file_data
+        
+        # Handle scans that have already finished without waiting
+        self._collect(timeout=0)
+        return not self.timeout_shutdown
+    
+    def finish(self):
+        """
+        Wait for the remaining scans and shut down the executor.
+        
+        After a timeout shutdown, scans that have not started are cancelled and
+        running scans are given twice the scan timeout to finish.
+        
+        Returns:
+            tuple: (results, successful_files, failed_files, timeout_shutdown) as from process_scan_tasks
+        """
+        logger = get_logger()
+        
+        if self._executor is not None:
+            if self.timeout_shutdown and self._in_flight:
+                cancelled = [future for future in self._in_flight if future.cancel()]
+                for future in cancelled:
+                    del self._in_flight[future]
+                if cancelled:
+                    logger.info(f"Cancelled {len(cancelled)} unstarted scan tasks")
+                
+                scan_timeout = self.config.malware_scan_timeout_seconds if self.config else 300
+                deadline = time.monotonic() + scan_timeout * 2
+                while self._in_flight and time.monotonic() < deadline:
+                    self._collect(timeout=deadline - time.monotonic())
+                if self._in_flight:
+                    logger.warning(f"Graceful shutdown timeout, {len(self._in_flight)} scans still running")
+            else:
+                while self._in_flight:
+                    self._collect()
+            self.close()
+        
+        log_final_status("Streaming", self.processed_count, self.failed_count)
+        if self.content_index is not None and self.content_index.duplicate_count:
+            logger.info(f"{self.content_index.duplicate_count} identical files used the result of an earlier scan")
+        
+        successful_files, failed_files = summarise_scan_results(self.results, self.daily_processing_tracker)
+        return self.results, successful_files, failed_files, self.timeout_shutdown
+    
+    def close(self):
+        """Shut down the executor, abandoning scans that have not started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
 
 
 def scan_and_process_directory(
@@ -824,7 +1864,18 @@ def scan_and_process_directory(
     notifier=None,
     notify_summary=False,
     skip_stability_check=False,
-    config=None
+    config=None,
+    candidate_files=None,
+    open_file_detection='lsof',
+    open_file_snapshot_max_age_seconds=30,
+    source_manifest=None,
+    source_walk_max_workers=1,
+    not_ready_recheck_seconds=0,
+    streaming_scan=False,
+    streaming_scan_window=0,
+    deduplicate_identical_files=False,
+    defender_batch_scan=False,
+    async_scan=False
     
     ):
     """
@@ -856,6 +1907,25 @@ def scan_and_process_directory(
 
         notifier (Notifier): Notifier for sending notifications
         notify_summary (bool): Whether to send notification on completion of every run
+        candidate_files (iterable): Optional (source_root, source_file) tuples to process
+            instead of walking the whole source tree (used by watch mode)
+        open_file_detection (str): Backends used to detect open files ('proc', 'smbstatus',
+            comma separated), or 'lsof' to run lsof for every file
+        open_file_snapshot_max_age_seconds (float): Refresh the open file snapshot when older than this
+        source_manifest (SourceManifest): Optional open manifest of files that were not quarantined
+        source_walk_max_workers (int): Maximum number of source directories listed at once
+        not_ready_recheck_seconds (float): Time to keep checking files that were not ready
+            again before scanning (0 leaves them for the next pass)
+        streaming_scan (bool): Scan each file as soon as it is quarantined, instead of
+            quarantining every file before scanning starts
+        streaming_scan_window (int): Maximum files quarantined but not yet scanned when
+            streaming (0 = twice max_scan_threads)
+        deduplicate_identical_files (bool): Scan files with the same hash and size once in
+            a pass, and apply the result to each of them
+        defender_batch_scan (bool): Scan small files in batches with one Defender invocation
+            each, before scanning the rest on their own (not used when streaming)
+        async_scan (bool): Run scans from an asyncio event loop in this process instead of
+            a pool of worker processes (not used when streaming)
 
     """
     
@@ -886,51 +1956,105 @@ def scan_and_process_directory(
         logger.info(f"Per-run throttling enabled: {throttle_max_file_count_per_run} files, {throttle_max_file_volume_per_run_mb} MB")
     
     try:
-        # Phase 1: Copy files from source to quarantine
-        quarantine_files, disk_error_stopped_processing = quarantine_files_for_scanning(
-            source_path,
-            quarantine_path,
-            destination_path,
-            hazard_archive_path,
-            throttle,
-            throttle_free_space_mb,
-            throttle_max_file_count_per_day,
-            throttle_max_file_volume_per_day_mb,
-            daily_processing_tracker,
-            throttle_max_file_count_per_run,
-            throttle_max_file_volume_per_run_mb,
-            per_run_tracker,
-            notifier,
-            skip_stability_check
+        # Directories are resolved once per pass, picking up symbolic link changes between passes
+        clear_path_cache()
+
+        # Take one snapshot of open files for this pass rather than running lsof per file
+        open_file_snapshot = create_open_file_snapshot(
+            open_file_detection,
+            open_file_snapshot_max_age_seconds
         )
-        
-        results = list()
-        
-        # Create all task parameter sets up front
-        scan_tasks = []
-        for file_path in quarantine_files:
-            scan_tasks.append((file_path, 
-                             hazard_encryption_key_file_path,
-                             hazard_archive_path,
-                             delete_source_files,
-                             on_demand_defender,
-                             on_demand_clam_av,
-                             defender_handles_suspect_files
-                             ))
-        
-        total_files = len(scan_tasks)
-        processed_count = 0
-        failed_count = 0
-        
-        # Process all scan tasks
-        results, successful_files, failed_files, timeout_shutdown = process_scan_tasks(
-            scan_tasks,
-            max_scan_threads,
-            daily_processing_tracker,
-            per_run_tracker,
-            config
+
+        scan_task_args = (
+            hazard_encryption_key_file_path,
+            hazard_archive_path,
+            delete_source_files,
+            on_demand_defender,
+            on_demand_clam_av,
+            defender_handles_suspect_files
         )
 
+        # Identical files in this pass are scanned once
+        content_index = QuarantineContentIndex() if deduplicate_identical_files else None
+
+        # When streaming, copying and scanning overlap: each file is scanned as soon as it is quarantined
+        pipeline = None
+        if streaming_scan:
+            pipeline = StreamingScanPipeline(
+                scan_task_args,
+                max_scan_threads,
+                streaming_scan_window,
+                daily_processing_tracker,
+                per_run_tracker,
+                config,
+                content_index
+            )
+
+        try:
+            # Phase 1: Copy files from source to quarantine
+            quarantine_files, disk_error_stopped_processing = quarantine_files_for_scanning(
+                source_path,
+                quarantine_path,
+                destination_path,
+                hazard_archive_path,
+                throttle,
+                throttle_free_space_mb,
+                throttle_max_file_count_per_day,
+                throttle_max_file_volume_per_day_mb,
+                daily_processing_tracker,
+                throttle_max_file_count_per_run,
+                throttle_max_file_volume_per_run_mb,
+                per_run_tracker,
+                notifier,
+                skip_stability_check,
+                candidate_files=candidate_files,
+                open_file_snapshot=open_file_snapshot,
+                source_manifest=source_manifest,
+                source_walk_max_workers=source_walk_max_workers,
+                not_ready_recheck_seconds=not_ready_recheck_seconds,
+                on_file_quarantined=pipeline.submit if pipeline is not None else None
+            )
+            
+            # Phase 2: Process all scan tasks
+            if pipeline is not None:
+                results, successful_files, failed_files, timeout_shutdown = pipeline.finish()
+                # Only files with a result, in the same order as the results
+                quarantine_files = pipeline.quarantine_files
+            else:
+                scanned_files = quarantine_files
+                if content_index is not None:
+                    scanned_files = [file_data for file_data in quarantine_files if content_index.add(file_data)]
+                    quarantine_files = content_index.grouped_files()
+                    if content_index.duplicate_count:
+                        logger.info(f"Scanning {len(scanned_files)} files, {content_index.duplicate_count} "
+                                    f"identical files will use their results")
+                
+                # Create all task parameter sets up front
+                scan_tasks = [(file_path,) + scan_task_args for file_path in scanned_files]
+                
+                # Small files are scanned together first, to start mdatp fewer times
+                defender_verdicts = None
+                if defender_batch_scan and on_demand_defender:
+                    defender_verdicts = scan_defender_batches(scanned_files, quarantine_path, max_scan_threads, config)
+                
+                result_files = []
+                process_tasks = process_scan_tasks_async if async_scan else process_scan_tasks
+                results, successful_files, failed_files, timeout_shutdown = process_tasks(
+                    scan_tasks,
+                    max_scan_threads,
+                    daily_processing_tracker,
+                    per_run_tracker,
+                    config,
+                    content_index,
+                    defender_verdicts,
+                    result_files
+                )
+                # Only files with a result, in the same order as the results
+                quarantine_files = result_files
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+
         # Handle timeout shutdown with proper cleanup
         if timeout_shutdown:
             logger.error("Processing stopped due to excessive scan timeouts")
@@ -942,7 +2066,8 @@ def scan_and_process_directory(
                 source_path,
                 delete_source_files,
                 quarantine_path,
-                is_timeout_shutdown=True
+                is_timeout_shutdown=True,
+                open_file_snapshot=open_file_snapshot
             )
             
             # Send critical error notification
@@ -965,7 +2090,8 @@ def scan_and_process_directory(
             source_path,
             delete_source_files,
             quarantine_path,
-            is_timeout_shutdown=False
+            is_timeout_shutdown=False,
+            open_file_snapshot=open_file_snapshot
         )
 
         # Check if all files were processed successfully
@@ -981,7 +2107,8 @@ def scan_and_process_directory(
             failed_files,
             suspect_files,
             disk_error_stopped_processing,
-            notify_summary
+            notify_summary,
+            count_scan_cache_hits(results) if default_scan_verdict_cache.enabled else None
         )
 
     except Exception as e:
@@ -1,6 +1,8 @@
 import os
 import shutil
+import signal
 import sys
+import time
 import logging
 from datetime import datetime
 
@@ -10,9 +12,16 @@ from shuttle_common.notifier import Notifier
 
 from shuttle_common.scan_utils import (
     get_mdatp_version,
+    get_mdatp_definitions_version,
+    get_clam_av_versions,
     is_using_simulator
 )
 
+from shuttle_common.open_files import (
+    OPEN_FILE_BACKEND_LSOF,
+    OPEN_FILE_BACKEND_SMBSTATUS
+)
+
 from shuttle_common.logger_injection import (
     configure_logging,
     get_logger
@@ -26,7 +35,23 @@ from .scanning import (
     scan_and_process_directory
 )
 
+from .source_watcher import (
+    SourceWatcher,
+    InotifyUnavailableError
+)
+
 from shuttle.daily_processing_tracker import DailyProcessingTracker
+from shuttle.source_manifest import SourceManifest
+from shuttle_common.hash_cache import default_hash_cache, HASH_CACHE_FILE_NAME
+from shuttle_common.hash_engine import default_hash_engine
+from shuttle_common.streaming_io import default_streaming_io
+from shuttle_common.clamd_client import default_clamd_client
+from shuttle_common.scan_verdict_cache import (
+    default_scan_verdict_cache,
+    SCAN_VERDICT_CACHE_FILE_NAME,
+    SCANNER_DEFENDER,
+    SCANNER_CLAM_AV
+)
 from shuttle.per_run_tracker import PerRunTracker
 
 
@@ -65,8 +90,9 @@ shuttle.shuttle.Shuttle.run
 ┃
 ┣━━ # RESOURCE CHECK
 ┃   ┗━━ shuttle.shuttle.Shuttle._check_resources
+┃       ┣━━ if open_file_detection uses lsof/smbstatus: → check for lsof/smbstatus
 ┃       ┣━━ if not using_simulator: → check for mdatp
-┃       ┣━━ if config.on_demand_clam_av: → check for clamdscan
+┃       ┣━━ if config.on_demand_clam_av and not config.clamd_socket_path: → check for clamdscan
 ┃       ┗━━ if missing_commands: → _shutdown_with_error → exit(1)
 ┃
 ┣━━ # HAZARD PATH CHECK
@@ -89,43 +115,73 @@ shuttle.shuttle.Shuttle.run
 ┃           ┣━━ if not ledger.load(): → _shutdown_with_error → exit(1)
 ┃           ┗━━ if not ledger.is_version_tested(): → _shutdown_with_error → exit(1)
 ┃
+┣━━ # WATCH MODE (config.watch_mode)
+┃   ┗━━ shuttle.shuttle.Shuttle._watch_and_process_files
+┃       ┣━━ shuttle.source_watcher.SourceWatcher.start
+┃       ┗━━ loop until SIGTERM/SIGINT
+┃           ┣━━ if reconciliation due: → _process_files()  (full directory walk)
+┃           ┣━━ if settled files: → _process_files(candidate_files)
+┃           ┗━━ shuttle.source_watcher.SourceWatcher.read_events
+┃
 ┣━━ # MAIN PROCESSING
 ┃   ┗━━ shuttle.shuttle.Shuttle._process_files
 ┃       ┣━━ shuttle.daily_processing_tracker.DailyProcessingTracker.__init__  
+┃       ┣━━ shuttle.source_manifest.SourceManifest.open
+┃       ┣━━ shuttle_common.hash_cache.HashCache.load  (persist_hash_cache)
+┃       ┣━━ shuttle.shuttle.Shuttle._update_scan_verdict_cache  (scan_verdict_cache)
+┃       ┃   ┣━━ shuttle_common.scan_verdict_cache.ScanVerdictCache.open
+┃       ┃   ┗━━ ScanVerdictCache.set_scanner_versions  (mdatp and clamdscan versions)
 ┃       ┣━━ shuttle.per_run_tracker.PerRunTracker.__init__  
 ┃       ┗━━ shuttle.scanning.scan_and_process_directory
+┃           ┣━━ shuttle_common.open_files.create_open_file_snapshot
 ┃           ┣━━ shuttle.scanning.quarantine_files_for_scanning
+┃           ┃   ┣━━ shuttle.scanning.iter_prioritised_source_files  (deferred files first)
+┃           ┃   ┃   ┗━━ shuttle.source_tree_walker.SourceTreeWalker  (skips unchanged directories)
+┃           ┃   ┣━━ shuttle.source_manifest.SourceManifest.should_skip
 ┃           ┃   ┣━━ shuttle.scanning.is_file_safe_for_processing
 ┃           ┃   ┣━━ shuttle_common.file_utils.normalize_path
 ┃           ┃   ┣━━ shuttle.throttle_utils.handle_throttle_check
 ┃           ┃   ┃   ┣━━ shuttle.throttler.Throttler.can_process_file
 ┃           ┃   ┃   ┣━━ shuttle.throttle_utils.check_daily_limits
 ┃           ┃   ┃   ┗━━ shuttle.throttle_utils.check_per_run_limits
-┃           ┃   ┣━━ shuttle_common.files.get_file_hash 
 ┃           ┃   ┣━━ daily_processing_tracker.add_pending_file 
 ┃           ┃   ┣━━ per_run_tracker.add_pending_file 
-┃           ┃   ┗━━ shuttle_common.file_utils.copy_temp_then_rename
+┃           ┃   ┗━━ shuttle_common.file_utils.copy_and_hash_temp_then_rename  (hash from the same read)
 ┃           ┃
-┃           ┣━━ shuttle.scanning.process_scan_tasks
+┃           ┣━━ shuttle.scanning.process_scan_tasks  (or StreamingScanPipeline.submit per quarantined file)
 ┃           ┃   ┃
 ┃           ┃   ┣━━ PARALLEL MODE
 ┃           ┃   ┃   concurrent.futures.ProcessPoolExecutor
+┃           ┃   ┃   (adaptive_scan_concurrency: ScanConcurrencyController sets the scans in flight)
 ┃           ┃   ┃   loop
 ┃           ┃   ┃   ┣━ call_scan_and_process_file ━━━━━┓
-┃           ┃   ┃   ┗━ process_task_result             ┃
-┃           ┃   ┃       ┣━━ daily_processing_tracker.complete_file_processing
-┃           ┃   ┃       ┗━━ per_run_tracker.complete_file_processing
+┃           ┃   ┃   ┣━ process_task_result             ┃
+┃           ┃   ┃   ┃   ┣━━ daily_processing_tracker.complete_file_processing
+┃           ┃   ┃   ┃   ┗━━ per_run_tracker.complete_file_processing
+┃           ┃   ┃   ┗━ process_duplicate_results       ┃  (identical files, not scanned)
+┃           ┃   ┃       ┗━━ process_duplicate_file     ┃
 ┃           ┃   ┃                                      ┃
 ┃           ┃   ┣━━ SINGLE THREAD MODE                 ┃
 ┃           ┃   ┃    loop                              ┃
 ┃           ┃   ┃    ┣━━ call_scan_and_process_file ━━━┫
-┃           ┃   ┃    ┗━━ process_task_result           ┃
-┃           ┃   ┃        ┣━━ daily_processing_tracker.complete_file_processing
-┃           ┃   ┃        ┗━━ per_run_tracker.complete_file_processing
+┃           ┃   ┃    ┣━━ process_task_result           ┃
+┃           ┃   ┃    ┃   ┣━━ daily_processing_tracker.complete_file_processing
+┃           ┃   ┃    ┃   ┗━━ per_run_tracker.complete_file_processing
+┃           ┃   ┃    ┗━━ process_duplicate_results     ┃
+┃           ┃   ┃        ┗━━ process_duplicate_file    ┃
+┃           ┃   ┃                                      ┃
+┃           ┃   ┣━━ ASYNC MODE (async_scan, process_scan_tasks_async)
+┃           ┃   ┃    asyncio event loop, semaphore of max_scan_threads (or the adaptive limit)
+┃           ┃   ┃    ┣━━ scan_and_process_file_async   ┃  (scanners via asyncio.create_subprocess_exec,
+┃           ┃   ┃    ┃                                 ┃   post scan processing via asyncio.to_thread)
+┃           ┃   ┃    ┣━━ process_task_result           ┃
+┃           ┃   ┃    ┗━━ process_duplicate_results     ┃
 ┃           ┃   ┃                                      ┃
 ┃           ┃   ┃                                      ┗━━ scan_and_process_file  
 ┃           ┃   ┃                                          ┣━━ shuttle.scanning.check_file_safety
 ┃           ┃   ┃                                          ┣━━ shuttle.scanning.scan_file
+┃           ┃   ┃                                          ┃   ┣━━ concurrent_scan_engines: both scanners as asyncio tasks,
+┃           ┃   ┃                                          ┃   ┃   the first suspect verdict cancels the other
 ┃           ┃   ┃                                          ┃   ┣━━ shuttle_common.scan_utils.scan_with_defender
 ┃           ┃   ┃                                          ┃   ┃   ┣━━ shuttle_common.scan_utils.calculate_dynamic_timeout
 ┃           ┃   ┃                                          ┃   ┃   ┣━━ shuttle_common.scan_utils.run_malware_scan
@@ -137,10 +193,13 @@ shuttle.shuttle.Shuttle.run
 ┃           ┃   ┃                                          ┃       ┣━━ shuttle_common.scan_utils.run_malware_scan
 ┃           ┃   ┃                                          ┃       ┃   ┣━━ subprocess.run(timeout=dynamic_timeout)
 ┃           ┃   ┃                                          ┃       ┃   ┗━━ log scan metrics (time, size, ms/byte)
+┃           ┃   ┃                                          ┃       ┣━━ shuttle_common.clamd_client.ClamdClient.scan_file  (clamd_socket_path)
+┃           ┃   ┃                                          ┃       ┃   ┗━━ FILDES or INSTREAM on a pooled IDSESSION session
 ┃           ┃   ┃                                          ┃       ┗━━ retry logic with circuit breaker
 ┃           ┃   ┃                                          ┗━━ shuttle.scanning.handle_scan_result
 ┃           ┃   ┃                                              ┣━━ shuttle.post_scan_processing.move_clean_file_to_destination
-┃           ┃   ┃                                              ┃   ┗━━ shuttle_common.file_utils.copy_temp_then_rename
+┃           ┃   ┃                                              ┃   ┣━━ shuttle_common.file_utils.move_temp_then_rename  (same filesystem)
+┃           ┃   ┃                                              ┃   ┗━━ shuttle_common.file_utils.copy_and_hash_temp_then_rename
 ┃           ┃   ┃                                              ┗━━ shuttle.post_scan_processing.handle_suspect_file
 ┃           ┃   ┃                                                  ┣━━ shuttle.post_scan_processing.encrypt_file
 ┃           ┃   ┃                                                  ┗━━ shuttle.post_scan_processing.archive_file
@@ -161,9 +220,16 @@ shuttle.shuttle.Shuttle.run
 ┃
 ┗━━ # FINALLY BLOCK
     ┣━━ daily_processing_tracker.close() 
+    ┣━━ source_manifest.close()
+    ┣━━ default_hash_cache.save()  (persist_hash_cache)
+    ┣━━ default_scan_verdict_cache.close()
+    ┣━━ default_clamd_client.close()  (clamd_socket_path)
     ┗━━ _cleanup_lock_file(config.lock_file)
 """
 
+# Maximum time the watch loop blocks waiting for events, so stop requests are noticed promptly
+WATCH_POLL_SECONDS = 1.0
+
 class Shuttle:
     """Main Shuttle application class that encapsulates the file scanning and transfer functionality."""
     
@@ -174,7 +240,10 @@ class Shuttle:
         self.lock_file_created = False
         self.daily_processing_tracker = None
         self.per_run_tracker = None
+        self.source_manifest = None
+        self.hash_cache_file = None
         self.using_simulator = False
+        self._stop_requested = False
     
     def get_config(self):
         """Get the Shuttle configuration object."""
@@ -259,11 +328,19 @@ class Shuttle:
     def _check_resources(self):
         """Check for required external commands."""
         # Check for required external commands
-        required_commands = ['lsof', 'gpg']
+        required_commands = ['gpg']
+        
+        open_file_backends = [name.strip() for name in self.config.open_file_detection.split(',')]
+        if OPEN_FILE_BACKEND_LSOF in open_file_backends:
+            required_commands.append('lsof')
+        if OPEN_FILE_BACKEND_SMBSTATUS in open_file_backends:
+            required_commands.append('smbstatus')
+        
         if not self.using_simulator:
             required_commands.append('mdatp')
 
-        if self.config.on_demand_clam_av:
+        # clamdscan is not needed when talking to clamd over its socket
+        if self.config.on_demand_clam_av and not self.config.clamd_socket_path:
             required_commands.append('clamdscan')
 
         missing_commands = []
@@ -320,13 +397,47 @@ class Shuttle:
             if not ledger.is_version_tested(defender_version):
                 _shutdown_with_error("This application requires that the current version Microsoft Defender has been tested and this successful testing has been confirmed in the status file.", self)
                 
-    def _process_files(self):
-        """Process the files using scan_and_process_directory function."""
-        # Create the DailyProcessingTracker instance
-        self.daily_processing_tracker = DailyProcessingTracker(
-            data_directory=self.config.daily_processing_tracker_logs_path
+    def _process_files(self, candidate_files=None):
+        """
+        Process the files using scan_and_process_directory function.
+        
+        Args:
+            candidate_files: Optional (source_root, source_file) tuples to process
+                instead of walking the whole source tree (used by watch mode)
+        """
+        # Create the DailyProcessingTracker instance (kept across passes in watch mode)
+        if self.daily_processing_tracker is None:
+            self.daily_processing_tracker = DailyProcessingTracker(
+                data_directory=self.config.daily_processing_tracker_logs_path
+            )
+        
+        # Open the SourceManifest (kept across passes in watch mode)
+        if self.source_manifest is None and self.config.source_manifest:
+            self.source_manifest = SourceManifest(
+                data_directory=self.config.daily_processing_tracker_logs_path,
+                full_walk_interval_seconds=self.config.source_full_walk_interval_seconds
+            )
+            self.source_manifest.open()
+        
+        # Hash with the configured algorithms, forked scan workers inherit them
+        default_hash_engine.set_algorithms(self.config.hash_algorithm, self.config.secondary_hash_algorithm)
+        default_streaming_io.set_enabled(self.config.streaming_io)
+        default_clamd_client.configure(
+            self.config.clamd_socket_path,
+            self.config.clamd_max_sessions,
+            self.config.clamd_scan_command
         )
         
+        # Size the hash cache, and load hashes saved by the last run (kept across passes in watch mode)
+        default_hash_cache.resize(self.config.hash_cache_size)
+        if self.hash_cache_file is None and self.config.persist_hash_cache:
+            self.hash_cache_file = os.path.join(self.config.daily_processing_tracker_logs_path, HASH_CACHE_FILE_NAME)
+            default_hash_cache.load(self.hash_cache_file)
+        
+        # Check the scanner versions on every pass, definitions can be updated while watching
+        if self.config.scan_verdict_cache:
+            self._update_scan_verdict_cache()
+        
         # Create the PerRunTracker instance
         self.per_run_tracker = PerRunTracker()
         
@@ -352,8 +463,121 @@ class Shuttle:
             per_run_tracker=self.per_run_tracker,  # Pass the per-run tracker directly
             notifier=self.notifier,
             notify_summary=self.config.notify_summary,
-            skip_stability_check=self.config.skip_stability_check
+            skip_stability_check=self.config.skip_stability_check,
+            config=self.config,
+            candidate_files=candidate_files,
+            open_file_detection=self.config.open_file_detection,
+            open_file_snapshot_max_age_seconds=self.config.open_file_snapshot_max_age_seconds,
+            source_manifest=self.source_manifest,
+            source_walk_max_workers=self.config.source_walk_max_workers,
+            not_ready_recheck_seconds=self.config.not_ready_recheck_seconds,
+            streaming_scan=self.config.streaming_scan,
+            streaming_scan_window=self.config.streaming_scan_window,
+            deduplicate_identical_files=self.config.deduplicate_identical_files,
+            defender_batch_scan=self.config.defender_batch_scan,
+            async_scan=self.config.async_scan
         )
+
+    def _update_scan_verdict_cache(self):
+        """
+        Open the scan verdict cache, and record the current scanner versions.
+        
+        Verdicts given by other engine or definitions versions are not used.
+        Forked scan workers inherit the versions.
+        """
+        default_scan_verdict_cache.ttl_seconds = self.config.scan_verdict_cache_ttl_hours * 3600
+        if not default_scan_verdict_cache.enabled:
+            default_scan_verdict_cache.open(
+                os.path.join(self.config.daily_processing_tracker_logs_path, SCAN_VERDICT_CACHE_FILE_NAME)
+            )
+        
+        if self.config.on_demand_defender:
+            default_scan_verdict_cache.set_scanner_versions(
+                SCANNER_DEFENDER, get_mdatp_version(), get_mdatp_definitions_version()
+            )
+        if self.config.on_demand_clam_av:
+            if default_clamd_client.enabled:
+                default_scan_verdict_cache.set_scanner_versions(SCANNER_CLAM_AV, *default_clamd_client.get_versions())
+            else:
+                default_scan_verdict_cache.set_scanner_versions(SCANNER_CLAM_AV, *get_clam_av_versions())
+
+    def _request_stop(self, signum, frame):
+        """Signal handler asking the watch loop to stop after the current pass."""
+        self._stop_requested = True
+
+    def _roll_over_daily_tracker(self):
+        """Close the daily processing tracker when the day changes so a new one is started."""
+        if self.daily_processing_tracker is not None and self.daily_processing_tracker.today != datetime.now().date():
+            logger = get_logger()
+            logger.info("Day changed, closing daily processing tracker")
+            self.daily_processing_tracker.close()
+            self.daily_processing_tracker = None
+
+    def _watch_and_process_files(self):
+        """
+        Run continuously, processing files as the source watcher reports them.
+        
+        A file is processed once no further events have been seen for it for
+        watch_settle_seconds. A full directory walk is run at startup, every
+        watch_reconcile_interval_seconds, and whenever the watcher reports that
+        events may have been missed.
+        """
+        logger = get_logger()
+        
+        watcher = SourceWatcher(self.config.source_path)
+        try:
+            watcher.start()
+        except InotifyUnavailableError as e:
+            _shutdown_with_error(f"Watch mode requires inotify: {e}", self)
+        
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        
+        settle_seconds = max(0.0, self.config.watch_settle_seconds)
+        reconcile_interval = self.config.watch_reconcile_interval_seconds
+        last_event_times = {}  # (source_root, source_file) -> time of last event
+        last_reconcile_time = None
+        
+        logger.info(f"Watch mode started (settle: {settle_seconds}s, reconcile interval: {reconcile_interval}s)")
+        
+        try:
+            while not self._stop_requested:
+                self._roll_over_daily_tracker()
+                now = time.monotonic()
+                
+                # Full walk at startup, periodically, and when events may have been missed
+                if (last_reconcile_time is None
+                        or watcher.needs_reconciliation
+                        or (reconcile_interval > 0 and now - last_reconcile_time >= reconcile_interval)):
+                    logger.info("Running reconciliation walk of source directory")
+                    watcher.needs_reconciliation = False
+                    last_reconcile_time = now
+                    self._process_files()
+                    continue
+                
+                # Process files that have had no events for the settle time
+                settled = [candidate for candidate, event_time in last_event_times.items()
+                           if now - event_time >= settle_seconds]
+                if settled:
+                    for candidate in settled:
+                        del last_event_times[candidate]
+                    logger.info(f"Processing {len(settled)} files reported by source watcher")
+                    self._process_files(candidate_files=sorted(settled))
+                    continue
+                
+                # Wait for events, waking in time for the next settled file or reconciliation
+                wait_seconds = WATCH_POLL_SECONDS
+                if reconcile_interval > 0:
+                    wait_seconds = min(wait_seconds, reconcile_interval - (now - last_reconcile_time))
+                if last_event_times:
+                    wait_seconds = min(wait_seconds, settle_seconds - (now - min(last_event_times.values())))
+                
+                for candidate in watcher.read_events(timeout_seconds=max(0.0, wait_seconds)):
+                    last_event_times[candidate] = time.monotonic()
+                    
+            logger.info("Watch mode stopped")
+        finally:
+            watcher.close()
     
     def run(self):
         """Run the Shuttle application."""
@@ -393,7 +617,10 @@ class Shuttle:
             self._check_scan_config()
             
             # Process files
-            self._process_files()
+            if self.config.watch_mode:
+                self._watch_and_process_files()
+            else:
+                self._process_files()
             
             return 0
             
@@ -414,6 +641,17 @@ class Shuttle:
                 except:
                     pass
                 self.daily_processing_tracker.close()
+            
+            # Close the source manifest if it exists
+            if self.source_manifest is not None:
+                self.source_manifest.close()
+            
+            # Save remembered file hashes for the next run
+            if self.hash_cache_file is not None:
+                default_hash_cache.save(self.hash_cache_file)
+            
+            default_scan_verdict_cache.close()
+            default_clamd_client.close()
                 
             # Existing cleanup code
             if hasattr(self.config, 'lock_file') and os.path.exists(self.config.lock_file):
@@ -16,6 +16,8 @@ from typing import Optional
 # Import common configuration using relative imports
 from shuttle_common.config import CommonConfig, add_common_arguments, parse_common_config, get_setting_from_arg_or_file, find_config_file
 from shuttle_common.logger_injection import get_logger
+from shuttle_common.hash_engine import HASH_ALGORITHMS
+from shuttle_common.clamd_client import CLAMD_SCAN_COMMANDS
 
 
 @dataclass
@@ -35,10 +37,26 @@ class ShuttleConfig(CommonConfig):
     # Processing settings
     delete_source_files: bool = None
     max_scan_threads: int = 1
+    adaptive_scan_concurrency: bool = False  # Adjust concurrent scans between min_scan_threads and max_scan_threads from scan latency and timeouts
+    min_scan_threads: int = 1  # Fewest concurrent scans when adapting
+    async_scan: bool = False  # Run scans from an asyncio event loop instead of a pool of worker processes
+    streaming_scan: bool = False  # Scan each file as soon as it is quarantined
+    streaming_scan_window: int = 0  # Maximum files quarantined but not yet scanned when streaming (0 = 2 x max_scan_threads)
+    rename_clean_files: bool = False  # Rename clean files from quarantine to destination when on the same filesystem
+    rehash_source_before_delete: bool = False  # Re-read source files to verify them before deletion, instead of checking they are unchanged
+    deduplicate_identical_files: bool = False  # Scan files with the same hash once per run and apply the result to each
+    streaming_io: bool = False  # Drop copied and hashed files from the page cache, and prefetch the next file
     
     # Scanning settings
     on_demand_defender: bool = None
     on_demand_clam_av: bool = None
+    concurrent_scan_engines: bool = False  # Scan each file with Defender and ClamAV at the same time, stopping the other on a threat
+    defender_batch_scan: bool = False  # Scan small files in batches with one Defender invocation each
+    defender_batch_scan_max_files: int = 50  # Maximum files in a Defender batch
+    defender_batch_scan_max_mb: float = 16  # Maximum total MB of the files in a Defender batch, larger files are scanned alone
+    clamd_socket_path: Optional[str] = None  # Scan with clamd over this Unix socket instead of running clamdscan
+    clamd_max_sessions: int = 4  # Maximum clamd sessions kept open by each scan worker process
+    clamd_scan_command: str = 'FILDES'  # 'FILDES' to pass clamd each file's descriptor, 'INSTREAM' to send its contents
     
     # Throttle settings
     throttle: bool = None
@@ -51,6 +69,31 @@ class ShuttleConfig(CommonConfig):
     throttle_max_file_count_per_run: int = 1000  # Maximum files to process per run (default: 1000)
     throttle_max_file_volume_per_run_mb: int = 1024  # Maximum MB to process per run (default: 1GB)
     
+    # Source manifest settings
+    source_manifest: bool = False  # Remember rejected and deferred source files across runs
+    source_full_walk_interval_seconds: int = 86400  # Maximum time between walks listing every directory (0 = every run)
+    source_walk_max_workers: int = 1  # Maximum number of source directories listed at once
+    
+    # Hash cache settings
+    hash_cache_size: int = 100000  # Maximum file hashes remembered by file identity (0 = disabled)
+    persist_hash_cache: bool = False  # Keep remembered file hashes between runs
+    hash_algorithm: str = 'sha256'  # Hash algorithm for integrity checks
+    secondary_hash_algorithm: Optional[str] = None  # Also record this hash for each file, while changing algorithm
+    
+    # Scan verdict cache settings
+    scan_verdict_cache: bool = False  # Reuse scan verdicts for content scanned before with the same scanner versions
+    scan_verdict_cache_ttl_hours: float = 24  # Maximum age of a reused scan verdict
+    
+    # Open file detection settings
+    open_file_detection: str = 'lsof'  # Comma separated backends ('proc', 'smbstatus') or 'lsof' for per-file lsof
+    open_file_snapshot_max_age_seconds: float = 30  # Refresh the open file snapshot when older than this
+    not_ready_recheck_seconds: float = 0  # Time to keep re-checking unstable or open files in the same run (0 = next run)
+    
+    # Watch mode settings
+    watch_mode: bool = False  # Run continuously, picking up files from inotify events
+    watch_reconcile_interval_seconds: int = 600  # Full directory walk interval in watch mode (catches missed events)
+    watch_settle_seconds: float = 5.0  # Quiet time after the last event on a file before it is processed
+    
     # Testing settings
     skip_stability_check: bool = False  # Skip file stability check (for testing)
     
@@ -91,6 +134,66 @@ def parse_shuttle_config() -> ShuttleConfig:
                         help='Delete the source files after copying them to the destination',
                         default=None)
     parser.add_argument('--max-scan-threads', type=int, help='Maximum number of parallel scans')
+    parser.add_argument('--adaptive-scan-concurrency',
+                        action='store_true',
+                        help='Adjust the number of parallel scans between min and max scan threads from scan latency, throughput and timeouts',
+                        default=None)
+    parser.add_argument('--min-scan-threads', type=int, help='Fewest parallel scans when adapting scan concurrency')
+    parser.add_argument('--async-scan',
+                        action='store_true',
+                        help='Run up to max scan threads scans at once from one process, instead of a pool of worker processes',
+                        default=None)
+    parser.add_argument('--streaming-scan',
+                        action='store_true',
+                        help='Scan each file as soon as it is quarantined instead of after all files are quarantined',
+                        default=None)
+    parser.add_argument('--streaming-scan-window',
+                        type=int,
+                        help='Maximum files quarantined but not yet scanned when streaming (default: twice max scan threads)',
+                        default=None)
+    parser.add_argument('--rename-clean-files',
+                        action='store_true',
+                        help='Rename clean files from quarantine to destination instead of copying them, when on the same filesystem',
+                        default=None)
+    parser.add_argument('--rehash-source-before-delete',
+                        action='store_true',
+                        help='Hash each source file again before deleting it, instead of checking it is unchanged since it was copied',
+                        default=None)
+    parser.add_argument('--streaming-io',
+                        action='store_true',
+                        help='Drop files from the page cache once copied or hashed, and read ahead into the next file',
+                        default=None)
+    parser.add_argument('--deduplicate-identical-files',
+                        action='store_true',
+                        help='Scan files with the same hash once per run and apply the result to each',
+                        default=None)
+    parser.add_argument('--concurrent-scan-engines',
+                        action='store_true',
+                        help='Scan each file with Defender and ClamAV at the same time, stopping the other when one finds a threat',
+                        default=None)
+    parser.add_argument('--defender-batch-scan',
+                        action='store_true',
+                        help='Scan small files in batches with one Defender invocation per batch',
+                        default=None)
+    parser.add_argument('--defender-batch-scan-max-files',
+                        type=int,
+                        help='Maximum files in a Defender batch (default: 50)',
+                        default=None)
+    parser.add_argument('--defender-batch-scan-max-mb',
+                        type=float,
+                        help='Maximum total MB of the files in a Defender batch (default: 16)',
+                        default=None)
+    parser.add_argument('--clamd-socket-path',
+                        help='Scan with clamd over this Unix socket, keeping sessions open, instead of running clamdscan for each file',
+                        default=None)
+    parser.add_argument('--clamd-max-sessions',
+                        type=int,
+                        help='Maximum clamd sessions kept open by each scan worker (default: 4)',
+                        default=None)
+    parser.add_argument('--clamd-scan-command',
+                        choices=CLAMD_SCAN_COMMANDS,
+                        help='Pass clamd the file descriptor (FILDES) or send the file contents (INSTREAM) (default: FILDES)',
+                        default=None)
     parser.add_argument('--lock-file', help='Optional: Path to lock file to prevent multiple instances')
     parser.add_argument('--hazard-archive-path', help='Path to the hazard archive directory')
     parser.add_argument('--hazard-encryption-key-path', help='Path to the GPG public key file for encrypting hazard files')
@@ -117,6 +220,75 @@ def parse_shuttle_config() -> ShuttleConfig:
                         help='Path to store daily processing tracker logs (defaults to log_path if not specified)',
                         default=None)
                         
+    # Source manifest parameters
+    parser.add_argument('--source-manifest',
+                        action='store_true',
+                        help='Keep a manifest of rejected and deferred source files between runs',
+                        default=None)
+    parser.add_argument('--source-walk-max-workers',
+                        help='Maximum number of source directories listed at once, 1 walks serially (default: 1)',
+                        type=int,
+                        default=None)
+    parser.add_argument('--source-full-walk-interval-seconds',
+                        help='Maximum time between walks that list every source directory, 0 lists every directory on every run (default: 86400)',
+                        type=int,
+                        default=None)
+    
+    # Hash cache parameters
+    parser.add_argument('--hash-cache-size',
+                        help='Maximum file hashes remembered by device, inode, size and modification time, 0 disables (default: 100000)',
+                        type=int,
+                        default=None)
+    parser.add_argument('--persist-hash-cache',
+                        action='store_true',
+                        help='Keep remembered file hashes between runs',
+                        default=None)
+    parser.add_argument('--hash-algorithm',
+                        choices=HASH_ALGORITHMS,
+                        help='Hash algorithm for integrity checks (default: sha256)',
+                        default=None)
+    parser.add_argument('--secondary-hash-algorithm',
+                        choices=HASH_ALGORITHMS,
+                        help='Also record this hash for each file in the daily processing tracker, while changing hash algorithm',
+                        default=None)
+    
+    # Scan verdict cache parameters
+    parser.add_argument('--scan-verdict-cache',
+                        action='store_true',
+                        help='Do not scan content that was scanned before with the same scanner engine and definitions versions',
+                        default=None)
+    parser.add_argument('--scan-verdict-cache-ttl-hours',
+                        help='Maximum age of a reused scan verdict in hours (default: 24)',
+                        type=float,
+                        default=None)
+    
+    # Open file detection parameters
+    parser.add_argument('--open-file-detection',
+                        help="Open file detection backends: 'proc', 'smbstatus' (comma separated), or 'lsof' (default: lsof)",
+                        default=None)
+    parser.add_argument('--open-file-snapshot-max-age-seconds',
+                        help='Refresh the open file snapshot when it is older than this (default: 30)',
+                        type=float,
+                        default=None)
+    parser.add_argument('--not-ready-recheck-seconds',
+                        help='Time to keep re-checking files that are still being written or are open before scanning, 0 leaves them for the next run (default: 0)',
+                        type=float,
+                        default=None)
+    
+    # Watch mode parameters
+    parser.add_argument('--watch-mode',
+                        action='store_true',
+                        help='Run continuously, processing files as they arrive (uses inotify)',
+                        default=None)
+    parser.add_argument('--watch-reconcile-interval-seconds',
+                        help='Interval between full source directory walks in watch mode (default: 600)',
+                        type=int,
+                        default=None)
+    parser.add_argument('--watch-settle-seconds',
+                        help='Quiet time after the last event on a file before it is processed in watch mode (default: 5)',
+                        type=float,
+                        default=None)
+                        
     # Testing parameters
     parser.add_argument('--skip-stability-check',
                         action='store_true',
@@ -165,10 +337,26 @@ def parse_shuttle_config() -> ShuttleConfig:
     # Get processing settings
     config.delete_source_files = get_setting_from_arg_or_file(args, 'delete_source_files_after_copying', 'settings', 'delete_source_files_after_copying', False, bool, settings_file_config)
     config.max_scan_threads = get_setting_from_arg_or_file(args, 'max_scan_threads', 'settings', 'max_scan_threads', 1, int, settings_file_config)
+    config.adaptive_scan_concurrency = get_setting_from_arg_or_file(args, 'adaptive_scan_concurrency', 'settings', 'adaptive_scan_concurrency', False, bool, settings_file_config)
+    config.min_scan_threads = get_setting_from_arg_or_file(args, 'min_scan_threads', 'settings', 'min_scan_threads', 1, int, settings_file_config)
+    config.async_scan = get_setting_from_arg_or_file(args, 'async_scan', 'settings', 'async_scan', False, bool, settings_file_config)
+    config.streaming_scan = get_setting_from_arg_or_file(args, 'streaming_scan', 'settings', 'streaming_scan', False, bool, settings_file_config)
+    config.streaming_scan_window = get_setting_from_arg_or_file(args, 'streaming_scan_window', 'settings', 'streaming_scan_window', 0, int, settings_file_config)
+    config.rename_clean_files = get_setting_from_arg_or_file(args, 'rename_clean_files', 'settings', 'rename_clean_files', False, bool, settings_file_config)
+    config.rehash_source_before_delete = get_setting_from_arg_or_file(args, 'rehash_source_before_delete', 'settings', 'rehash_source_before_delete', False, bool, settings_file_config)
+    config.streaming_io = get_setting_from_arg_or_file(args, 'streaming_io', 'settings', 'streaming_io', False, bool, settings_file_config)
+    config.deduplicate_identical_files = get_setting_from_arg_or_file(args, 'deduplicate_identical_files', 'settings', 'deduplicate_identical_files', False, bool, settings_file_config)
     
     # Get scanning settings
     config.on_demand_defender = get_setting_from_arg_or_file(args, 'on_demand_defender', 'settings', 'on_demand_defender', False, bool, settings_file_config)
     config.on_demand_clam_av = get_setting_from_arg_or_file(args, 'on_demand_clam_av', 'settings', 'on_demand_clam_av', False, bool, settings_file_config)
+    config.concurrent_scan_engines = get_setting_from_arg_or_file(args, 'concurrent_scan_engines', 'settings', 'concurrent_scan_engines', False, bool, settings_file_config)
+    config.defender_batch_scan = get_setting_from_arg_or_file(args, 'defender_batch_scan', 'settings', 'defender_batch_scan', False, bool, settings_file_config)
+    config.defender_batch_scan_max_files = get_setting_from_arg_or_file(args, 'defender_batch_scan_max_files', 'settings', 'defender_batch_scan_max_files', 50, int, settings_file_config)
+    config.defender_batch_scan_max_mb = get_setting_from_arg_or_file(args, 'defender_batch_scan_max_mb', 'settings', 'defender_batch_scan_max_mb', 16.0, float, settings_file_config)
+    config.clamd_socket_path = get_setting_from_arg_or_file(args, 'clamd_socket_path', 'settings', 'clamd_socket_path', None, None, settings_file_config)
+    config.clamd_max_sessions = get_setting_from_arg_or_file(args, 'clamd_max_sessions', 'settings', 'clamd_max_sessions', 4, int, settings_file_config)
+    config.clamd_scan_command = get_setting_from_arg_or_file(args, 'clamd_scan_command', 'settings', 'clamd_scan_command', 'FILDES', None, settings_file_config)
         
     # Parse throttle settings
     config.throttle = get_setting_from_arg_or_file(args, 'throttle', 'settings', 'throttle', False, bool, settings_file_config)
@@ -181,6 +369,29 @@ def parse_shuttle_config() -> ShuttleConfig:
     config.throttle_max_file_count_per_run = get_setting_from_arg_or_file(args, 'throttle_max_file_count_per_run', 'settings', 'throttle_max_file_count_per_run', 1000, int, settings_file_config)
     config.throttle_max_file_volume_per_run_mb = get_setting_from_arg_or_file(args, 'throttle_max_file_volume_per_run_mb', 'settings', 'throttle_max_file_volume_per_run_mb', 1024, int, settings_file_config)
     
+    # Parse source manifest settings
+    config.source_manifest = get_setting_from_arg_or_file(args, 'source_manifest', 'settings', 'source_manifest', False, bool, settings_file_config)
+    config.source_walk_max_workers = get_setting_from_arg_or_file(args, 'source_walk_max_workers', 'settings', 'source_walk_max_workers', 1, int, settings_file_config)
+    config.hash_cache_size = get_setting_from_arg_or_file(args, 'hash_cache_size', 'settings', 'hash_cache_size', 100000, int, settings_file_config)
+    config.persist_hash_cache = get_setting_from_arg_or_file(args, 'persist_hash_cache', 'settings', 'persist_hash_cache', False, bool, settings_file_config)
+    config.hash_algorithm = get_setting_from_arg_or_file(args, 'hash_algorithm', 'settings', 'hash_algorithm', 'sha256', None, settings_file_config)
+    config.secondary_hash_algorithm = get_setting_from_arg_or_file(args, 'secondary_hash_algorithm', 'settings', 'secondary_hash_algorithm', None, None, settings_file_config)
+    config.source_full_walk_interval_seconds = get_setting_from_arg_or_file(args, 'source_full_walk_interval_seconds', 'settings', 'source_full_walk_interval_seconds', 86400, int, settings_file_config)
+    
+    # Parse scan verdict cache settings
+    config.scan_verdict_cache = get_setting_from_arg_or_file(args, 'scan_verdict_cache', 'settings', 'scan_verdict_cache', False, bool, settings_file_config)
+    config.scan_verdict_cache_ttl_hours = get_setting_from_arg_or_file(args, 'scan_verdict_cache_ttl_hours', 'settings', 'scan_verdict_cache_ttl_hours', 24.0, float, settings_file_config)
+    
+    # Parse open file detection settings
+    config.open_file_detection = get_setting_from_arg_or_file(args, 'open_file_detection', 'settings', 'open_file_detection', 'lsof', None, settings_file_config)
+    config.open_file_snapshot_max_age_seconds = get_setting_from_arg_or_file(args, 'open_file_snapshot_max_age_seconds', 'settings', 'open_file_snapshot_max_age_seconds', 30.0, float, settings_file_config)
+    config.not_ready_recheck_seconds = get_setting_from_arg_or_file(args, 'not_ready_recheck_seconds', 'settings', 'not_ready_recheck_seconds', 0.0, float, settings_file_config)
+    
+    # Parse watch mode settings
+    config.watch_mode = get_setting_from_arg_or_file(args, 'watch_mode', 'settings', 'watch_mode', False, bool, settings_file_config)
+    config.watch_reconcile_interval_seconds = get_setting_from_arg_or_file(args, 'watch_reconcile_interval_seconds', 'settings', 'watch_reconcile_interval_seconds', 600, int, settings_file_config)
+    config.watch_settle_seconds = get_setting_from_arg_or_file(args, 'watch_settle_seconds', 'settings', 'watch_settle_seconds', 5.0, float, settings_file_config)
+    
     # Parse testing settings
     config.skip_stability_check = get_setting_from_arg_or_file(args, 'skip_stability_check', 'settings', 'skip_stability_check', False, bool, settings_file_config)
     
@@ -205,4 +416,12 @@ def parse_shuttle_config() -> ShuttleConfig:
         raise ValueError("Quarantine path is required")
     if not config.daily_processing_tracker_logs_path:
         raise ValueError("Output path for daily processing tracker is required")
+    
+    # Settings from the file are not checked by argparse choices
+    if config.clamd_scan_command not in CLAMD_SCAN_COMMANDS:
+        raise ValueError(f"clamd_scan_command must be one of {', '.join(CLAMD_SCAN_COMMANDS)}, not {config.clamd_scan_command!r}")
+    if config.hash_algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"hash_algorithm must be one of {', '.join(HASH_ALGORITHMS)}, not {config.hash_algorithm!r}")
+    if config.secondary_hash_algorithm is not None and config.secondary_hash_algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"secondary_hash_algorithm must be one of {', '.join(HASH_ALGORITHMS)}, not {config.secondary_hash_algorithm!r}")
     return config
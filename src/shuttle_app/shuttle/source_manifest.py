@@ -0,0 +1,375 @@
+"""
+Source Manifest for Shuttle file transfer utility.
+
+Keeps a persistent SQLite index of source files that were not quarantined on
+an earlier pass, and why, so that later passes can:
+
+- skip files rejected for unsafe names until they are renamed or changed
+- process files deferred by throttling limits before newly arrived files
+- forget files that have vanished from the source directory
+
+It also records the mtime and contents of each source directory, so that
+directories that have not changed and held nothing to process are not listed
+again (see SourceTreeWalker).
+"""
+
+import os
+import time
+import sqlite3
+from datetime import datetime
+from shuttle_common.logger_injection import get_logger
+
+
+MANIFEST_FILE_NAME = 'source_manifest.sqlite3'
+
+# The manifest only holds what a full walk would rediscover, so it is
+# rebuilt rather than migrated when the schema changes
+SCHEMA_VERSION = 2
+
+# Directories modified more recently than this may still change within the
+# same mtime tick (network and FAT filesystems have coarse timestamps)
+DIRECTORY_MTIME_SAFETY_SECONDS = 5
+
+# Dispositions recorded for source files
+DISPOSITION_UNSAFE_NAME = 'unsafe_name'  # Skipped while unchanged
+DISPOSITION_NOT_READY = 'not_ready'      # Unstable or open, checked again next pass
+DISPOSITION_DEFERRED = 'deferred'        # Held back by throttling, processed first next pass
+DISPOSITION_COPY_FAILED = 'copy_failed'  # Could not be copied to quarantine, retried next pass
+
+# Dispositions that cannot change unless the file changes
+SKIPPED_DISPOSITIONS = (DISPOSITION_UNSAFE_NAME,)
+
+
+class SourceManifest:
+    """
+    Persistent index of source files that were not quarantined, with their last disposition.
+
+    Records are kept per relative file path. A record only applies while the
+    file's identity (st_dev, st_ino, size, mtime_ns) is unchanged, so a file
+    that is replaced, rewritten or touched is examined again from scratch.
+
+    Every pass is numbered. Records are marked with the pass that last saw the
+    file, and after a complete walk of the source tree records that were not
+    seen are pruned.
+
+    Directory records hold each directory's mtime and whether it can be pruned:
+    it had no files that were quarantined, deferred or not ready. A pruned
+    directory is not listed, but its known subdirectories are still checked.
+    """
+
+    def __init__(self, data_directory, full_walk_interval_seconds=86400):
+        """
+        Initialize the source manifest.
+
+        Args:
+            data_directory: Directory path for the manifest database
+            full_walk_interval_seconds: Maximum time between walks that list every
+                directory (0 disables directory pruning)
+        """
+        self.data_directory = data_directory
+        self.database_file = os.path.join(data_directory, MANIFEST_FILE_NAME)
+        self.full_walk_interval_seconds = full_walk_interval_seconds
+        self._connection = None
+        self.current_pass = 0
+        self.full_walk = True
+        self._active_directories = set()
+
+    def open(self):
+        """Open (creating if needed) the manifest database."""
+        logger = get_logger()
+
+        os.makedirs(self.data_directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.database_file)
+
+        schema_version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version != SCHEMA_VERSION:
+            if schema_version != 0:
+                logger.info(f"Rebuilding source manifest for schema version {SCHEMA_VERSION}")
+            for table in ('source_files', 'source_directories', 'manifest_state'):
+                self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS source_files (
+                relative_file_path TEXT PRIMARY KEY,
+                relative_dir_path TEXT NOT NULL,
+                dev INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                disposition TEXT NOT NULL,
+                reason TEXT,
+                first_recorded TEXT NOT NULL,
+                last_recorded TEXT NOT NULL,
+                last_seen_pass INTEGER NOT NULL
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS source_files_disposition ON source_files (disposition, first_recorded)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS source_files_directory ON source_files (relative_dir_path)"
+        )
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS source_directories (
+                relative_dir_path TEXT PRIMARY KEY,
+                parent_dir_path TEXT,
+                mtime_ns INTEGER NOT NULL,
+                file_count INTEGER NOT NULL,
+                subdirectory_count INTEGER NOT NULL,
+                prunable INTEGER NOT NULL,
+                last_seen_pass INTEGER NOT NULL
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS source_directories_parent ON source_directories (parent_dir_path)"
+        )
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS manifest_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        self._connection.commit()
+
+        row = self._connection.execute("SELECT COUNT(*) FROM source_files").fetchone()
+        logger.debug(f"Opened source manifest {self.database_file} with {row[0]} records")
+
+    def close(self):
+        """Commit any outstanding changes and close the database."""
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def _get_state(self, key):
+        row = self._connection.execute("SELECT value FROM manifest_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_state(self, key, value):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO manifest_state (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def begin_pass(self):
+        """
+        Start a new pass, numbered after the last pass recorded.
+
+        Decides whether this pass must list every directory: when directory pruning
+        is disabled, or the last full walk is older than full_walk_interval_seconds.
+        """
+        logger = get_logger()
+
+        self.current_pass = int(self._get_state('last_pass') or 0) + 1
+        self._set_state('last_pass', self.current_pass)
+        self._active_directories = set()
+
+        last_full_walk = float(self._get_state('last_full_walk_time') or 0)
+        self.full_walk = (
+            self.full_walk_interval_seconds <= 0
+            or time.time() - last_full_walk >= self.full_walk_interval_seconds
+        )
+        if self.full_walk and self.full_walk_interval_seconds > 0:
+            logger.info("Running full walk of source directory (directory pruning disabled for this pass)")
+
+    def end_pass(self, walk_completed):
+        """
+        Finish a pass, pruning records for files that were not seen.
+
+        Args:
+            walk_completed: True if the whole source tree was walked. Records are
+                only pruned after a complete walk, otherwise unseen files may still exist.
+
+        Returns:
+            int: Number of records pruned
+        """
+        logger = get_logger()
+
+        pruned = 0
+        if walk_completed:
+            cursor = self._connection.execute(
+                "DELETE FROM source_files WHERE last_seen_pass < ?", (self.current_pass,)
+            )
+            pruned = cursor.rowcount
+            cursor = self._connection.execute(
+                "DELETE FROM source_directories WHERE last_seen_pass < ?", (self.current_pass,)
+            )
+            if pruned or cursor.rowcount:
+                logger.debug(f"Pruned {pruned} file and {cursor.rowcount} directory records "
+                             f"from source manifest for paths no longer present")
+            if self.full_walk:
+                self._set_state('last_full_walk_time', time.time())
+        self._connection.commit()
+        return pruned
+
+    def should_skip(self, relative_file_path, file_metadata):
+        """
+        Check whether a file can be skipped because it was rejected before and has not changed.
+
+        Args:
+            relative_file_path: Path relative to the source directory
+            file_metadata: FileMetadata for the file
+
+        Returns:
+            bool: True if the file was rejected with a disposition in SKIPPED_DISPOSITIONS
+                  and its identity is unchanged
+        """
+        row = self._connection.execute(
+            "SELECT dev, inode, size, mtime_ns, disposition FROM source_files WHERE relative_file_path = ?",
+            (relative_file_path,)
+        ).fetchone()
+
+        if row is None:
+            return False
+
+        dev, inode, size, mtime_ns, disposition = row
+        if (dev, inode, size, mtime_ns) != (file_metadata.dev, file_metadata.inode, file_metadata.size, file_metadata.mtime_ns):
+            return False
+        if disposition not in SKIPPED_DISPOSITIONS:
+            return False
+
+        self._connection.execute(
+            "UPDATE source_files SET last_seen_pass = ? WHERE relative_file_path = ?",
+            (self.current_pass, relative_file_path)
+        )
+        return True
+
+    def record(self, relative_file_path, file_metadata, disposition, reason=None):
+        """
+        Record the disposition of a file that was not quarantined.
+
+        Args:
+            relative_file_path: Path relative to the source directory
+            file_metadata: FileMetadata for the file
+            disposition: One of the DISPOSITION_ values
+            reason: Optional description of why the file was not quarantined
+        """
+        timestamp = datetime.now().isoformat()
+
+        row = self._connection.execute(
+            "SELECT first_recorded, disposition FROM source_files WHERE relative_file_path = ?",
+            (relative_file_path,)
+        ).fetchone()
+
+        # Keep the original time for files that stay in the same state (orders deferred files)
+        first_recorded = row[0] if row is not None and row[1] == disposition else timestamp
+
+        relative_dir_path = os.path.dirname(relative_file_path)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO source_files "
+            "(relative_file_path, relative_dir_path, dev, inode, size, mtime_ns, disposition, reason, first_recorded, last_recorded, last_seen_pass) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (relative_file_path, relative_dir_path, file_metadata.dev, file_metadata.inode, file_metadata.size, file_metadata.mtime_ns,
+             disposition, reason, first_recorded, timestamp, self.current_pass)
+        )
+
+        if disposition not in SKIPPED_DISPOSITIONS:
+            self._active_directories.add(relative_dir_path)
+
+    def forget(self, relative_file_path):
+        """
+        Remove the record for a file, e.g. once it has been quarantined.
+
+        Args:
+            relative_file_path: Path relative to the source directory
+        """
+        self._connection.execute(
+            "DELETE FROM source_files WHERE relative_file_path = ?", (relative_file_path,)
+        )
+        self._active_directories.add(os.path.dirname(relative_file_path))
+
+    def get_deferred_files(self):
+        """
+        Get files deferred by throttling limits, oldest first.
+
+        Returns:
+            list: Relative file paths
+        """
+        rows = self._connection.execute(
+            "SELECT relative_file_path FROM source_files WHERE disposition = ? ORDER BY first_recorded",
+            (DISPOSITION_DEFERRED,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def can_prune_directory(self, relative_dir_path, mtime_ns):
+        """
+        Check whether a directory can be left unlisted on this pass.
+
+        Args:
+            relative_dir_path: Directory path relative to the source directory
+            mtime_ns: Current mtime of the directory
+
+        Returns:
+            bool: True if this is not a full walk, the directory's mtime is unchanged
+                  and it had nothing to process when it was last listed
+        """
+        if self.full_walk:
+            return False
+
+        row = self._connection.execute(
+            "SELECT mtime_ns, prunable FROM source_directories WHERE relative_dir_path = ?",
+            (relative_dir_path,)
+        ).fetchone()
+        return row is not None and row[0] == mtime_ns and bool(row[1])
+
+    def prune_directory(self, relative_dir_path):
+        """
+        Mark a directory that was not listed, and the files recorded in it, as seen.
+
+        Args:
+            relative_dir_path: Directory path relative to the source directory
+
+        Returns:
+            list: Names of the directory's subdirectories when it was last listed
+        """
+        self._connection.execute(
+            "UPDATE source_directories SET last_seen_pass = ? WHERE relative_dir_path = ?",
+            (self.current_pass, relative_dir_path)
+        )
+        self._connection.execute(
+            "UPDATE source_files SET last_seen_pass = ? WHERE relative_dir_path = ?",
+            (self.current_pass, relative_dir_path)
+        )
+        rows = self._connection.execute(
+            "SELECT relative_dir_path FROM source_directories WHERE parent_dir_path = ? ORDER BY relative_dir_path",
+            (relative_dir_path,)
+        ).fetchall()
+        return [os.path.basename(row[0]) for row in rows]
+
+    def mark_directory_active(self, relative_dir_path):
+        """
+        Prevent a directory from being pruned on the next pass.
+
+        Args:
+            relative_dir_path: Directory path relative to the source directory
+        """
+        self._active_directories.add(relative_dir_path)
+
+    def record_directory(self, relative_dir_path, mtime_ns, file_count, subdirectory_count):
+        """
+        Record a directory after it has been listed and all of its files handled.
+
+        The directory can be pruned on later passes if none of its files were
+        quarantined, deferred, not ready or failed on this pass, and its mtime is
+        old enough that a further change would be visible.
+
+        Args:
+            relative_dir_path: Directory path relative to the source directory
+            mtime_ns: Directory mtime when it was listed
+            file_count: Number of files in the directory
+            subdirectory_count: Number of subdirectories in the directory
+        """
+        mtime_age_seconds = time.time() - mtime_ns / 1e9
+        prunable = (
+            relative_dir_path not in self._active_directories
+            and mtime_age_seconds > DIRECTORY_MTIME_SAFETY_SECONDS
+        )
+        parent_dir_path = None if relative_dir_path == '.' else os.path.dirname(relative_dir_path) or '.'
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO source_directories "
+            "(relative_dir_path, parent_dir_path, mtime_ns, file_count, subdirectory_count, prunable, last_seen_pass) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (relative_dir_path, parent_dir_path, mtime_ns, file_count, subdirectory_count,
+             int(prunable), self.current_pass)
+        )
@@ -0,0 +1,237 @@
+"""
+Source tree walker for Shuttle.
+
+Walks the source directory tree, listing directories in parallel with a
+bounded thread pool (each listing is a round trip to the file server on
+network mounts), and using the SourceManifest to avoid listing directories
+that have not changed since they were last listed and held nothing to process.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from shuttle_common.files import FileMetadata
+from shuttle_common.logger_injection import get_logger
+
+
+def _list_directory(directory_path):
+    """
+    List a directory and stat its entries. Runs in a worker thread.
+
+    Returns:
+        tuple: (files, subdirectories, unreadable_count)
+            - files: sorted list of (name, FileMetadata)
+            - subdirectories: sorted list of (name, mtime_ns)
+            - unreadable_count: number of files that could not be stat'ed
+    """
+    files = []
+    subdirectories = []
+    unreadable_count = 0
+
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append((entry.name, entry.stat(follow_symlinks=False).st_mtime_ns))
+                    continue
+                if entry.is_dir():
+                    # Symbolic link to a directory, not followed
+                    continue
+            except OSError:
+                continue
+
+            try:
+                files.append((entry.name, FileMetadata.from_stat(entry.stat())))
+            except OSError:
+                unreadable_count += 1
+
+    files.sort()
+    subdirectories.sort()
+    return files, subdirectories, unreadable_count
+
+
+def _stat_subdirectories(directory_path, names):
+    """
+    Get the mtimes of known subdirectories of a pruned directory. Runs in a worker thread.
+
+    Returns:
+        list: (name, mtime_ns) for each subdirectory that still exists
+    """
+    subdirectories = []
+    for name in names:
+        try:
+            st = os.stat(os.path.join(directory_path, name), follow_symlinks=False)
+        except OSError:
+            continue
+        subdirectories.append((name, st.st_mtime_ns))
+    return subdirectories
+
+
+class _Directory:
+    """A directory in the walk whose listing (or subdirectory stats) may still be in progress."""
+
+    def __init__(self, path, relative_path, mtime_ns, future, pruned):
+        self.path = path
+        self.relative_path = relative_path
+        self.mtime_ns = mtime_ns
+        self.future = future
+        self.pruned = pruned
+        self.resolved = False
+        self.files = None                # None if pruned or unreadable
+        self.unreadable_count = 0
+        self.subdirectory_count = 0
+        self.unsubmitted = deque()       # (path, relative_path, mtime_ns) not yet submitted
+        self.submitted = deque()         # _Directory objects submitted, in walk order
+
+
+class SourceTreeWalker:
+    """
+    Walk a source directory tree, yielding each file with its metadata.
+
+    Directories are visited bottom up (deepest first) like
+    os.walk(source_path, topdown=False), with entries in name order, so the
+    order is the same however listings complete.
+
+    Up to max_workers directories are listed at once. Listings are submitted
+    as the walk reaches a directory's subdirectories, with at most max_workers
+    siblings listed ahead of the walk at each level.
+
+    When a SourceManifest is given, a directory whose mtime is unchanged and
+    that had nothing to process when it was last listed is pruned: it is not
+    listed and its files are not stat'ed. A directory's mtime only changes
+    when its own entries change, so the subdirectories recorded for a pruned
+    directory are still visited and their mtimes checked.
+
+    Each listed directory is recorded in the manifest once all of its files
+    have been handled by the consumer, so a walk that is stopped early leaves
+    the previous record in place.
+    """
+
+    def __init__(self, source_path, source_manifest=None, max_workers=1):
+        """
+        Initialize the walker.
+
+        Args:
+            source_path (str): Root of the source directory tree
+            source_manifest (SourceManifest): Optional open manifest, with a pass begun
+            max_workers (int): Maximum number of directories listed at once (1 lists serially)
+        """
+        self.source_path = source_path
+        self.source_manifest = source_manifest
+        self.max_workers = max(1, max_workers)
+        self.directories_listed = 0
+        self.directories_pruned = 0
+        self._executor = None
+
+    def _run(self, function, *args):
+        """Run a function in the thread pool, or immediately when walking serially."""
+        if self._executor is not None:
+            return self._executor.submit(function, *args)
+
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _submit(self, path, relative_path, mtime_ns):
+        """Start listing a directory, or stat'ing its subdirectories if it can be pruned."""
+        if self.source_manifest is not None and self.source_manifest.can_prune_directory(relative_path, mtime_ns):
+            self.directories_pruned += 1
+            names = self.source_manifest.prune_directory(relative_path)
+            return _Directory(path, relative_path, mtime_ns, self._run(_stat_subdirectories, path, names), True)
+
+        self.directories_listed += 1
+        return _Directory(path, relative_path, mtime_ns, self._run(_list_directory, path), False)
+
+    def _resolve(self, directory):
+        """Wait for a directory's listing and queue its subdirectories."""
+        logger = get_logger()
+
+        directory.resolved = True
+        try:
+            result = directory.future.result()
+        except OSError as e:
+            logger.warning(f"Could not read directory {directory.path}: {e}")
+            return
+
+        if directory.pruned:
+            subdirectories = result
+        else:
+            directory.files, subdirectories, directory.unreadable_count = result
+
+        directory.subdirectory_count = len(subdirectories)
+        for name, mtime_ns in subdirectories:
+            # Relative paths match os.path.relpath(source_root, source_path), e.g. '.', 'a', 'a/b'
+            directory.unsubmitted.append((
+                os.path.join(directory.path, name),
+                os.path.normpath(os.path.join(directory.relative_path, name)),
+                mtime_ns
+            ))
+
+    def _next_subdirectory(self, directory):
+        """Take the next subdirectory to descend into, keeping up to max_workers siblings in progress."""
+        while directory.unsubmitted and len(directory.submitted) < self.max_workers:
+            directory.submitted.append(self._submit(*directory.unsubmitted.popleft()))
+        if directory.submitted:
+            return directory.submitted.popleft()
+        return None
+
+    def __iter__(self):
+        """
+        Yields:
+            tuple: (source_root, source_file, file_metadata) for each file in listed directories
+        """
+        logger = get_logger()
+
+        try:
+            root_mtime_ns = os.stat(self.source_path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Could not read source directory {self.source_path}: {e}")
+            return
+
+        if self.max_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='source-walk')
+
+        stack = []
+        try:
+            stack.append(self._submit(self.source_path, '.', root_mtime_ns))
+            while stack:
+                directory = stack[-1]
+                if not directory.resolved:
+                    self._resolve(directory)
+
+                subdirectory = self._next_subdirectory(directory)
+                if subdirectory is not None:
+                    stack.append(subdirectory)
+                    continue
+
+                stack.pop()
+                if directory.files is None:
+                    continue
+
+                for name, file_metadata in directory.files:
+                    yield directory.path, name, file_metadata
+
+                if self.source_manifest is not None:
+                    if directory.unreadable_count:
+                        # List the directory again next pass in case its files become readable
+                        self.source_manifest.mark_directory_active(directory.relative_path)
+                    self.source_manifest.record_directory(
+                        directory.relative_path,
+                        directory.mtime_ns,
+                        len(directory.files),
+                        directory.subdirectory_count
+                    )
+        finally:
+            if self._executor is not None:
+                # Walk stopped early: drop listings that have not started
+                for directory in stack:
+                    for pending in directory.submitted:
+                        pending.future.cancel()
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+        logger.debug(f"Source walk listed {self.directories_listed} directories, "
+                     f"pruned {self.directories_pruned} unchanged directories")
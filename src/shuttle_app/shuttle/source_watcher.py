@@ -0,0 +1,220 @@
+"""
+Source directory watcher for Shuttle.
+
+Provides an inotify based watcher used by watch mode to pick up files as they
+arrive in the source directory, instead of walking the whole source tree on
+every run.
+"""
+
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from shuttle_common.logger_injection import get_logger
+
+
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Events that make a file a candidate for processing
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_BUFFER_SIZE = 64 * 1024
+
+
+class InotifyUnavailableError(Exception):
+    """Raised when inotify cannot be used on this host"""
+    pass
+
+
+class SourceWatcher:
+    """
+    Watch a source directory tree for new or completed files using inotify.
+
+    A watch is added to every directory in the tree. New subdirectories are
+    watched as they appear and any files already present in them are reported,
+    so files created before the watch was in place are not missed.
+
+    If the kernel event queue overflows, or a watch cannot be added (for example
+    because fs.inotify.max_user_watches is exhausted), `needs_reconciliation` is
+    set so that the caller can fall back to a full directory walk.
+    """
+
+    def __init__(self, source_path):
+        """
+        Initialize the watcher.
+
+        Args:
+            source_path (str): Root of the source directory tree to watch
+        """
+        self.source_path = source_path
+        self.needs_reconciliation = False
+        self._fd = None
+        self._libc = None
+        self._watch_descriptors = {}  # wd -> directory path
+
+    def start(self):
+        """
+        Create the inotify instance and add watches for the whole tree.
+
+        Raises:
+            InotifyUnavailableError: If inotify is not supported on this host
+        """
+        logger = get_logger()
+
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise InotifyUnavailableError("C library not found")
+
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            self._libc.inotify_init1.argtypes = [ctypes.c_int]
+            self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        except (OSError, AttributeError) as e:
+            raise InotifyUnavailableError(f"inotify is not available: {e}")
+
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyUnavailableError(f"inotify_init1 failed: {os.strerror(err)}")
+
+        self._fd = fd
+        self._add_watch_recursive(self.source_path)
+
+        logger.info(f"Watching {len(self._watch_descriptors)} directories under {self.source_path}")
+
+    def close(self):
+        """Close the inotify instance, removing all watches."""
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+        self._watch_descriptors = {}
+
+    def fileno(self):
+        """Return the inotify file descriptor (for use with select/poll)."""
+        return self._fd
+
+    def _add_watch(self, directory_path):
+        """
+        Add a watch for a single directory.
+
+        Returns:
+            bool: True if the watch was added, False otherwise
+        """
+        logger = get_logger()
+
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory_path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning(f"inotify watch limit reached, cannot watch {directory_path}. "
+                               f"Increase fs.inotify.max_user_watches; falling back to periodic directory walks")
+                self.needs_reconciliation = True
+            elif err != errno.ENOENT:
+                logger.warning(f"Could not watch directory {directory_path}: {os.strerror(err)}")
+            return False
+
+        self._watch_descriptors[wd] = directory_path
+        return True
+
+    def _add_watch_recursive(self, directory_path):
+        """
+        Add watches for a directory and every directory below it.
+
+        Returns:
+            set: (source_root, source_file) tuples for files already present
+        """
+        existing_files = set()
+
+        for root, dirs, files in os.walk(directory_path):
+            if not self._add_watch(root):
+                dirs[:] = []
+                continue
+            for filename in files:
+                existing_files.add((root, filename))
+
+        return existing_files
+
+    def read_events(self, timeout_seconds=None):
+        """
+        Wait for events and return the files they refer to.
+
+        Args:
+            timeout_seconds (float): Maximum time to wait for events (None waits indefinitely)
+
+        Returns:
+            set: (source_root, source_file) tuples for files that were created,
+                 written and closed, or moved into the tree
+        """
+        logger = get_logger()
+        candidates = set()
+
+        if self._fd is None:
+            return candidates
+
+        readable, _, _ = select.select([self._fd], [], [], timeout_seconds)
+        if not readable:
+            return candidates
+
+        while True:
+            try:
+                buffer = os.read(self._fd, _READ_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            except InterruptedError:
+                continue
+
+            if not buffer:
+                break
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                wd, mask, _cookie, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                raw_name = buffer[offset:offset + name_length].rstrip(b'\0')
+                offset += name_length
+
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("inotify event queue overflowed, a full directory walk is required")
+                    self.needs_reconciliation = True
+                    continue
+
+                directory_path = self._watch_descriptors.get(wd)
+
+                if mask & IN_IGNORED:
+                    self._watch_descriptors.pop(wd, None)
+                    continue
+
+                if directory_path is None or not raw_name:
+                    continue
+
+                name = os.fsdecode(raw_name)
+                event_path = os.path.join(directory_path, name)
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        logger.debug(f"New directory in source tree: {event_path}")
+                        candidates |= self._add_watch_recursive(event_path)
+                    continue
+
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+                    candidates.add((directory_path, name))
+
+        return candidates
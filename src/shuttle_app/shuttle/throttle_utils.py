@@ -99,7 +99,8 @@ def handle_throttle_check(
         max_files_per_run=0,
         max_volume_per_run=0,
         per_run_tracker=None,
-        notifier=None
+        notifier=None,
+        file_metadata=None
     ):
     """
     Check if a file can be processed based on available disk space, daily limits, and per-run limits.
@@ -118,6 +119,7 @@ def handle_throttle_check(
         max_volume_per_run: Maximum volume to process per run in MB (0 for no limit)
         per_run_tracker: PerRunTracker instance for per-run limit tracking
         notifier: Notifier instance for sending notifications (optional)
+        file_metadata: FileMetadata for the source file, if already known (optional)
         
     Returns:
         bool: True if processing can continue, False if it should stop
@@ -128,7 +130,10 @@ def handle_throttle_check(
     file_size_bytes = 0
     file_size_mb = 0
     try:
-        file_size_bytes = os.path.getsize(source_file_path)
+        if file_metadata is not None:
+            file_size_bytes = file_metadata.size
+        else:
+            file_size_bytes = os.path.getsize(source_file_path)
         file_size_mb = file_size_bytes / (1024 * 1024)  # Convert to MB
         logger.debug(f"File size for {os.path.basename(source_file_path)}: {file_size_mb:.2f} MB")
     except Exception as e:
@@ -10,6 +10,7 @@ import logging
 import types
 from typing import Optional
 from shuttle_common.logger_injection import get_logger
+from shuttle_common.files import FileMetadata
 
 
 class Throttler:
@@ -89,7 +90,7 @@ class Throttler:
     @staticmethod
     def can_process_file(source_file_path, quarantine_path, destination_path, 
                          hazard_path, min_free_space_mb, daily_totals=None, max_files_per_day=0, 
-                         max_volume_per_day_mb=0):
+                         max_volume_per_day_mb=0, file_metadata=None):
         """
         Check if a file can be processed with the given paths and return detailed status.
         
@@ -102,6 +103,7 @@ class Throttler:
             daily_totals (dict): Current daily totals with 'files_processed' and 'volume_processed_mb' keys
             max_files_per_day (int): Maximum number of files to process per day (0 for no limit)
             max_volume_per_day_mb (int): Maximum volume to process per day in MB (0 for no limit)
+            file_metadata (FileMetadata): Metadata for the source file, if already known
             
         Returns:
             SimpleNamespace: Object with the following attributes:
@@ -125,12 +127,18 @@ class Throttler:
         # Get logger for this method
         logger = get_logger()
         
+        # Stat the source file once for both the daily limit and disk space checks
+        try:
+            if file_metadata is None:
+                file_metadata = FileMetadata.from_stat(os.stat(source_file_path))
+        except OSError as e:
+            logger.error(f"Could not determine file size for {source_file_path}: {e}")
+        
         # Check daily throttling limits if enabled
         if daily_totals and (max_files_per_day > 0 or max_volume_per_day_mb > 0):
             try:
                 # Get file size in MB for checking volume limits
-                file_size_bytes = os.path.getsize(source_file_path)
-                file_size_mb = file_size_bytes / (1024 * 1024)  # Convert to MB
+                file_size_mb = file_metadata.size_mb
                 
                 logger.debug(f"Checking daily throttle limits: files={max_files_per_day}, volume={max_volume_per_day_mb}MB")
                 
@@ -151,7 +159,7 @@ class Throttler:
                 
         try:
             # Get file size in MB
-            file_size_mb = os.path.getsize(source_file_path) / (1024 * 1024)
+            file_size_mb = file_metadata.size_mb
             
             # Calculate pending volume from daily totals if available
             pending_volume_mb = 0
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Load-test the clamd client against the clamd simulator.
+
+Small files are scanned from several threads in three ways:
+
+- pooled:     ClamdClient, reusing IDSESSION sessions
+- connection: a new ClamdClient for every scan, so each scan opens a
+              connection as clamdscan does
+- clamdscan:  clamdscan --fdpass for each file, pointed at the simulator, only
+              when clamdscan is installed
+
+The simulator answers from a thread per connection with a fixed delay per
+scan, so the differences show the cost of connecting and of starting a
+process, not of the engine.
+
+Usage:
+    PYTHONPATH=src/shared_library python tests/benchmark_clamd_client.py [--files N] [--threads N] [--delay-ms N]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from shuttle_common.clamd_client import ClamdClient
+from shuttle_common.scan_utils import scan_result_types
+from clamd_simulator import ClamdSimulator
+
+
+def run(mode, scan, paths, threads, server):
+    server.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(scan, paths))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if result != scan_result_types.FILE_IS_CLEAN)
+    print(f"{mode:<12}{len(paths) / elapsed:>12.0f}{elapsed * 1000 / len(paths) * threads:>14.2f}{server.connections:>14}{failed:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the clamd client against the clamd simulator')
+    parser.add_argument('--files', type=int, default=2000, help='Number of files to scan (default: 2000)')
+    parser.add_argument('--threads', type=int, default=8, help='Scanning threads (default: 8)')
+    parser.add_argument('--delay-ms', type=float, default=0, help='Simulated scan time per file (default: 0)')
+    parser.add_argument('--file-kb', type=int, default=4, help='Size of each file in KB (default: 4)')
+    args = parser.parse_args()
+
+    # Keep the per-file scan messages out of the results
+    logging.disable(logging.WARNING)
+
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, 'clamd.sock')
+    server = ClamdSimulator(socket_path, args.delay_ms).start()
+
+    try:
+        content = os.urandom(args.file_kb * 1024)
+        paths = []
+        for index in range(args.files):
+            path = os.path.join(directory, f"file_{index}.bin")
+            with open(path, 'wb') as f:
+                f.write(content)
+            paths.append(path)
+
+        print(f"{'':<12}{'scans/s':>12}{'ms per scan':>14}{'connections':>14}{'failed':>10}")
+
+        client = ClamdClient(socket_path, max_sessions=args.threads)
+        run('pooled', client.scan_file, paths, args.threads, server)
+        client.close()
+
+        def scan_with_connection(path):
+            connection_client = ClamdClient(socket_path)
+            result = connection_client.scan_file(path)
+            connection_client.close()
+            return result
+
+        run('connection', scan_with_connection, paths, args.threads, server)
+
+        if shutil.which('clamdscan'):
+            config_file = os.path.join(directory, 'clamd.conf')
+            with open(config_file, 'w') as f:
+                f.write(f"LocalSocket {socket_path}\n")
+
+            def scan_with_clamdscan(path):
+                result = subprocess.run(
+                    ['clamdscan', '--fdpass', f'--config-file={config_file}', path],
+                    capture_output=True,
+                    check=False
+                )
+                return scan_result_types.FILE_IS_CLEAN if result.returncode == 0 else scan_result_types.FILE_SCAN_FAILED
+
+            run('clamdscan', scan_with_clamdscan, paths, args.threads, server)
+        else:
+            print("clamdscan is not installed, not comparing with it")
+    finally:
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark file hashing throughput: the original 4 KB chunked get_file_hash
+versus the HashEngine readinto, file_digest and mmap paths, across file size
+classes, and hashing many files serially versus on a thread pool.
+
+Files are read from the page cache after the first pass, so this measures
+the cost of hashing and reading in Python rather than the disk.
+
+Usage:
+    PYTHONPATH=src/shared_library python tests/benchmark_hashing.py [--directory DIR] [--total-mb N]
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+from shuttle_common.hash_engine import HashEngine
+
+
+SIZE_CLASSES = [
+    ('64 KB', 64 * 1024),
+    ('1 MB', 1024 * 1024),
+    ('16 MB', 16 * 1024 * 1024),
+    ('256 MB', 256 * 1024 * 1024),
+]
+
+
+def original_get_file_hash(file_path):
+    """get_file_hash as it was before the hash engine."""
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(4096), b''):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
+def make_files(directory, size, total_bytes):
+    count = max(1, total_bytes // size)
+    block = os.urandom(min(size, 1024 * 1024))
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"file_{size}_{index}.bin")
+        with open(path, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                f.write(block[:remaining])
+                remaining -= len(block)
+        paths.append(path)
+    return paths
+
+
+def throughput(function, paths, size):
+    function(paths[0])  # Warm the page cache and any buffers
+    start = time.perf_counter()
+    for path in paths:
+        function(path)
+    elapsed = time.perf_counter() - start
+    return len(paths) * size / (1024 * 1024) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark file hashing throughput')
+    parser.add_argument('--directory', help='Directory to create test files in (default: a temporary directory)')
+    parser.add_argument('--total-mb', type=int, default=512, help='MB of files per size class (default: 512)')
+    parser.add_argument('--workers', type=int, default=4, help='Threads for the thread pool test (default: 4)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir=args.directory)
+    total_bytes = args.total_mb * 1024 * 1024
+
+    methods = [
+        ('original 4 KB', original_get_file_hash),
+        ('readinto 1 MB', HashEngine(buffer_size=1024 * 1024).hash_file),
+        ('readinto 4 MB', HashEngine(buffer_size=4 * 1024 * 1024).hash_file),
+        ('readinto 16 MB', HashEngine(buffer_size=16 * 1024 * 1024).hash_file),
+        ('mmap', HashEngine(use_mmap=True).hash_file),
+    ]
+    if hasattr(hashlib, 'file_digest'):
+        methods.append(('file_digest', HashEngine(use_file_digest=True).hash_file))
+
+    try:
+        print(f"{'':<10}" + ''.join(f"{name:>16}" for name, _ in methods) + "   (MB/s)")
+        for label, size in SIZE_CLASSES:
+            paths = make_files(directory, size, total_bytes)
+            rates = [throughput(function, paths, size) for _, function in methods]
+            print(f"{label:<10}" + ''.join(f"{rate:>16.0f}" for rate in rates))
+
+            if label == '16 MB':
+                engine = HashEngine(max_workers=1)
+                start = time.perf_counter()
+                engine.hash_files(paths)
+                serial = time.perf_counter() - start
+                engine = HashEngine(max_workers=args.workers)
+                start = time.perf_counter()
+                engine.hash_files(paths)
+                parallel = time.perf_counter() - start
+                volume = len(paths) * size / (1024 * 1024)
+                print(f"{'':<10}hash_files on {len(paths)} files: serial {volume / serial:.0f} MB/s, "
+                      f"{args.workers} threads {volume / parallel:.0f} MB/s ({serial / parallel:.1f}x)")
+
+            for path in paths:
+                os.remove(path)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
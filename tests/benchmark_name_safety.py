@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark filename and path safety checks: the original character by character
+check versus the compiled regex checks, on names with many unicode characters.
+
+Usage:
+    PYTHONPATH=src/shared_library python tests/benchmark_name_safety.py [--files N] [--directories N]
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from shuttle_common.files import (
+    is_name_safe,
+    are_file_and_path_names_safe,
+    find_unsafe_filenames,
+    NameSafetyValidator
+)
+
+
+def original_is_name_safe(name, is_path=False):
+    """The check as it was before the rules were compiled."""
+    if any(ord(char) < 32 or ord(char) == 0x7F for char in name):
+        return False
+    dangerous_chars = ['\\', '..', '>', '<', '|', '*', '$', '&', ';', '`']
+    if not is_path:
+        dangerous_chars.append('/')
+    for char in dangerous_chars:
+        if char in name:
+            return False
+    check_name = name
+    if is_path and '/' in name:
+        check_name = name.rstrip('/').split('/')[-1]
+    if check_name not in ['.', '..'] and (check_name.startswith('-') or check_name.startswith('.')):
+        return False
+    try:
+        name.encode('utf-8').decode('utf-8')
+    except UnicodeError:
+        return False
+    return True
+
+
+def original_are_names_safe(source_file, source_root):
+    """The three checks are_file_and_path_names_safe made for every file."""
+    return (original_is_name_safe(source_file)
+            and original_is_name_safe(source_root, True)
+            and original_is_name_safe(source_root + '/' + source_file, True))
+
+
+UNICODE_LETTERS = 'абвгдежзийклмнопрстуфхцчшщэюяαβγδεζηθλμξπσφψω文件资料报告データファイル한국어éèêëàâîïôûüç'
+
+
+def random_name(rng, length):
+    return ''.join(rng.choice(UNICODE_LETTERS) for _ in range(length))
+
+
+def make_listing(directory_count, files_per_directory):
+    rng = random.Random(42)
+    listing = []
+    for _ in range(directory_count):
+        source_root = '/mnt/source/' + '/'.join(random_name(rng, 20) for _ in range(6))
+        names = [random_name(rng, 60) + '.pdf' for _ in range(files_per_directory)]
+        listing.append((source_root, names))
+    return listing
+
+
+def time_it(label, function, baseline=None):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    speedup = f" ({baseline / elapsed:5.1f}x)" if baseline else ""
+    print(f"  {label:<40} {elapsed:8.4f}s{speedup}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark name safety checks')
+    parser.add_argument('--directories', type=int, default=50, help='Number of directories (default: 50)')
+    parser.add_argument('--files', type=int, default=200, help='Files per directory (default: 200)')
+    args = parser.parse_args()
+
+    listing = make_listing(args.directories, args.files)
+    file_count = args.directories * args.files
+    print(f"Checking {file_count} files in {args.directories} directories, ~200 unicode characters per path")
+
+    def run_original():
+        for source_root, names in listing:
+            for name in names:
+                original_are_names_safe(name, source_root)
+
+    def run_compiled():
+        for source_root, names in listing:
+            for name in names:
+                are_file_and_path_names_safe(name, source_root)
+
+    def run_validator():
+        validator = NameSafetyValidator()
+        for source_root, names in listing:
+            for name in names:
+                validator.are_file_and_path_names_safe(name, source_root)
+
+    def run_batch():
+        validator = NameSafetyValidator()
+        for source_root, names in listing:
+            if validator.is_directory_safe(source_root):
+                find_unsafe_filenames(names)
+
+    baseline = time_it("original, 3 checks per file", run_original)
+    time_it("compiled, 3 checks per file", run_compiled, baseline)
+    time_it("compiled, directory memo", run_validator, baseline)
+    time_it("compiled, directory memo + batch listing", run_batch, baseline)
+
+    # Single name checks
+    names = [name for _, names in listing for name in names]
+    baseline = time_it("original is_name_safe", lambda: [original_is_name_safe(name) for name in names])
+    time_it("compiled is_name_safe", lambda: [is_name_safe(name) for name in names], baseline)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
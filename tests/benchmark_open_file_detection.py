@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark open file detection: one lsof process per file versus a single /proc snapshot.
+
+Usage:
+    PYTHONPATH=src/shared_library python tests/benchmark_open_file_detection.py [--files N]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from shuttle_common.files import is_path_open
+from shuttle_common.open_files import create_open_file_snapshot
+
+
+def create_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"file_{i:05d}.txt")
+        with open(path, "w") as f:
+            f.write("content")
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark open file detection')
+    parser.add_argument('--files', type=int, default=200, help='Number of files to check (default: 200)')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        paths = create_files(temp_dir, args.files)
+        print(f"Checking {len(paths)} files")
+
+        start = time.perf_counter()
+        snapshot = create_open_file_snapshot('proc')
+        snapshot_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for path in paths:
+            is_path_open(path, snapshot)
+        lookup_time = time.perf_counter() - start
+        print(f"  /proc snapshot: {snapshot_time + lookup_time:8.3f}s "
+              f"(snapshot {snapshot_time:.3f}s, lookups {lookup_time:.3f}s)")
+
+        if shutil.which('lsof') is None:
+            print("  lsof per file:  skipped (lsof not installed)")
+            return 0
+
+        start = time.perf_counter()
+        for path in paths:
+            is_path_open(path)
+        lsof_time = time.perf_counter() - start
+        print(f"  lsof per file:  {lsof_time:8.3f}s")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
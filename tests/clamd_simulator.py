@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+clamd Simulator
+
+Listens on a Unix socket and answers the parts of the clamd protocol Shuttle
+uses, so the clamd client can be tested and load-tested without ClamAV
+installed: PING, VERSION, IDSESSION/END, SCAN, FILDES, INSTREAM, MULTISCAN and
+CONTSCAN, with z (null terminated) or n (newline terminated) commands.
+
+Content holding the EICAR test string is reported as
+'Eicar-Test-Signature FOUND', everything else is OK. An optional delay is
+added to every scan to stand in for the engine.
+
+IMPORTANT: This is for development and testing only.
+           DO NOT use in production environments.
+
+Usage:
+    python tests/clamd_simulator.py --socket /tmp/clamd-simulator.sock [--delay-ms 5]
+"""
+
+import os
+import sys
+import time
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+VERSION = "ClamAV 1.0.0/27000/Thu Jan  1 00:00:00 2026"
+
+EICAR_SIGNATURE = b'EICAR-STANDARD-ANTIVIRUS-TEST-FILE'
+THREAT_NAME = 'Eicar-Test-Signature'
+
+# Largest INSTREAM chunk accepted, as clamd's StreamMaxLength
+STREAM_MAX_LENGTH = 25 * 1024 * 1024
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.buffer = b''
+        self.terminator = b'\0'
+        self.fds = []
+
+    def recv_more(self):
+        data, fds, _, _ = socket.recv_fds(self.request, 65536, 4)
+        self.fds.extend(fds)
+        if not data:
+            raise EOFError
+        self.buffer += data
+
+    def recv_exactly(self, size):
+        while len(self.buffer) < size:
+            self.recv_more()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_command(self):
+        # The first byte says how the command is terminated
+        while not self.buffer:
+            self.recv_more()
+        prefix = self.buffer[:1]
+        if prefix in (b'z', b'n'):
+            self.buffer = self.buffer[1:]
+            self.terminator = b'\0' if prefix == b'z' else b'\n'
+        while self.terminator not in self.buffer:
+            self.recv_more()
+        command, _, self.buffer = self.buffer.partition(self.terminator)
+        return command.decode('utf-8', errors='replace')
+
+    def reply(self, text, request_id=None):
+        if request_id is not None:
+            text = f"{request_id}: {text}"
+        self.request.sendall(text.encode() + self.terminator)
+
+    def verdict(self, name, content):
+        time.sleep(self.server.delay_seconds)
+        self.server.count_scan()
+        if EICAR_SIGNATURE in content:
+            return f"{name}: {THREAT_NAME} FOUND"
+        return f"{name}: OK"
+
+    def scan_path(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return self.verdict(path, f.read())
+        except OSError as e:
+            return f"{path}: {e.strerror}. ERROR"
+
+    def scan_fildes(self):
+        # The descriptor arrives with at least one byte of data
+        while not self.fds:
+            self.recv_more()
+        self.buffer = self.buffer[1:]
+        fd = self.fds.pop(0)
+        try:
+            with os.fdopen(fd, 'rb') as f:
+                return self.verdict(f"fd[{fd}]", f.read())
+        except OSError as e:
+            return f"fd[{fd}]: {e.strerror}. ERROR"
+
+    def scan_stream(self):
+        chunks = []
+        total = 0
+        while True:
+            (size,) = struct.unpack('!L', self.recv_exactly(4))
+            if size == 0:
+                break
+            total += size
+            if total > STREAM_MAX_LENGTH:
+                return "INSTREAM size limit exceeded. ERROR"
+            chunks.append(self.recv_exactly(size))
+        return self.verdict("stream", b''.join(chunks))
+
+    def scan_directory(self, path):
+        if not os.path.isdir(path):
+            return [self.scan_path(path)]
+        findings = []
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                result = self.scan_path(os.path.join(root, name))
+                if not result.endswith(': OK'):
+                    findings.append(result)
+        return findings or [f"{path}: OK"]
+
+    def run_command(self, command, request_id=None):
+        name, _, argument = command.partition(' ')
+        if name == 'PING':
+            self.reply("PONG", request_id)
+        elif name == 'VERSION':
+            self.reply(VERSION, request_id)
+        elif name == 'SCAN':
+            self.reply(self.scan_path(argument), request_id)
+        elif name == 'FILDES':
+            self.reply(self.scan_fildes(), request_id)
+        elif name == 'INSTREAM':
+            self.reply(self.scan_stream(), request_id)
+        elif name in ('MULTISCAN', 'CONTSCAN') and request_id is None:
+            for result in self.scan_directory(argument):
+                self.reply(result)
+            return False
+        else:
+            self.reply("UNKNOWN COMMAND", request_id)
+            return False
+        return True
+
+    def handle(self):
+        self.server.count_connection()
+        try:
+            command = self.read_command()
+            if command != 'IDSESSION':
+                self.run_command(command)
+                return
+
+            # Commands in a session are answered with their number until END
+            request_id = 0
+            while True:
+                command = self.read_command()
+                if command == 'END':
+                    return
+                request_id += 1
+                if not self.run_command(command, request_id):
+                    return
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            for fd in self.fds:
+                os.close(fd)
+
+
+class ClamdSimulator(socketserver.ThreadingUnixStreamServer):
+    """clamd stand-in serving each connection on its own thread."""
+
+    daemon_threads = True
+
+    # As clamd's MaxConnectionQueueLength
+    request_queue_size = 200
+
+    def __init__(self, socket_path, delay_ms=0):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.delay_seconds = delay_ms / 1000
+        self.connections = 0
+        self.scans = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def count_scan(self):
+        with self._lock:
+            self.scans += 1
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and remove the socket."""
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='clamd protocol simulator for testing')
+    parser.add_argument('--socket', required=True, help='Path of the Unix socket to listen on')
+    parser.add_argument('--delay-ms', type=float, default=0, help='Time added to every scan in milliseconds')
+    args = parser.parse_args()
+
+    server = ClamdSimulator(args.socket, args.delay_ms)
+    print(f"SIMULATOR: clamd listening on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
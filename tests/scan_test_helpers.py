@@ -0,0 +1,42 @@
+"""
+Quarantined files and settings shared by the scanning unit tests.
+"""
+
+from types import SimpleNamespace
+
+from shuttle_common.files import FileMetadata
+
+
+# Arguments after the file in each scan task, scanning with Defender only and keeping sources
+SCAN_TASK_ARGS = ("/key.gpg", "/hazard", False, True, False, False)
+
+
+def make_file_data(index, file_hash=None, size=100, quarantine_path=None):
+    """Build the file tuple of a quarantined file, hashed as hash<index> unless a hash is given."""
+    return (
+        quarantine_path or f"/quarantine/file{index}.txt",
+        f"/source/file{index}.txt",
+        f"/destination/file{index}.txt",
+        file_hash or f"hash{index}",
+        f"./file{index}.txt",
+        FileMetadata(size=size, mtime_ns=0, inode=index, dev=1),
+        None
+    )
+
+
+def make_config(**overrides):
+    """Build scan settings, scanning with both engines at the same time and without adapting concurrency."""
+    settings = dict(
+        concurrent_scan_engines=True,
+        adaptive_scan_concurrency=False,
+        min_scan_threads=1,
+        hash_algorithm=None,
+        malware_scan_timeout_seconds=60,
+        malware_scan_timeout_ms_per_byte=0.0,
+        malware_scan_retry_wait_seconds=0,
+        malware_scan_retry_count=1,
+        rename_clean_files=False,
+        rehash_source_before_delete=False
+    )
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
@@ -0,0 +1,300 @@
+"""
+Unit tests for scanning from an asyncio event loop.
+"""
+
+import unittest
+import os
+import sys
+import time
+import stat
+import asyncio
+import tempfile
+import shutil
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from shuttle_common.scan_utils import (
+    scan_result_types,
+    ScanTimeoutError,
+    run_malware_scan_async,
+    scan_for_malware_using_defender_async,
+    handle_clamav_scan_result
+)
+from shuttle.scanning import (
+    process_scan_tasks_async,
+    scan_and_process_file,
+    scan_and_process_file_async,
+    ScanTimeoutResult
+)
+from scan_test_helpers import make_file_data, make_config, SCAN_TASK_ARGS
+
+
+FAKE_MDATP = """#!/bin/sh
+# Reports files whose name contains EICAR as threats, as the mdatp simulator does
+for path; do :; done
+case "$path" in
+    *EICAR*) printf 'Scan has started\\n\\t1 file(s) scanned\\n\\t1 threat(s) detected\\nThreat(s) found\\n' ;;
+    *) printf 'Scan has started\\n\\t1 file(s) scanned\\n\\t0 threat(s) detected\\n' ;;
+esac
+"""
+
+
+class TestAsyncScanners(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, 'file.txt')
+        with open(self.file_path, 'w') as f:
+            f.write("content")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_scanner_return_code_is_handled(self):
+        """Test that the scanner's return code and output are passed to the result handler."""
+        cmd = [sys.executable, "-c", "import sys; sys.exit(1)"]
+        result = asyncio.run(run_malware_scan_async(cmd, self.file_path, handle_clamav_scan_result, 10, 7))
+        self.assertEqual(result, scan_result_types.FILE_IS_SUSPECT)
+
+    def test_timeout_kills_scanner(self):
+        """Test that a scan that times out raises ScanTimeoutError without waiting for the scanner."""
+        cmd = [sys.executable, "-c", "import time; time.sleep(30)"]
+        start = time.monotonic()
+        with self.assertRaises(ScanTimeoutError):
+            asyncio.run(run_malware_scan_async(cmd, self.file_path, handle_clamav_scan_result, 0.5, 7))
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_defender_scan(self):
+        """Test that Defender output is parsed as for the synchronous scanner."""
+        mdatp = os.path.join(self.temp_dir, 'mdatp')
+        with open(mdatp, 'w') as f:
+            f.write(FAKE_MDATP)
+        os.chmod(mdatp, stat.S_IRWXU)
+        eicar_path = os.path.join(self.temp_dir, 'EICAR.txt')
+        shutil.copy(self.file_path, eicar_path)
+
+        with patch('shuttle_common.scan_utils.DEFENDER_COMMAND', mdatp):
+            self.assertEqual(asyncio.run(scan_for_malware_using_defender_async(self.file_path, None, 7)), scan_result_types.FILE_IS_CLEAN)
+            self.assertEqual(asyncio.run(scan_for_malware_using_defender_async(eicar_path, None, 7)), scan_result_types.FILE_IS_SUSPECT)
+
+
+class TestProcessScanTasksAsync(unittest.TestCase):
+
+    def test_concurrency_limited_by_max_scan_threads(self):
+        """Test that every task is processed and no more than max_scan_threads run at once."""
+        running = 0
+        peak = 0
+
+        async def fake_scan(file_data, *args):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return True
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(20)]
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan):
+            results, successful_files, failed_files, timeout_shutdown = process_scan_tasks_async(tasks, 4)
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual((successful_files, failed_files, timeout_shutdown), (20, 0, False))
+        self.assertEqual(peak, 4)
+
+    def test_results_in_file_order(self):
+        """Test that results of scans finishing out of order are returned in file order."""
+        async def fake_scan(file_data, *args):
+            index = file_data[5].inode
+            await asyncio.sleep((6 - index) * 0.01)
+            return index % 2 == 0
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(6)]
+        result_files = []
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan):
+            results, _, _, _ = process_scan_tasks_async(tasks, 6, result_files=result_files)
+
+        self.assertEqual(result_files, [task[0] for task in tasks])
+        self.assertEqual(results, [True, False] * 3)
+
+    def test_batch_verdicts_passed_to_scans(self):
+        """Test that each scan is given its file's Defender batch verdict."""
+        verdicts = {}
+
+        async def fake_scan(file_data, *args):
+            verdicts[file_data[0]] = args[-1]
+            return True
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(2)]
+        batch_verdicts = {make_file_data(0)[0]: scan_result_types.FILE_IS_CLEAN}
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan):
+            process_scan_tasks_async(tasks, 2, defender_verdicts=batch_verdicts)
+
+        self.assertEqual(verdicts, {make_file_data(0)[0]: scan_result_types.FILE_IS_CLEAN, make_file_data(1)[0]: None})
+
+    def test_timeouts_shut_down_processing(self):
+        """Test that reaching the timeout limit cancels scans that have not started."""
+        started = []
+
+        async def fake_timeout_scan(file_data, *args):
+            started.append(file_data)
+            await asyncio.sleep(0.01)
+            return ScanTimeoutResult(file_data[0], file_data[1])
+
+        config = SimpleNamespace(malware_scan_retry_count=2, malware_scan_timeout_seconds=1, adaptive_scan_concurrency=False)
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(10)]
+        result_files = []
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_timeout_scan):
+            results, _, failed_files, timeout_shutdown = process_scan_tasks_async(tasks, 2, config=config, result_files=result_files)
+
+        # Scans already running when the limit was reached complete, the rest never start
+        self.assertTrue(timeout_shutdown)
+        self.assertLess(len(started), 10)
+        self.assertEqual(len(results), len(started))
+        # Files that never started have no result, and are left out of result_files
+        self.assertEqual(result_files, started)
+
+
+class TestConcurrentScanEngines(unittest.TestCase):
+
+    def setUp(self):
+        self.cancelled = []
+        suspect_handler = patch('shuttle.scanning.handle_suspect_scan_result', return_value=MagicMock())
+        clean_handler = patch('shuttle.scanning.handle_clean_file', return_value=MagicMock())
+        self.handle_suspect = suspect_handler.start()
+        self.handle_clean = clean_handler.start()
+        self.addCleanup(patch.stopall)
+
+    def fake_scanner(self, name, result, delay):
+        async def scan(path, config, file_size_bytes):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled.append(name)
+                raise
+            return result
+        return scan
+
+    def scan(self, defender, clam_av, defender_handles_suspect=False, config=None):
+        with patch('shuttle.scanning.scan_for_malware_using_defender_async', self.fake_scanner('Defender', *defender)), \
+                patch('shuttle.scanning.scan_for_malware_using_clam_av_async', self.fake_scanner('ClamAV', *clam_av)):
+            start = time.monotonic()
+            result = asyncio.run(scan_and_process_file_async(
+                make_file_data(0), "/key.gpg", "/hazard", False, True, True, defender_handles_suspect,
+                config or make_config()
+            ))
+            return result, time.monotonic() - start
+
+    def test_engines_scan_at_the_same_time(self):
+        """Test that a clean file is scanned by both engines at once and delivered."""
+        result, elapsed = self.scan((scan_result_types.FILE_IS_CLEAN, 0.3), (scan_result_types.FILE_IS_CLEAN, 0.3))
+        self.assertIs(result, self.handle_clean.return_value)
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual(self.cancelled, [])
+
+    def test_engines_scan_one_after_the_other_when_disabled(self):
+        """Test that without concurrent_scan_engines the engines scan in turn."""
+        _, elapsed = self.scan(
+            (scan_result_types.FILE_IS_CLEAN, 0.3),
+            (scan_result_types.FILE_IS_CLEAN, 0.3),
+            config=make_config(concurrent_scan_engines=False)
+        )
+        self.assertGreaterEqual(elapsed, 0.6)
+
+    def test_clam_av_threat_cancels_defender(self):
+        """Test that a ClamAV threat stops Defender's scan and Shuttle handles the file."""
+        result, elapsed = self.scan(
+            (scan_result_types.FILE_IS_CLEAN, 30),
+            (scan_result_types.FILE_IS_SUSPECT, 0),
+            defender_handles_suspect=True
+        )
+        self.assertIs(result, self.handle_suspect.return_value)
+        self.assertEqual(self.cancelled, ['Defender'])
+        self.assertLess(elapsed, 5)
+        # scanner_handling_suspect_file
+        self.assertFalse(self.handle_suspect.call_args[0][5])
+
+    def test_defender_threat_cancels_clam_av(self):
+        """Test that a Defender threat stops ClamAV's scan and Defender handles the file."""
+        result, _ = self.scan(
+            (scan_result_types.FILE_IS_SUSPECT, 0),
+            (scan_result_types.FILE_IS_CLEAN, 30),
+            defender_handles_suspect=True
+        )
+        self.assertIs(result, self.handle_suspect.return_value)
+        self.assertEqual(self.cancelled, ['ClamAV'])
+        self.assertTrue(self.handle_suspect.call_args[0][5])
+
+    def test_clam_av_failure_waits_for_defender(self):
+        """Test that a failed ClamAV scan does not hide a later Defender threat."""
+        result, _ = self.scan((scan_result_types.FILE_IS_SUSPECT, 0.2), (scan_result_types.FILE_SCAN_FAILED, 0))
+        self.assertIs(result, self.handle_suspect.return_value)
+        self.assertEqual(self.cancelled, [])
+
+    def test_one_engine_failing_fails_the_scan(self):
+        """Test that a file is only clean when both engines report it clean."""
+        result, _ = self.scan((scan_result_types.FILE_IS_CLEAN, 0), (scan_result_types.FILE_SCAN_FAILED, 0.1))
+        self.assertFalse(result)
+        self.handle_clean.assert_not_called()
+
+        result, _ = self.scan((scan_result_types.FILE_SCAN_FAILED, 0), (scan_result_types.FILE_IS_CLEAN, 30))
+        self.assertFalse(result)
+        self.assertEqual(self.cancelled, ['ClamAV'])
+
+    def test_timeout_cancels_other_engine(self):
+        """Test that a timed out engine gives a timeout result and stops the other."""
+        async def timed_out(path, config, file_size_bytes):
+            raise ScanTimeoutError(path)
+
+        with patch('shuttle.scanning.scan_for_malware_using_defender_async', timed_out), \
+                patch('shuttle.scanning.scan_for_malware_using_clam_av_async', self.fake_scanner('ClamAV', scan_result_types.FILE_IS_CLEAN, 30)):
+            result = asyncio.run(scan_and_process_file_async(
+                make_file_data(0), "/key.gpg", "/hazard", False, True, True, False, make_config()
+            ))
+        self.assertIsInstance(result, ScanTimeoutResult)
+        self.assertEqual(self.cancelled, ['ClamAV'])
+
+    def test_scans_in_turn_without_event_loop(self):
+        """Test that without concurrent_scan_engines a file is scanned without an event loop, even from inside one."""
+        async def scan_from_event_loop():
+            return scan_and_process_file(
+                make_file_data(0), "/key.gpg", "/hazard", False, True, True, False,
+                make_config(concurrent_scan_engines=False)
+            )
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with patch('shuttle.scanning.scan_for_malware_using_defender', return_value=scan_result_types.FILE_IS_CLEAN), \
+                patch('shuttle.scanning.scan_for_malware_using_clam_av', return_value=scan_result_types.FILE_IS_CLEAN), \
+                patch('shuttle.scanning.asyncio.run', side_effect=AssertionError("event loop started")):
+            result = loop.run_until_complete(scan_from_event_loop())
+
+        self.assertIs(result, self.handle_clean.return_value)
+
+    def test_worker_kills_scanner_process(self):
+        """Test that scanning from a worker stops the slower engine's scanner process."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_path = os.path.join(temp_dir, 'file.txt')
+        with open(file_path, 'w') as f:
+            f.write("content")
+        scanners = {
+            'mdatp': "#!/bin/sh\nexec sleep 30\n",
+            'clamdscan': "#!/bin/sh\nexit 1\n"
+        }
+        for name, script in scanners.items():
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write(script)
+            os.chmod(os.path.join(temp_dir, name), stat.S_IRWXU)
+
+        file_data = (file_path,) + make_file_data(0)[1:]
+        start = time.monotonic()
+        with patch('shuttle_common.scan_utils.DEFENDER_COMMAND', os.path.join(temp_dir, 'mdatp')), \
+                patch.dict(os.environ, {'PATH': temp_dir + os.pathsep + os.environ['PATH']}):
+            result = scan_and_process_file(file_data, "/key.gpg", "/hazard", False, True, True, False, make_config())
+
+        self.assertIs(result, self.handle_suspect.return_value)
+        self.assertLess(time.monotonic() - start, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
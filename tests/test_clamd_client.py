@@ -0,0 +1,142 @@
+"""
+Unit tests for the clamd socket client, run against the clamd simulator.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from shuttle_common.scan_utils import scan_result_types, scan_for_malware_using_clam_av, ScanTimeoutError
+from shuttle_common.clamd_client import ClamdClient, parse_clamd_reply, default_clamd_client
+from clamd_simulator import ClamdSimulator, EICAR_SIGNATURE
+
+
+class TestParseClamdReply(unittest.TestCase):
+
+    def test_replies_map_to_scan_results(self):
+        """Test that only the end of a reply decides the result."""
+        self.assertEqual(parse_clamd_reply("stream: OK"), scan_result_types.FILE_IS_CLEAN)
+        self.assertEqual(parse_clamd_reply("fd[7]: Eicar-Test-Signature FOUND"), scan_result_types.FILE_IS_SUSPECT)
+        self.assertEqual(parse_clamd_reply("/q/OK: FOUND: lstat() failed. ERROR"), scan_result_types.FILE_SCAN_FAILED)
+        self.assertEqual(parse_clamd_reply("INSTREAM size limit exceeded. ERROR"), scan_result_types.FILE_SCAN_FAILED)
+
+
+class TestClamdClient(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, 'clamd.sock')
+        self.server = ClamdSimulator(self.socket_path).start()
+
+        self.files_dir = os.path.join(self.temp_dir, 'files')
+        os.makedirs(self.files_dir)
+        self.clean_file = self.make_file('clean.txt', b'harmless content')
+        self.suspect_file = self.make_file('suspect.txt', b'X5O!P%@AP ' + EICAR_SIGNATURE)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def make_file(self, name, content):
+        path = os.path.join(self.files_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_fildes_and_instream_scans(self):
+        """Test that both single file scan commands report clean and suspect files."""
+        for scan_command in ('FILDES', 'INSTREAM'):
+            client = ClamdClient(self.socket_path, scan_command=scan_command)
+            try:
+                self.assertEqual(client.scan_file(self.clean_file), scan_result_types.FILE_IS_CLEAN)
+                self.assertEqual(client.scan_file(self.suspect_file), scan_result_types.FILE_IS_SUSPECT)
+                self.assertEqual(client.scan_file(os.path.join(self.files_dir, 'missing.txt')), scan_result_types.FILE_NOT_FOUND)
+            finally:
+                client.close()
+
+    def test_sessions_are_reused(self):
+        """Test that sequential scans share one connection."""
+        client = ClamdClient(self.socket_path)
+        try:
+            for _ in range(10):
+                self.assertEqual(client.scan_file(self.clean_file), scan_result_types.FILE_IS_CLEAN)
+        finally:
+            client.close()
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.scans, 10)
+
+    def test_concurrent_scans_limited_to_max_sessions(self):
+        """Test that threads share the pool and never open more than max_sessions."""
+        client = ClamdClient(self.socket_path, max_sessions=3)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda _: client.scan_file(self.clean_file), range(40)))
+        finally:
+            client.close()
+        self.assertTrue(all(result == scan_result_types.FILE_IS_CLEAN for result in results))
+        self.assertLessEqual(self.server.connections, 3)
+
+    def test_closed_session_is_replaced(self):
+        """Test that a session clamd has closed is replaced without failing the scan."""
+        client = ClamdClient(self.socket_path)
+        try:
+            self.assertEqual(client.scan_file(self.clean_file), scan_result_types.FILE_IS_CLEAN)
+            # As clamd does after IdleTimeout
+            client._idle[0].connection.sock.shutdown(2)
+            self.assertEqual(client.scan_file(self.clean_file), scan_result_types.FILE_IS_CLEAN)
+        finally:
+            client.close()
+        self.assertEqual(self.server.connections, 2)
+
+    def test_timeout_raises_scan_timeout(self):
+        """Test that a slow reply raises ScanTimeoutError and the session is not reused."""
+        self.server.delay_seconds = 0.5
+        client = ClamdClient(self.socket_path)
+        try:
+            with self.assertRaises(ScanTimeoutError):
+                client.scan_file(self.clean_file, timeout_seconds=0.1)
+            self.assertEqual(client._idle, [])
+        finally:
+            client.close()
+
+    def test_directory_scan(self):
+        """Test that MULTISCAN and CONTSCAN report the files with threats."""
+        client = ClamdClient(self.socket_path)
+        for command in ('MULTISCAN', 'CONTSCAN'):
+            result, findings = client.scan_directory(self.files_dir, command=command)
+            self.assertEqual(result, scan_result_types.FILE_IS_SUSPECT)
+            self.assertEqual(findings, {self.suspect_file: scan_result_types.FILE_IS_SUSPECT})
+
+        os.remove(self.suspect_file)
+        self.assertEqual(client.scan_directory(self.files_dir), (scan_result_types.FILE_IS_CLEAN, {}))
+
+    def test_versions(self):
+        """Test that versions are read with VERSION."""
+        client = ClamdClient(self.socket_path)
+        try:
+            self.assertEqual(client.get_versions(), ('1.0.0', '27000'))
+        finally:
+            client.close()
+
+    def test_scan_for_malware_using_clam_av_uses_configured_client(self):
+        """Test that ClamAV scans go to clamd when the default client is configured."""
+        config = SimpleNamespace(
+            malware_scan_timeout_seconds=10,
+            malware_scan_timeout_ms_per_byte=0.0,
+            malware_scan_retry_wait_seconds=0,
+            malware_scan_retry_count=1
+        )
+        default_clamd_client.configure(self.socket_path)
+        try:
+            self.assertEqual(scan_for_malware_using_clam_av(self.suspect_file, config), scan_result_types.FILE_IS_SUSPECT)
+        finally:
+            default_clamd_client.configure(None)
+        self.assertEqual(self.server.scans, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
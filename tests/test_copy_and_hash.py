@@ -0,0 +1,186 @@
+"""
+Unit tests for copying a file and hashing it from the same read.
+"""
+
+import unittest
+import os
+import hashlib
+import tempfile
+import shutil
+from unittest.mock import patch
+
+from shuttle_common.files import (
+    copy_and_hash_temp_then_rename,
+    FileIntegrityError,
+    COPY_BUFFER_SIZE,
+    get_source_identity
+)
+from shuttle_common.hash_engine import default_hash_engine
+from shuttle.post_scan_processing import handle_clean_file
+
+
+class TestCopyAndHash(unittest.TestCase):
+
+    def setUp(self):
+        """Create a source file larger than the copy buffer."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.content = os.urandom(COPY_BUFFER_SIZE * 2 + 123)
+        self.expected_hash = hashlib.sha256(self.content).hexdigest()
+        self.source_file = os.path.join(self.temp_dir, "source", "file.bin")
+        os.makedirs(os.path.dirname(self.source_file))
+        with open(self.source_file, "wb") as f:
+            f.write(self.content)
+        os.utime(self.source_file, ns=(1_600_000_000_123_456_789, 1_600_000_000_123_456_789))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_copy_returns_hash_of_contents(self):
+        """Test that the returned hash is the SHA-256 of the copied bytes and metadata is kept."""
+        destination_file = os.path.join(self.temp_dir, "quarantine", "sub", "file.bin")
+        file_hash = copy_and_hash_temp_then_rename(self.source_file, destination_file)
+
+        self.assertEqual(file_hash, self.expected_hash)
+        with open(destination_file, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.stat(destination_file).st_mtime_ns, os.stat(self.source_file).st_mtime_ns)
+        self.assertFalse(os.path.exists(destination_file + ".copying"))
+
+    def test_secondary_digest_from_same_copy(self):
+        """Test that a secondary algorithm is computed from the copy, and an explicit algorithm overrides both."""
+        destination_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        digests = {}
+        default_hash_engine.set_algorithms('blake2b', 'sha256')
+        try:
+            file_hash = copy_and_hash_temp_then_rename(self.source_file, destination_file, digests=digests)
+            sha256_hash = copy_and_hash_temp_then_rename(self.source_file, destination_file, algorithm='sha256')
+        finally:
+            default_hash_engine.set_algorithms('sha256')
+
+        self.assertEqual(file_hash, hashlib.blake2b(self.content).hexdigest())
+        self.assertEqual(digests, {'blake2b': file_hash, 'sha256': self.expected_hash})
+        self.assertEqual(sha256_hash, self.expected_hash)
+
+    def test_empty_file(self):
+        """Test that an empty file copies with the hash of no bytes."""
+        empty_file = os.path.join(self.temp_dir, "empty")
+        open(empty_file, "wb").close()
+        file_hash = copy_and_hash_temp_then_rename(empty_file, os.path.join(self.temp_dir, "copy"))
+        self.assertEqual(file_hash, hashlib.sha256(b"").hexdigest())
+
+    def test_mismatched_hash_is_not_delivered(self):
+        """Test that a copy not matching the expected hash is never renamed into place."""
+        destination_file = os.path.join(self.temp_dir, "destination", "file.bin")
+        with self.assertRaises(FileIntegrityError):
+            copy_and_hash_temp_then_rename(self.source_file, destination_file, expected_hash="0" * 64)
+
+        self.assertFalse(os.path.exists(destination_file))
+        self.assertFalse(os.path.exists(destination_file + ".copying"))
+
+    def test_clean_file_delivered_and_source_removed(self):
+        """Test that a clean file is delivered and its unchanged source deleted."""
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+        destination_file = os.path.join(self.temp_dir, "destination", "file.bin")
+
+        result = handle_clean_file(quarantine_file, self.source_file, destination_file, True, quarantine_hash)
+
+        self.assertTrue(result)
+        self.assertFalse(os.path.exists(self.source_file))
+        with open(destination_file, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_changed_source_not_removed(self):
+        """Test that a source modified after it was quarantined is not deleted."""
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+        with open(self.source_file, "ab") as f:
+            f.write(b"more")
+
+        result = handle_clean_file(quarantine_file, self.source_file,
+                                   os.path.join(self.temp_dir, "destination", "file.bin"), True, quarantine_hash)
+
+        self.assertFalse(result)
+        self.assertTrue(os.path.exists(self.source_file))
+
+    def test_clean_file_renamed_on_same_filesystem(self):
+        """Test that a clean file is renamed into the destination instead of copied."""
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+        quarantine_inode = os.stat(quarantine_file).st_ino
+        destination_file = os.path.join(self.temp_dir, "destination", "sub", "file.bin")
+
+        with patch('shuttle.post_scan_processing.copy_and_hash_temp_then_rename') as copy:
+            result = handle_clean_file(quarantine_file, self.source_file, destination_file, True, quarantine_hash,
+                                       rename_to_destination=True)
+
+        self.assertTrue(result)
+        copy.assert_not_called()
+        self.assertFalse(os.path.exists(quarantine_file))
+        self.assertFalse(os.path.exists(self.source_file))
+        self.assertFalse(os.path.exists(destination_file + ".copying"))
+        self.assertEqual(os.stat(destination_file).st_ino, quarantine_inode)
+
+    def test_clean_file_copied_across_filesystems(self):
+        """Test that a clean file is copied when quarantine and destination are on different filesystems."""
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+        destination_file = os.path.join(self.temp_dir, "destination", "file.bin")
+
+        with patch('shuttle_common.files.is_same_filesystem', return_value=False):
+            result = handle_clean_file(quarantine_file, self.source_file, destination_file, False, quarantine_hash,
+                                       rename_to_destination=True)
+
+        self.assertTrue(result)
+        self.assertTrue(os.path.exists(quarantine_file))
+        with open(destination_file, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_unchanged_source_removed_without_reading_it(self):
+        """Test that a source with the identity it had when copied is deleted without hashing it again."""
+        source_identity = get_source_identity(self.source_file)
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+
+        with patch('shuttle.post_scan_processing.get_file_hash') as get_file_hash:
+            result = handle_clean_file(quarantine_file, self.source_file,
+                                       os.path.join(self.temp_dir, "destination", "file.bin"), True, quarantine_hash,
+                                       source_identity=source_identity)
+
+        self.assertTrue(result)
+        get_file_hash.assert_not_called()
+        self.assertFalse(os.path.exists(self.source_file))
+
+    def test_touched_source_not_removed(self):
+        """Test that a source whose identity changed after it was copied is not deleted."""
+        source_identity = get_source_identity(self.source_file)
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+        os.utime(self.source_file, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+
+        result = handle_clean_file(quarantine_file, self.source_file,
+                                   os.path.join(self.temp_dir, "destination", "file.bin"), True, quarantine_hash,
+                                   source_identity=source_identity)
+
+        self.assertFalse(result)
+        self.assertTrue(os.path.exists(self.source_file))
+
+    def test_rehash_source_reads_source_again(self):
+        """Test that rehash_source verifies the source by reading it, ignoring cached hashes."""
+        source_identity = get_source_identity(self.source_file)
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "file.bin")
+        quarantine_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+
+        with patch('shuttle.post_scan_processing.get_file_hash', return_value=quarantine_hash) as get_file_hash:
+            result = handle_clean_file(quarantine_file, self.source_file,
+                                       os.path.join(self.temp_dir, "destination", "file.bin"), True, quarantine_hash,
+                                       source_identity=source_identity, rehash_source=True)
+
+        self.assertTrue(result)
+        get_file_hash.assert_called_once_with(self.source_file, use_cache=False, algorithm=None)
+        self.assertFalse(os.path.exists(self.source_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
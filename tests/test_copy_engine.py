@@ -0,0 +1,138 @@
+"""
+Unit tests for the CopyEngine that picks the fastest working copy mechanism.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import hashlib
+from unittest.mock import patch
+
+from shuttle_common import copy_engine
+from shuttle_common.copy_engine import (
+    CopyEngine,
+    CopyMechanismUnsupported,
+    COPY_MECHANISMS,
+    COPY_MECHANISM_REFLINK,
+    COPY_MECHANISM_READINTO
+)
+from shuttle_common.files import copy_temp_then_rename, copy_file_with_digests, KERNEL_COPY_MECHANISMS
+
+
+def unsupported(source_fd, target_fd, size):
+    raise CopyMechanismUnsupported("not supported in this test")
+
+
+class TestCopyEngine(unittest.TestCase):
+
+    def setUp(self):
+        """Create a source file larger than the copy buffers."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.content = os.urandom(copy_engine.READINTO_BUFFER_SIZE * 2 + 321)
+        self.source_file = os.path.join(self.temp_dir, "source.bin")
+        with open(self.source_file, "wb") as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def assert_copied(self, path):
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_each_mechanism_copies_or_reports_unsupported(self):
+        """Test that every mechanism either copies the whole file or falls back cleanly."""
+        for mechanism in COPY_MECHANISMS:
+            with self.subTest(mechanism=mechanism):
+                engine = CopyEngine()
+                target = os.path.join(self.temp_dir, f"{mechanism}.bin")
+                used = engine.copy(self.source_file, target, mechanisms=(mechanism,))
+                if used is None:
+                    self.assertEqual(os.path.getsize(target), 0)
+                else:
+                    self.assertEqual(used, mechanism)
+                    self.assert_copied(target)
+
+    def test_falls_back_to_readinto(self):
+        """Test that the copy falls back to readinto when nothing faster works."""
+        faster = {mechanism: unsupported for mechanism in COPY_MECHANISMS if mechanism != COPY_MECHANISM_READINTO}
+        with patch.dict(copy_engine._COPY_FUNCTIONS, faster):
+            engine = CopyEngine()
+            target = os.path.join(self.temp_dir, "copy.bin")
+            self.assertEqual(engine.copy(self.source_file, target), COPY_MECHANISM_READINTO)
+        self.assert_copied(target)
+
+    def test_unsupported_mechanism_remembered_per_device_pair(self):
+        """Test that a mechanism failing for a device pair is not tried again for that pair."""
+        reflink_calls = []
+
+        def failing_reflink(source_fd, target_fd, size):
+            reflink_calls.append(source_fd)
+            raise CopyMechanismUnsupported("not supported in this test")
+
+        with patch.dict(copy_engine._COPY_FUNCTIONS, {COPY_MECHANISM_REFLINK: failing_reflink}):
+            engine = CopyEngine()
+            for index in range(3):
+                target = os.path.join(self.temp_dir, f"copy{index}.bin")
+                used = engine.copy(self.source_file, target)
+                self.assert_copied(target)
+
+        self.assertEqual(len(reflink_calls), 1)
+        dev = os.stat(self.temp_dir).st_dev
+        self.assertEqual(engine.get_mechanism(dev, dev), used)
+        self.assertIsNone(engine.get_mechanism(dev, dev + 1))
+        self.assertEqual(engine.mechanism_counts[used], 3)
+
+    def test_restricted_copy_does_not_block_other_mechanisms(self):
+        """Test that an unsupported restricted copy still leaves the other mechanisms available."""
+        with patch.dict(copy_engine._COPY_FUNCTIONS, {COPY_MECHANISM_REFLINK: unsupported}):
+            engine = CopyEngine()
+            target = os.path.join(self.temp_dir, "copy.bin")
+            self.assertIsNone(engine.copy(self.source_file, target, mechanisms=(COPY_MECHANISM_REFLINK,)))
+            self.assertIsNotNone(engine.copy(self.source_file, target))
+        self.assert_copied(target)
+
+    def test_copy_temp_then_rename_uses_engine(self):
+        """Test that copy_temp_then_rename copies contents and metadata and leaves no temporary file."""
+        os.utime(self.source_file, ns=(1_600_000_000_123_456_789, 1_600_000_000_123_456_789))
+        target = os.path.join(self.temp_dir, "destination", "copy.bin")
+
+        mechanism = copy_temp_then_rename(self.source_file, target)
+
+        self.assertIn(mechanism, COPY_MECHANISMS)
+        self.assert_copied(target)
+        self.assertEqual(os.stat(target).st_mtime_ns, os.stat(self.source_file).st_mtime_ns)
+        self.assertFalse(os.path.exists(target + ".copying"))
+
+    def test_copy_with_digests_uses_kernel_copy(self):
+        """Test that copying with digests copies in the kernel where it can, and hashes the copy."""
+        engine = CopyEngine()
+        target = os.path.join(self.temp_dir, "copy.bin")
+        with patch('shuttle_common.files.default_copy_engine', engine):
+            digests = copy_file_with_digests(self.source_file, target, ('sha256',))
+
+        self.assertEqual(digests, {'sha256': hashlib.sha256(self.content).hexdigest()})
+        self.assert_copied(target)
+        dev = os.stat(self.source_file).st_dev
+        self.assertIn(engine.get_mechanism(dev, dev), KERNEL_COPY_MECHANISMS)
+
+    def test_copy_with_digests_without_kernel_copy(self):
+        """Test that the bytes are hashed in a userspace copy when no kernel copy works."""
+        engine = CopyEngine()
+        target = os.path.join(self.temp_dir, "copy.bin")
+        with patch.dict(copy_engine._COPY_FUNCTIONS, {mechanism: unsupported for mechanism in KERNEL_COPY_MECHANISMS}), \
+                patch('shuttle_common.files.default_copy_engine', engine):
+            digests = copy_file_with_digests(self.source_file, target, ('sha256', 'blake2b'))
+
+        self.assertEqual(digests, {
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+            'blake2b': hashlib.blake2b(self.content).hexdigest()
+        })
+        self.assert_copied(target)
+        self.assertEqual(sum(engine.mechanism_counts.values()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,9 @@ import shutil
 import yaml
 from datetime import datetime
 
+from unittest.mock import patch
+
+from shuttle_common.hash_engine import HashEngine
 from shuttle.daily_processing_tracker import DailyProcessingTracker
 
 
@@ -75,8 +78,39 @@ class TestDailyProcessingTracker(unittest.TestCase):
         self.assertEqual(record['file_size_mb'], self.file_size_mb)
         self.assertEqual(record['status'], 'pending')
         self.assertEqual(record['file_hash'], self.file_hash)
+        self.assertEqual(record['hash_algorithm'], 'sha256')
+        self.assertNotIn('secondary_hashes', record)
         self.assertIsNotNone(record['quarantine_time'])
         
+    def test_add_pending_file_with_secondary_hash(self):
+        """Test that the hash algorithm and secondary hashes are recorded with the file."""
+        self.tracker.add_pending_file(
+            file_path=self.file_path,
+            file_size_mb=self.file_size_mb,
+            file_hash=self.file_hash,
+            source_path=self.source_path,
+            relative_file_path=self.relative_file_path,
+            hash_algorithm='blake2b',
+            secondary_hashes={'sha256': 'sha256_hash'}
+        )
+        
+        record = self.tracker.file_records[self.relative_file_path]
+        self.assertEqual(record['hash_algorithm'], 'blake2b')
+        self.assertEqual(record['secondary_hashes'], {'sha256': 'sha256_hash'})
+        
+    def test_add_pending_file_records_configured_algorithm(self):
+        """Test that a file added without its algorithm records the configured hash algorithm."""
+        with patch('shuttle.daily_processing_tracker.default_hash_engine', HashEngine(algorithm='sha512')):
+            self.tracker.add_pending_file(
+                file_path=self.file_path,
+                file_size_mb=self.file_size_mb,
+                file_hash=self.file_hash,
+                source_path=self.source_path,
+                relative_file_path=self.relative_file_path
+            )
+        
+        self.assertEqual(self.tracker.file_records[self.relative_file_path]['hash_algorithm'], 'sha512')
+        
     def test_complete_pending_file_success(self):
         """Test completing a pending file as successful."""
         # Add a pending file first
@@ -0,0 +1,191 @@
+"""
+Unit tests for scanning small quarantined files in Defender batches.
+"""
+
+import unittest
+import os
+import stat
+import tempfile
+import shutil
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from shuttle_common.scan_utils import (
+    scan_result_types,
+    parse_defender_batch_scan_result,
+    ScanTimeoutError
+)
+from shuttle.defender_batch_scan import (
+    plan_defender_batches,
+    scan_defender_batch,
+    scan_defender_batches,
+    BATCH_DIRECTORY_PREFIX
+)
+from shuttle.scanning import scan_and_process_file
+from scan_test_helpers import make_file_data
+
+
+CLEAN_OUTPUT = "Scan has started\nScan has finished\n\t{count} file(s) scanned\n\t0 threat(s) detected\n"
+FAKE_MDATP = """#!/bin/sh
+# Scans the files in the directory given last, reporting those that contain EICAR as threats
+for path; do :; done
+count=0
+threats=""
+for file in "$path"/*; do
+    count=$((count + 1))
+    if grep -q EICAR "$file"; then threats="$threats\t\t$file\n"; fi
+done
+printf 'Scan has started\nScan has finished\n\t%s file(s) scanned\n' "$count"
+if [ -n "$threats" ]; then
+    printf '\t1 threat(s) detected\nThreat(s) found\n'
+    printf "$threats"
+else
+    printf '\t0 threat(s) detected\n'
+fi
+"""
+THREAT_OUTPUT = (
+    "Scan has started\nScan has finished\n\t{count} file(s) scanned\n\t1 threat(s) detected\n"
+    "Threat(s) found\n\tThreat(s) found\n\t\"EICAR-Test-File (not a virus)\"\n\t\t{path}\n"
+)
+
+
+class TestPlanDefenderBatches(unittest.TestCase):
+
+    def test_batches_limited_by_count_and_size(self):
+        """Test that batches are split at the file count and byte limits."""
+        files = [make_file_data(i) for i in range(7)]
+        batches = plan_defender_batches(files, max_files=3, max_bytes=1000)
+        self.assertEqual([len(batch) for batch in batches], [3, 3])
+
+        batches = plan_defender_batches(files, max_files=10, max_bytes=250)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 2])
+
+    def test_large_files_and_single_file_batches_left_out(self):
+        """Test that files over the byte limit, and batches of one, are scanned on their own."""
+        files = [
+            make_file_data(0, size=10),
+            make_file_data(1, size=5000),
+            make_file_data(2, size=10),
+            make_file_data(3, size=10)
+        ]
+        batches = plan_defender_batches(files, max_files=2, max_bytes=100)
+        self.assertEqual(batches, [[files[0], files[2]]])
+
+
+class TestParseDefenderBatchScanResult(unittest.TestCase):
+
+    def test_clean_batch_marks_every_file_clean(self):
+        """Test that a clean batch gives every file a clean verdict."""
+        entries = ["/q/batch/000000", "/q/batch/000001"]
+        verdicts = parse_defender_batch_scan_result(0, CLEAN_OUTPUT.format(count=2), entries)
+        self.assertEqual(verdicts, {path: scan_result_types.FILE_IS_CLEAN for path in entries})
+
+    def test_incomplete_batch_gives_no_verdicts(self):
+        """Test that no file is clean if Defender scanned fewer files than the batch holds."""
+        entries = ["/q/batch/000000", "/q/batch/000001"]
+        self.assertEqual(parse_defender_batch_scan_result(0, CLEAN_OUTPUT.format(count=1), entries), {})
+
+    def test_threat_names_only_suspect_files(self):
+        """Test that only the files named in the threat report get a verdict."""
+        entries = ["/q/batch/000000", "/q/batch/000001", "/q/batch/000002"]
+        output = THREAT_OUTPUT.format(count=3, path=entries[1])
+        verdicts = parse_defender_batch_scan_result(0, output, entries)
+        self.assertEqual(verdicts, {entries[1]: scan_result_types.FILE_IS_SUSPECT})
+
+    def test_failed_scan_gives_no_verdicts(self):
+        """Test that a failed batch scan leaves every file to be scanned on its own."""
+        self.assertEqual(parse_defender_batch_scan_result(2, "", ["/q/batch/000000"]), {})
+
+
+class TestScanDefenderBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.quarantine_path = tempfile.mkdtemp()
+        self.files = []
+        for index in range(3):
+            path = os.path.join(self.quarantine_path, f"file{index}.txt")
+            with open(path, 'w') as f:
+                f.write("content")
+            self.files.append(make_file_data(index, size=7, quarantine_path=path))
+
+    def tearDown(self):
+        shutil.rmtree(self.quarantine_path)
+
+    def test_verdicts_mapped_to_quarantine_files(self):
+        """Test that verdicts for the linked entries are returned for the quarantined files and the batch is removed."""
+        def fake_batch_scan(batch_directory, entry_paths, config, total_size_bytes):
+            self.assertEqual(sorted(os.listdir(batch_directory)), ["000000", "000001", "000002"])
+            self.assertEqual(total_size_bytes, 21)
+            output = THREAT_OUTPUT.format(count=3, path=entry_paths[2])
+            return parse_defender_batch_scan_result(0, output, entry_paths)
+
+        with patch('shuttle.defender_batch_scan.scan_batch_for_malware_using_defender', side_effect=fake_batch_scan):
+            verdicts = scan_defender_batch(self.files, self.quarantine_path)
+
+        self.assertEqual(verdicts, {self.files[2][0]: scan_result_types.FILE_IS_SUSPECT})
+        self.assertFalse(any(name.startswith(BATCH_DIRECTORY_PREFIX) for name in os.listdir(self.quarantine_path)))
+
+    def test_timeout_gives_no_verdicts(self):
+        """Test that a batch that timed out leaves its files to be scanned on their own."""
+        with patch('shuttle.defender_batch_scan.scan_batch_for_malware_using_defender', side_effect=ScanTimeoutError("timeout")):
+            self.assertEqual(scan_defender_batch(self.files, self.quarantine_path), {})
+        self.assertEqual(len(os.listdir(self.quarantine_path)), 3)
+
+    def test_batch_scanned_with_defender_command(self):
+        """Test that a batch directory passes the path checks and the scanner output is mapped to its files."""
+        mdatp = os.path.join(self.quarantine_path, 'mdatp')
+        with open(mdatp, 'w') as f:
+            f.write(FAKE_MDATP)
+        os.chmod(mdatp, stat.S_IRWXU)
+        with open(self.files[1][0], 'w') as f:
+            f.write("EICAR")
+
+        with patch('shuttle_common.scan_utils.DEFENDER_COMMAND', mdatp):
+            verdicts = scan_defender_batch(self.files, self.quarantine_path)
+            self.assertEqual(verdicts, {self.files[1][0]: scan_result_types.FILE_IS_SUSPECT})
+
+            verdicts = scan_defender_batch([self.files[0], self.files[2]], self.quarantine_path)
+            self.assertEqual(verdicts, {
+                self.files[0][0]: scan_result_types.FILE_IS_CLEAN,
+                self.files[2][0]: scan_result_types.FILE_IS_CLEAN
+            })
+
+    def test_scan_defender_batches_without_config(self):
+        """Test that the default batch limits are used when there is no config."""
+        with patch('shuttle.defender_batch_scan.scan_defender_batch', return_value={}) as scan:
+            scan_defender_batches(self.files, self.quarantine_path, 1, None)
+
+        scan.assert_called_once_with(self.files, self.quarantine_path, None)
+
+    def test_scan_defender_batches_uses_config_limits(self):
+        """Test that batches are planned from the config limits and their verdicts combined."""
+        config = SimpleNamespace(hash_algorithm=None, defender_batch_scan_max_files=2, defender_batch_scan_max_mb=1)
+
+        def fake_scan_defender_batch(batch, quarantine_path, config):
+            return {file_data[0]: scan_result_types.FILE_IS_CLEAN for file_data in batch}
+
+        with patch('shuttle.defender_batch_scan.scan_defender_batch', side_effect=fake_scan_defender_batch) as scan:
+            verdicts = scan_defender_batches(self.files, self.quarantine_path, 1, config)
+
+        # The third file would be a batch of one, it is scanned on its own
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual(verdicts, {file_data[0]: scan_result_types.FILE_IS_CLEAN for file_data in self.files[:2]})
+
+
+class TestBatchVerdictInScanAndProcessFile(unittest.TestCase):
+
+    def test_batch_verdict_skips_defender_scan(self):
+        """Test that a file with a batch verdict is not scanned again and suspects are handled by Shuttle."""
+        file_data = make_file_data(0)
+        with patch('shuttle.scanning.scan_for_malware_using_defender') as scan, \
+                patch('shuttle.scanning.handle_suspect_scan_result') as handle_suspect:
+            scan_and_process_file(file_data, "/key.gpg", "/hazard", False, True, False, True,
+                                  batch_defender_result=scan_result_types.FILE_IS_SUSPECT)
+
+        scan.assert_not_called()
+        # Defender only saw a link to the file, so it cannot be left to handle it
+        self.assertFalse(handle_suspect.call_args[0][5])
+
+
+if __name__ == '__main__':
+    unittest.main()
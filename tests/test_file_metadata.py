@@ -0,0 +1,76 @@
+"""
+Unit tests for the stat-once FileMetadata walker and the checks that use it.
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+from unittest.mock import patch
+
+from shuttle_common.files import (
+    FileMetadata,
+    get_file_metadata,
+    iter_files_with_metadata,
+    is_path_stable
+)
+
+
+class TestFileMetadata(unittest.TestCase):
+
+    def setUp(self):
+        """Create a small directory tree."""
+        self.temp_dir = tempfile.mkdtemp()
+        for relative_path in ("top.txt", "a/one.txt", "a/b/two.txt", "c/three.txt"):
+            file_path = os.path.join(self.temp_dir, relative_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(relative_path)
+
+    def tearDown(self):
+        """Remove the temporary tree."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_walk_matches_os_walk_bottom_up(self):
+        """Test that the scandir walker visits files in os.walk(topdown=False) order."""
+        expected = [
+            (root, name)
+            for root, _, files in os.walk(self.temp_dir, topdown=False)
+            for name in files
+        ]
+        walked = [(root, name) for root, name, _ in iter_files_with_metadata(self.temp_dir)]
+
+        self.assertEqual(sorted(walked), sorted(expected))
+        self.assertEqual([root for root, _ in walked], [root for root, _ in expected])
+
+    def test_walk_metadata_matches_stat(self):
+        """Test that the metadata yielded by the walker matches os.stat."""
+        for root, name, file_metadata in iter_files_with_metadata(self.temp_dir):
+            st = os.stat(os.path.join(root, name))
+            self.assertEqual(file_metadata, FileMetadata(st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev))
+
+    def test_walk_skips_symlinked_directories(self):
+        """Test that symbolic links to directories are not followed."""
+        os.symlink(os.path.join(self.temp_dir, "a"), os.path.join(self.temp_dir, "link"))
+        walked = [os.path.relpath(os.path.join(root, name), self.temp_dir)
+                  for root, name, _ in iter_files_with_metadata(self.temp_dir)]
+        self.assertNotIn(os.path.join("link", "one.txt"), walked)
+
+    def test_missing_file_has_no_metadata(self):
+        """Test that metadata for a missing file is None."""
+        self.assertIsNone(get_file_metadata(os.path.join(self.temp_dir, "missing.txt")))
+
+    def test_stability_uses_metadata_without_stat(self):
+        """Test that is_path_stable uses supplied metadata instead of stat'ing the file."""
+        file_path = os.path.join(self.temp_dir, "top.txt")
+        old = FileMetadata(size=1, mtime_ns=int((time.time() - 60) * 1e9), inode=1, dev=1)
+        new = old._replace(mtime_ns=int(time.time() * 1e9))
+
+        with patch('os.path.getmtime', side_effect=AssertionError("unexpected stat")):
+            self.assertTrue(is_path_stable(file_path, 5, old))
+            self.assertFalse(is_path_stable(file_path, 5, new))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the HashCache that remembers file hashes by file identity.
+"""
+
+import unittest
+import os
+import hashlib
+import tempfile
+import shutil
+from unittest.mock import patch
+
+from shuttle_common.hash_cache import HashCache, default_hash_cache, get_file_identity
+from shuttle_common.files import get_file_hash, copy_and_hash_temp_then_rename
+
+
+OLD_MTIME_NS = 1_600_000_000_000_000_000
+
+
+class TestHashCache(unittest.TestCase):
+
+    def setUp(self):
+        """Create a source file with an old modification time."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_file = os.path.join(self.temp_dir, "source.bin")
+        self.content = os.urandom(50000)
+        with open(self.source_file, "wb") as f:
+            f.write(self.content)
+        os.utime(self.source_file, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+        default_hash_cache.clear()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        default_hash_cache.clear()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used digest is evicted first."""
+        cache = HashCache(max_entries=2)
+        cache.put((1, 1, 1, 1), "a")
+        cache.put((1, 2, 1, 1), "b")
+        cache.get((1, 1, 1, 1))
+        cache.put((1, 3, 1, 1), "c")
+
+        self.assertEqual(cache.get((1, 1, 1, 1)), "a")
+        self.assertIsNone(cache.get((1, 2, 1, 1)))
+        self.assertEqual(cache.get((1, 3, 1, 1)), "c")
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_changed_or_recent_files_not_stored(self):
+        """Test that files changed while read, or modified just now, are not cached."""
+        cache = HashCache()
+        self.assertFalse(cache.put((1, 1, 10, 1), "a", stat_before=(1, 1, 5, 1)))
+        recent = os.stat(self.temp_dir).st_mtime_ns
+        self.assertFalse(cache.put((1, 1, 10, recent), "a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_get_file_hash_reads_unchanged_file_once(self):
+        """Test that an unchanged file is hashed from the cache, and a modified one is read again."""
+        expected = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(get_file_hash(self.source_file), expected)
+
+        with patch('shuttle_common.files.hashlib.sha256') as sha256:
+            self.assertEqual(get_file_hash(self.source_file), expected)
+            sha256.return_value.update.assert_not_called()
+
+        with open(self.source_file, "ab") as f:
+            f.write(b"more")
+        os.utime(self.source_file, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+        self.assertEqual(get_file_hash(self.source_file), hashlib.sha256(self.content + b"more").hexdigest())
+
+    def test_copy_remembers_source_and_copy(self):
+        """Test that hashing while copying caches the digest for both files."""
+        quarantine_file = os.path.join(self.temp_dir, "quarantine", "source.bin")
+        file_hash = copy_and_hash_temp_then_rename(self.source_file, quarantine_file)
+
+        self.assertEqual(default_hash_cache.get(get_file_identity(os.stat(self.source_file))), file_hash)
+        self.assertEqual(default_hash_cache.get(get_file_identity(os.stat(quarantine_file))), file_hash)
+
+    def test_save_and_load(self):
+        """Test that saved digests are loaded by another cache, most recently used kept."""
+        database_file = os.path.join(self.temp_dir, "data", "hash_cache.sqlite3")
+        cache = HashCache()
+        for inode in range(5):
+            cache.put((1, inode, 1, 1), f"digest{inode}")
+        self.assertTrue(cache.save(database_file))
+
+        loaded = HashCache(max_entries=2)
+        self.assertEqual(loaded.load(database_file), 2)
+        self.assertEqual(loaded.get((1, 4, 1, 1)), "digest4")
+        self.assertEqual(loaded.get((1, 3, 1, 1)), "digest3")
+        self.assertIsNone(loaded.get((1, 2, 1, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Unit tests for the HashEngine read, mmap and thread pool hashing paths.
+"""
+
+import unittest
+import os
+import hashlib
+import tempfile
+import shutil
+
+from shuttle_common.hash_engine import HashEngine
+
+
+class TestHashEngine(unittest.TestCase):
+
+    def setUp(self):
+        """Create files of a few sizes around the buffer size."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.buffer_size = 64 * 1024
+        self.files = {}
+        for size in (0, 1, self.buffer_size - 1, self.buffer_size, self.buffer_size * 3 + 7):
+            content = os.urandom(size)
+            path = os.path.join(self.temp_dir, f"file{size}.bin")
+            with open(path, "wb") as f:
+                f.write(content)
+            self.files[path] = hashlib.sha256(content).hexdigest()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_every_path_matches_hashlib(self):
+        """Test that readinto, mmap and file_digest hashing all give the hashlib digest."""
+        engines = {
+            'readinto': HashEngine(buffer_size=self.buffer_size),
+            'mmap': HashEngine(buffer_size=self.buffer_size, use_mmap=True),
+            'file_digest': HashEngine(use_file_digest=True),
+        }
+        for name, engine in engines.items():
+            for path, expected in self.files.items():
+                with self.subTest(engine=name, path=os.path.basename(path)):
+                    self.assertEqual(engine.hash_file(path), expected)
+
+    def test_algorithms(self):
+        """Test that the configured algorithm is used, and several can be computed from one read."""
+        engine = HashEngine(buffer_size=self.buffer_size, algorithm='blake2b', secondary_algorithm='sha256')
+        path = max(self.files, key=os.path.getsize)
+        with open(path, "rb") as f:
+            content = f.read()
+
+        self.assertEqual(engine.hash_file(path), hashlib.blake2b(content).hexdigest())
+        with open(path, "rb", buffering=0) as f:
+            digests = engine.hash_open_file_with_algorithms(f, engine.algorithms)
+        self.assertEqual(digests, {'blake2b': hashlib.blake2b(content).hexdigest(), 'sha256': self.files[path]})
+
+        with self.assertRaises(ValueError):
+            engine.set_algorithms('md5')
+
+    def test_hash_files_in_parallel(self):
+        """Test that hash_files hashes every file and returns None for missing ones."""
+        engine = HashEngine(buffer_size=self.buffer_size, max_workers=3)
+        missing = os.path.join(self.temp_dir, "missing.bin")
+
+        hashes = engine.hash_files(list(self.files) + [missing])
+
+        self.assertEqual({path: hashes[path] for path in self.files}, self.files)
+        self.assertIsNone(hashes[missing])
+
+
+if __name__ == '__main__':
+    unittest.main()
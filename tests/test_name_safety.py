@@ -0,0 +1,97 @@
+"""
+Unit tests for filename and path safety checks.
+"""
+
+import unittest
+import itertools
+from unittest.mock import patch
+
+from shuttle_common import files
+from shuttle_common.files import (
+    is_name_safe,
+    are_file_and_path_names_safe,
+    find_unsafe_filenames,
+    NameSafetyValidator
+)
+
+
+def reference_is_name_safe(name, is_path=False):
+    """The original character by character check, kept to compare results against."""
+    if any(ord(char) < 32 or ord(char) == 0x7F for char in name):
+        return False
+    dangerous_chars = ['\\', '..', '>', '<', '|', '*', '$', '&', ';', '`']
+    if not is_path:
+        dangerous_chars.append('/')
+    for char in dangerous_chars:
+        if char in name:
+            return False
+    check_name = name
+    if is_path and '/' in name:
+        check_name = name.rstrip('/').split('/')[-1]
+    if check_name not in ['.', '..'] and (check_name.startswith('-') or check_name.startswith('.')):
+        return False
+    try:
+        name.encode('utf-8').decode('utf-8')
+    except UnicodeError:
+        return False
+    return True
+
+
+# Building blocks for generated names, including every unsafe character
+NAME_PARTS = ['a', 'é', '文件', ' ', '.', '-', '/', '\\', '>', '<', '|', '*', '$',
+              '&', ';', '`', '\x00', '\x1f', '\x7f', '\udcff', '_']
+
+
+class TestNameSafety(unittest.TestCase):
+
+    def test_matches_reference_check(self):
+        """Test that the compiled check gives the same result as the original for all short names."""
+        for length in range(1, 4):
+            for parts in itertools.product(NAME_PARTS, repeat=length):
+                name = ''.join(parts)
+                for is_path in (False, True):
+                    self.assertEqual(
+                        is_name_safe(name, is_path),
+                        reference_is_name_safe(name, is_path),
+                        f"{name!r} is_path={is_path}"
+                    )
+
+    def test_find_unsafe_filenames(self):
+        """Test that a listing is checked in one go, reporting only the unsafe names."""
+        self.assertEqual(find_unsafe_filenames(['report.pdf', 'données.csv', 'a-b.txt']), [])
+        self.assertEqual(
+            find_unsafe_filenames(['ok.txt', '.hidden', 'a..b', '-rf', 'tab\tname', 'fine-', 'b$c']),
+            ['.hidden', 'a..b', '-rf', 'tab\tname', 'b$c']
+        )
+
+    def test_validator_matches_function(self):
+        """Test that the validator agrees with are_file_and_path_names_safe."""
+        validator = NameSafetyValidator()
+        cases = [
+            ('file.txt', '/source/dir'),
+            ('file.txt', '/source/.hidden'),
+            ('file.txt', '/source/a..b'),
+            ('.file', '/source/dir'),
+            ('fi;le', '/source/dir'),
+            ('file', '/source/dir/'),
+            ('-file', '/source/dir'),
+            ('ファイル.txt', '/source/ディレクトリ'),
+        ]
+        for source_file, source_root in cases:
+            self.assertEqual(
+                validator.are_file_and_path_names_safe(source_file, source_root),
+                are_file_and_path_names_safe(source_file, source_root),
+                f"{source_root!r} {source_file!r}"
+            )
+
+    def test_directory_checked_once(self):
+        """Test that the directory path is only checked for the first file in a directory."""
+        validator = NameSafetyValidator()
+        with patch.object(files, 'is_pathname_safe', wraps=files.is_pathname_safe) as is_pathname_safe:
+            for index in range(5):
+                self.assertTrue(validator.are_file_and_path_names_safe(f"file{index}.txt", '/source/dir'))
+        self.assertEqual(is_pathname_safe.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
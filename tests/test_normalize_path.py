@@ -0,0 +1,82 @@
+"""
+Unit tests for normalize_path and its resolved directory cache.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+from shuttle_common.files import (
+    normalize_path,
+    clear_path_cache,
+    invalidate_path_cache,
+    remove_directory
+)
+
+
+class TestNormalizePath(unittest.TestCase):
+
+    def setUp(self):
+        """Create a directory reached through a symbolic link."""
+        self.temp_dir = os.path.realpath(tempfile.mkdtemp())
+        self.real_dir = os.path.join(self.temp_dir, "real")
+        self.link_dir = os.path.join(self.temp_dir, "link")
+        os.makedirs(os.path.join(self.real_dir, "sub"))
+        os.symlink(self.real_dir, self.link_dir)
+        clear_path_cache()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        clear_path_cache()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_matches_uncached_resolution(self):
+        """Test that cached results are the same as resolving every time."""
+        paths = [
+            os.path.join(self.link_dir, "file.txt"),
+            os.path.join(self.link_dir, "sub", "file.txt"),
+            os.path.join(self.link_dir, "sub", "..", "file.txt"),
+            os.path.join(self.link_dir, "missing", "file.txt"),
+            self.link_dir + "/",
+        ]
+        for path in paths:
+            p = Path(path)
+            expected = str(p.parent.resolve().joinpath(p.name))
+            self.assertEqual(normalize_path(path), expected, path)
+            self.assertEqual(normalize_path(path), expected, path)
+
+    def test_directory_resolved_once(self):
+        """Test that files in the same directory only resolve it once."""
+        with patch.object(Path, 'resolve', autospec=True, side_effect=lambda self, *args: Path(os.path.realpath(self))) as resolve:
+            for index in range(10):
+                normalize_path(os.path.join(self.link_dir, f"file{index}.txt"))
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_removed_directory_is_invalidated(self):
+        """Test that a directory replaced by a symbolic link after removal is resolved again."""
+        plain_dir = os.path.join(self.temp_dir, "plain")
+        os.makedirs(os.path.join(plain_dir, "inner"))
+        file_path = os.path.join(plain_dir, "inner", "file.txt")
+        self.assertEqual(normalize_path(file_path), file_path)
+
+        remove_directory(os.path.join(plain_dir, "inner"))
+        os.symlink(os.path.join(self.real_dir, "sub"), os.path.join(plain_dir, "inner"))
+
+        self.assertEqual(normalize_path(file_path), os.path.join(self.real_dir, "sub", "file.txt"))
+
+    def test_invalidate_covers_subdirectories(self):
+        """Test that invalidating a directory also forgets directories below it."""
+        deep_file = os.path.join(self.temp_dir, "swap", "a", "b", "file.txt")
+        normalize_path(deep_file)
+        invalidate_path_cache(os.path.join(self.temp_dir, "swap"))
+
+        os.symlink(self.real_dir, os.path.join(self.temp_dir, "swap"))
+        os.makedirs(os.path.join(self.real_dir, "a", "b"))
+        self.assertEqual(normalize_path(deep_file), os.path.join(self.real_dir, "a", "b", "file.txt"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Unit tests for the open file snapshot used in place of per-file lsof checks.
+"""
+
+import unittest
+import os
+import sys
+import time
+import tempfile
+import shutil
+import subprocess
+
+from shuttle_common.open_files import (
+    OpenFileBackend,
+    OpenFileSnapshot,
+    ProcFdBackend,
+    create_open_file_backends,
+    create_open_file_snapshot
+)
+from shuttle_common.files import is_path_open
+
+
+class CountingBackend(OpenFileBackend):
+    """Backend returning a fixed set of files and counting collections."""
+
+    name = 'counting'
+
+    def __init__(self, open_files=None):
+        self.open_files = set(open_files or [])
+        self.collect_count = 0
+
+    def collect(self):
+        self.collect_count += 1
+        return set(self.open_files)
+
+
+class TestOpenFileSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        """Create a temporary file to check."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, "held.txt")
+        with open(self.file_path, "w") as f:
+            f.write("content")
+        self.holder = None
+
+    def tearDown(self):
+        """Stop any holding process and remove the temporary directory."""
+        if self.holder is not None:
+            self.holder.kill()
+            self.holder.wait()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _hold_file_open(self):
+        """Start a child process that keeps the test file open."""
+        self.holder = subprocess.Popen(
+            [sys.executable, "-c",
+             "import sys, time\n"
+             "f = open(sys.argv[1])\n"
+             "print('ready', flush=True)\n"
+             "time.sleep(60)\n",
+             self.file_path],
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        self.assertEqual(self.holder.stdout.readline().strip(), 'ready')
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), "/proc not available")
+    def test_proc_snapshot_detects_open_file(self):
+        """Test that a file held open by another process is found in the /proc snapshot."""
+        snapshot = OpenFileSnapshot([ProcFdBackend()])
+        snapshot.refresh()
+        self.assertFalse(snapshot.is_open(self.file_path))
+
+        self._hold_file_open()
+        snapshot.refresh()
+        self.assertTrue(snapshot.is_open(self.file_path))
+        self.assertTrue(is_path_open(self.file_path, snapshot))
+
+    def test_missing_path_is_not_open(self):
+        """Test that a path that no longer exists is reported as not open."""
+        snapshot = OpenFileSnapshot([CountingBackend()])
+        self.assertFalse(snapshot.is_open(os.path.join(self.temp_dir, "missing.txt")))
+
+    def test_refresh_policy(self):
+        """Test that lookups only refresh according to max_age_seconds."""
+        st = os.stat(self.file_path)
+        backend = CountingBackend({(st.st_dev, st.st_ino)})
+
+        # Explicit refresh only
+        snapshot = OpenFileSnapshot([backend], max_age_seconds=None)
+        self.assertTrue(snapshot.is_open(self.file_path))
+        self.assertTrue(snapshot.is_open(self.file_path))
+        self.assertEqual(backend.collect_count, 1)
+
+        # File closed, but the snapshot is not refreshed until asked
+        backend.open_files = set()
+        self.assertTrue(snapshot.is_open(self.file_path))
+        snapshot.refresh()
+        self.assertFalse(snapshot.is_open(self.file_path))
+
+        # Refresh on every lookup
+        backend.collect_count = 0
+        snapshot = OpenFileSnapshot([backend], max_age_seconds=0)
+        snapshot.is_open(self.file_path)
+        snapshot.is_open(self.file_path)
+        self.assertEqual(backend.collect_count, 2)
+
+        # Refresh when stale
+        backend.collect_count = 0
+        snapshot = OpenFileSnapshot([backend], max_age_seconds=0.05)
+        snapshot.is_open(self.file_path)
+        snapshot.is_open(self.file_path)
+        self.assertEqual(backend.collect_count, 1)
+        time.sleep(0.1)
+        snapshot.is_open(self.file_path)
+        self.assertEqual(backend.collect_count, 2)
+
+    def test_backend_configuration(self):
+        """Test backend name parsing and the legacy lsof setting."""
+        self.assertEqual([b.name for b in create_open_file_backends('proc, smbstatus')], ['proc', 'smbstatus'])
+        with self.assertRaises(ValueError):
+            create_open_file_backends('proc,fuser')
+        self.assertIsNone(create_open_file_snapshot('lsof'))
+        # lsof stays the default
+        self.assertIsNone(create_open_file_snapshot())
+        with self.assertRaises(TypeError):
+            OpenFileBackend()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src', 'shuttle_app'))
 
 from shuttle.scanning import process_scan_tasks, scan_and_process_directory
+from shuttle_common.files import FileMetadata
 
 
 class TestPerRunTrackerFix(unittest.TestCase):
@@ -82,7 +83,8 @@ class TestPerRunTrackerFix(unittest.TestCase):
         
         # Create a mock task that returns success
         mock_task = (
-            ("/tmp/quarantine/test.txt", "/tmp/source/test.txt", "/tmp/dest/test.txt", "hash123", "test.txt"),
+            ("/tmp/quarantine/test.txt", "/tmp/source/test.txt", "/tmp/dest/test.txt", "hash123", "test.txt",
+             FileMetadata(size=1024 * 1024, mtime_ns=0, inode=1, dev=1), None),  # 1MB
             "/tmp/key.pem",
             "/tmp/hazard",
             False,  # delete_source_files
@@ -94,17 +96,13 @@ class TestPerRunTrackerFix(unittest.TestCase):
         with patch('shuttle.scanning.call_scan_and_process_file') as mock_scan:
             mock_scan.return_value = True  # Successful scan
             
-            # Mock file size check
-            with patch('os.path.getsize') as mock_getsize:
-                mock_getsize.return_value = 1024 * 1024  # 1MB
-                
-                results, successful, failed, timeout = process_scan_tasks(
-                    scan_tasks=[mock_task],
-                    max_scan_threads=1,  # Sequential
-                    daily_processing_tracker=self.mock_daily_tracker,
-                    per_run_tracker=self.mock_per_run_tracker,
-                    config=self.mock_config
-                )
+            results, successful, failed, timeout = process_scan_tasks(
+                scan_tasks=[mock_task],
+                max_scan_threads=1,  # Sequential
+                daily_processing_tracker=self.mock_daily_tracker,
+                per_run_tracker=self.mock_per_run_tracker,
+                config=self.mock_config
+            )
         
         # Verify per_run_tracker was called
         self.mock_per_run_tracker.complete_file_processing.assert_called()
@@ -0,0 +1,188 @@
+"""
+Unit tests for scanning identical quarantined files once.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from shuttle_common.files import FileMetadata, copy_and_hash_temp_then_rename
+from shuttle.quarantine_content_index import QuarantineContentIndex
+from shuttle.post_scan_processing import ProcessingResult
+from shuttle.scanning import process_scan_tasks, process_duplicate_file, cleanup_after_processing
+from scan_test_helpers import make_file_data, SCAN_TASK_ARGS
+
+
+class TestQuarantineContentIndex(unittest.TestCase):
+
+    def test_identical_files_wait_for_first_scan(self):
+        """Test that only the first file with some content is scanned and the others wait for its result."""
+        index = QuarantineContentIndex()
+        first, second, third = (make_file_data(i, "aaa") for i in range(3))
+
+        self.assertTrue(index.add(first))
+        self.assertFalse(index.add(second))
+        self.assertFalse(index.add(third))
+        self.assertIsNone(index.get_scan_result(second))
+
+        result = ProcessingResult(True)
+        self.assertEqual(index.set_scan_result(first, result), [second, third])
+        self.assertEqual(index.duplicate_count, 2)
+
+        # A duplicate arriving after the scan uses the result straight away
+        fourth = make_file_data(3, "aaa")
+        self.assertFalse(index.add(fourth))
+        self.assertIs(index.get_scan_result(fourth), result)
+        self.assertEqual(index.set_scan_result(first, result), [])
+
+    def test_different_size_or_missing_hash_is_scanned(self):
+        """Test that files are only duplicates when both hash and size match."""
+        index = QuarantineContentIndex()
+        self.assertTrue(index.add(make_file_data(0, "aaa", size=100)))
+        self.assertTrue(index.add(make_file_data(1, "aaa", size=200)))
+        for file_data in (make_file_data(2), make_file_data(3)):
+            self.assertTrue(index.add(file_data[:3] + (None,) + file_data[4:]))
+        self.assertEqual(index.duplicate_count, 0)
+
+    def test_grouped_files(self):
+        """Test that each scanned file is followed by its duplicates."""
+        index = QuarantineContentIndex()
+        files = [make_file_data(0, "aaa"), make_file_data(1, "bbb"), make_file_data(2, "aaa"), make_file_data(3, "bbb")]
+        for file_data in files:
+            index.add(file_data)
+        self.assertEqual(index.grouped_files(), [files[0], files[2], files[1], files[3]])
+
+
+class TestDuplicateProcessing(unittest.TestCase):
+
+    def setUp(self):
+        """Quarantine two identical source files."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.files = []
+        for index in range(2):
+            source_file = os.path.join(self.temp_dir, "source", f"file{index}.bin")
+            quarantine_file = os.path.join(self.temp_dir, "quarantine", f"file{index}.bin")
+            destination_file = os.path.join(self.temp_dir, "destination", f"user{index}", "file.bin")
+            os.makedirs(os.path.dirname(source_file), exist_ok=True)
+            with open(source_file, "wb") as f:
+                f.write(b"installer" * 1000)
+            file_hash = copy_and_hash_temp_then_rename(source_file, quarantine_file)
+            self.files.append((quarantine_file, source_file, destination_file, file_hash, f"./file{index}.bin",
+                               FileMetadata(size=9000, mtime_ns=0, inode=index, dev=1), None))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_clean_result_delivers_duplicate(self):
+        """Test that a clean result delivers the duplicate to its own destination and deletes its source."""
+        result = process_duplicate_file(self.files[1], ProcessingResult(True), None, None, True, True, False, False)
+
+        self.assertTrue(result)
+        self.assertTrue(os.path.exists(self.files[1][2]))
+        self.assertFalse(os.path.exists(self.files[1][1]))
+
+    def test_suspect_result_removes_duplicate(self):
+        """Test that a suspect result removes the duplicate's quarantine copy and source."""
+        result = process_duplicate_file(self.files[1], ProcessingResult(True, is_suspect=True), None, None, True, True, False, False)
+
+        self.assertTrue(result.is_suspect)
+        self.assertFalse(os.path.exists(self.files[1][0]))
+        self.assertFalse(os.path.exists(self.files[1][1]))
+        self.assertFalse(os.path.exists(self.files[1][2]))
+
+    def test_failed_scan_leaves_duplicate(self):
+        """Test that a duplicate of a file that could not be scanned is not delivered."""
+        self.assertFalse(process_duplicate_file(self.files[1], False, None, None, True, True, False, False))
+        self.assertTrue(os.path.exists(self.files[1][1]))
+        self.assertFalse(os.path.exists(self.files[1][2]))
+
+    def test_scan_tasks_scan_identical_files_once(self):
+        """Test that process_scan_tasks scans one file and records a result for both."""
+        index = QuarantineContentIndex()
+        scan_tasks = [(file_data,) + SCAN_TASK_ARGS for file_data in self.files if index.add(file_data)]
+
+        with patch('shuttle.scanning.call_scan_and_process_file', return_value=ProcessingResult(True)) as scan, \
+                patch('shuttle.scanning.process_duplicate_file', return_value=ProcessingResult(True)) as duplicate:
+            results, successful_files, failed_files, timeout_shutdown = process_scan_tasks(
+                scan_tasks, 1, content_index=index
+            )
+
+        scan.assert_called_once()
+        duplicate.assert_called_once()
+        self.assertEqual(duplicate.call_args[0][0], self.files[1])
+        self.assertEqual(len(results), 2)
+        self.assertEqual((successful_files, failed_files), (2, 0))
+
+
+class TestScanResultOrder(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.quarantine_dir = os.path.join(self.temp_dir, 'quarantine')
+        os.makedirs(self.quarantine_dir)
+
+        # Later files finish first, odd files fail
+        self.files = []
+        for index in range(6):
+            source = os.path.join(self.temp_dir, f"file{index}.txt")
+            with open(source, 'w') as f:
+                f.write("content")
+            file_data = make_file_data(index, f"hash{index}")
+            self.files.append((file_data[0], source) + file_data[2:])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def scan(self, file_data, *args):
+        index = self.files.index(file_data)
+        time.sleep((len(self.files) - index) * 0.02)
+        return index % 2 == 0
+
+    def test_parallel_results_in_file_order(self):
+        """Test that results of scans finishing out of order are returned in file order."""
+        scan_tasks = [(file_data,) + SCAN_TASK_ARGS for file_data in self.files]
+        result_files = []
+        with patch('shuttle.scanning.ProcessPoolExecutor', ThreadPoolExecutor), \
+                patch('shuttle.scanning.call_scan_and_process_file', side_effect=self.scan):
+            results, _, _, _ = process_scan_tasks(scan_tasks, 6, result_files=result_files)
+
+        self.assertEqual(result_files, self.files)
+        self.assertEqual(results, [True, False] * 3)
+
+    def test_duplicates_follow_their_scanned_file(self):
+        """Test that each duplicate's result follows its scanned file's result."""
+        index = QuarantineContentIndex()
+        duplicate = make_file_data(9, "hash0")
+        for file_data in self.files + [duplicate]:
+            index.add(file_data)
+        scan_tasks = [(file_data,) + SCAN_TASK_ARGS for file_data in self.files]
+        expected = self.files[:1] + [duplicate] + self.files[1:]
+        result_files = []
+        with patch('shuttle.scanning.ProcessPoolExecutor', ThreadPoolExecutor), \
+                patch('shuttle.scanning.call_scan_and_process_file', side_effect=self.scan), \
+                patch('shuttle.scanning.process_duplicate_file', return_value=ProcessingResult(True)):
+            process_scan_tasks(scan_tasks, 6, content_index=index, result_files=result_files)
+
+        self.assertEqual(result_files, expected)
+
+    def test_cleanup_removes_sources_by_their_own_result(self):
+        """Test that each source is removed by its own result when scans finish out of order."""
+        scan_tasks = [(file_data,) + SCAN_TASK_ARGS for file_data in self.files]
+        result_files = []
+        with patch('shuttle.scanning.ProcessPoolExecutor', ThreadPoolExecutor), \
+                patch('shuttle.scanning.call_scan_and_process_file', side_effect=self.scan):
+            results, _, _, _ = process_scan_tasks(scan_tasks, 6, result_files=result_files)
+
+        cleanup_after_processing(result_files, results, self.temp_dir, True, self.quarantine_dir)
+
+        remaining = [os.path.exists(file_data[1]) for file_data in self.files]
+        self.assertEqual(remaining, [False, True] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
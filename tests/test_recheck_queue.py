@@ -0,0 +1,151 @@
+"""
+Unit tests for the RecheckQueue of files that were not ready when first checked.
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+
+from shuttle_common.files import FileMetadata
+from shuttle_common.open_files import OpenFileBackend, OpenFileSnapshot
+from shuttle.recheck_queue import RecheckQueue, BASE_STABILITY_SECONDS, STABILITY_PAUSE_FACTOR
+from shuttle.source_manifest import SourceManifest
+from shuttle.scanning import quarantine_files_for_scanning
+
+
+def _metadata(size, mtime):
+    return FileMetadata(size=size, mtime_ns=int(mtime * 1_000_000_000), inode=1, dev=1)
+
+
+class FixedOpenFilesBackend(OpenFileBackend):
+
+    name = 'fixed'
+
+    def __init__(self):
+        self.open_files = set()
+
+    def collect(self):
+        return set(self.open_files)
+
+
+class TestRecheckQueue(unittest.TestCase):
+
+    def test_delay_doubles_up_to_maximum(self):
+        """Test that each re-check of a stable but unready (open) file backs off exponentially."""
+        queue = RecheckQueue(3600, initial_delay_seconds=1, max_delay_seconds=8)
+        old_file = _metadata(100, time.time() - 600)
+
+        delays = [queue.defer("/source", "open.txt", old_file) for _ in range(6)]
+        self.assertEqual([round(delay) for delay in delays], [1, 2, 4, 8, 8, 8])
+
+    def test_delay_waits_for_stability_window(self):
+        """Test that a recently modified file is not checked before it could be stable."""
+        queue = RecheckQueue(3600, initial_delay_seconds=1)
+        delay = queue.defer("/source", "new.txt", _metadata(100, time.time()))
+        self.assertGreater(delay, BASE_STABILITY_SECONDS - 1)
+
+    def test_files_past_deadline_are_dropped(self):
+        """Test that files that would not be due before the deadline are left for the next run."""
+        queue = RecheckQueue(3, initial_delay_seconds=1)
+        old_file = _metadata(100, time.time() - 600)
+
+        self.assertIsNotNone(queue.defer("/source", "open.txt", old_file))
+        self.assertIsNotNone(queue.defer("/source", "open.txt", old_file))
+        self.assertIsNone(queue.defer("/source", "open.txt", old_file))
+
+    def test_window_widens_for_writer_that_pauses(self):
+        """Test that a file written again after an idle period gets a longer stability window."""
+        queue = RecheckQueue(3600)
+        path = os.path.join("/source", "slow.txt")
+        now = time.time()
+
+        # First sample: idle for 4 seconds, then written again
+        queue.defer("/source", "slow.txt", _metadata(100, now - 4))
+        self.assertEqual(queue.stability_window(path), BASE_STABILITY_SECONDS)
+        queue.defer("/source", "slow.txt", _metadata(200, now))
+
+        self.assertAlmostEqual(queue.stability_window(path), STABILITY_PAUSE_FACTOR * 4, delta=0.5)
+
+    def test_continuous_writer_keeps_base_window(self):
+        """Test that a file written between every sample keeps the base stability window."""
+        queue = RecheckQueue(3600)
+        path = os.path.join("/source", "busy.txt")
+        now = time.time()
+
+        queue.defer("/source", "busy.txt", _metadata(100, now))
+        queue.defer("/source", "busy.txt", _metadata(200, now + 0.001))
+        self.assertEqual(queue.stability_window(path), BASE_STABILITY_SECONDS)
+
+
+class TestQuarantineRecheck(unittest.TestCase):
+
+    def setUp(self):
+        """Create source and quarantine directories."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.temp_dir, "source")
+        self.quarantine_path = os.path.join(self.temp_dir, "quarantine")
+        os.makedirs(self.source_path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _quarantine(self, not_ready_recheck_seconds, open_file_snapshot=None, source_manifest=None):
+        return quarantine_files_for_scanning(
+            self.source_path,
+            self.quarantine_path,
+            os.path.join(self.temp_dir, "destination"),
+            os.path.join(self.temp_dir, "hazard"),
+            throttle=False,
+            throttle_free_space_mb=0,
+            open_file_snapshot=open_file_snapshot or OpenFileSnapshot(backends=[]),
+            source_manifest=source_manifest,
+            not_ready_recheck_seconds=not_ready_recheck_seconds
+        )
+
+    def test_file_becoming_stable_is_quarantined_in_same_run(self):
+        """Test that a file that settles just after the walk is picked up without another run."""
+        file_path = os.path.join(self.source_path, "upload.txt")
+        with open(file_path, "w") as f:
+            f.write("content")
+        settles_soon = time.time() - BASE_STABILITY_SECONDS + 0.5
+        os.utime(file_path, (settles_soon, settles_soon))
+
+        quarantine_files, _ = self._quarantine(not_ready_recheck_seconds=0)
+        self.assertEqual(quarantine_files, [])
+
+        quarantine_files, _ = self._quarantine(not_ready_recheck_seconds=10)
+        self.assertEqual([entry[1] for entry in quarantine_files], [file_path])
+
+    def test_file_still_not_ready_after_recheck_keeps_directory_listed(self):
+        """Test that the directory of a deferred file that never became ready is listed on the next pass."""
+        busy_dir = os.path.join(self.source_path, "busy")
+        os.makedirs(busy_dir)
+        file_path = os.path.join(busy_dir, "open.txt")
+        with open(file_path, "w") as f:
+            f.write("content")
+        old_time = time.time() - 60
+        for path in (file_path, busy_dir, self.source_path):
+            os.utime(path, (old_time, old_time))
+
+        backend = FixedOpenFilesBackend()
+        file_stat = os.stat(file_path)
+        backend.open_files.add((file_stat.st_dev, file_stat.st_ino))
+        manifest = SourceManifest(os.path.join(self.temp_dir, "tracking"), full_walk_interval_seconds=3600)
+        manifest.open()
+        try:
+            # Checked again once within the deadline, then left for the next run
+            quarantine_files, _ = self._quarantine(2, OpenFileSnapshot(backends=[backend]), manifest)
+            self.assertEqual(quarantine_files, [])
+
+            backend.open_files.clear()
+            quarantine_files, _ = self._quarantine(0, OpenFileSnapshot(backends=[backend]), manifest)
+            self.assertEqual([entry[1] for entry in quarantine_files], [file_path])
+        finally:
+            manifest.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,305 @@
+"""
+Unit tests for the adaptive scan concurrency controller.
+"""
+
+import unittest
+import time
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+from shuttle.scan_concurrency import (
+    ScanConcurrencyController,
+    create_scan_concurrency_controller,
+    percentile,
+    MIN_WINDOW_SCANS,
+    PROBE_AFTER_WINDOWS
+)
+from shuttle.scanning import (
+    process_scan_tasks,
+    process_scan_tasks_async,
+    _complete_within_limit,
+    ScanTimeoutResult
+)
+from scan_test_helpers import make_file_data, make_config, SCAN_TASK_ARGS
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_window(controller, clock, latency):
+    """Complete a window of scans, all started together and each taking latency seconds."""
+    tokens = [controller.start() for _ in range(max(controller.limit, MIN_WINDOW_SCANS))]
+    clock.now += latency
+    for token in tokens:
+        controller.finish(token)
+
+
+def make_adaptive_config(**overrides):
+    settings = dict(adaptive_scan_concurrency=True, malware_scan_retry_count=0, malware_scan_timeout_seconds=1)
+    settings.update(overrides)
+    return make_config(**settings)
+
+
+class RecordingController:
+    """Controller with a fixed limit recording each finished scan."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.min_limit = 1
+        self.max_limit = limit
+        self.started = 0
+        self.finished = []
+
+    def start(self):
+        self.started += 1
+        return self.started
+
+    def finish(self, token, timed_out=False):
+        self.finished.append(timed_out)
+
+
+class TestScanConcurrencyController(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_percentile(self):
+        """Test that the nearest rank percentile is used."""
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([3, 1, 2], 95), 3)
+        self.assertEqual(percentile([5], 95), 5)
+
+    def test_grows_while_throughput_improves(self):
+        """Test that the limit grows by one per window up to the maximum when scans do not slow down."""
+        controller = ScanConcurrencyController(4, 8, clock=self.clock)
+        self.assertEqual(controller.limit, 4)
+
+        limits = []
+        for _ in range(6):
+            run_window(controller, self.clock, 1.0)
+            limits.append(controller.limit)
+        self.assertEqual(limits, [5, 6, 7, 8, 8, 8])
+
+    def test_holds_when_throughput_stops_improving_then_probes(self):
+        """Test that the limit holds once more scans do not raise throughput, and is tried again later."""
+        controller = ScanConcurrencyController(4, 10, clock=self.clock)
+        run_window(controller, self.clock, 1.0)
+        self.assertEqual(controller.limit, 5)
+
+        # Each scan takes as much longer as there are more scans, so throughput is flat
+        for _ in range(PROBE_AFTER_WINDOWS):
+            run_window(controller, self.clock, controller.limit / 4)
+            self.assertEqual(controller.limit, 5)
+        run_window(controller, self.clock, controller.limit / 4)
+        self.assertEqual(controller.limit, 6)
+
+    def test_timeout_halves_limit_once(self):
+        """Test that a timeout halves the limit, and scans started before do not halve it again."""
+        controller = ScanConcurrencyController(1, 16, clock=self.clock)
+        controller.limit = 8
+        tokens = [controller.start() for _ in range(8)]
+
+        controller.finish(tokens[0], timed_out=True)
+        self.assertEqual(controller.limit, 4)
+        for token in tokens[1:]:
+            controller.finish(token, timed_out=True)
+        self.assertEqual(controller.limit, 4)
+        self.assertEqual(controller.decrease_count, 1)
+
+        controller.finish(controller.start(), timed_out=True)
+        self.assertEqual(controller.limit, 2)
+
+    def test_rising_latency_halves_limit(self):
+        """Test that a window with p95 latency well above the baseline backs off."""
+        controller = ScanConcurrencyController(4, 16, clock=self.clock)
+        for _ in range(4):
+            run_window(controller, self.clock, 1.0)
+        self.assertEqual(controller.limit, 8)
+
+        run_window(controller, self.clock, 5.0)
+        self.assertEqual(controller.limit, 4)
+
+    def test_limit_stays_within_bounds(self):
+        """Test that backing off never goes below the minimum."""
+        controller = ScanConcurrencyController(3, 4, clock=self.clock)
+        for _ in range(3):
+            controller.finish(controller.start(), timed_out=True)
+        self.assertEqual(controller.limit, 3)
+
+    def test_controller_only_created_when_enabled(self):
+        """Test that no controller is used when disabled or when there is no range to adapt in."""
+        self.assertIsNone(create_scan_concurrency_controller(None, 8))
+        self.assertIsNone(create_scan_concurrency_controller(make_config(adaptive_scan_concurrency=False), 8))
+        self.assertIsNone(create_scan_concurrency_controller(make_adaptive_config(min_scan_threads=8), 8))
+
+        controller = create_scan_concurrency_controller(make_adaptive_config(min_scan_threads=2), 8)
+        self.assertEqual((controller.min_limit, controller.max_limit, controller.limit), (2, 8, 2))
+
+
+class TestAdaptiveScanTasks(unittest.TestCase):
+
+    def test_submissions_follow_limit(self):
+        """Test that no more tasks are submitted than the controller's limit, and every task completes."""
+        controller = ScanConcurrencyController(1, 4)
+        running = 0
+        peak = 0
+
+        def scan(file_data):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            if running > 2:
+                result = ScanTimeoutResult(file_data[0], file_data[1])
+            else:
+                result = True
+            running -= 1
+            return result
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(40)]
+        futures_to_files = {}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            completed = list(_complete_within_limit(
+                tasks, lambda task: executor.submit(scan, task[0]), futures_to_files, controller
+            ))
+
+        self.assertEqual(len(completed), 40)
+        self.assertEqual(len(futures_to_files), 40)
+        self.assertLessEqual(peak, 4)
+
+    def test_failed_scans_finish_with_controller(self):
+        """Test that scans that raise or are cancelled are recorded with the controller as timed out."""
+        controller = RecordingController(2)
+
+        def scan(file_data):
+            if file_data[5].inode % 3 == 0:
+                raise RuntimeError("scanner crashed")
+            return True
+
+        def submit(task):
+            if task[0][5].inode == 4:
+                future = Future()
+                future.cancel()
+                future.set_running_or_notify_cancel()
+                return future
+            return executor.submit(scan, task[0])
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(6)]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(_complete_within_limit(tasks, submit, {}, controller))
+
+        self.assertEqual(controller.started, 6)
+        # Two scans raised and one was cancelled
+        self.assertEqual(sorted(controller.finished), [False] * 3 + [True] * 3)
+
+    def test_async_failed_scans_finish_with_controller(self):
+        """Test that asyncio scans that raise are recorded with the controller as timed out."""
+        controller = RecordingController(2)
+
+        async def fake_scan(file_data, *args):
+            await asyncio.sleep(0)
+            if file_data[5].inode % 3 == 0:
+                raise RuntimeError("scanner crashed")
+            return True
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(6)]
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan), \
+                patch('shuttle.scanning.create_scan_concurrency_controller', return_value=controller):
+            process_scan_tasks_async(tasks, 2, config=make_adaptive_config())
+
+        self.assertEqual(controller.finished, [True, False, False, True, False, False])
+
+    def test_async_scans_stopped_at_shutdown_are_failed(self):
+        """Test that scans cancelled when the graceful shutdown times out are recorded as failed."""
+        async def fake_scan(file_data, *args):
+            if file_data[5].inode == 0:
+                await asyncio.sleep(0.01)
+                return ScanTimeoutResult(file_data[0], file_data[1])
+            await asyncio.sleep(30)
+            return True
+
+        tracker = MagicMock()
+        tracker.generate_task_summary.return_value = {'successful_files': 0, 'failed_files': 2, 'suspect_files': 0}
+        config = make_config(adaptive_scan_concurrency=False, malware_scan_retry_count=1, malware_scan_timeout_seconds=0.05)
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(4)]
+        result_files = []
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan):
+            results, _, _, timeout_shutdown = process_scan_tasks_async(
+                tasks, 2, tracker, config=config, result_files=result_files
+            )
+
+        # The third file starts when the first times out, the fourth never starts
+        self.assertTrue(timeout_shutdown)
+        self.assertEqual(result_files, [task[0] for task in tasks[:3]])
+        self.assertEqual(results[1:], [None, None])
+        failed = sorted(call.kwargs['relative_file_path'] for call in tracker.complete_pending_file.call_args_list
+                        if call.kwargs['outcome'] == 'failed')
+        self.assertEqual(failed, [task[0][4] for task in tasks[:3]])
+
+    def test_async_scans_back_off_on_timeouts(self):
+        """Test that asyncio scans grow towards the maximum and back off when scans time out."""
+        running = 0
+        peak = 0
+        timeouts = 0
+
+        async def fake_scan(file_data, *args):
+            nonlocal running, peak, timeouts
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.002)
+            overloaded = running > 3
+            running -= 1
+            if overloaded:
+                timeouts += 1
+                return ScanTimeoutResult(file_data[0], file_data[1])
+            return True
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(300)]
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan):
+            results, _, _, timeout_shutdown = process_scan_tasks_async(tasks, 8, config=make_adaptive_config())
+
+        self.assertEqual(len(results), 300)
+        self.assertFalse(timeout_shutdown)
+        self.assertGreater(peak, 3)
+        self.assertLessEqual(peak, 8)
+        # Backing off keeps most scans below the overload point
+        self.assertLess(timeouts, 60)
+
+    def test_pool_results_in_file_order(self):
+        """Test that adaptive pool scans finishing out of order return their results in file order."""
+        def scan(file_data, *args):
+            time.sleep((8 - file_data[5].inode) * 0.01)
+            return file_data[5].inode % 2 == 0
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(8)]
+        result_files = []
+        with patch('shuttle.scanning.ProcessPoolExecutor', ThreadPoolExecutor), \
+                patch('shuttle.scanning.call_scan_and_process_file', side_effect=scan):
+            results, _, _, _ = process_scan_tasks(tasks, 6, config=make_adaptive_config(min_scan_threads=4), result_files=result_files)
+
+        self.assertEqual(result_files, [task[0] for task in tasks])
+        self.assertEqual(results, [True, False] * 4)
+
+    def test_async_results_in_file_order(self):
+        """Test that adaptive asyncio scans finishing out of order return their results in file order."""
+        async def fake_scan(file_data, *args):
+            await asyncio.sleep((8 - file_data[5].inode) * 0.01)
+            return file_data[5].inode % 2 == 0
+
+        tasks = [(make_file_data(index),) + SCAN_TASK_ARGS for index in range(8)]
+        result_files = []
+        with patch('shuttle.scanning.scan_and_process_file_async', side_effect=fake_scan):
+            results, _, _, _ = process_scan_tasks_async(tasks, 6, config=make_adaptive_config(min_scan_threads=4), result_files=result_files)
+
+        self.assertEqual(result_files, [task[0] for task in tasks])
+        self.assertEqual(results, [True, False] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
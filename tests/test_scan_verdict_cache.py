@@ -0,0 +1,115 @@
+"""
+Unit tests for the ScanVerdictCache and its use by scan_and_process_file.
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+from unittest.mock import patch
+
+from shuttle_common.files import FileMetadata
+from shuttle_common.scan_utils import scan_result_types
+from shuttle_common.scan_verdict_cache import ScanVerdictCache, SCANNER_DEFENDER, SCANNER_CLAM_AV
+from shuttle.post_scan_processing import ProcessingResult
+from shuttle.scanning import scan_and_process_file, count_scan_cache_hits
+
+
+DIGEST = "ab" * 32
+
+
+class TestScanVerdictCache(unittest.TestCase):
+
+    def setUp(self):
+        """Create a cache in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.database_file = os.path.join(self.temp_dir, "verdicts.sqlite3")
+        self.cache = self.open_cache()
+
+    def tearDown(self):
+        """Close the cache and remove the temporary directory."""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def open_cache(self, ttl_seconds=3600):
+        cache = ScanVerdictCache(ttl_seconds)
+        self.assertTrue(cache.open(self.database_file))
+        cache.set_scanner_versions(SCANNER_DEFENDER, "101.1", "1.400.1")
+        return cache
+
+    def test_verdict_kept_between_runs(self):
+        """Test that a stored verdict is returned by a cache opened later on the same database."""
+        self.assertIsNone(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER))
+        self.assertTrue(self.cache.put(DIGEST, "sha256", SCANNER_DEFENDER, scan_result_types.FILE_IS_SUSPECT))
+        self.cache.close()
+
+        self.cache = self.open_cache()
+        self.assertEqual(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER), scan_result_types.FILE_IS_SUSPECT)
+        self.assertIsNone(self.cache.get(DIGEST, "sha512", SCANNER_DEFENDER))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_new_definitions_invalidate_verdicts(self):
+        """Test that a verdict is not used after the definitions or engine version changes."""
+        self.cache.put(DIGEST, "sha256", SCANNER_DEFENDER, scan_result_types.FILE_IS_CLEAN)
+
+        self.cache.set_scanner_versions(SCANNER_DEFENDER, "101.1", "1.400.2")
+        self.assertIsNone(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER))
+        self.cache.set_scanner_versions(SCANNER_DEFENDER, "101.2", "1.400.1")
+        self.assertIsNone(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER))
+        self.cache.set_scanner_versions(SCANNER_DEFENDER, "101.1", "1.400.1")
+        self.assertEqual(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER), scan_result_types.FILE_IS_CLEAN)
+
+    def test_expired_verdicts_not_used(self):
+        """Test that verdicts older than the time to live are not used and are removed on open."""
+        self.cache.put(DIGEST, "sha256", SCANNER_DEFENDER, scan_result_types.FILE_IS_CLEAN)
+        later = time.time() + 7200
+        with patch('shuttle_common.scan_verdict_cache.time.time', return_value=later):
+            self.assertIsNone(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER))
+            self.cache.close()
+            self.cache = self.open_cache()
+        self.assertIsNone(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER))
+
+    def test_failures_and_unknown_versions_not_cached(self):
+        """Test that failed scans, and scanners without known versions, are never cached."""
+        self.assertFalse(self.cache.put(DIGEST, "sha256", SCANNER_DEFENDER, scan_result_types.FILE_SCAN_FAILED))
+        self.assertFalse(self.cache.put(DIGEST, "sha256", SCANNER_DEFENDER, scan_result_types.FILE_NOT_FOUND))
+        self.assertFalse(self.cache.put(DIGEST, "sha256", SCANNER_CLAM_AV, scan_result_types.FILE_IS_CLEAN))
+
+        self.cache.put(DIGEST, "sha256", SCANNER_DEFENDER, scan_result_types.FILE_IS_CLEAN)
+        self.cache.set_scanner_versions(SCANNER_DEFENDER, "101.1", None)
+        self.assertIsNone(self.cache.get(DIGEST, "sha256", SCANNER_DEFENDER))
+
+
+class TestScanAndProcessFileWithCache(unittest.TestCase):
+
+    def setUp(self):
+        """Open a cache to stand in for the default cache."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ScanVerdictCache()
+        self.cache.open(os.path.join(self.temp_dir, "verdicts.sqlite3"))
+        self.cache.set_scanner_versions(SCANNER_DEFENDER, "101.1", "1.400.1")
+        self.file_data = ("/quarantine/file.txt", "/source/file.txt", "/destination/file.txt", DIGEST,
+                          "./file.txt", FileMetadata(size=100, mtime_ns=0, inode=1, dev=1), None)
+
+    def tearDown(self):
+        """Close the cache and remove the temporary directory."""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_second_scan_of_same_content_uses_cache(self):
+        """Test that content is scanned once and its verdict reused, and the hit is reported."""
+        with patch('shuttle.scanning.default_scan_verdict_cache', self.cache), \
+                patch('shuttle.scanning.scan_for_malware_using_defender', return_value=scan_result_types.FILE_IS_CLEAN) as scan, \
+                patch('shuttle.scanning.handle_clean_file', side_effect=lambda *args, **kwargs: ProcessingResult(True)):
+            first = scan_and_process_file(self.file_data, None, None, False, True, False, False)
+            second = scan_and_process_file(self.file_data, None, None, False, True, False, False)
+
+        scan.assert_called_once()
+        self.assertFalse(first.scan_cache_hit)
+        self.assertTrue(second.scan_cache_hit)
+        self.assertEqual(count_scan_cache_hits([first, second, False]), (1, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Unit tests for checking settings read from the Shuttle settings file.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+from unittest.mock import patch
+
+from shuttle.shuttle_config import parse_shuttle_config
+
+
+class TestSettingsFileChoices(unittest.TestCase):
+
+    def setUp(self):
+        """Create a temporary directory for the settings file and logs."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _parse(self, settings):
+        """Parse a settings file with the given [settings] lines."""
+        settings_path = os.path.join(self.temp_dir, "settings.ini")
+        with open(settings_path, "w") as f:
+            f.write("[paths]\n")
+            for name in ("source_path", "destination_path", "quarantine_path"):
+                f.write(f"{name} = {os.path.join(self.temp_dir, name)}\n")
+            f.write("[settings]\n" + settings)
+
+        argv = ["shuttle", "--settings-path", settings_path, "--log-path", self.temp_dir]
+        with patch("sys.argv", argv):
+            return parse_shuttle_config()
+
+    def test_valid_choices_are_accepted(self):
+        """Test that choices accepted on the command line are accepted from the file."""
+        config = self._parse("clamd_scan_command = INSTREAM\nhash_algorithm = blake2b\n")
+        self.assertEqual((config.clamd_scan_command, config.hash_algorithm), ("INSTREAM", "blake2b"))
+
+    def test_unknown_clamd_scan_command_is_rejected(self):
+        """Test that a clamd scan command argparse would refuse is refused from the file."""
+        with self.assertRaisesRegex(ValueError, "clamd_scan_command"):
+            self._parse("clamd_scan_command = FDPASS\n")
+
+    def test_unknown_hash_algorithm_is_rejected(self):
+        """Test that a hash algorithm argparse would refuse is refused from the file."""
+        with self.assertRaisesRegex(ValueError, "hash_algorithm"):
+            self._parse("hash_algorithm = md5\n")
+        with self.assertRaisesRegex(ValueError, "secondary_hash_algorithm"):
+            self._parse("secondary_hash_algorithm = md5\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+Unit tests for the SourceManifest of rejected and deferred source files.
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+
+from shuttle_common.files import FileMetadata
+from shuttle.source_manifest import (
+    SourceManifest,
+    DISPOSITION_UNSAFE_NAME,
+    DISPOSITION_NOT_READY,
+    DISPOSITION_DEFERRED
+)
+from shuttle.scanning import iter_prioritised_source_files
+from shuttle.source_tree_walker import SourceTreeWalker
+
+
+class TestSourceManifest(unittest.TestCase):
+
+    def setUp(self):
+        """Create a manifest in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_directory = os.path.join(self.temp_dir, "tracking")
+        self.manifest = SourceManifest(self.data_directory)
+        self.manifest.open()
+        self.manifest.begin_pass()
+        self.metadata = FileMetadata(size=10, mtime_ns=1000, inode=5, dev=1)
+
+    def tearDown(self):
+        """Close the manifest and remove the temporary directory."""
+        self.manifest.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _reopen(self):
+        """Close and reopen the manifest, as a new run would."""
+        self.manifest.close()
+        self.manifest = SourceManifest(self.data_directory)
+        self.manifest.open()
+        self.manifest.begin_pass()
+
+    def test_unchanged_unsafe_file_is_skipped_across_runs(self):
+        """Test that an unchanged file rejected for its name is skipped after a restart."""
+        self.manifest.record("./bad$name.txt", self.metadata, DISPOSITION_UNSAFE_NAME)
+        self.manifest.end_pass(walk_completed=True)
+        self._reopen()
+
+        self.assertTrue(self.manifest.should_skip("./bad$name.txt", self.metadata))
+
+    def test_changed_file_is_not_skipped(self):
+        """Test that any change to the file's identity means it is examined again."""
+        self.manifest.record("./bad$name.txt", self.metadata, DISPOSITION_UNSAFE_NAME)
+
+        for changed in (self.metadata._replace(size=11),
+                        self.metadata._replace(mtime_ns=2000),
+                        self.metadata._replace(inode=6),
+                        self.metadata._replace(dev=2)):
+            self.assertFalse(self.manifest.should_skip("./bad$name.txt", changed))
+
+    def test_not_ready_file_is_not_skipped(self):
+        """Test that files that were unstable or open are checked again."""
+        self.manifest.record("./busy.txt", self.metadata, DISPOSITION_NOT_READY)
+        self.assertFalse(self.manifest.should_skip("./busy.txt", self.metadata))
+
+    def test_unseen_files_are_pruned_after_complete_walk(self):
+        """Test that records are only pruned after a pass that walked the whole tree."""
+        self.manifest.record("./gone.txt", self.metadata, DISPOSITION_UNSAFE_NAME)
+        self.manifest.end_pass(walk_completed=True)
+
+        self.manifest.begin_pass()
+        self.assertEqual(self.manifest.end_pass(walk_completed=False), 0)
+
+        self.manifest.begin_pass()
+        self.assertEqual(self.manifest.end_pass(walk_completed=True), 1)
+        self.assertFalse(self.manifest.should_skip("./gone.txt", self.metadata))
+
+    def test_deferred_files_are_yielded_first(self):
+        """Test that files deferred on an earlier pass are walked before other files."""
+        source_path = os.path.join(self.temp_dir, "source")
+        for relative_path in ("a/first.txt", "z/deferred.txt", "top.txt"):
+            file_path = os.path.join(source_path, relative_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(relative_path)
+
+        self.manifest.record(os.path.join("z", "deferred.txt"), self.metadata, DISPOSITION_DEFERRED)
+        self.manifest.record(os.path.join(".", "missing.txt"), self.metadata, DISPOSITION_DEFERRED)
+
+        walked = [os.path.relpath(os.path.join(root, name), source_path)
+                  for root, name, _ in iter_prioritised_source_files(source_path, self.manifest)]
+
+        self.assertEqual(walked[0], os.path.join("z", "deferred.txt"))
+        self.assertEqual(sorted(walked), sorted(["a/first.txt", "z/deferred.txt", "top.txt"]))
+
+
+
+class TestSourceTreeWalker(unittest.TestCase):
+
+    def setUp(self):
+        """Create a source tree whose directories were last modified a minute ago."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.temp_dir, "source")
+        self.data_directory = os.path.join(self.temp_dir, "tracking")
+        os.makedirs(os.path.join(self.source_path, "static", "deep", "leaf"))
+        os.makedirs(os.path.join(self.source_path, "busy"))
+        with open(os.path.join(self.source_path, "busy", "file.txt"), "w") as f:
+            f.write("content")
+        self._age_directories()
+
+        self.manifest = SourceManifest(self.data_directory, full_walk_interval_seconds=3600)
+        self.manifest.open()
+
+    def tearDown(self):
+        """Close the manifest and remove the temporary directory."""
+        self.manifest.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _age_directories(self):
+        old_time = time.time() - 60
+        for root, _, _ in os.walk(self.source_path):
+            os.utime(root, (old_time, old_time))
+
+    def _walk(self, not_ready=(), max_workers=1):
+        """Run one pass, recording the given relative file paths as not ready."""
+        self.manifest.begin_pass()
+        walker = SourceTreeWalker(self.source_path, self.manifest, max_workers)
+        walked = []
+        for root, name, file_metadata in walker:
+            relative_file_path = os.path.join(os.path.relpath(root, self.source_path), name)
+            walked.append(relative_file_path)
+            if relative_file_path in not_ready:
+                self.manifest.record(relative_file_path, file_metadata, DISPOSITION_NOT_READY)
+        self.manifest.end_pass(walk_completed=True)
+        return walker, walked
+
+    def test_unchanged_directories_are_pruned(self):
+        """Test that only directories with something to process are listed again."""
+        busy_file = os.path.join("busy", "file.txt")
+        walker, walked = self._walk(not_ready={busy_file})
+        self.assertEqual(walker.directories_pruned, 0)
+        self.assertEqual(walked, [busy_file])
+
+        walker, walked = self._walk(not_ready={busy_file})
+        self.assertEqual(walked, [busy_file])
+        self.assertEqual(walker.directories_listed, 1)
+        self.assertEqual(walker.directories_pruned, 4)
+
+    def test_change_below_pruned_directory_is_found(self):
+        """Test that a file added deep in an unchanged subtree is still found."""
+        self._walk()
+        new_file = os.path.join("static", "deep", "leaf", "new.txt")
+        with open(os.path.join(self.source_path, new_file), "w") as f:
+            f.write("content")
+
+        walker, walked = self._walk()
+        self.assertEqual(walked, [new_file])
+        self.assertEqual(walker.directories_listed, 1)
+
+    def test_full_walk_lists_every_directory(self):
+        """Test that pruning is disabled when a full walk is due."""
+        self.manifest.full_walk_interval_seconds = 0
+        self._walk()
+        walker, walked = self._walk()
+        self.assertEqual(walker.directories_pruned, 0)
+        self.assertEqual(walked, [os.path.join("busy", "file.txt")])
+
+    def test_parallel_walk_matches_serial_walk(self):
+        """Test that listing directories in parallel yields files in the same order."""
+        for directory in ("a", os.path.join("a", "x"), "b", "c"):
+            os.makedirs(os.path.join(self.source_path, directory), exist_ok=True)
+            for name in ("2.txt", "1.txt"):
+                with open(os.path.join(self.source_path, directory, name), "w") as f:
+                    f.write("content")
+
+        serial = list(SourceTreeWalker(self.source_path, max_workers=1))
+        parallel = list(SourceTreeWalker(self.source_path, max_workers=4))
+        self.assertEqual(parallel, serial)
+        self.assertEqual(
+            [os.path.relpath(os.path.join(root, name), self.source_path) for root, name, _ in serial][:4],
+            [os.path.join("a", "x", "1.txt"), os.path.join("a", "x", "2.txt"),
+             os.path.join("a", "1.txt"), os.path.join("a", "2.txt")]
+        )
+
+    def test_parallel_walk_prunes_unchanged_directories(self):
+        """Test that pruning works the same with several listing workers."""
+        busy_file = os.path.join("busy", "file.txt")
+        self._walk(not_ready={busy_file}, max_workers=4)
+
+        walker, walked = self._walk(not_ready={busy_file}, max_workers=4)
+        self.assertEqual(walked, [busy_file])
+        self.assertEqual(walker.directories_listed, 1)
+        self.assertEqual(walker.directories_pruned, 4)
+
+    def test_stopped_walk_shuts_down_workers(self):
+        """Test that abandoning a parallel walk part way through does not leave listings running."""
+        for index in range(10):
+            directory = os.path.join(self.source_path, f"dir{index}")
+            os.makedirs(directory)
+            with open(os.path.join(directory, "file.txt"), "w") as f:
+                f.write("content")
+
+        walker = SourceTreeWalker(self.source_path, max_workers=4)
+        files = iter(walker)
+        next(files)
+        files.close()
+        self.assertIsNone(walker._executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the inotify based SourceWatcher used by watch mode.
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+
+from shuttle.source_watcher import SourceWatcher, InotifyUnavailableError
+from shuttle.scanning import iter_candidate_files
+
+
+class TestSourceWatcher(unittest.TestCase):
+
+    def setUp(self):
+        """Create a temporary source tree and start watching it."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.temp_dir, "source")
+        os.makedirs(os.path.join(self.source_path, "existing"))
+
+        self.watcher = SourceWatcher(self.source_path)
+        try:
+            self.watcher.start()
+        except InotifyUnavailableError as e:
+            shutil.rmtree(self.temp_dir)
+            self.skipTest(f"inotify not available: {e}")
+
+    def tearDown(self):
+        """Stop watching and remove the temporary tree."""
+        self.watcher.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _collect_events(self, timeout_seconds=2.0):
+        """Read events until none arrive within a short interval."""
+        candidates = set()
+        deadline = time.monotonic() + timeout_seconds
+        while time.monotonic() < deadline:
+            events = self.watcher.read_events(timeout_seconds=0.2)
+            if not events and candidates:
+                break
+            candidates |= events
+        return candidates
+
+    def test_written_file_is_reported(self):
+        """Test that a file written into a watched directory is reported."""
+        directory = os.path.join(self.source_path, "existing")
+        with open(os.path.join(directory, "new.txt"), "w") as f:
+            f.write("content")
+
+        self.assertIn((directory, "new.txt"), self._collect_events())
+
+    def test_moved_in_file_is_reported(self):
+        """Test that a file moved into the tree is reported."""
+        outside_file = os.path.join(self.temp_dir, "outside.txt")
+        with open(outside_file, "w") as f:
+            f.write("content")
+        os.rename(outside_file, os.path.join(self.source_path, "moved.txt"))
+
+        self.assertIn((self.source_path, "moved.txt"), self._collect_events())
+
+    def test_new_directory_is_watched(self):
+        """Test that files in a newly created directory are picked up."""
+        new_directory = os.path.join(self.source_path, "new_dir")
+        os.makedirs(new_directory)
+        self._collect_events(timeout_seconds=0.5)
+
+        with open(os.path.join(new_directory, "inner.txt"), "w") as f:
+            f.write("content")
+
+        self.assertIn((new_directory, "inner.txt"), self._collect_events())
+
+    def test_candidates_outside_source_are_ignored(self):
+        """Test that candidate filtering drops files outside the source tree or missing."""
+        inside_file = os.path.join(self.source_path, "inside.txt")
+        outside_file = os.path.join(self.temp_dir, "outside.txt")
+        for path in (inside_file, outside_file):
+            with open(path, "w") as f:
+                f.write("content")
+
+        candidates = [
+            (self.source_path, "inside.txt"),
+            (self.temp_dir, "outside.txt"),
+            (self.source_path, "missing.txt")
+        ]
+
+        self.assertEqual(
+            [(root, name) for root, name, _ in iter_candidate_files(self.source_path, candidates)],
+            [(self.source_path, "inside.txt")]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Unit tests for the page cache hints given when streaming I/O is enabled.
+"""
+
+import unittest
+import os
+import hashlib
+import tempfile
+import shutil
+from unittest.mock import patch
+
+from shuttle_common import streaming_io
+from shuttle_common.streaming_io import StreamingIO, DROP_INTERVAL_BYTES
+from shuttle_common.hash_engine import HashEngine
+from shuttle_common.files import copy_file_with_digests
+from shuttle.scanning import prefetch_next_source_file
+
+
+@unittest.skipUnless(streaming_io.STREAMING_IO_AVAILABLE, "posix_fadvise not available")
+class TestStreamingIO(unittest.TestCase):
+
+    def setUp(self):
+        """Create a file spanning several drop intervals."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.size = DROP_INTERVAL_BYTES * 2 + 12345
+        self.source_file = os.path.join(self.temp_dir, "source.bin")
+        with open(self.source_file, "wb") as f:
+            f.write(os.urandom(self.size))
+        with open(self.source_file, "rb") as f:
+            self.expected_hash = hashlib.sha256(f.read()).hexdigest()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def dropped_bytes(self, fadvise):
+        return sum(call.args[2] for call in fadvise.call_args_list if call.args[3] == os.POSIX_FADV_DONTNEED)
+
+    def test_disabled_gives_no_hints(self):
+        """Test that no hints are given while disabled."""
+        engine = HashEngine(streaming_io=StreamingIO(enabled=False))
+        with patch('shuttle_common.streaming_io.os.posix_fadvise') as fadvise:
+            self.assertEqual(engine.hash_file(self.source_file), self.expected_hash)
+        fadvise.assert_not_called()
+
+    def test_hashed_pages_dropped(self):
+        """Test that a hashed file is read sequentially and every byte is dropped from the cache."""
+        engine = HashEngine(buffer_size=1024 * 1024, use_mmap=True, streaming_io=StreamingIO(enabled=True))
+        with patch('shuttle_common.streaming_io.os.posix_fadvise') as fadvise:
+            self.assertEqual(engine.hash_file(self.source_file), self.expected_hash)
+
+        self.assertEqual(fadvise.call_args_list[0].args[1:], (0, 0, os.POSIX_FADV_SEQUENTIAL))
+        self.assertEqual(self.dropped_bytes(fadvise), self.size)
+
+    def test_copied_pages_flushed_and_dropped(self):
+        """Test that a copy drops the pages of both files, flushing the written file first."""
+        target_file = os.path.join(self.temp_dir, "target.bin")
+        with patch('shuttle_common.files.default_streaming_io', StreamingIO(enabled=True)), \
+                patch('shuttle_common.files.default_copy_engine.copy', return_value=None), \
+                patch('shuttle_common.streaming_io.os.posix_fadvise') as fadvise, \
+                patch('shuttle_common.streaming_io.os.fdatasync', wraps=os.fdatasync) as fdatasync:
+            digests = copy_file_with_digests(self.source_file, target_file, ('sha256',))
+
+        self.assertEqual(digests, {'sha256': self.expected_hash})
+        self.assertEqual(os.path.getsize(target_file), self.size)
+        self.assertEqual(self.dropped_bytes(fadvise), self.size * 2)
+        self.assertEqual(fdatasync.call_count, 3)
+
+    def test_prefetch_one_file_ahead(self):
+        """Test that each file is prefetched before the file ahead of it is returned."""
+        entries = [(self.temp_dir, f"file{index}", None) for index in range(3)]
+        events = []
+        with patch('shuttle.scanning.default_streaming_io') as streaming:
+            streaming.prefetch.side_effect = lambda path: events.append(('prefetch', os.path.basename(path)))
+            for entry in prefetch_next_source_file(entries):
+                events.append(('copy', entry[1]))
+
+        self.assertEqual(events, [
+            ('prefetch', 'file0'), ('prefetch', 'file1'), ('copy', 'file0'),
+            ('prefetch', 'file2'), ('copy', 'file1'), ('copy', 'file2')
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests for the StreamingScanPipeline that scans files as they are quarantined.
+"""
+
+import unittest
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from shuttle.scanning import StreamingScanPipeline, ScanTimeoutResult
+from shuttle.quarantine_content_index import QuarantineContentIndex
+from shuttle.post_scan_processing import ProcessingResult
+from scan_test_helpers import make_file_data, SCAN_TASK_ARGS
+
+
+def fake_scan(file_data, *args):
+    """Stand-in for call_scan_and_process_file, run in the scan worker processes."""
+    time.sleep(0.02)
+    return True
+
+
+def fake_timeout_scan(file_data, *args):
+    return ScanTimeoutResult(file_data[0], file_data[1])
+
+
+class TestStreamingScanPipeline(unittest.TestCase):
+
+    def test_sequential_scans_each_file_when_submitted(self):
+        """Test that with one scan thread each file is scanned before submit returns."""
+        with patch('shuttle.scanning.call_scan_and_process_file', side_effect=fake_scan) as scan:
+            pipeline = StreamingScanPipeline(SCAN_TASK_ARGS, max_scan_threads=1)
+            for index in range(3):
+                self.assertTrue(pipeline.submit(make_file_data(index)))
+                self.assertEqual(scan.call_count, index + 1)
+            results, successful_files, failed_files, timeout_shutdown = pipeline.finish()
+
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual((successful_files, failed_files, timeout_shutdown), (3, 0, False))
+        self.assertEqual(pipeline.quarantine_files, [make_file_data(index) for index in range(3)])
+
+    def test_parallel_window_limits_files_in_flight(self):
+        """Test that no more than the window of files are waiting on scans at once."""
+        with patch('shuttle.scanning.call_scan_and_process_file', fake_scan):
+            pipeline = StreamingScanPipeline(SCAN_TASK_ARGS, max_scan_threads=2, max_in_flight=3)
+            try:
+                for index in range(12):
+                    self.assertTrue(pipeline.submit(make_file_data(index)))
+                    self.assertLessEqual(len(pipeline._in_flight), 3)
+                results, successful_files, failed_files, timeout_shutdown = pipeline.finish()
+            finally:
+                pipeline.close()
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual((successful_files, failed_files, timeout_shutdown), (12, 0, False))
+        self.assertEqual(sorted(pipeline.quarantine_files), sorted(make_file_data(index) for index in range(12)))
+
+    def test_timeouts_stop_submission(self):
+        """Test that reaching the timeout limit tells the copy loop to stop."""
+        config = SimpleNamespace(malware_scan_retry_count=2, malware_scan_timeout_seconds=1)
+        with patch('shuttle.scanning.call_scan_and_process_file', side_effect=fake_timeout_scan):
+            pipeline = StreamingScanPipeline(SCAN_TASK_ARGS, max_scan_threads=1, config=config)
+            self.assertTrue(pipeline.submit(make_file_data(0)))
+            self.assertFalse(pipeline.submit(make_file_data(1)))
+            self.assertFalse(pipeline.submit(make_file_data(2)))
+            results, _, _, timeout_shutdown = pipeline.finish()
+
+        self.assertTrue(timeout_shutdown)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(pipeline.failed_count, 2)
+
+    def test_identical_files_scanned_once(self):
+        """Test that files with the same hash are scanned once and each gets a result."""
+        files = [make_file_data(index)[:3] + ("samehash",) + make_file_data(index)[4:] for index in range(3)]
+        with patch('shuttle.scanning.call_scan_and_process_file', return_value=ProcessingResult(True)) as scan, \
+                patch('shuttle.scanning.process_duplicate_file', return_value=ProcessingResult(True)) as duplicate:
+            pipeline = StreamingScanPipeline(SCAN_TASK_ARGS, max_scan_threads=1, content_index=QuarantineContentIndex())
+            for file_data in files:
+                self.assertTrue(pipeline.submit(file_data))
+            results, successful_files, _, _ = pipeline.finish()
+
+        scan.assert_called_once()
+        self.assertEqual(duplicate.call_count, 2)
+        self.assertEqual(pipeline.quarantine_files, files)
+        self.assertEqual(successful_files, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()